@@ -0,0 +1,108 @@
+"""
+CPU pinning benchmark: throughput of CPU-bound simulations run by a single worker.
+
+Runs `--tasks` fake simulations with `execute_simulation_subprocess`, from threads as the eventlet worker does,
+in three modes:
+  oversubscribed - all tasks at once, as with default concurrency of the eventlet pool,
+  sized          - as many tasks at once as cores planned for simulations, not pinned,
+  sized + pinned - the same concurrency, each simulation pinned to a dedicated core (`CPU_PINNING=1`).
+The fake simulator is a single-threaded process doing fixed amount of work and printing progress lines,
+like SHIELD-HIT12A (the fake `rfluka` in yaptide/fake only sleeps, so it does not load the CPU).
+`--noise` starts unpinned busy processes competing for the cores, as noisy neighbours on a shared host.
+Reports simulations per second and the slowest simulation of each mode.
+
+Usage:
+    python benchmarks/cpu_pinning.py --tasks 32 --work 20
+    SIMULATION_NUMA_NODES="0-7;8-15" python benchmarks/cpu_pinning.py --noise 4
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+FAKE_SIMULATOR = """
+import sys
+work = int(sys.argv[1]) * 100000
+total = 0
+for step in range(work):
+    total += step * step % 7
+    if step % 100000 == 0:
+        print(f" Primary particle no. {step // 100000:12d} ETR:    0 hour(s)    0 minute(s)    1 second(s)", flush=True)
+print(" Run time:    0 hour(s)    0 minute(s)    1 second(s)")
+"""
+
+BUSY_LOOP = "while True: pass"
+
+
+def parse_args() -> argparse.Namespace:
+    """Parses command line arguments"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=16, help="number of simulations")
+    parser.add_argument("--work", type=int, default=20, help="work of each simulation, in 100k loop steps")
+    parser.add_argument("--noise", type=int, default=0, help="number of busy processes competing for cores")
+    return parser.parse_args()
+
+
+def run_simulations(tmp_dir: Path, simulator: Path, tasks: int, work: int, concurrency: int) -> tuple[float, float]:
+    """Runs simulations, returns total time and time of the slowest simulation"""
+    from yaptide.celery.utils.pymc import execute_simulation_subprocess
+
+    def run(task_id: int) -> float:
+        work_dir = tmp_dir / f"task_{task_id}"
+        work_dir.mkdir(exist_ok=True)
+        start = time.perf_counter()
+        success, _, stderr = execute_simulation_subprocess(
+            dir_path=work_dir, command_as_list=[sys.executable, str(simulator), str(work)]
+        )
+        if not success:
+            raise RuntimeError(f"Simulation failed: {stderr}")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        durations = list(executor.map(run, range(tasks)))
+    return time.perf_counter() - start, max(durations)
+
+
+def main():
+    """Runs the benchmark in all modes"""
+    args = parse_args()
+    from yaptide.celery.utils import cpu_affinity
+
+    plan = cpu_affinity.get_core_plan()
+    concurrency = len(plan.simulation)
+    print(f"cores reserved: {plan.reserved}, for simulations: {plan.simulation}")
+    print(f"simulations: {args.tasks}, concurrency: {concurrency}, noisy processes: {args.noise}")
+
+    noise = [subprocess.Popen([sys.executable, "-c", BUSY_LOOP]) for _ in range(args.noise)]
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            simulator = Path(tmp_dir) / "fake_simulator.py"
+            simulator.write_text(FAKE_SIMULATOR)
+            modes = (("oversubscribed", args.tasks, False), ("sized", concurrency, False))
+            # pinned mode is the last one, as it pins this process to the reserved cores
+            modes += (("sized + pinned", concurrency, True),)
+            for name, mode_concurrency, pinned in modes:
+                if pinned:
+                    os.environ["CPU_PINNING"] = "1"
+                    cpu_affinity.get_core_pool.cache_clear()
+                    cpu_affinity.pin_worker_process()
+                elapsed, slowest = run_simulations(Path(tmp_dir), simulator, args.tasks, args.work, mode_concurrency)
+                print(f"{name}:")
+                print(f"  throughput:       {args.tasks / elapsed:.2f} simulations/s")
+                print(f"  slowest:          {slowest:.2f} s")
+    finally:
+        for process in noise:
+            process.kill()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Input by reference benchmark: size of task messages of a large job and time of enqueueing them.
+
+Enqueues `run_single_simulation` messages of all tasks of a job, as `run_job` does, with the input embedded
+in every message and with the input uploaded once to the input store and passed by its hash.
+Reports time of enqueueing and memory taken by the queued messages in the broker: growth of `used_memory`
+for a Redis broker, size of the queued messages for the in-memory broker used by default.
+Tasks are sent to a separate queue, which is purged afterwards, no worker is needed.
+The input is uploaded to Redis given with `--redis-url` (by default `REDIS_URL`), without it only the hash
+of the input is computed and upload time is not included.
+
+Usage:
+    python benchmarks/input_by_reference.py --size 2 --tasks 500
+    python benchmarks/input_by_reference.py --broker-url redis://localhost:6379/0 --redis-url redis://localhost:6379/1
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+BENCHMARK_QUEUE = "input_by_reference_benchmark"
+TASK_NAME = "yaptide.celery.tasks.run_single_simulation"
+
+
+def parse_args() -> argparse.Namespace:
+    """Parses command line arguments"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=float, default=2, help="size of the simulation input in megabytes")
+    parser.add_argument("--tasks", type=int, default=500, help="number of tasks of the job")
+    parser.add_argument("--broker-url", default="memory://", help="Celery broker, in-memory broker by default")
+    parser.add_argument("--redis-url", default=os.environ.get("REDIS_URL"), help="Redis used as input store")
+    return parser.parse_args()
+
+
+def generate_input(size_bytes: int) -> dict:
+    """Returns synthetic input files, mostly numbers, as in detector and geometry definitions"""
+    rng = random.Random(0)
+    lines = []
+    size = 0
+    while size < size_bytes:
+        line = " ".join(f"{rng.uniform(-100, 100):10.4f}" for _ in range(6)) + "\n"
+        lines.append(line)
+        size += len(line)
+    return {"beam.dat": "NSTAT 100000\n", "geo.dat": "".join(lines), "mat.dat": "MEDIUM 1\n", "detect.dat": ""}
+
+
+def broker_usage(celery_app) -> int:
+    """Returns memory used by the broker, in bytes"""
+    with celery_app.connection_for_write() as connection:
+        channel = connection.default_channel
+        if connection.transport_cls == "memory":
+            return sum(len(json.dumps(message)) for message in channel._queue_for(BENCHMARK_QUEUE).queue)
+        return int(channel.client.info("memory")["used_memory"])
+
+
+def enqueue(celery_app, ntasks: int, files_dict: Optional[dict], input_ref: Optional[str]) -> None:
+    """Sends messages of all tasks of the job"""
+    with celery_app.producer_or_acquire() as producer:
+        for task_id in range(ntasks):
+            celery_app.send_task(
+                TASK_NAME,
+                kwargs={
+                    "files_dict": files_dict,
+                    "task_id": task_id,
+                    "update_key": "update_key",
+                    "simulation_id": 1,
+                    "sim_type": "shieldhit",
+                    "cycles": 1,
+                    "input_ref": input_ref,
+                },
+                queue=BENCHMARK_QUEUE,
+                producer=producer,
+            )
+
+
+def measure(celery_app, ntasks: int, files_dict: dict, by_reference: bool, input_store) -> tuple[float, int]:
+    """Enqueues the job, returns enqueue time (including upload of the input) and broker memory of its messages"""
+    from yaptide.celery.utils.input_cache import input_hash
+
+    with celery_app.connection_for_write() as connection:
+        connection.default_channel.queue_purge(BENCHMARK_QUEUE)
+    usage_before = broker_usage(celery_app)
+    start = time.perf_counter()
+    if by_reference:
+        input_ref = input_hash(files_dict) if input_store is None else input_store.put(files_dict)
+        enqueue(celery_app, ntasks, files_dict=None, input_ref=input_ref)
+    else:
+        enqueue(celery_app, ntasks, files_dict=files_dict, input_ref=None)
+    elapsed = time.perf_counter() - start
+    usage = broker_usage(celery_app) - usage_before
+    with celery_app.connection_for_write() as connection:
+        connection.default_channel.queue_purge(BENCHMARK_QUEUE)
+    return elapsed, usage
+
+
+def main():
+    """Runs the benchmark with input embedded in messages and passed by reference"""
+    args = parse_args()
+    from kombu import Queue
+
+    from yaptide.celery.simulation_worker import celery_app
+
+    celery_app.conf.broker_url = args.broker_url
+    celery_app.conf.task_queues = [Queue(BENCHMARK_QUEUE)]
+    with celery_app.connection_for_write() as connection:
+        Queue(BENCHMARK_QUEUE, channel=connection.default_channel).declare()
+
+    input_store = None
+    if args.redis_url:
+        import redis
+
+        from yaptide.celery.utils.input_store import InputStore
+
+        input_store = InputStore(redis_client=redis.Redis.from_url(args.redis_url))
+    else:
+        print("input store not configured, input upload not included")
+
+    files_dict = generate_input(int(args.size * 1024 * 1024))
+    print(f"input: {sum(len(content) for content in files_dict.values()) / 1024 / 1024:.1f} MB, tasks: {args.tasks}")
+    results = {}
+    for name, by_reference in (("embedded", False), ("by reference", True)):
+        elapsed, usage = measure(celery_app, args.tasks, files_dict, by_reference, input_store)
+        results[name] = elapsed, usage
+        print(f"{name}:")
+        print(f"  enqueue time:     {elapsed:.3f} s")
+        print(f"  broker memory:    {usage / 1024 / 1024:.2f} MB")
+    print(f"enqueue speedup:    {results['embedded'][0] / results['by reference'][0]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
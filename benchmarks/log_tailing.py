@@ -0,0 +1,117 @@
+"""
+Log tailing benchmark: latency of progress lines and wakeups of idle task monitors.
+
+Starts several monitors following their own log files with `log_generator`, as celery workers
+and batch watchers do, appends progress lines to the files at a fixed interval and then leaves
+the monitors idle. Reports latency between writing a line and reading it by the monitor
+and number of wakeups per monitor per second while idle, with inotify and with the polling fallback.
+
+Usage:
+    python benchmarks/log_tailing.py --monitors 32 --lines 20 --interval 0.1 --idle 5
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from yaptide.batch import watcher  # noqa: E402
+
+
+def parse_args() -> argparse.Namespace:
+    """Parses command line arguments"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--monitors", type=int, default=32, help="number of monitored log files")
+    parser.add_argument("--lines", type=int, default=20, help="number of progress lines written to each file")
+    parser.add_argument("--interval", type=float, default=0.1, help="seconds between progress lines")
+    parser.add_argument("--idle", type=float, default=5, help="seconds during which monitors wait for new data")
+    parser.add_argument("--polling-interval", type=float, default=1, help="polling interval of the fallback")
+    return parser.parse_args()
+
+
+class CountingWaiter(watcher.LogWaiter):
+    """Log waiter counting its wakeups"""
+
+    wakeups = 0
+    lock = threading.Lock()
+
+    def wait(self, timeout: float) -> bool:
+        stop = super().wait(timeout)
+        with CountingWaiter.lock:
+            CountingWaiter.wakeups += 1
+        return stop
+
+
+def monitor(filepath: Path, event: watcher.StopEvent, lines: int, latencies: list, polling_interval: float):
+    """Follows the log file and records latency of progress lines, which contain time of writing"""
+    with open(filepath) as thefile:
+        for line in watcher.log_generator(thefile, event, polling_interval_seconds=polling_interval):
+            latencies.append(time.monotonic() - float(line))
+            lines -= 1
+            if lines == 0:
+                break
+        # wait idle for new data until stopped
+        for _ in watcher.log_generator(thefile, event, polling_interval_seconds=polling_interval):
+            pass
+
+
+def run(args: argparse.Namespace, mode: str) -> None:
+    """Runs the benchmark with inotify or with polling"""
+    CountingWaiter.wakeups = 0
+    latencies = []
+    event = watcher.StopEvent()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filepaths = [Path(tmp_dir) / f"shieldhit_{number:04d}.log" for number in range(args.monitors)]
+        for filepath in filepaths:
+            filepath.write_text("")
+        threads = [
+            threading.Thread(target=monitor, args=(filepath, event, args.lines, latencies, args.polling_interval))
+            for filepath in filepaths
+        ]
+        for thread in threads:
+            thread.start()
+        for _ in range(args.lines):
+            time.sleep(args.interval)
+            for filepath in filepaths:
+                with open(filepath, "a") as logfile:
+                    logfile.write(f"{time.monotonic()}\n")
+        time.sleep(args.interval)
+        wakeups_before_idle = CountingWaiter.wakeups
+        time.sleep(args.idle)
+        idle_wakeups = CountingWaiter.wakeups - wakeups_before_idle
+        stopped_at = time.monotonic()
+        event.set()
+        for thread in threads:
+            thread.join()
+        stop_latency = time.monotonic() - stopped_at
+
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    print(f"{mode}:")
+    print(f"  lines read:           {len(latencies_ms)} / {args.monitors * args.lines}")
+    print(f"  latency mean:         {statistics.mean(latencies_ms):.1f} ms")
+    print(f"  latency p95:          {latencies_ms[int(len(latencies_ms) * 0.95)]:.1f} ms")
+    print(f"  latency max:          {latencies_ms[-1]:.1f} ms")
+    print(f"  idle wakeups:         {idle_wakeups / args.monitors / args.idle:.2f} per monitor per second")
+    print(f"  stop latency:         {stop_latency * 1000:.1f} ms")
+
+
+def main():
+    """Runs the benchmark with inotify and with polling fallback"""
+    args = parse_args()
+    watcher.LogWaiter = CountingWaiter
+    run(args, "inotify")
+
+    def inotify_not_available():
+        raise OSError("disabled by the benchmark")
+
+    watcher.InotifyWatch = inotify_not_available
+    run(args, "polling")
+
+
+if __name__ == "__main__":
+    main()
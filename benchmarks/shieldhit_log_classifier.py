@@ -0,0 +1,108 @@
+"""
+SHIELD-HIT12A log classifier benchmark: throughput of parsing log lines by task monitors.
+
+Parses a SHIELD-HIT12A log with the previous approach (uncompiled patterns searched in every line,
+numbers extracted by splitting the line) and with `classify_shieldhit_line` (keyword check first,
+then compiled pattern matched at the keyword). Reports lines and megabytes parsed per second.
+A recorded log may be given with `--log`, otherwise a synthetic log of the given size is generated,
+with progress lines interleaved with other output of the simulator.
+
+Usage:
+    python benchmarks/shieldhit_log_classifier.py --size 100
+    python benchmarks/shieldhit_log_classifier.py --log path/to/shieldhit_0001.log
+"""
+
+import argparse
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from yaptide.batch.watcher import classify_shieldhit_line  # noqa: E402
+
+LEGACY_RUN_MATCH = r"\bPrimary particle no.\s*\d*\s*ETR:\s*\d*\s*hour.*\d*\s*minute.*\d*\s*second.*\b"
+LEGACY_COMPLETE_MATCH = r"\bRun time:\s*\d*\s*hour.*\d*\s*minute.*\d*\s*second.*\b"
+LEGACY_REQUESTED_MATCH = r"\bRequested number of primaries NSTAT"
+
+OTHER_LINES = [
+    " Reading beam file: beam.dat\n",
+    " Transport of particles started\n",
+    " WARNING: particle energy below cutoff, particle discarded\n",
+    " Saving detector output for geometry mesh\n",
+]
+
+
+def parse_args() -> argparse.Namespace:
+    """Parses command line arguments"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", type=Path, help="recorded SHIELD-HIT12A log, synthetic log is generated if not given")
+    parser.add_argument("--size", type=int, default=100, help="size of synthetic log in megabytes")
+    return parser.parse_args()
+
+
+def legacy_classify(line: str) -> Optional[tuple]:
+    """Previous way of parsing log lines by monitors"""
+    if re.search(LEGACY_RUN_MATCH, line):
+        splitted = line.split()
+        return int(splitted[3]), int(splitted[9]) + int(splitted[7]) * 60 + int(splitted[5]) * 3600
+    if re.search(LEGACY_REQUESTED_MATCH, line):
+        return (int(line.split(": ")[1]),)
+    if re.search(LEGACY_COMPLETE_MATCH, line):
+        return ()
+    return None
+
+
+def generate_log(filepath: Path, size_bytes: int) -> None:
+    """Writes synthetic SHIELD-HIT12A log, mostly progress lines with some other output in between"""
+    with open(filepath, "w") as logfile:
+        logfile.write(" SHIELD-HIT12A\n Requested number of primaries NSTAT: 100000000\n")
+        primaries = 0
+        while logfile.tell() < size_bytes:
+            primaries += 1
+            remaining = 100000000 - primaries
+            logfile.write(
+                f" Primary particle no. {primaries:12d} ETR: {remaining // 3600000:4d} hour(s) "
+                f"{remaining // 60000 % 60:4d} minute(s) {remaining // 1000 % 60:4d} second(s)\n"
+            )
+            if primaries % 10 == 0:
+                logfile.write(OTHER_LINES[primaries // 10 % len(OTHER_LINES)])
+        logfile.write(" Run time:    27 hour(s)   46 minute(s)  40 second(s)\n")
+
+
+def measure(lines: list[str], classify: Callable[[str], object]) -> tuple[float, int]:
+    """Returns time of classifying all lines and number of relevant lines"""
+    start = time.perf_counter()
+    relevant = sum(1 for line in lines if classify(line) is not None)
+    return time.perf_counter() - start, relevant
+
+
+def main():
+    """Runs the benchmark for both classifiers"""
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filepath = args.log
+        if filepath is None:
+            filepath = Path(tmp_dir) / "shieldhit_0001.log"
+            generate_log(filepath, args.size * 1024 * 1024)
+        with open(filepath) as logfile:
+            lines = logfile.readlines()
+    megabytes = sum(len(line) for line in lines) / 1024 / 1024
+
+    print(f"log: {len(lines)} lines, {megabytes:.1f} MB")
+    results = {}
+    for name, classify in (("regex search + split", legacy_classify), ("keyword + compiled", classify_shieldhit_line)):
+        elapsed, relevant = measure(lines, classify)
+        results[name] = elapsed
+        print(f"{name}:")
+        print(f"  relevant lines:   {relevant}")
+        print(f"  time:             {elapsed:.2f} s")
+        print(f"  throughput:       {len(lines) / elapsed / 1e6:.2f} M lines/s, {megabytes / elapsed:.1f} MB/s")
+    print(f"speedup: {results['regex search + split'] / results['keyword + compiled']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
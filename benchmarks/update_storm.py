@@ -0,0 +1,159 @@
+"""
+Update storm benchmark: many simulation tasks sending progress updates to the backend at the same time.
+
+Creates simulations with tasks in a temporary SQLite database (or in the database given
+by `FLASK_SQLALCHEMY_DATABASE_URI`) and sends progress updates of all tasks to `/tasks`
+from several threads, as workers of a large job do. Reports throughput and latency of the updates.
+
+Usage:
+    python benchmarks/update_storm.py --simulations 10 --tasks 100 --rounds 5
+    python benchmarks/update_storm.py --no-update-key-cache --profile
+"""
+
+import argparse
+import cProfile
+import os
+import pstats
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def parse_args() -> argparse.Namespace:
+    """Parses command line arguments"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--simulations", type=int, default=10, help="number of simulations")
+    parser.add_argument("--tasks", type=int, default=100, help="number of tasks of each simulation")
+    parser.add_argument("--rounds", type=int, default=5, help="number of progress updates sent by each task")
+    parser.add_argument("--threads", type=int, default=8, help="number of threads sending updates")
+    parser.add_argument("--no-update-key-cache", action="store_true", help="verify update key on every request")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="print functions taking most of the time, updates are sent from a single thread",
+    )
+    return parser.parse_args()
+
+
+def create_simulations(app, simulations: int, tasks: int) -> list[tuple[int, str]]:
+    """Creates running simulations with tasks, returns their ids and update keys"""
+    from yaptide.persistence.database import db
+    from yaptide.persistence.models import CelerySimulationModel, CeleryTaskModel, YaptideUserModel
+    from yaptide.routes.utils.tokens import encode_simulation_auth_token
+    from yaptide.utils.enums import EntityState, InputType, SimulationType
+
+    with app.app_context():
+        user = YaptideUserModel(username="update_storm")
+        user.set_password("update_storm")
+        db.session.add(user)
+        db.session.commit()
+        result = []
+        for number in range(simulations):
+            simulation = CelerySimulationModel(
+                job_id=f"update_storm_{number}",
+                user_id=user.id,
+                input_type=InputType.FILES.value,
+                sim_type=SimulationType.SHIELDHIT.value,
+                title=f"update storm {number}",
+                job_state=EntityState.RUNNING.value,
+                running_tasks=tasks,
+                requested_primaries=tasks * 10**6,
+            )
+            db.session.add(simulation)
+            db.session.commit()
+            db.session.add_all(
+                CeleryTaskModel(
+                    simulation_id=simulation.id,
+                    task_id=task_id,
+                    requested_primaries=10**6,
+                    task_state=EntityState.RUNNING.value,
+                )
+                for task_id in range(1, tasks + 1)
+            )
+            db.session.commit()
+            result.append((simulation.id, encode_simulation_auth_token(simulation.id)))
+    return result
+
+
+def send_updates(app, simulations: list[tuple[int, str]], tasks: int, rounds: int, threads: int) -> list[float]:
+    """Sends progress updates of all tasks, returns latencies of the requests in seconds"""
+    local = threading.local()
+
+    def send(update: tuple[int, str, int, int]) -> float:
+        sim_id, update_key, task_id, primaries = update
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+        payload = {
+            "simulation_id": sim_id,
+            "task_id": task_id,
+            "update_key": update_key,
+            "update_dict": {"simulated_primaries": primaries, "estimated_time": 60},
+        }
+        start = time.perf_counter()
+        resp = local.client.post("/tasks", json=payload)
+        latency = time.perf_counter() - start
+        if resp.status_code != 202:
+            raise RuntimeError(f"Update rejected: {resp.status_code} {resp.json}")
+        return latency
+
+    updates = [
+        (sim_id, update_key, task_id, 1000 * (update_round + 1))
+        for update_round in range(rounds)
+        for sim_id, update_key in simulations
+        for task_id in range(1, tasks + 1)
+    ]
+    if threads == 1:
+        return [send(update) for update in updates]
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(send, updates))
+
+
+def main():
+    """Runs the benchmark"""
+    args = parse_args()
+    database_file = None
+    if "FLASK_SQLALCHEMY_DATABASE_URI" not in os.environ:
+        # in-memory SQLite database is not shared between threads, temporary file is used instead
+        database_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        os.environ["FLASK_SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{database_file.name}"
+    if args.no_update_key_cache:
+        os.environ["UPDATE_KEY_CACHE_TTL"] = "0"
+
+    from yaptide.application import create_app
+    from yaptide.routes.utils.update_key_cache import get_update_key_cache
+
+    app = create_app()
+    simulations = create_simulations(app, simulations=args.simulations, tasks=args.tasks)
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    start = time.perf_counter()
+    # profiler sees only the thread which enabled it
+    threads = 1 if args.profile else args.threads
+    latencies = send_updates(app, simulations, tasks=args.tasks, rounds=args.rounds, threads=threads)
+    duration = time.perf_counter() - start
+    if profiler:
+        profiler.disable()
+
+    latencies.sort()
+    print(f"updates:          {len(latencies)}")
+    print(f"throughput:       {len(latencies) / duration:.1f} updates/s")
+    print(f"mean latency:     {1000 * statistics.mean(latencies):.2f} ms")
+    print(f"p95 latency:      {1000 * latencies[int(0.95 * (len(latencies) - 1))]:.2f} ms")
+    print(f"update key cache: {get_update_key_cache().stats()}")
+    if profiler:
+        pstats.Stats(profiler).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(25)
+
+    if database_file:
+        os.unlink(database_file.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""add task counters to simulation
+
+Revision ID: 456ef8cf37aa
+Revises: 5003b9acb1f4
+Create Date: 2026-10-19 14:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '456ef8cf37aa'
+down_revision = '5003b9acb1f4'
+branch_labels = None
+depends_on = None
+
+TASK_STATE_COUNTER_COLUMNS = {
+    'PENDING': 'pending_tasks',
+    'RUNNING': 'running_tasks',
+    'COMPLETED': 'completed_tasks',
+    'FAILED': 'failed_tasks',
+    'CANCELED': 'canceled_tasks',
+}
+
+
+def upgrade():
+    with op.batch_alter_table('Simulation', schema=None) as batch_op:
+        for column in TASK_STATE_COUNTER_COLUMNS.values():
+            batch_op.add_column(sa.Column(column, sa.Integer(), nullable=False, server_default="0"))
+        batch_op.add_column(sa.Column('requested_primaries', sa.BigInteger(), nullable=False, server_default="0"))
+        batch_op.add_column(sa.Column('simulated_primaries', sa.BigInteger(), nullable=False, server_default="0"))
+        batch_op.add_column(sa.Column('tasks_update_time', sa.DateTime(timezone=True), nullable=True))
+
+    # counters of existing simulations are computed from their tasks with a single UPDATE statement
+    simulation = sa.table(
+        'Simulation',
+        sa.column('id', sa.Integer),
+        *(sa.column(column, sa.Integer) for column in TASK_STATE_COUNTER_COLUMNS.values()),
+        sa.column('requested_primaries', sa.BigInteger),
+        sa.column('simulated_primaries', sa.BigInteger),
+        sa.column('tasks_update_time', sa.DateTime(timezone=True)),
+    )
+    task = sa.table(
+        'Task',
+        sa.column('simulation_id', sa.Integer),
+        sa.column('task_state', sa.String),
+        sa.column('requested_primaries', sa.Integer),
+        sa.column('simulated_primaries', sa.Integer),
+        sa.column('last_update_time', sa.DateTime(timezone=True)),
+    )
+    simulation_tasks = task.c.simulation_id == simulation.c.id
+    values = {
+        column: sa.select(sa.func.count()).where(simulation_tasks, task.c.task_state == state).scalar_subquery()
+        for state, column in TASK_STATE_COUNTER_COLUMNS.items()
+    }
+    for column in ('requested_primaries', 'simulated_primaries'):
+        total = sa.func.coalesce(sa.func.sum(task.c[column]), 0)
+        values[column] = sa.select(total).where(simulation_tasks).scalar_subquery()
+    last_update = sa.func.max(task.c.last_update_time)
+    values['tasks_update_time'] = sa.select(last_update).where(simulation_tasks).scalar_subquery()
+    op.execute(simulation.update().values(values))
+
+
+def downgrade():
+    with op.batch_alter_table('Simulation', schema=None) as batch_op:
+        batch_op.drop_column('tasks_update_time')
+        batch_op.drop_column('simulated_primaries')
+        batch_op.drop_column('requested_primaries')
+        for column in reversed(TASK_STATE_COUNTER_COLUMNS.values()):
+            batch_op.drop_column(column)
@@ -29,4 +29,13 @@ else
     ./yaptide/admin/simulators.py download-fluka --dir /simulators
 fi
 
-celery --app yaptide.celery.simulation_worker worker --events --loglevel="$LOG_LEVEL_ROOT" --pool eventlet --hostname yaptide-simulation-worker --queues simulations
+# with CPU pinning the worker runs one simulation per core available for simulations (within cgroup CPU quota)
+# and takes only tasks it can start, so tasks are not held by a busy worker
+CONCURRENCY_OPTIONS=()
+if [[ "${CPU_PINNING,,}" =~ ^(1|true|yes)$ ]]; then
+    CONCURRENCY="$(python3 -m yaptide.celery.utils.cpu_affinity)"
+    echo "CPU pinning enabled, running $CONCURRENCY simulations at once"
+    CONCURRENCY_OPTIONS=(--concurrency "$CONCURRENCY" --prefetch-multiplier 1)
+fi
+
+celery --app yaptide.celery.simulation_worker worker --events --loglevel="$LOG_LEVEL_ROOT" --pool eventlet --hostname yaptide-simulation-worker --queues simulations "${CONCURRENCY_OPTIONS[@]}"
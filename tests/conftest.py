@@ -1,4 +1,5 @@
 import copy
+from contextlib import contextmanager
 import json
 import logging
 from pathlib import Path
@@ -7,8 +8,18 @@ from typing import Generator
 import pytest
 import os
 
+import redis
+from sqlalchemy import event
+
 from yaptide.application import create_app
 from yaptide.persistence.database import db
+from yaptide.persistence.live_progress import get_live_progress_store
+from yaptide.persistence.throughput import get_throughput_store
+from yaptide.routes.utils.user_cache import get_user_cache
+from yaptide.utils.redis_client import get_redis_client
+
+# singletons which keep the Redis client of the process
+REDIS_SINGLETONS = (get_redis_client, get_live_progress_store, get_throughput_store, get_user_cache)
 
 
 @pytest.fixture(scope="session")
@@ -139,6 +150,31 @@ def db_session():
         db.drop_all()
 
 
+@pytest.fixture
+def redis_client(monkeypatch) -> Generator[redis.Redis, None, None]:
+    """
+    Redis used by all Redis clients created by the application, emptied before each test.
+    Server is read from `TEST_REDIS_URL` (Redis service in CI), if it is not reachable
+    in-memory fakeredis is used when installed, otherwise the test is skipped.
+    """
+    redis_url = os.environ.get("TEST_REDIS_URL", "redis://localhost:6379/15")
+    client = redis.Redis.from_url(redis_url, socket_timeout=5)
+    try:
+        client.ping()
+    except redis.RedisError:
+        fakeredis = pytest.importorskip("fakeredis", reason="Redis is not available")
+        server = fakeredis.FakeServer()
+        client = fakeredis.FakeRedis(server=server)
+        monkeypatch.setattr(redis.Redis, "from_url", lambda *args, **kwargs: fakeredis.FakeRedis(server=server))
+    monkeypatch.setenv("REDIS_URL", redis_url)
+    client.flushdb()
+    for singleton in REDIS_SINGLETONS:
+        singleton.cache_clear()
+    yield client
+    for singleton in REDIS_SINGLETONS:
+        singleton.cache_clear()
+
+
 @pytest.fixture(scope="session")
 def db_good_username() -> str:
     """Username for user with valid password"""
@@ -165,3 +201,18 @@ def check_if_environment_variables_set(variables: list[str]) -> bool:
             logging.error("variable %s not set", var_name)
             result = False
     return result
+
+
+@contextmanager
+def captured_statements() -> Generator[list[str], None, None]:
+    """Captures SQL statements executed on the database engine"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):  # skipcq: PYL-W0613
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
@@ -0,0 +1,35 @@
+import json
+
+from yaptide.batch import watcher
+from yaptide.routes.utils.backpressure import UpdateLoadMonitor
+
+
+def test_update_interval_is_not_extended_under_light_load():
+    """Test that monitors keep their default interval while the backend is not busy"""
+    monitor = UpdateLoadMonitor(base_interval=2, max_interval=60, target_load=0.5, window=10)
+    for _ in range(10):
+        interval = monitor.record(updates=1, seconds=0.01)
+
+    assert interval == 2
+
+
+def test_update_interval_grows_with_load_up_to_limit():
+    """Test that interval is extended when the backend is overloaded, but not above the maximum"""
+    monitor = UpdateLoadMonitor(base_interval=2, max_interval=60, target_load=0.5, window=10)
+    interval = monitor.record(updates=100, seconds=10)
+
+    assert interval == 2 * (10 / 10) / 0.5
+    for _ in range(20):
+        interval = monitor.record(updates=100, seconds=10)
+    assert interval == 60
+
+
+def test_watcher_uses_suggested_update_interval(monkeypatch):
+    """Test that batch watcher reads the interval from response body and ignores malformed responses"""
+    monkeypatch.setattr(watcher, "min_update_interval_seconds", 0.0)
+    watcher.record_min_update_interval(json.dumps({"message": "Task updated", "min_update_interval": 8}).encode())
+    assert watcher.min_update_interval_seconds == 8
+
+    watcher.record_min_update_interval(b"not json")
+    watcher.record_min_update_interval(json.dumps({"message": "Task updated"}).encode())
+    assert watcher.min_update_interval_seconds == 8
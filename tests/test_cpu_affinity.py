@@ -0,0 +1,64 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+from yaptide.celery.utils import cpu_affinity
+from yaptide.celery.utils.cpu_affinity import CorePlan, CorePool, cgroup_cpu_limit, parse_cpu_list, plan_cores
+from yaptide.celery.utils.pymc import execute_simulation_subprocess
+
+
+@pytest.mark.parametrize(
+    "cpu_max,expected",
+    [("400000 100000\n", 4.0), ("150000 100000\n", 1.5), ("max 100000\n", None)],
+)
+def test_cgroup_cpu_limit(tmp_path: Path, cpu_max: str, expected: float):
+    """Test that CPU quota is read from cgroup v2 file and from cgroup v1 files"""
+    (tmp_path / "cpu.max").write_text(cpu_max)
+    assert cgroup_cpu_limit(cpu_max=tmp_path / "cpu.max") == expected
+
+    (tmp_path / "quota").write_text("200000\n")
+    (tmp_path / "period").write_text("100000\n")
+    assert cgroup_cpu_limit(tmp_path / "missing", tmp_path / "quota", tmp_path / "period") == 2.0
+    assert cgroup_cpu_limit(tmp_path / "missing", tmp_path / "missing", tmp_path / "missing") is None
+
+
+def test_cores_are_planned_within_quota_and_spread_over_numa_nodes():
+    """Test that cores fit the CPU quota, one is reserved and the rest alternate between NUMA nodes"""
+    nodes = [parse_cpu_list("0-3"), parse_cpu_list("8-10,11")]
+
+    assert plan_cores(nodes, cpu_limit=4.5) == CorePlan(reserved=(0,), simulation=(8, 1, 9))
+    assert plan_cores(nodes, cpu_limit=None, reserved_cores=2) == CorePlan((0, 8), (1, 9, 2, 10, 3, 11))
+    assert plan_cores([[0, 1, 2]], cpu_limit=0.5) == CorePlan(reserved=(), simulation=(0,))
+
+
+def test_simulations_get_dedicated_cores():
+    """Test that running simulations get different cores and released cores are used again"""
+    pool = CorePool((2, 5))
+    with pool.core() as first, pool.core() as second, pool.core() as third:
+        assert (first, second, third) == (2, 5, None)
+    with pool.core() as core:
+        assert core == 2
+
+
+def test_simulation_subprocess_is_pinned(tmp_path: Path, monkeypatch):
+    """Test that simulator and processes it starts run on the first core planned for simulations"""
+    monkeypatch.setenv("CPU_PINNING", "1")
+    cpu_affinity.get_core_plan.cache_clear()
+    cpu_affinity.get_core_pool.cache_clear()
+    worker_affinity = os.sched_getaffinity(0)
+    try:
+        core = cpu_affinity.get_core_plan().simulation[0]
+        # worker process runs on the reserved cores, the launcher starts the actual simulator
+        cpu_affinity.pin_worker_process()
+        simulator = "import os; print(sorted(os.sched_getaffinity(0)))"
+        launcher = f"import subprocess, sys; subprocess.run([sys.executable, '-c', {simulator!r}])"
+        command = [sys.executable, "-c", launcher]
+        success, stdout, _ = execute_simulation_subprocess(dir_path=tmp_path, command_as_list=command)
+    finally:
+        os.sched_setaffinity(0, worker_affinity)
+        cpu_affinity.get_core_pool.cache_clear()
+
+    assert success
+    assert stdout == f"[{core}]\n"
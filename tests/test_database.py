@@ -4,6 +4,7 @@ import time
 from sqlalchemy.orm.scoping import scoped_session
 from sqlalchemy.orm import with_polymorphic
 
+from yaptide.persistence.db_methods import update_task_state, update_tasks_states
 from yaptide.utils.enums import PlatformType, EntityState, InputType, SimulationType
 from yaptide.persistence.models import (
     UserModel,
@@ -190,7 +191,7 @@ def test_celery_task_model_creation_and_update(
         "simulated_primaries": 500,
         "start_time": start_time,
     }
-    task.update_state(update_dict=update_dict)
+    update_task_state(sim_id=simulation.id, task_id=task.task_id, update_dict=update_dict)
     assert task.simulated_primaries == 500
     assert task.task_state == EntityState.RUNNING.value
     assert task.end_time is None
@@ -200,7 +201,7 @@ def test_celery_task_model_creation_and_update(
 
     end_time = datetime.utcnow().isoformat(sep=" ")
     update_dict = {"task_state": EntityState.COMPLETED.value, "end_time": end_time, "simulated_primaries": 1000}
-    task.update_state(update_dict=update_dict)
+    update_task_state(sim_id=simulation.id, task_id=task.task_id, update_dict=update_dict)
     assert task.simulated_primaries == 1000
     assert task.task_state == EntityState.COMPLETED.value
     assert task.end_time is not None
@@ -246,7 +247,7 @@ def test_batch_task_model_creation_and_update(db_session: scoped_session, db_goo
 
     start_time = datetime.utcnow().isoformat(sep=" ")
     update_dict = {"task_state": EntityState.RUNNING.value, "simulated_primaries": 500, "start_time": start_time}
-    task.update_state(update_dict=update_dict)
+    update_task_state(sim_id=simulation.id, task_id=task.task_id, update_dict=update_dict)
     assert task.simulated_primaries == 500
     assert task.task_state == EntityState.RUNNING.value
     assert task.end_time is None
@@ -255,7 +256,7 @@ def test_batch_task_model_creation_and_update(db_session: scoped_session, db_goo
 
     end_time = datetime.utcnow().isoformat(sep=" ")
     update_dict = {"task_state": EntityState.COMPLETED.value, "end_time": end_time, "simulated_primaries": 1000}
-    task.update_state(update_dict=update_dict)
+    update_task_state(sim_id=simulation.id, task_id=task.task_id, update_dict=update_dict)
     assert task.simulated_primaries == 1000
     assert task.task_state == EntityState.COMPLETED.value
     assert task.end_time is not None
@@ -278,6 +279,8 @@ def test_celery_simulation_with_multiple_tasks(
         input_type=InputType.EDITOR.value,
         sim_type=SimulationType.SHIELDHIT.value,
         title="testtitle",
+        pending_tasks=100,
+        requested_primaries=100 * 1000,
     )
     db_session.add(simulation)
     db_session.commit()
@@ -295,20 +298,18 @@ def test_celery_simulation_with_multiple_tasks(
 
     start_time = datetime.utcnow().isoformat(sep=" ")
     update_dict = {"task_state": EntityState.RUNNING.value, "simulated_primaries": 1, "start_time": start_time}
-    for task in tasks:
-        task.update_state(update_dict=update_dict)
-    db_session.commit()
+    update_tasks_states(updates=[(simulation.id, task.task_id, update_dict) for task in tasks])
 
     time.sleep(1)
 
     update_dict = {"task_state": EntityState.RUNNING.value, "simulated_primaries": 500}
-
+    updates = []
     for idx, task in enumerate(tasks):
         if idx == 50:
             end_time = datetime.utcnow().isoformat(sep=" ")
             update_dict = {"task_state": EntityState.COMPLETED.value, "end_time": end_time, "simulated_primaries": 1000}
-        task.update_state(update_dict=update_dict)
-    db_session.commit()
+        updates.append((simulation.id, task.task_id, update_dict))
+    update_tasks_states(updates=updates)
 
     tasks_running: list[CeleryTaskModel] = CeleryTaskModel.query.filter_by(
         simulation_id=simulation.id, task_state=EntityState.RUNNING.value
@@ -332,6 +333,53 @@ def test_celery_simulation_with_multiple_tasks(
         assert task.end_time is not None
         assert task.end_time > task.start_time
 
+    # task counters of the simulation are changed by the updates, without counting the tasks
+    db_session.refresh(simulation)
+    assert (simulation.pending_tasks, simulation.running_tasks, simulation.completed_tasks) == (0, 50, 50)
+    assert simulation.simulated_primaries == 50 * 500 + 50 * 1000
+    assert simulation.requested_primaries == 100 * 1000
+
+
+def test_task_update_rules(db_session: scoped_session, db_good_username: str, db_good_password: str):
+    """Test that progress does not go back, times are set once and finished tasks are not changed"""
+    user = YaptideUserModel(username=db_good_username)
+    user.set_password(db_good_password)
+    db_session.add(user)
+    db_session.commit()
+    simulation = CelerySimulationModel(
+        job_id="testjob",
+        user_id=user.id,
+        input_type=InputType.EDITOR.value,
+        sim_type=SimulationType.SHIELDHIT.value,
+        title="testtitle",
+        pending_tasks=1,
+        requested_primaries=1000,
+    )
+    db_session.add(simulation)
+    db_session.commit()
+    task = CeleryTaskModel(simulation_id=simulation.id, task_id=1, requested_primaries=1000)
+    db_session.add(task)
+    db_session.commit()
+
+    updates = [
+        {"task_state": EntityState.RUNNING.value, "simulated_primaries": 500, "start_time": "2024-01-01 10:00:00.0"},
+        {"simulated_primaries": 200, "start_time": "2024-01-01 11:00:00.0", "estimated_time": 60},
+        {"task_state": EntityState.FAILED.value, "end_time": "2024-01-01 12:00:00.0"},
+        {"task_state": EntityState.CANCELED.value, "simulated_primaries": 900},
+    ]
+    results = [update_task_state(sim_id=simulation.id, task_id=1, update_dict=update) for update in updates]
+
+    assert [result is not None for result in results] == [True, True, True, False]
+    assert results[1].simulated_primaries == 500
+    assert results[1].estimated_time == 60
+    assert results[2].estimated_time is None
+    db_session.refresh(task)
+    assert (task.task_state, task.simulated_primaries) == (EntityState.FAILED.value, 500)
+    assert (task.start_time.hour, task.end_time.hour) == (10, 12)
+    db_session.refresh(simulation)
+    assert (simulation.pending_tasks, simulation.running_tasks, simulation.failed_tasks) == (0, 0, 1)
+    assert simulation.simulated_primaries == 500
+
 
 def test_create_input(
     db_session: scoped_session, db_good_username: str, db_good_password: str, payload_editor_dict_data: dict
@@ -0,0 +1,144 @@
+from typing import Generator
+
+import pytest
+from sqlalchemy import inspect
+from sqlalchemy.orm.scoping import scoped_session
+
+from yaptide.persistence.db_methods import (
+    fetch_estimator_by_sim_id_and_est_name,
+    fetch_estimators_by_sim_id,
+    fetch_input_by_sim_id,
+    fetch_logfiles_by_sim_id,
+    fetch_page_by_est_id_and_page_number,
+    fetch_pages_by_estimator_id,
+    fetch_pages_metadata_by_est_id,
+    fetch_simulation_by_job_id,
+    fetch_tasks_by_sim_id,
+)
+from yaptide.persistence.models import (
+    CelerySimulationModel,
+    CeleryTaskModel,
+    EstimatorModel,
+    InputModel,
+    LogfilesModel,
+    PageModel,
+    YaptideUserModel,
+)
+from yaptide.utils.enums import InputType, SimulationType
+from tests.conftest import captured_statements
+
+BLOB_COLUMN = "compressed_data"
+
+
+def loaded_blob_bytes(objects: list) -> int:
+    """Returns number of bytes of blob columns which were loaded into the provided ORM objects"""
+    return sum(len(obj.__dict__.get(BLOB_COLUMN) or b"") for obj in objects)
+
+
+def loaded_columns(obj) -> set[str]:
+    """Returns names of column attributes loaded into the provided ORM object"""
+    state = inspect(obj)
+    return {attr.key for attr in state.mapper.column_attrs if attr.key not in state.unloaded}
+
+
+@pytest.fixture(scope="function")
+def simulation_id(
+    db_session: scoped_session, db_good_username: str, db_good_password: str, result_dict_data: dict
+) -> Generator[int, None, None]:
+    """Stores simulation with input, logfiles, tasks and results in the database and returns its id"""
+    user = YaptideUserModel(username=db_good_username)
+    user.set_password(db_good_password)
+    db_session.add(user)
+    db_session.commit()
+
+    simulation = CelerySimulationModel(
+        job_id="testjob",
+        user_id=user.id,
+        input_type=InputType.FILES.value,
+        sim_type=SimulationType.SHIELDHIT.value,
+        title="testtitle",
+    )
+    db_session.add(simulation)
+    db_session.commit()
+
+    input_model = InputModel(simulation_id=simulation.id)
+    input_model.data = {"input_files": {"beam.dat": "NSTAT 1000 0"}}
+    logfiles = LogfilesModel(simulation_id=simulation.id)
+    logfiles.data = {"shieldhit_0001.log": "log content"}
+    db_session.add_all([input_model, logfiles])
+    for task_id in range(2):
+        db_session.add(CeleryTaskModel(simulation_id=simulation.id, task_id=task_id, requested_primaries=500))
+    for estimator_dict in result_dict_data["estimators"]:
+        estimator = EstimatorModel(name=estimator_dict["name"], file_name=estimator_dict["name"])
+        estimator.simulation_id = simulation.id
+        estimator.data = estimator_dict["metadata"]
+        db_session.add(estimator)
+        db_session.flush()
+        for page_dict in estimator_dict["pages"]:
+            page = PageModel(
+                estimator_id=estimator.id,
+                page_number=int(page_dict["metadata"]["page_number"]),
+                page_dimension=int(page_dict["dimensions"]),
+                page_name=str(page_dict["metadata"]["name"]),
+            )
+            page.data = page_dict
+            db_session.add(page)
+    db_session.commit()
+    simulation_id = simulation.id
+    # start each test with empty identity map, so nothing is served from the session
+    db_session.expunge_all()
+    yield simulation_id
+
+
+def test_status_endpoint_queries_do_not_load_blobs(simulation_id: int):
+    """Queries used by JobsResource.get, JobsDirect.get and UserSimulations.get do not touch blob columns"""
+    with captured_statements() as statements:
+        simulation = fetch_simulation_by_job_id(job_id="testjob")
+        tasks = fetch_tasks_by_sim_id(sim_id=simulation.id)
+
+    assert len(tasks) == 2
+    assert len(statements) == 2
+    assert all(BLOB_COLUMN not in statement for statement in statements)
+
+
+def test_estimator_listing_does_not_load_blobs(simulation_id: int, result_dict_data: dict):
+    """Queries used by EstimatorResource.get load only names and page metadata, without any blobs"""
+    with captured_statements() as statements:
+        estimators = fetch_estimators_by_sim_id(sim_id=simulation_id)
+        pages_metadata = [fetch_pages_metadata_by_est_id(est_id=estimator.id) for estimator in estimators]
+
+    assert len(estimators) == len(result_dict_data["estimators"])
+    assert sum(len(metadata) for metadata in pages_metadata) > 0
+    assert all(BLOB_COLUMN not in statement for statement in statements)
+    assert loaded_blob_bytes(estimators) == 0
+    assert loaded_columns(estimators[0]) == {"id", "simulation_id", "name", "file_name"}
+
+
+def test_results_queries_load_blobs_on_request(simulation_id: int):
+    """Queries used by ResultsResource.get load blobs in bulk, when asked for data"""
+    with captured_statements() as statements:
+        estimators = fetch_estimators_by_sim_id(sim_id=simulation_id, with_data=True)
+        pages = [page for estimator in estimators for page in estimator.pages]
+
+    # one query for estimators and one for pages of all estimators
+    assert len(statements) == 2
+    assert loaded_blob_bytes(estimators) > 0
+    assert loaded_blob_bytes(pages) > 0
+    assert BLOB_COLUMN in loaded_columns(pages[0])
+
+
+@pytest.mark.parametrize("with_data", [False, True])
+def test_single_object_fetchers_respect_with_data(simulation_id: int, with_data: bool):
+    """Single object fetchers load blob columns only if asked to"""
+    estimator = fetch_estimator_by_sim_id_and_est_name(sim_id=simulation_id, est_name="z_profile_", with_data=with_data)
+    objects = [
+        estimator,
+        fetch_input_by_sim_id(sim_id=simulation_id, with_data=with_data),
+        fetch_logfiles_by_sim_id(sim_id=simulation_id, with_data=with_data),
+        fetch_page_by_est_id_and_page_number(est_id=estimator.id, page_number=0, with_data=with_data),
+        *fetch_pages_by_estimator_id(est_id=estimator.id, with_data=with_data),
+    ]
+
+    for obj in objects:
+        assert (BLOB_COLUMN in loaded_columns(obj)) == with_data
+    assert (loaded_blob_bytes(objects) > 0) == with_data
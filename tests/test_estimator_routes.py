@@ -0,0 +1,125 @@
+import pytest
+
+from yaptide.application import create_app
+from yaptide.persistence.database import db
+from yaptide.persistence.db_methods import fetch_pages_metadata_by_sim_id
+from yaptide.persistence.models import CelerySimulationModel, EstimatorModel, PageModel, YaptideUserModel
+from yaptide.utils.enums import InputType, SimulationType
+from tests.conftest import captured_statements
+
+BLOB_COLUMN = "compressed_data"
+
+
+@pytest.fixture
+def app():
+    """Fixture for the app."""
+    _app = create_app()
+    with _app.app_context():
+        db.create_all()
+    yield _app
+
+    with _app.app_context():
+        db.drop_all()
+
+
+@pytest.fixture
+def simulation_id(app, db_good_username: str, db_good_password: str, result_dict_data: dict) -> int:
+    """Stores simulation with results and one estimator without pages in the database and returns its id"""
+    with app.app_context():
+        user = YaptideUserModel(username=db_good_username)
+        user.set_password(db_good_password)
+        db.session.add(user)
+        db.session.commit()
+
+        simulation = CelerySimulationModel(
+            job_id="testjob",
+            user_id=user.id,
+            input_type=InputType.FILES.value,
+            sim_type=SimulationType.SHIELDHIT.value,
+            title="testtitle",
+        )
+        db.session.add(simulation)
+        db.session.commit()
+
+        estimators = [*result_dict_data["estimators"], {"name": "empty_", "metadata": {}, "pages": []}]
+        for estimator_dict in estimators:
+            estimator = EstimatorModel(name=estimator_dict["name"], file_name=estimator_dict["name"])
+            estimator.simulation_id = simulation.id
+            estimator.data = estimator_dict["metadata"]
+            db.session.add(estimator)
+            db.session.flush()
+            for page_dict in estimator_dict["pages"]:
+                page = PageModel(
+                    estimator_id=estimator.id,
+                    page_number=int(page_dict["metadata"]["page_number"]),
+                    page_dimension=int(page_dict["dimensions"]),
+                    page_name=str(page_dict["metadata"]["name"]),
+                )
+                page.data = page_dict
+                db.session.add(page)
+        db.session.commit()
+        return simulation.id
+
+
+@pytest.fixture
+def client(app, simulation_id: int, db_good_username: str, db_good_password: str):
+    """Fixture for the test client of logged in user, owning simulation `testjob`"""
+    _client = app.test_client()
+    resp = _client.post("/auth/login", json={"username": db_good_username, "password": db_good_password})
+    assert resp.status_code == 202
+    yield _client
+
+
+def expected_estimators_metadata(result_dict_data: dict) -> list[dict]:
+    """Returns estimators metadata, as expected from EstimatorResource.get"""
+    expected = []
+    for estimator_dict in result_dict_data["estimators"]:
+        pages = sorted(estimator_dict["pages"], key=lambda page: int(page["metadata"]["page_number"]))
+        pages_metadata = [
+            {
+                "page_number": int(page_dict["metadata"]["page_number"]),
+                "page_name": str(page_dict["metadata"]["name"]),
+                "page_dimension": int(page_dict["dimensions"]),
+            }
+            for page_dict in pages
+        ]
+        expected.append({"name": estimator_dict["name"], "pages_metadata": pages_metadata})
+    expected.append({"name": "empty_", "pages_metadata": []})
+    return expected
+
+
+def test_pages_metadata_of_simulation_in_single_query(app, simulation_id: int, result_dict_data: dict):
+    """Pages metadata of all estimators is fetched with one query, sorted by estimator and page number"""
+    with app.app_context(), captured_statements() as statements:
+        pages_metadata = fetch_pages_metadata_by_sim_id(sim_id=simulation_id)
+
+    assert len(statements) == 1
+    assert BLOB_COLUMN not in statements[0]
+    expected = [
+        (estimator["name"], page["page_number"], page["page_name"], page["page_dimension"])
+        for estimator in expected_estimators_metadata(result_dict_data)
+        for page in estimator["pages_metadata"]
+    ]
+    # estimator without pages is returned with page columns set to None
+    expected.append(("empty_", None, None, None))
+    assert [tuple(row) for row in pages_metadata] == expected
+
+
+def test_estimators_metadata_is_grouped_by_estimator(app, client, result_dict_data: dict):
+    """EstimatorResource.get groups pages metadata by estimator, reading estimators and pages in one query"""
+    with app.app_context(), captured_statements() as statements:
+        resp = client.get("/estimators", query_string={"job_id": "testjob"})
+
+    assert resp.status_code == 200
+    assert resp.json["estimators_metadata"] == expected_estimators_metadata(result_dict_data)
+    # one query for the user, one for the simulation and one for pages metadata of all estimators
+    assert len(statements) == 3
+    assert sum('FROM "Estimator"' in statement for statement in statements) == 1
+    assert all(BLOB_COLUMN not in statement for statement in statements)
+
+
+def test_estimators_metadata_of_unknown_job(client):
+    """EstimatorResource.get returns 404 for a job which does not exist"""
+    resp = client.get("/estimators", query_string={"job_id": "unknown"})
+
+    assert resp.status_code == 404
@@ -0,0 +1,102 @@
+import gzip
+import json
+
+import pytest
+import requests
+from flask import Flask, request
+
+from yaptide.routes.utils.middleware import GzipRequestMiddleware
+from yaptide.utils.http_client import BackendClient
+
+
+class FakeResponse:
+    """Response returned by the patched session"""
+
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+
+
+@pytest.fixture
+def echo_app() -> Flask:
+    """Flask app with gzip middleware, returning size of the received JSON payload"""
+    app = Flask(__name__)
+
+    @app.post("/echo")
+    def echo():
+        return {"items": len(request.get_json(force=True)["items"])}
+
+    app.wsgi_app = GzipRequestMiddleware(app.wsgi_app, max_size=10 * 1024 * 1024)
+    return app
+
+
+def test_retries_with_backoff(monkeypatch):
+    """Test that unavailable backend is retried and failures are counted"""
+    outcomes = [requests.ConnectionError("refused"), FakeResponse(503), FakeResponse(202)]
+    client = BackendClient(base_url="http://backend", retry_backoff=0.001)
+    monkeypatch.setattr(client.session, "post", lambda *args, **kwargs: _next_outcome(outcomes))
+
+    response = client.post("/tasks", {"task_id": 1})
+
+    assert response.status_code == 202
+    stats = client.stats()
+    assert (stats["requests"], stats["failures"], stats["retries"]) == (3, 2, 2)
+
+
+def test_retries_are_bounded(monkeypatch):
+    """Test that client gives up after configured number of retries"""
+    client = BackendClient(base_url="http://backend", max_retries=2, retry_backoff=0.001)
+    monkeypatch.setattr(
+        client.session, "post", lambda *args, **kwargs: _next_outcome([requests.ConnectionError("refused")])
+    )
+
+    assert client.post("/tasks", {"task_id": 1}) is None
+    assert client.stats()["requests"] == 3
+
+
+def test_non_idempotent_request_is_not_retried_after_timeout(monkeypatch):
+    """Test that request which could have been processed by the backend is not sent again"""
+    client = BackendClient(base_url="http://backend", retry_backoff=0.001)
+    monkeypatch.setattr(client.session, "post", lambda *args, **kwargs: _next_outcome([requests.ReadTimeout()]))
+
+    assert client.post("/results", {"estimators": []}, idempotent=False) is None
+    assert client.stats()["requests"] == 1
+
+
+def test_large_payload_is_compressed(monkeypatch, echo_app: Flask):
+    """Test that large payloads are sent gzip compressed and decompressed by the server middleware"""
+    sent = []
+    client = BackendClient(base_url="http://backend", gzip_threshold=1024)
+
+    def post(url: str, data: bytes, headers: dict, timeout: tuple):  # skipcq: PYL-W0613
+        sent.append((data, headers))
+        return FakeResponse(202)
+
+    monkeypatch.setattr(client.session, "post", post)
+    payload = {"items": list(range(10000))}
+
+    client.post("/echo", payload)
+
+    body, headers = sent[0]
+    assert headers["Content-Encoding"] == "gzip"
+    assert len(body) < len(json.dumps(payload))
+    response = echo_app.test_client().post("/echo", data=body, headers=headers)
+    assert response.status_code == 200
+    assert response.json["items"] == 10000
+
+
+def test_middleware_rejects_invalid_gzip_body(echo_app: Flask):
+    """Test that broken or too large compressed bodies are rejected"""
+    client = echo_app.test_client()
+    headers = {"Content-Encoding": "gzip", "Content-Type": "application/json"}
+
+    assert client.post("/echo", data=b"not gzip", headers=headers).status_code == 400
+    bomb = gzip.compress(b"0" * (20 * 1024 * 1024))
+    assert client.post("/echo", data=bomb, headers=headers).status_code == 400
+
+
+def _next_outcome(outcomes: list):
+    """Returns next response from the list or raises next exception, the last outcome is repeated"""
+    outcome = outcomes.pop(0) if len(outcomes) > 1 else outcomes[0]
+    if isinstance(outcome, Exception):
+        raise outcome
+    return outcome
@@ -0,0 +1,41 @@
+import os
+from pathlib import Path
+
+from yaptide.celery.utils.input_cache import InputCache
+
+FILES_DICT = {"beam.dat": "NSTAT 1000\n", "geo.dat": "geometry\n" * 100, "input.inp": "START 1000.\n"}
+
+
+def test_tasks_share_cached_input_files(tmp_path: Path):
+    """Test that input is cached once, task work directories get hardlinks and own copies of modified files"""
+    cache = InputCache(directory=tmp_path / "cache")
+    work_dirs = [tmp_path / "task_1", tmp_path / "task_2"]
+    for work_dir in work_dirs:
+        work_dir.mkdir()
+        cache.populate(files_dict=FILES_DICT, output_dir=work_dir)
+
+    assert len(list((tmp_path / "cache").iterdir())) == 1
+    for work_dir in work_dirs:
+        assert {path.name: path.read_text() for path in work_dir.iterdir()} == FILES_DICT
+    assert os.path.samefile(work_dirs[0] / "geo.dat", work_dirs[1] / "geo.dat")
+    assert not os.path.samefile(work_dirs[0] / "input.inp", work_dirs[1] / "input.inp")
+
+    (work_dirs[0] / "input.inp").write_text("START 10.\n")
+    assert (work_dirs[1] / "input.inp").read_text() == FILES_DICT["input.inp"]
+
+
+def test_least_recently_used_inputs_are_evicted(tmp_path: Path):
+    """Test that least recently used inputs are removed when the cache exceeds its size limit"""
+    cache = InputCache(directory=tmp_path / "cache", max_bytes=2500)
+    for simulation in range(4):
+        work_dir = tmp_path / f"simulation_{simulation}"
+        work_dir.mkdir()
+        files_dict = {"geo.dat": f"{simulation}\n" * 500}
+        cache.populate(files_dict=files_dict, output_dir=work_dir)
+        # input of the first simulation is used again, so it is the most recently used one
+        if simulation == 2:
+            cache.populate(files_dict={"geo.dat": "0\n" * 500}, output_dir=tmp_path)
+
+    cached = sorted(path.read_text()[0] for entry in (tmp_path / "cache").iterdir() for path in entry.iterdir())
+    assert cached == ["0", "3"]
+    assert (tmp_path / "simulation_1" / "geo.dat").read_text() == "1\n" * 500
@@ -0,0 +1,62 @@
+from typing import Optional
+
+import pytest
+
+from yaptide.celery.utils.input_store import InputStore
+
+FILES_DICT = {"beam.dat": "NSTAT 1000\n", "geo.dat": "geometry\n" * 1000, "mat.dat": "MEDIUM 1\n"}
+
+
+class DictRedis:
+    """Minimal stand-in for Redis client keeping values in a dict, counts reads of values"""
+
+    def __init__(self):
+        self.values: dict[str, bytes] = {}
+        self.ttls: dict[str, int] = {}
+        self.reads = 0
+
+    def set(self, key: str, value: bytes, ex: Optional[int] = None) -> bool:
+        self.values[key] = value
+        self.ttls[key] = ex
+        return True
+
+    def get(self, key: str) -> Optional[bytes]:
+        self.reads += 1
+        return self.values.get(key)
+
+    def expire(self, key: str, ttl: int) -> bool:
+        if key not in self.values:
+            return False
+        self.ttls[key] = ttl
+        return True
+
+
+def test_input_is_uploaded_once_and_fetched_by_hash():
+    """Test that the same input is stored once, compressed, and read back unchanged"""
+    redis_client = DictRedis()
+    store = InputStore(redis_client=redis_client, ttl=100)
+
+    input_ref = store.put(FILES_DICT)
+    assert store.put(dict(reversed(FILES_DICT.items()))) == input_ref
+    assert list(redis_client.values) == [f"yaptide:input:{input_ref}"]
+    assert redis_client.ttls[f"yaptide:input:{input_ref}"] == 100
+    assert len(redis_client.values[f"yaptide:input:{input_ref}"]) < len(FILES_DICT["geo.dat"]) / 10
+
+    worker_store = InputStore(redis_client=redis_client)
+    assert worker_store.get(input_ref) == FILES_DICT
+    assert worker_store.get(input_ref) == FILES_DICT
+    assert redis_client.reads == 1
+
+
+def test_local_inputs_are_bounded_and_missing_input_is_reported():
+    """Test that worker keeps only the most recent inputs in memory and missing input raises LookupError"""
+    redis_client = DictRedis()
+    store = InputStore(redis_client=redis_client, local_entries=2)
+    refs = [store.put({"geo.dat": f"{i}\n"}) for i in range(3)]
+    for input_ref in refs:
+        store.get(input_ref)
+
+    assert list(store._local) == refs[1:]
+    redis_client.values.clear()
+    with pytest.raises(LookupError):
+        store.get(refs[0])
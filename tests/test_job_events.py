@@ -0,0 +1,267 @@
+import json
+
+import pytest
+import redis
+
+from yaptide.application import create_app
+from yaptide.persistence.database import db
+from yaptide.persistence.job_events import (
+    INITIAL_EVENT_ID,
+    JobStreamSlots,
+    can_resume_job_events,
+    fetch_changed_task_ids,
+    fetch_status_version,
+    format_server_sent_event,
+    latest_job_event_id,
+    publish_job_events,
+    read_job_events,
+    stream_job_events,
+    task_progress_event,
+)
+from yaptide.persistence.models import CelerySimulationModel, CeleryTaskModel, YaptideUserModel
+from yaptide.utils.enums import EntityState, InputType, SimulationType
+from yaptide.utils.redis_client import get_redis_client
+
+
+@pytest.fixture
+def sim_id(redis_client: redis.Redis) -> int:
+    """Simulation id used by the tests, Redis is empty at the start of each test"""
+    return 1
+
+
+@pytest.fixture
+def app():
+    """Fixture for the app."""
+    _app = create_app()
+    with _app.app_context():
+        db.create_all()
+    yield _app
+
+    with _app.app_context():
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app, db_good_username: str, db_good_password: str):
+    """Fixture for the test client of logged in user."""
+    with app.app_context():
+        user = YaptideUserModel(username=db_good_username)
+        user.set_password(db_good_password)
+        db.session.add(user)
+        db.session.commit()
+    _client = app.test_client()
+    resp = _client.post("/auth/login", json={"username": db_good_username, "password": db_good_password})
+    assert resp.status_code == 202
+    yield _client
+
+
+def create_job(app, job_state: str) -> tuple[str, int]:
+    """Creates simulation of the logged in user with a single running task, returns its job id and id"""
+    with app.app_context():
+        user = YaptideUserModel.query.first()
+        simulation = CelerySimulationModel(
+            job_id=f"job_{job_state.lower()}",
+            user_id=user.id,
+            input_type=InputType.FILES.value,
+            sim_type=SimulationType.SHIELDHIT.value,
+            title="streamed job",
+            job_state=job_state,
+        )
+        db.session.add(simulation)
+        db.session.commit()
+        db.session.add(
+            CeleryTaskModel(
+                simulation_id=simulation.id, task_id=1, task_state=EntityState.RUNNING.value, requested_primaries=100
+            )
+        )
+        db.session.commit()
+        return simulation.job_id, simulation.id
+
+
+def stream_events(data: bytes) -> list[tuple[str, str]]:
+    """Returns (event type, event id) of events in the response body, skipping retry field and comments"""
+    events = []
+    for chunk in data.decode().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in chunk.split("\n") if line and not line.startswith(("retry", ":")))
+        if fields:
+            events.append((fields["event"], fields.get("id")))
+    return events
+
+
+def test_server_sent_event_format():
+    """Test that events are formatted according to text/event-stream specification"""
+    assert format_server_sent_event("job", '{"job_state": "RUNNING"}', "5-0") == (
+        b'id: 5-0\nevent: job\ndata: {"job_state": "RUNNING"}\n\n'
+    )
+    assert format_server_sent_event("task", "{}") == b"event: task\ndata: {}\n\n"
+
+
+def test_task_progress_event():
+    """Test that progress event contains only progress of the task, with estimated time split as in `/jobs`"""
+    _, event_type, data = task_progress_event(sim_id=1, task_id=2, update_dict={"estimated_time": 3661})
+    assert event_type == "task"
+    assert data == {"task_id": 2, "estimated_time": {"hours": 1, "minutes": 1, "seconds": 1}}
+
+
+def test_events_are_resumed_after_last_event_id(redis_client: redis.Redis, sim_id: int):
+    """Test that client reconnecting with id of the last received event gets only newer events"""
+    assert can_resume_job_events(redis_client, sim_id, INITIAL_EVENT_ID)
+    publish_job_events([(sim_id, "task", {"task_id": 1, "simulated_primaries": 10})])
+    last_event_id = latest_job_event_id(redis_client, sim_id)
+    publish_job_events([(sim_id, "job", {"job_state": EntityState.COMPLETED.value})])
+
+    assert can_resume_job_events(redis_client, sim_id, last_event_id)
+    assert not can_resume_job_events(redis_client, sim_id, "1-0")
+    assert not can_resume_job_events(redis_client, sim_id, "not an id")
+    events = read_job_events(redis_client, sim_id, last_event_id)
+    assert [(event_type, json.loads(data)) for _, event_type, data in events] == [
+        ("job", {"job_state": EntityState.COMPLETED.value})
+    ]
+
+
+def test_changed_tasks_since_status_version(redis_client: redis.Redis, sim_id: int):
+    """Test that status version grows with updates and tasks changed since a version can be found"""
+    assert fetch_status_version(sim_id) is None
+    publish_job_events([(sim_id, "task", {"task_id": 1, "simulated_primaries": 10})])
+    first_version = fetch_status_version(sim_id)
+    publish_job_events(
+        [
+            (sim_id, "task", {"task_id": 2, "simulated_primaries": 10}),
+            (sim_id, "job", {"job_state": EntityState.RUNNING.value}),
+            (sim_id, "task", {"task_id": 3, "simulated_primaries": 10}),
+        ]
+    )
+    second_version = fetch_status_version(sim_id)
+
+    assert tuple(map(int, second_version.split("-"))) > tuple(map(int, first_version.split("-")))
+    assert fetch_changed_task_ids(sim_id, first_version) == {2, 3}
+    assert fetch_changed_task_ids(sim_id, second_version) == set()
+    assert fetch_changed_task_ids(sim_id, "1-0") is None
+
+
+def test_stream_ends_after_final_job_state(redis_client: redis.Redis, sim_id: int):
+    """Test that stream sends snapshot, events and ends after the final job state, releasing its slot"""
+    slots = JobStreamSlots(redis_client=redis_client, max_per_user=1)
+    slot = slots.acquire(user_id=1)
+    publish_job_events(
+        [
+            (sim_id, "task", {"task_id": 1, "simulated_primaries": 10}),
+            (sim_id, "job", {"job_state": EntityState.FAILED.value}),
+            (sim_id, "task", {"task_id": 1, "simulated_primaries": 20}),
+        ]
+    )
+
+    stream = stream_job_events(
+        sim_id=sim_id,
+        user_id=1,
+        slot=slot,
+        last_event_id=INITIAL_EVENT_ID,
+        initial_events=[b"event: snapshot\ndata: {}\n\n"],
+        heartbeat_interval=0.1,
+    )
+    chunks = list(stream)
+
+    assert chunks[0].startswith(b"retry:")
+    assert chunks[1] == b"event: snapshot\ndata: {}\n\n"
+    assert [chunk.split(b"\n")[1] for chunk in chunks[2:]] == [b"event: task", b"event: job"]
+    assert slots.acquire(user_id=1) is not None
+
+
+def test_stream_sends_heartbeats_when_idle(redis_client: redis.Redis, sim_id: int):
+    """Test that idle stream sends heartbeat comments until its maximum duration passes"""
+    stream = stream_job_events(
+        sim_id=sim_id,
+        user_id=1,
+        slot="slot",
+        last_event_id=INITIAL_EVENT_ID,
+        initial_events=[],
+        heartbeat_interval=0.05,
+        max_duration=0.2,
+    )
+    chunks = list(stream)
+
+    assert chunks[1:]
+    assert set(chunks[1:]) == {b": heartbeat\n\n"}
+
+
+def test_streams_per_user_are_limited(redis_client: redis.Redis, sim_id: int):
+    """Test that user cannot open more streams than allowed, until one of them is released"""
+    slots = JobStreamSlots(redis_client=redis_client, max_per_user=2)
+    first, second = slots.acquire(user_id=1), slots.acquire(user_id=1)
+
+    assert first and second
+    assert slots.acquire(user_id=1) is None
+    slots.release(user_id=1, slot=first)
+    assert slots.acquire(user_id=1) is not None
+
+
+def test_job_stream_requires_redis(app, client, monkeypatch):
+    """Test that without Redis the stream is not available and clients have to poll"""
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    get_redis_client.cache_clear()
+    job_id, _ = create_job(app, EntityState.RUNNING.value)
+
+    resp = client.get("/jobs/stream", query_string={"job_id": job_id})
+
+    assert resp.status_code == 501
+    get_redis_client.cache_clear()
+
+
+def test_job_stream_starts_with_snapshot(app, client, redis_client: redis.Redis):
+    """Test that a new stream starts with snapshot of the job, with id of the latest event"""
+    job_id, sim_id = create_job(app, EntityState.COMPLETED.value)
+    publish_job_events([(sim_id, "task", {"task_id": 1, "simulated_primaries": 10})])
+    last_event_id = latest_job_event_id(redis_client, sim_id)
+
+    resp = client.get("/jobs/stream", query_string={"job_id": job_id})
+
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/event-stream"
+    assert stream_events(resp.data) == [("snapshot", last_event_id)]
+    snapshot = json.loads(resp.data.decode().split("data: ", 1)[1].split("\n", 1)[0])
+    assert snapshot["job_state"] == EntityState.COMPLETED.value
+    assert [task["task_id"] for task in snapshot["job_tasks_status"]] == [1]
+
+
+def test_job_stream_is_resumed_after_last_event_id(app, client, redis_client: redis.Redis):
+    """Test that reconnected stream sends only missed events, without snapshot, and ends after final job state"""
+    job_id, sim_id = create_job(app, EntityState.RUNNING.value)
+    publish_job_events([(sim_id, "task", {"task_id": 1, "simulated_primaries": 10})])
+    first_event_id = latest_job_event_id(redis_client, sim_id)
+    publish_job_events(
+        [
+            (sim_id, "task", {"task_id": 1, "simulated_primaries": 20}),
+            (sim_id, "job", {"job_state": EntityState.COMPLETED.value}),
+        ]
+    )
+
+    resp = client.get("/jobs/stream", query_string={"job_id": job_id}, headers={"Last-Event-ID": first_event_id})
+
+    assert resp.status_code == 200
+    events = stream_events(resp.data)
+    assert [event_type for event_type, _ in events] == ["task", "job"]
+    assert events[-1][1] == latest_job_event_id(redis_client, sim_id)
+
+
+def test_job_stream_reconnect_after_final_state(app, client, redis_client: redis.Redis):
+    """Test that reconnecting after the final job state is answered with 204, which stops EventSource"""
+    job_id, sim_id = create_job(app, EntityState.COMPLETED.value)
+    publish_job_events([(sim_id, "job", {"job_state": EntityState.COMPLETED.value})])
+    last_event_id = latest_job_event_id(redis_client, sim_id)
+
+    resp = client.get("/jobs/stream", query_string={"job_id": job_id}, headers={"Last-Event-ID": last_event_id})
+
+    assert resp.status_code == 204
+
+
+def test_job_streams_over_limit_are_rejected(app, client, redis_client: redis.Redis, monkeypatch):
+    """Test that user with too many open streams gets 429"""
+    monkeypatch.setenv("JOB_STREAM_MAX_PER_USER", "1")
+    job_id, _ = create_job(app, EntityState.COMPLETED.value)
+    with app.app_context():
+        user_id = YaptideUserModel.query.first().id
+    assert JobStreamSlots(redis_client=redis_client, max_per_user=1).acquire(user_id=user_id)
+
+    resp = client.get("/jobs/stream", query_string={"job_id": job_id})
+
+    assert resp.status_code == 429
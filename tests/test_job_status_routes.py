@@ -0,0 +1,212 @@
+import pytest
+
+from yaptide.application import create_app
+from yaptide.persistence import throughput
+from yaptide.persistence.database import db
+from yaptide.persistence.models import CelerySimulationModel, CeleryTaskModel, YaptideUserModel
+from yaptide.routes.utils import utils
+from yaptide.utils.enums import EntityState, InputType, SimulationType
+from yaptide.utils.redis_client import get_redis_client
+
+TASK_STATES = [
+    (EntityState.COMPLETED.value, 100, None),
+    (EntityState.COMPLETED.value, 100, None),
+    (EntityState.FAILED.value, 30, None),
+    (EntityState.RUNNING.value, 40, 120),
+    (EntityState.RUNNING.value, 10, 3600),
+    (EntityState.PENDING.value, 0, None),
+]
+
+
+@pytest.fixture
+def app():
+    """Fixture for the app."""
+    _app = create_app()
+    with _app.app_context():
+        db.create_all()
+    yield _app
+
+    with _app.app_context():
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app, db_good_username: str, db_good_password: str):
+    """Fixture for the test client of logged in user."""
+    with app.app_context():
+        user = YaptideUserModel(username=db_good_username)
+        user.set_password(db_good_password)
+        db.session.add(user)
+        db.session.commit()
+    _client = app.test_client()
+    resp = _client.post("/auth/login", json={"username": db_good_username, "password": db_good_password})
+    assert resp.status_code == 202
+    yield _client
+
+
+@pytest.fixture
+def job_id(app, client) -> str:
+    """Creates running simulation with tasks in various states, returns its job id"""
+    with app.app_context():
+        user = YaptideUserModel.query.first()
+        simulation = CelerySimulationModel(
+            job_id="job_with_tasks",
+            user_id=user.id,
+            input_type=InputType.FILES.value,
+            sim_type=SimulationType.SHIELDHIT.value,
+            title="job with tasks",
+            job_state=EntityState.RUNNING.value,
+        )
+        db.session.add(simulation)
+        db.session.commit()
+        for task_id, (task_state, simulated_primaries, estimated_time) in enumerate(TASK_STATES, start=1):
+            task = CeleryTaskModel(
+                simulation_id=simulation.id,
+                task_id=task_id,
+                requested_primaries=100,
+                simulated_primaries=simulated_primaries,
+                task_state=task_state,
+                estimated_time=estimated_time,
+            )
+            db.session.add(task)
+        db.session.commit()
+    return "job_with_tasks"
+
+
+def test_job_status_summary(client, job_id: str):
+    """Test that summary contains aggregated state of tasks instead of their statuses"""
+    resp = client.get("/jobs", query_string={"job_id": job_id, "summary": "true"})
+
+    assert resp.status_code == 200
+    assert resp.json["job_state"] == EntityState.RUNNING.value
+    assert "job_tasks_status" not in resp.json
+    summary = resp.json["job_tasks_summary"]
+    assert summary["tasks_count"] == 6
+    assert summary["task_states"] == {
+        EntityState.COMPLETED.value: 2,
+        EntityState.FAILED.value: 1,
+        EntityState.RUNNING.value: 2,
+        EntityState.PENDING.value: 1,
+    }
+    assert summary["requested_primaries"] == 600
+    assert summary["simulated_primaries"] == 280
+    assert summary["estimated_time_min"] == {"hours": 0, "minutes": 2, "seconds": 0}
+    assert summary["estimated_time_max"] == {"hours": 1, "minutes": 0, "seconds": 0}
+    assert len(summary["failed_task_ids"]) == 1
+
+
+def test_job_status_pagination(client, job_id: str):
+    """Test that statuses of all tasks can be fetched page by page"""
+    full = client.get("/jobs", query_string={"job_id": job_id}).json["job_tasks_status"]
+
+    pages = []
+    params = {"job_id": job_id, "limit": 4}
+    while True:
+        resp = client.get("/jobs", query_string=params)
+        assert resp.status_code == 200
+        pages.append(resp.json["job_tasks_status"])
+        if "next_task_id" not in resp.json:
+            break
+        params["after_task_id"] = resp.json["next_task_id"]
+
+    assert [len(page) for page in pages] == [4, 2]
+    assert [task for page in pages for task in page] == full
+    assert resp.json["job_state"] == EntityState.RUNNING.value
+
+
+def test_job_status_page_size_is_limited(client, job_id: str):
+    """Test that too large pages are rejected"""
+    resp = client.get("/jobs", query_string={"job_id": job_id, "limit": 100000})
+
+    assert resp.status_code == 400
+
+
+def test_job_status_contains_job_progress(app, client, job_id: str, monkeypatch):
+    """Test that running job reports throughput of its tasks and time needed to finish it with pending tasks"""
+    store = throughput.ThroughputStore()
+    monkeypatch.setattr(throughput, "get_throughput_store", lambda: store)
+    with app.app_context():
+        sim_id = CelerySimulationModel.query.filter_by(job_id=job_id).first().id
+    # task 4 simulates 2 primaries per second, task 5 one primary per second
+    for task_id, simulated_primaries in ((4, 20), (5, 0)):
+        store.record(sim_id=sim_id, task_id=task_id, simulated_primaries=simulated_primaries, sampled_at=0)
+    for task_id, simulated_primaries in ((4, 40), (5, 10)):
+        store.record(sim_id=sim_id, task_id=task_id, simulated_primaries=simulated_primaries, sampled_at=10)
+
+    resp = client.get("/jobs", query_string={"job_id": job_id, "summary": "true"})
+
+    assert resp.status_code == 200
+    # task 4 finishes after 30 s, then pending task needs 100 primaries with mean rate 1.5 primaries per second
+    assert resp.json["job_progress"] == {
+        "primaries_per_second": 3.0,
+        "estimated_time": {"hours": 0, "minutes": 1, "seconds": 37},
+    }
+
+
+@pytest.mark.parametrize("endpoint", ["/jobs", "/jobs/direct"])
+def test_unchanged_job_status_is_not_modified(client, job_id: str, endpoint: str, monkeypatch):
+    """Test that polling with the known status version or ETag is answered with 304 Not Modified"""
+    monkeypatch.setattr(utils, "fetch_status_version", lambda sim_id: "5-0")
+
+    resp = client.get(endpoint, query_string={"job_id": job_id})
+    assert resp.status_code == 200
+    assert resp.json["status_version"] == "5-0"
+    etag = resp.headers["ETag"]
+
+    resp = client.get(endpoint, query_string={"job_id": job_id, "since_version": "5-0"})
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == etag
+    resp = client.get(endpoint, query_string={"job_id": job_id}, headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+
+
+@pytest.mark.parametrize("endpoint", ["/jobs", "/jobs/direct"])
+def test_only_changed_tasks_are_returned_since_version(client, job_id: str, endpoint: str, monkeypatch):
+    """Test that with `since_version` only statuses of tasks changed since that version are returned"""
+    monkeypatch.setattr(utils, "fetch_status_version", lambda sim_id: "7-0")
+    requested_versions = []
+
+    def fetch_changed_task_ids(sim_id: int, since_version: str) -> set[int]:
+        requested_versions.append(since_version)
+        return {4, 2}
+
+    monkeypatch.setattr(utils, "fetch_changed_task_ids", fetch_changed_task_ids)
+
+    resp = client.get(endpoint, query_string={"job_id": job_id, "since_version": "5-0"})
+
+    assert resp.status_code == 200
+    assert requested_versions == ["5-0"]
+    assert resp.json["changed_tasks_only"] is True
+    assert [task["task_id"] for task in resp.json["job_tasks_status"]] == [2, 4]
+    # job state is derived from states of all tasks, not only the changed ones
+    assert resp.json["job_state"] == EntityState.RUNNING.value
+    assert resp.json["status_version"] == "7-0"
+
+
+@pytest.mark.parametrize("since_version", ["1-0", "not a version"])
+def test_all_tasks_are_returned_when_changes_are_unknown(client, job_id: str, since_version: str, monkeypatch):
+    """Test that statuses of all tasks are returned if the version was trimmed or is malformed"""
+    monkeypatch.setattr(utils, "fetch_status_version", lambda sim_id: "7-0")
+    monkeypatch.setattr(utils, "fetch_changed_task_ids", lambda sim_id, since_version: None)
+
+    resp = client.get("/jobs", query_string={"job_id": job_id, "since_version": since_version})
+
+    assert resp.status_code == 200
+    assert "changed_tasks_only" not in resp.json
+    assert [task["task_id"] for task in resp.json["job_tasks_status"]] == list(range(1, len(TASK_STATES) + 1))
+
+
+def test_job_status_etag_from_content_without_redis(client, job_id: str, monkeypatch):
+    """Test that without status versions ETag is computed from the response, unchanged status gets 304"""
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    get_redis_client.cache_clear()
+
+    resp = client.get("/jobs/direct", query_string={"job_id": job_id})
+    assert resp.status_code == 200
+    assert "status_version" not in resp.json
+    etag = resp.headers["ETag"]
+
+    resp = client.get("/jobs/direct", query_string={"job_id": job_id}, headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    resp = client.get("/jobs/direct", query_string={"job_id": job_id}, headers={"If-None-Match": '"other"'})
+    assert resp.status_code == 200
@@ -0,0 +1,66 @@
+import pytest
+
+from yaptide.application import create_app
+from yaptide.persistence.database import db
+from yaptide.persistence.models import CelerySimulationModel, YaptideUserModel
+from yaptide.routes import celery_routes
+
+
+@pytest.fixture
+def app():
+    """Fixture for the app."""
+    _app = create_app()
+    with _app.app_context():
+        db.create_all()
+    yield _app
+
+    with _app.app_context():
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app, db_good_username: str, db_good_password: str):
+    """Fixture for the test client of logged in user."""
+    with app.app_context():
+        user = YaptideUserModel(username=db_good_username)
+        user.set_password(db_good_password)
+        db.session.add(user)
+        db.session.commit()
+    _client = app.test_client()
+    resp = _client.post("/auth/login", json={"username": db_good_username, "password": db_good_password})
+    assert resp.status_code == 202
+    yield _client
+
+
+@pytest.fixture
+def submitted_jobs(monkeypatch) -> list[tuple]:
+    """Collects arguments of jobs submitted to celery instead of submitting them"""
+    submitted = []
+
+    def run_job(*args):
+        submitted.append(args)
+        return "merge_id"
+
+    monkeypatch.setattr(celery_routes, "run_job", run_job)
+    return submitted
+
+
+def test_fluka_cycles_have_to_divide_primaries_of_tasks(
+    app, client, fluka_payload_files_dict_data: dict, submitted_jobs: list
+):
+    """Test that job with cycles not dividing primaries of its tasks is rejected before it is created"""
+    # 10000 primaries in 4 tasks, 2500 primaries per task
+    payload = {**fluka_payload_files_dict_data, "ntasks": 4, "cycles": 3}
+
+    resp = client.post("/jobs/direct", json=payload)
+
+    assert resp.status_code == 400
+    assert "2500" in resp.json["message"]
+    assert submitted_jobs == []
+    with app.app_context():
+        assert CelerySimulationModel.query.count() == 0
+
+    resp = client.post("/jobs/direct", json={**payload, "cycles": 5})
+
+    assert resp.status_code == 202
+    assert [args[-1] for args in submitted_jobs] == [5]
@@ -0,0 +1,61 @@
+import pytest
+import redis
+
+from yaptide.persistence.live_progress import LiveProgressStore, is_progress_update
+from yaptide.persistence.models import CeleryTaskModel
+from yaptide.utils.enums import EntityState
+
+
+@pytest.fixture
+def sim_id(redis_client: redis.Redis) -> int:
+    """Simulation id used by the tests, Redis is empty at the start of each test"""
+    return 1
+
+
+def test_is_progress_update():
+    """Test that only updates without state transitions are recognized as progress"""
+    assert is_progress_update({"simulated_primaries": 10, "estimated_time": 5})
+    assert not is_progress_update({"simulated_primaries": 10, "task_state": EntityState.RUNNING.value})
+    assert not is_progress_update({})
+
+
+def test_status_dict_with_live_progress():
+    """Test that live progress overrides database values only for tasks which are still running"""
+    task = CeleryTaskModel(
+        task_id=1, task_state=EntityState.RUNNING.value, requested_primaries=100, simulated_primaries=10
+    )
+    live_progress = {"simulated_primaries": 60, "estimated_time": 3661}
+
+    status = task.get_status_dict(live_progress)
+    assert status["simulated_primaries"] == 60
+    assert status["estimated_time"] == {"hours": 1, "minutes": 1, "seconds": 1}
+    assert task.simulated_primaries == 10
+
+    task.task_state = EntityState.COMPLETED.value
+    assert task.get_status_dict(live_progress)["simulated_primaries"] == 10
+
+
+def test_live_progress_store(redis_client: redis.Redis, sim_id: int):
+    """Test that progress is merged per task and removed when task state changes"""
+    store = LiveProgressStore(redis_client=redis_client)
+    store.record(sim_id=sim_id, task_id=1, update_dict={"simulated_primaries": 10, "estimated_time": 50})
+    store.record(sim_id=sim_id, task_id=1, update_dict={"simulated_primaries": 20})
+    store.record(sim_id=sim_id, task_id=2, update_dict={"simulated_primaries": 5})
+
+    assert store.get(sim_id=sim_id) == {
+        1: {"simulated_primaries": 20, "estimated_time": 50},
+        2: {"simulated_primaries": 5},
+    }
+    assert store.pop(sim_id=sim_id, task_id=1) == {"simulated_primaries": 20, "estimated_time": 50}
+    assert store.get(sim_id=sim_id) == {2: {"simulated_primaries": 5}}
+
+
+def test_live_progress_flush_is_acquired_once_per_interval(redis_client: redis.Redis, sim_id: int):
+    """Test that only one caller saves live progress in the database within flush interval"""
+    store = LiveProgressStore(redis_client=redis_client, flush_interval=60)
+    store.record(sim_id=sim_id, task_id=1, update_dict={"simulated_primaries": 10})
+    assert not store.acquire_flush(sim_id=sim_id)
+
+    eager_store = LiveProgressStore(redis_client=redis_client, flush_interval=0)
+    assert eager_store.acquire_flush(sim_id=sim_id)
+    assert not eager_store.acquire_flush(sim_id=sim_id)
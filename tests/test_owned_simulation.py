@@ -0,0 +1,97 @@
+import pytest
+
+from yaptide.application import create_app
+from yaptide.persistence.database import db
+from yaptide.persistence.models import (
+    BatchSimulationModel,
+    CelerySimulationModel,
+    ClusterModel,
+    YaptideUserModel,
+)
+from yaptide.routes.utils.utils import fetch_owned_simulation, fetch_request_simulation
+from yaptide.utils.enums import EntityState, InputType, PlatformType, SimulationType
+from tests.conftest import captured_statements
+
+
+@pytest.fixture
+def app():
+    """Fixture for the app."""
+    _app = create_app()
+    with _app.app_context():
+        db.create_all()
+    yield _app
+
+    with _app.app_context():
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app, db_good_username: str, db_good_password: str):
+    """Fixture for the test client of logged in user, another user owns job `foreign_job`"""
+    with app.app_context():
+        for username in (db_good_username, "other"):
+            user = YaptideUserModel(username=username)
+            user.set_password(db_good_password)
+            db.session.add(user)
+        cluster = ClusterModel(cluster_name="cluster")
+        db.session.add(cluster)
+        db.session.commit()
+        owner, other = YaptideUserModel.query.order_by(YaptideUserModel.id).all()
+        common = {"input_type": InputType.FILES.value, "sim_type": SimulationType.SHIELDHIT.value, "title": "job"}
+        common["job_state"] = EntityState.RUNNING.value
+        db.session.add(CelerySimulationModel(job_id="direct_job", user_id=owner.id, **common))
+        db.session.add(BatchSimulationModel(job_id="batch_job", user_id=owner.id, cluster_id=cluster.id, **common))
+        db.session.add(CelerySimulationModel(job_id="foreign_job", user_id=other.id, **common))
+        db.session.commit()
+    _client = app.test_client()
+    resp = _client.post("/auth/login", json={"username": db_good_username, "password": db_good_password})
+    assert resp.status_code == 202
+    yield _client
+
+
+def simulation_queries(statements: list[str]) -> list[str]:
+    """Returns statements reading the Simulation table"""
+    return [statement for statement in statements if 'FROM "Simulation"' in statement]
+
+
+def test_simulation_is_fetched_once_per_request(app, client):
+    """Test that ownership check and later fetches of the same job in a request take a single query"""
+    # each request has its own application context, where fetched simulations are cached
+    with app.app_context(), app.test_request_context(), captured_statements() as statements:
+        user = YaptideUserModel.query.filter_by(username="other").first()
+        simulation, _, code = fetch_owned_simulation(job_id="foreign_job", user=user)
+        assert code == 200
+        assert fetch_request_simulation(job_id="foreign_job") is simulation
+        assert fetch_owned_simulation(job_id="foreign_job", user=user)[0] is simulation
+        assert len(simulation_queries(statements)) == 1
+
+        # missing simulations are not cached
+        assert fetch_request_simulation(job_id="missing_job") is None
+        assert fetch_request_simulation(job_id="missing_job") is None
+        assert len(simulation_queries(statements)) == 3
+
+    with app.app_context(), app.test_request_context(), captured_statements() as statements:
+        assert fetch_request_simulation(job_id="foreign_job") is not None
+        assert len(simulation_queries(statements)) == 1
+
+
+def test_platform_of_simulation_is_checked(app, client):
+    """Test that direct endpoints do not return batch jobs and batch endpoints do not return direct jobs"""
+    # batch endpoints are available only for Keycloak users, so the batch platform is checked directly
+    with app.app_context(), app.test_request_context():
+        user = YaptideUserModel.query.filter_by(username="other").first()
+        assert fetch_owned_simulation(job_id="foreign_job", user=user, platform=PlatformType.BATCH)[2] == 404
+        assert fetch_owned_simulation(job_id="foreign_job", user=user, platform=PlatformType.DIRECT)[2] == 200
+
+    assert client.get("/jobs/direct", query_string={"job_id": "batch_job"}).status_code == 404
+    assert client.get("/jobs/direct", query_string={"job_id": "direct_job"}).status_code == 200
+    # endpoints common for both platforms return jobs of any platform
+    assert client.get("/jobs", query_string={"job_id": "batch_job", "summary": "true"}).status_code == 200
+
+
+@pytest.mark.parametrize("endpoint", ["/jobs", "/jobs/direct", "/results", "/inputs"])
+def test_job_of_another_user_is_forbidden(client, endpoint: str):
+    """Test that job owned by another user is not returned"""
+    resp = client.get(endpoint, query_string={"job_id": "foreign_job"})
+
+    assert resp.status_code == 403
@@ -0,0 +1,55 @@
+import sys
+from pathlib import Path
+
+from yaptide.celery.utils.pymc import execute_simulation_subprocess
+from yaptide.celery.utils.process_output import STDERR_SPOOL_NAME, STDOUT_SPOOL_NAME, OutputSpool
+
+
+def test_output_is_spooled_to_rotating_files(tmp_path: Path):
+    """Test that output is written to rotated files of limited size and only its tail is kept in memory"""
+    lines = [f"line {number:04d}\n" for number in range(100)]
+    parsed = []
+    spool = OutputSpool(
+        tmp_path / "stdout.log", line_callback=parsed.append, max_file_size=100, backup_count=2, tail_lines=3
+    )
+    spool.consume(iter(lines))
+
+    assert parsed == lines
+    assert spool.line_count == 100
+    assert spool.tail() == "".join(lines[-3:])
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["stdout.log", "stdout.log.1", "stdout.log.2"]
+    spooled = "".join((tmp_path / name).read_text() for name in ("stdout.log.2", "stdout.log.1", "stdout.log"))
+    assert spooled == "".join(lines[-len(spooled.splitlines()) :])
+    assert all(len(path.read_text()) <= 100 for path in tmp_path.iterdir())
+
+
+def test_failing_callback_does_not_stop_spooling(tmp_path: Path):
+    """Test that all lines are spooled even if parsing of the output fails"""
+
+    def failing_callback(line: str):
+        raise ValueError(line)
+
+    spool = OutputSpool(tmp_path / "stdout.log", line_callback=failing_callback)
+    spool.consume(iter(["first\n", "second\n"]))
+
+    assert (tmp_path / "stdout.log").read_text() == "first\nsecond\n"
+
+
+def test_simulation_subprocess_output_is_streamed(tmp_path: Path):
+    """Test that output of subprocess is spooled to files and passed to callback while it runs"""
+    script = "import sys\nfor i in range(5000):\n    print('progress', i)\n    print('warning', i, file=sys.stderr)\n"
+    parsed = []
+
+    success, stdout, stderr = execute_simulation_subprocess(tmp_path, [sys.executable, "-c", script], parsed.append)
+
+    assert success
+    assert len(parsed) == 5000
+    assert parsed[-1] == "progress 4999\n"
+    assert stdout.endswith("progress 4999\n") and len(stdout.splitlines()) < 5000
+    assert stderr.endswith("warning 4999\n")
+    assert (tmp_path / STDOUT_SPOOL_NAME).read_text().count("\n") == 5000
+    assert (tmp_path / STDERR_SPOOL_NAME).read_text().count("\n") == 5000
+
+    success, _, stderr = execute_simulation_subprocess(tmp_path, [sys.executable, "-c", "raise SystemExit('crashed')"])
+    assert not success
+    assert stderr == "crashed\n"
@@ -0,0 +1,139 @@
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from yaptide.celery.utils.progress import monitor_service
+from yaptide.celery.utils.progress.fluka_monitor import FlukaLogParser, fluka_log_pattern
+from yaptide.celery.utils.progress.monitor_service import ProgressMonitorService
+from yaptide.celery.utils.progress.shieldhit_monitor import ShieldhitLogParser
+from yaptide.utils.enums import EntityState
+
+SHIELDHIT_LOG = [
+    "Requested number of primaries NSTAT: 1000\n",
+    "Primary particle no.      500 ETR:    0 hour(s)    0 minute(s)   5 second(s)\n",
+    "Run time:    0 hour(s)    0 minute(s)   10 second(s)\n",
+]
+
+
+def fluka_cycle_log(progress: int, remaining: int) -> str:
+    """Returns FLUKA output file of a single cycle with a single progress line"""
+    return (
+        " NEXT SEEDS:  1A5E8E0D  0  0  0  0  0\n"
+        f"  {progress:8d}  {remaining:8d}  1.0E+30  3.2E-03  3.1E-03  3.4E+00\n"
+        " All cases handled by Feeder\n"
+        " * ======   End of FLUKA 2021.2.9 run   ====== *\n"
+    )
+
+
+@pytest.fixture(params=["inotify", "polling"])
+def service(request, monkeypatch) -> ProgressMonitorService:
+    """Progress monitor service using inotify or polling fallback, with updates recorded instead of sent"""
+    if request.param == "polling":
+
+        def inotify_not_available():
+            raise OSError("inotify not available")
+
+        monkeypatch.setattr(monitor_service, "InotifyWatch", inotify_not_available)
+    updates = []
+    monkeypatch.setattr(
+        monitor_service,
+        "send_task_update",
+        lambda simulation_id, task_id, update_key, update_dict: updates.append((task_id, update_dict)),
+    )
+    _service = ProgressMonitorService(polling_interval_seconds=0.02)
+    _service.updates = updates
+    return _service
+
+
+def wait_until(condition, timeout: float = 5):
+    """Waits until the condition is met"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met before timeout"
+        time.sleep(0.01)
+
+
+def test_log_files_of_many_tasks_are_followed(service: ProgressMonitorService, tmp_path: Path):
+    """Test that single service follows log files created later, also with lines written in parts"""
+    monitors = []
+    for task_id in (1, 2):
+        (tmp_path / str(task_id)).mkdir()
+        monitors.append(
+            service.register(1, task_id, "key", tmp_path / str(task_id), "shieldhit_*.log", ShieldhitLogParser())
+        )
+    for task_id in (1, 2):
+        with open(tmp_path / str(task_id) / f"shieldhit_000{task_id}.log", "w") as logfile:
+            logfile.write(SHIELDHIT_LOG[0] + SHIELDHIT_LOG[1][:20])
+            logfile.flush()
+            time.sleep(0.05)
+            logfile.write(SHIELDHIT_LOG[1][20:] + SHIELDHIT_LOG[2])
+
+    wait_until(lambda: len(service.updates) == 6)
+    for monitor in monitors:
+        service.unregister(monitor)
+    for task_id in (1, 2):
+        task_updates = [update_dict for updated_task_id, update_dict in service.updates if updated_task_id == task_id]
+        assert [update_dict.get("task_state") for update_dict in task_updates] == [
+            EntityState.RUNNING.value,
+            None,
+            EntityState.COMPLETED.value,
+        ]
+        assert task_updates[1] == {"simulated_primaries": 500, "estimated_time": 5}
+    wait_until(lambda: service._thread is None)
+
+
+def test_task_fails_without_log_file(service: ProgressMonitorService, tmp_path: Path):
+    """Test that task is marked as failed if its log file is not created in time"""
+    monitor = service.register(1, 1, "key", tmp_path, "shieldhit_0001.log", ShieldhitLogParser(), 0.1)
+
+    wait_until(lambda: service.updates)
+    service.unregister(monitor)
+    assert service.updates[0][1]["task_state"] == EntityState.FAILED.value
+
+
+def test_no_updates_after_unregister(service: ProgressMonitorService, tmp_path: Path):
+    """Test that updates of unregistered task are sent before unregister returns and no more updates follow"""
+    logfile = tmp_path / "shieldhit_0001.log"
+    logfile.write_text(SHIELDHIT_LOG[0])
+    monitor = service.register(1, 1, "key", tmp_path, logfile.name, ShieldhitLogParser())
+    wait_until(lambda: service.updates)
+
+    writer = threading.Timer(0.05, lambda: logfile.write_text(SHIELDHIT_LOG[0] + SHIELDHIT_LOG[2]))
+    service.unregister(monitor)
+    writer.start()
+    writer.join()
+    time.sleep(0.1)
+    assert len(service.updates) == 1
+
+
+def test_progress_parsed_from_stream(service: ProgressMonitorService):
+    """Test that updates of lines parsed from simulator output are sent before waiting for updates returns"""
+    parse = service.stream_parser(1, 1, "key", ShieldhitLogParser())
+    for line in SHIELDHIT_LOG + ["Primary particle no.      900 ETR:    0 hour(s)    0 minute(s)   1 second(s)\n"]:
+        parse(line)
+    service.wait_for_updates()
+
+    assert [update_dict.get("task_state") for _, update_dict in service.updates] == [
+        EntityState.RUNNING.value,
+        None,
+        EntityState.COMPLETED.value,
+    ]
+
+
+def test_log_files_of_fluka_cycles_are_followed(service: ProgressMonitorService, tmp_path: Path):
+    """Test that output of each FLUKA cycle is followed when it starts and progress is summed over cycles"""
+    monitor = service.register(1, 1, "key", tmp_path, fluka_log_pattern(cycle=1), FlukaLogParser(cycles=2))
+    (tmp_path / "fluka_1234").mkdir()
+    (tmp_path / "fluka_1234" / "input001.out").write_text(fluka_cycle_log(progress=50, remaining=50))
+    wait_until(lambda: len(service.updates) == 2)
+    (tmp_path / "fluka_1234" / "input002.out").write_text(fluka_cycle_log(progress=60, remaining=40))
+
+    wait_until(lambda: len(service.updates) == 4)
+    service.unregister(monitor)
+    task_updates = [update_dict for _, update_dict in service.updates]
+    assert task_updates[0]["task_state"] == EntityState.RUNNING.value
+    assert task_updates[0]["requested_primaries"] == 200
+    assert [update_dict["simulated_primaries"] for update_dict in task_updates] == [50, 100, 160, 200]
+    assert task_updates[3]["task_state"] == EntityState.COMPLETED.value
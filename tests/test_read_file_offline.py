@@ -0,0 +1,90 @@
+import io
+from pathlib import Path
+
+import pytest
+
+from yaptide.celery.utils.pymc import (
+    read_file_offline,
+    read_fluka_file_offline,
+    read_fluka_files_offline,
+    read_lines_backwards,
+    update_primaries_per_cycle_in_fluka_file,
+)
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 64 * 1024])
+@pytest.mark.parametrize("content", ["", "single line\n", "first\n\nthird\n", "no trailing newline\nlast"])
+def test_lines_are_read_backwards(content: str, block_size: int):
+    """Test that lines are read in reversed order regardless of block boundaries"""
+    lines = list(read_lines_backwards(io.BytesIO(content.encode()), block_size=block_size))
+
+    # every line is terminated, also the one after the last newline
+    assert "".join(reversed(lines)) == (content + "\n" if content else "")
+    assert len(lines) == (content.count("\n") + 1 if content else 0)
+
+
+def test_shieldhit_summary_is_read_from_head_and_tail(tmp_path: Path):
+    """Test that requested primaries are read from the head of the log and simulated ones from the last progress"""
+    logfile = tmp_path / "shieldhit_0001.log"
+    with open(logfile, "w") as f:
+        f.write(" SHIELD-HIT12A\n Requested number of primaries NSTAT: 100000\n")
+        for primaries in range(1, 20001):
+            f.write(f" Primary particle no. {primaries:12d} ETR:    0 hour(s)    0 minute(s)    1 second(s)\n")
+        f.write(" Run time:    0 hour(s)    1 minute(s)    2 second(s)\n Saving results\n")
+
+    assert read_file_offline(logfile) == (20000, 100000)
+    assert read_file_offline(tmp_path / "missing.log") == (0, 0)
+
+    logfile.write_text(" SHIELD-HIT12A\n Requested number of primaries NSTAT: 1000\n Segmentation fault\n")
+    assert read_file_offline(logfile) == (0, 1000)
+
+
+def test_fluka_summary_is_read_from_last_progress(tmp_path: Path):
+    """Test that FLUKA progress is read from the last line of numbers following the next seeds line"""
+    outfile = tmp_path / "input001.out"
+    with open(outfile, "w") as f:
+        f.write(" 1NUMBER OF BEAM PARTICLES\n")
+        for progress in range(100, 1001, 100):
+            f.write(" NEXT SEEDS:  1A5E8E0D  0  0  0  0  0\n")
+            f.write(f"  {progress:8d}  {1000 - progress:8d}  1.0E+30  3.2E-03  3.1E-03  3.4E+00\n")
+        f.write(" All cases handled by Feeder\n")
+        f.write("  1  2  3  4  5  6\n")
+        f.write(" * ====== End of FLUKA run ====== *\n")
+
+    assert read_fluka_file_offline(outfile) == (1000, 1000)
+    assert read_fluka_file_offline(tmp_path / "missing.out") == (0, 0)
+
+
+def test_fluka_cycles_summary(tmp_path: Path):
+    """Test that primaries of FLUKA task are divided between cycles and progress of finished cycles is summed"""
+    input_file = tmp_path / "input.inp"
+    input_file.write_text("TITLE\nSTART         1000.0\nSTOP\n")
+    assert update_primaries_per_cycle_in_fluka_file(input_file, cycles=4) == (250, 4)
+    assert input_file.read_text().split("\n")[1].split()[:2] == ["START", "250."]
+
+    for cycle in (1, 2):
+        (tmp_path / f"input{cycle:03d}.out").write_text(
+            " NEXT SEEDS:  1A5E8E0D  0  0  0  0  0\n"
+            f"  {250 if cycle == 1 else 100:8d}  {0 if cycle == 1 else 150:8d}  1.0E+30  3.2E-03  3.1E-03  3.4E+00\n"
+        )
+    assert read_fluka_files_offline(tmp_path, cycles=4) == (350, 1000)
+
+
+def test_fluka_cycles_divide_primaries(tmp_path: Path):
+    """Test that only WHAT(1) of START card is changed and cycles are lowered to divide primaries evenly"""
+    input_file = tmp_path / "input.inp"
+    start_card = "START".ljust(10) + "1000.".rjust(10) + "".rjust(10) + "1.0".rjust(10) + "".rjust(40) + "SDUM"
+    input_file.write_text(f"TITLE\n{start_card}\nSTOP\n")
+
+    assert update_primaries_per_cycle_in_fluka_file(input_file, cycles=3) == (500, 2)
+    assert input_file.read_text().split("\n")[1] == start_card.replace(" 1000.", "  500.")
+
+
+@pytest.mark.parametrize("start_card", ["START", "START 1000.0", "START,1000.0,,,,,"])
+def test_fluka_unreadable_start_card_runs_single_cycle(tmp_path: Path, start_card: str):
+    """Test that START card with empty WHAT(1) or in free format is left unchanged and a single cycle is run"""
+    input_file = tmp_path / "input.inp"
+    input_file.write_text(f"TITLE\n{start_card}\nSTOP\n")
+
+    assert update_primaries_per_cycle_in_fluka_file(input_file, cycles=4) == (0, 1)
+    assert input_file.read_text() == f"TITLE\n{start_card}\nSTOP\n"
@@ -0,0 +1,273 @@
+import pytest
+
+from yaptide.application import create_app
+from yaptide.persistence.database import db
+from yaptide.persistence.live_progress import LiveProgressStore
+from yaptide.persistence.models import CelerySimulationModel, CeleryTaskModel, YaptideUserModel
+from yaptide.routes import task_routes
+from yaptide.routes.utils import task_ids_cache
+from yaptide.routes.utils.task_ids_cache import TaskIdsCache
+from yaptide.routes.utils.tokens import encode_simulation_auth_token
+from yaptide.utils.enums import EntityState, InputType, SimulationType
+from tests.conftest import captured_statements
+
+
+@pytest.fixture
+def app():
+    """Fixture for the app."""
+    _app = create_app()
+    with _app.app_context():
+        db.create_all()
+    yield _app
+
+    with _app.app_context():
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    """Fixture for the test client."""
+    _client = app.test_client()
+    yield _client
+
+
+@pytest.fixture
+def simulations(app, db_good_username: str, db_good_password: str) -> list[int]:
+    """Creates two simulations with two tasks each, returns their ids"""
+    with app.app_context():
+        user = YaptideUserModel(username=db_good_username)
+        user.set_password(db_good_password)
+        db.session.add(user)
+        db.session.commit()
+        simulation_ids = []
+        for job_id in ("job1", "job2"):
+            simulation = CelerySimulationModel(
+                job_id=job_id,
+                user_id=user.id,
+                input_type=InputType.FILES.value,
+                sim_type=SimulationType.SHIELDHIT.value,
+                title=job_id,
+                pending_tasks=2,
+                requested_primaries=200,
+            )
+            db.session.add(simulation)
+            db.session.commit()
+            for task_id in (1, 2):
+                db.session.add(CeleryTaskModel(simulation_id=simulation.id, task_id=task_id, requested_primaries=100))
+            db.session.commit()
+            simulation_ids.append(simulation.id)
+    return simulation_ids
+
+
+def test_tasks_batch_update(app, client, simulations: list[int]):
+    """Test that updates of many tasks of many simulations are applied by a single request"""
+    payload = {
+        "simulations": [
+            {
+                "simulation_id": sim_id,
+                "update_key": encode_simulation_auth_token(sim_id),
+                "tasks": [
+                    {"task_id": 1, "update_dict": {"simulated_primaries": 10 * sim_id}},
+                    {"task_id": 2, "update_dict": {"task_state": EntityState.RUNNING.value}},
+                ],
+            }
+            for sim_id in simulations
+        ]
+    }
+
+    resp = client.post("/tasks/batch", json=payload)
+
+    assert resp.status_code == 202
+    assert resp.json["updated_tasks"] == 4
+    assert resp.json["rejected"] == []
+    with app.app_context():
+        for sim_id in simulations:
+            task_1 = CeleryTaskModel.query.filter_by(simulation_id=sim_id, task_id=1).first()
+            task_2 = CeleryTaskModel.query.filter_by(simulation_id=sim_id, task_id=2).first()
+            assert task_1.simulated_primaries == 10 * sim_id
+            assert task_2.task_state == EntityState.RUNNING.value
+
+
+def test_tasks_update_changes_simulation_counters(app, client, simulations: list[int]):
+    """Test that aggregated task counters of the simulation follow updates of its tasks"""
+    sim_id = simulations[0]
+    payload = {
+        "simulations": [
+            {
+                "simulation_id": sim_id,
+                "update_key": encode_simulation_auth_token(sim_id),
+                "tasks": [
+                    {"task_id": 1, "update_dict": {"task_state": EntityState.RUNNING.value, "simulated_primaries": 30}},
+                    {"task_id": 2, "update_dict": {"task_state": EntityState.COMPLETED.value}},
+                ],
+            }
+        ]
+    }
+
+    resp = client.post("/tasks/batch", json=payload)
+
+    assert resp.status_code == 202
+    with app.app_context():
+        simulation = db.session.get(CelerySimulationModel, sim_id)
+        assert simulation.get_tasks_progress_dict()["tasks_states"] == {
+            EntityState.RUNNING.value: 1,
+            EntityState.COMPLETED.value: 1,
+        }
+        assert simulation.requested_primaries == 200
+        assert simulation.simulated_primaries == 130
+        assert simulation.tasks_update_time is not None
+
+
+def test_tasks_batch_update_rejects_invalid_entries(app, client, simulations: list[int]):
+    """Test that updates with wrong update key or of missing tasks are rejected without affecting other updates"""
+    first_id, second_id = simulations
+    payload = {
+        "simulations": [
+            {
+                "simulation_id": first_id,
+                "update_key": encode_simulation_auth_token(first_id),
+                "tasks": [
+                    {"task_id": 1, "update_dict": {"simulated_primaries": 50}},
+                    {"task_id": 3, "update_dict": {"simulated_primaries": 50}},
+                ],
+            },
+            {
+                "simulation_id": second_id,
+                "update_key": encode_simulation_auth_token(first_id),
+                "tasks": [{"task_id": 1, "update_dict": {"simulated_primaries": 50}}],
+            },
+        ]
+    }
+
+    resp = client.post("/tasks/batch", json=payload)
+
+    assert resp.status_code == 202
+    assert resp.json["updated_tasks"] == 1
+    assert len(resp.json["rejected"]) == 2
+    with app.app_context():
+        assert CeleryTaskModel.query.filter_by(simulation_id=first_id, task_id=1).first().simulated_primaries == 50
+        assert CeleryTaskModel.query.filter_by(simulation_id=second_id, task_id=1).first().simulated_primaries == 0
+
+
+def test_progress_of_unknown_task_is_not_recorded(client, simulations: list[int], monkeypatch):
+    """Test that updates of unknown tasks are rejected before progress is recorded in the live progress store"""
+    recorded = []
+    monkeypatch.setattr(task_routes, "record_live_progress", lambda **kwargs: recorded.append(kwargs) or True)
+    sim_id = simulations[0]
+    update_key = encode_simulation_auth_token(sim_id)
+
+    resp = client.post(
+        "/tasks",
+        json={
+            "simulation_id": sim_id,
+            "task_id": 3,
+            "update_key": update_key,
+            "update_dict": {"simulated_primaries": 5},
+        },
+    )
+    assert resp.status_code == 400
+
+    payload = {
+        "simulations": [
+            {
+                "simulation_id": sim_id,
+                "update_key": update_key,
+                "tasks": [
+                    {"task_id": 1, "update_dict": {"simulated_primaries": 5}},
+                    {"task_id": 3, "update_dict": {"simulated_primaries": 5}},
+                ],
+            }
+        ]
+    }
+    resp = client.post("/tasks/batch", json=payload)
+    assert resp.status_code == 202
+    assert resp.json["updated_tasks"] == 1
+    assert resp.json["rejected"] == [{"simulation_id": sim_id, "task_id": 3, "message": "Task does not exist"}]
+    assert [(update["sim_id"], update["task_id"]) for update in recorded] == [(sim_id, 1)]
+
+
+def test_task_ids_cache(app, simulations: list[int], monkeypatch):
+    """Test that task ids are cached per simulation and tasks added later are found in the database"""
+    cache = TaskIdsCache(ttl=100, maxsize=1)
+    monkeypatch.setattr(task_ids_cache, "get_task_ids_cache", lambda: cache)
+    first_id, second_id = simulations
+    with app.app_context():
+        assert task_ids_cache.verify_task_exists(sim_id=first_id, task_id=1)
+        assert cache.get(first_id) == {1, 2}
+        assert not task_ids_cache.verify_task_exists(sim_id=first_id, task_id=3)
+
+        db.session.add(CeleryTaskModel(simulation_id=first_id, task_id=3))
+        db.session.commit()
+        assert task_ids_cache.verify_task_exists(sim_id=first_id, task_id=3)
+        assert cache.get(first_id) == {1, 2, 3}
+
+        assert task_ids_cache.verify_task_exists(sim_id=second_id, task_id=2)
+        assert cache.get(first_id) is None
+        cache.invalidate_simulation(second_id)
+        assert cache.get(second_id) is None
+
+
+def test_tasks_batch_update_requires_simulations_list(client):
+    """Test that payload without list of simulations is rejected"""
+    resp = client.post("/tasks/batch", json={"simulation_id": 1})
+
+    assert resp.status_code == 400
+
+
+def test_task_update_rules(app, client, simulations: list[int]):
+    """Test that start and end times are set once, progress does not go back and finished tasks are not changed"""
+    sim_id = simulations[0]
+    update_key = encode_simulation_auth_token(sim_id)
+    updates = [
+        {"task_state": EntityState.RUNNING.value, "simulated_primaries": 50, "start_time": "2024-01-01 10:00:00.0"},
+        {"simulated_primaries": 20, "start_time": "2024-01-01 11:00:00.0", "estimated_time": 60},
+        {"task_state": EntityState.FAILED.value, "end_time": "2024-01-01 12:00:00.0"},
+        {"task_state": EntityState.COMPLETED.value, "end_time": "2024-01-01 13:00:00.0"},
+    ]
+
+    for update_dict in updates:
+        resp = client.post(
+            "/tasks", json={"simulation_id": sim_id, "task_id": 1, "update_key": update_key, "update_dict": update_dict}
+        )
+        assert resp.status_code == 202
+
+    with app.app_context():
+        task = CeleryTaskModel.query.filter_by(simulation_id=sim_id, task_id=1).first()
+        assert task.task_state == EntityState.FAILED.value
+        assert task.simulated_primaries == 50
+        assert task.start_time.hour == 10
+        assert task.end_time.hour == 12
+        assert task.estimated_time is None
+        simulation = db.session.get(CelerySimulationModel, sim_id)
+        assert simulation.get_tasks_progress_dict()["tasks_states"] == {
+            EntityState.PENDING.value: 1,
+            EntityState.FAILED.value: 1,
+        }
+
+
+def test_progress_is_kept_in_live_progress_store(app, client, simulations: list[int], redis_client):
+    """Test that progress update does not touch the task row and state transition saves the latest progress"""
+    sim_id = simulations[0]
+    update_key = encode_simulation_auth_token(sim_id)
+    progress = {"simulated_primaries": 40, "estimated_time": 60}
+
+    with app.app_context(), captured_statements() as statements:
+        resp = client.post(
+            "/tasks", json={"simulation_id": sim_id, "task_id": 1, "update_key": update_key, "update_dict": progress}
+        )
+    assert resp.status_code == 202
+    assert not [statement for statement in statements if statement.lstrip().upper().startswith("UPDATE")]
+    assert LiveProgressStore(redis_client=redis_client).get(sim_id=sim_id) == {1: progress}
+    with app.app_context():
+        task = CeleryTaskModel.query.filter_by(simulation_id=sim_id, task_id=1).first()
+        assert (task.simulated_primaries, task.estimated_time) == (0, None)
+
+    transition = {"task_state": EntityState.RUNNING.value}
+    resp = client.post(
+        "/tasks", json={"simulation_id": sim_id, "task_id": 1, "update_key": update_key, "update_dict": transition}
+    )
+    assert resp.status_code == 202
+    assert LiveProgressStore(redis_client=redis_client).get(sim_id=sim_id) == {}
+    with app.app_context():
+        task = CeleryTaskModel.query.filter_by(simulation_id=sim_id, task_id=1).first()
+        assert (task.task_state, task.simulated_primaries, task.estimated_time) == (EntityState.RUNNING.value, 40, 60)
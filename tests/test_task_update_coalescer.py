@@ -0,0 +1,127 @@
+import json
+import threading
+
+import pytest
+import requests
+
+from yaptide.celery.utils.requests import TaskUpdateCoalescer
+from yaptide.utils.http_client import BackendClient
+
+
+class FakeResponse:
+    """Response returned by the patched `requests.Session.post`"""
+
+    status_code = 202
+
+    @staticmethod
+    def json() -> dict:
+        return {"message": "ok", "rejected": []}
+
+
+@pytest.fixture
+def sent_requests(monkeypatch) -> list[tuple[str, dict]]:
+    """Collects (url, json payload) of requests sent to the backend instead of sending them"""
+    sent = []
+
+    def post(self, url: str, data: bytes, **kwargs):  # skipcq: PYL-W0613
+        sent.append((url, json.loads(data)))
+        return FakeResponse()
+
+    monkeypatch.setattr(requests.Session, "post", post)
+    monkeypatch.setenv("BACKEND_INTERNAL_URL", "http://backend")
+    return sent
+
+
+def test_progress_updates_are_coalesced(sent_requests: list):
+    """Test that only the latest progress of each task is sent, in a single batch request"""
+    client = BackendClient(base_url="http://backend")
+    coalescer = TaskUpdateCoalescer(flush_interval_seconds=60)
+    for primaries in (10, 20, 30):
+        coalescer.submit(client, 1, 1, "key1", {"simulated_primaries": primaries})
+    coalescer.submit(client, 1, 2, "key1", {"simulated_primaries": 5, "estimated_time": 7})
+    coalescer.submit(client, 2, 1, "key2", {"simulated_primaries": 1})
+    assert sent_requests == []
+
+    coalescer.flush()
+
+    assert len(sent_requests) == 1
+    url, payload = sent_requests[0]
+    assert url == "http://backend/tasks/batch"
+    assert payload["simulations"] == [
+        {
+            "simulation_id": 1,
+            "update_key": "key1",
+            "tasks": [
+                {"task_id": 1, "update_dict": {"simulated_primaries": 30}},
+                {"task_id": 2, "update_dict": {"simulated_primaries": 5, "estimated_time": 7}},
+            ],
+        },
+        {
+            "simulation_id": 2,
+            "update_key": "key2",
+            "tasks": [{"task_id": 1, "update_dict": {"simulated_primaries": 1}}],
+        },
+    ]
+
+
+def test_state_transitions_are_sent_immediately(sent_requests: list):
+    """Test that state transition is sent at once, together with pending progress of the same task"""
+    client = BackendClient(base_url="http://backend")
+    coalescer = TaskUpdateCoalescer(flush_interval_seconds=60)
+    coalescer.submit(client, 1, 1, "key1", {"simulated_primaries": 10, "estimated_time": 3})
+    coalescer.submit(client, 1, 2, "key1", {"simulated_primaries": 20})
+
+    coalescer.submit(client, 1, 1, "key1", {"task_state": "COMPLETED", "simulated_primaries": 100})
+
+    assert len(sent_requests) == 1
+    url, payload = sent_requests[0]
+    assert url == "http://backend/tasks"
+    assert payload["task_id"] == 1
+    assert payload["update_dict"] == {"task_state": "COMPLETED", "simulated_primaries": 100, "estimated_time": 3}
+
+    coalescer.flush()
+    assert len(sent_requests) == 2
+    assert sent_requests[1][1]["simulations"][0]["tasks"] == [
+        {"task_id": 2, "update_dict": {"simulated_primaries": 20}}
+    ]
+
+
+def test_state_transition_waits_for_progress_in_flight(sent_requests: list, monkeypatch):
+    """Test that state transition is sent after the batch with progress of the same task is completed"""
+    batch_started, batch_released = threading.Event(), threading.Event()
+    record = requests.Session.post
+
+    def post(self, url: str, data: bytes, **kwargs):
+        if url.endswith("/tasks/batch"):
+            batch_started.set()
+            batch_released.wait(timeout=5)
+        return record(self, url, data, **kwargs)
+
+    monkeypatch.setattr(requests.Session, "post", post)
+    client = BackendClient(base_url="http://backend")
+    coalescer = TaskUpdateCoalescer(flush_interval_seconds=60)
+    coalescer.submit(client, 1, 1, "key1", {"simulated_primaries": 10})
+    flusher = threading.Thread(target=coalescer.flush)
+    flusher.start()
+    assert batch_started.wait(timeout=5)
+
+    transition = threading.Thread(target=coalescer.submit, args=(client, 1, 1, "key1", {"task_state": "COMPLETED"}))
+    transition.start()
+    transition.join(timeout=0.2)
+    assert transition.is_alive()
+    assert sent_requests == []
+
+    batch_released.set()
+    flusher.join(timeout=5)
+    transition.join(timeout=5)
+    assert [url for url, _ in sent_requests] == ["http://backend/tasks/batch", "http://backend/tasks"]
+
+
+def test_coalescing_can_be_disabled(sent_requests: list):
+    """Test that with zero flush interval every update is sent immediately"""
+    client = BackendClient(base_url="http://backend")
+    coalescer = TaskUpdateCoalescer(flush_interval_seconds=0)
+    coalescer.submit(client, 1, 1, "key1", {"simulated_primaries": 10})
+    coalescer.submit(client, 1, 1, "key1", {"simulated_primaries": 20})
+
+    assert [url for url, _ in sent_requests] == ["http://backend/tasks", "http://backend/tasks"]
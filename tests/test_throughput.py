@@ -0,0 +1,41 @@
+import math
+
+import pytest
+
+from yaptide.persistence.throughput import TaskThroughput, ThroughputStore, estimate_job_time
+
+
+def test_rate_is_exponentially_weighted():
+    """Test that rate follows progress samples weighted by time between them and ignores delayed samples"""
+    store = ThroughputStore(time_constant=60)
+    store.record(sim_id=1, task_id=1, simulated_primaries=0, sampled_at=0)
+    assert store.get(sim_id=1)[1].rate is None
+
+    store.record(sim_id=1, task_id=1, simulated_primaries=100, sampled_at=10)
+    assert store.get(sim_id=1)[1].rate == pytest.approx(10)
+
+    store.record(sim_id=1, task_id=1, simulated_primaries=400, sampled_at=70)
+    weight = 1 - math.exp(-1)
+    assert store.get(sim_id=1)[1].rate == pytest.approx(10 + weight * (5 - 10))
+
+    rate = store.get(sim_id=1)[1].rate
+    store.record(sim_id=1, task_id=1, simulated_primaries=300, sampled_at=80)
+    store.record(sim_id=1, task_id=1, simulated_primaries=500, sampled_at=70)
+    assert store.get(sim_id=1)[1].rate == rate
+    assert store.get(sim_id=2) == {}
+
+
+@pytest.mark.parametrize("rate", [None, 12.5])
+def test_throughput_serialization(rate):
+    """Test that throughput stored in Redis is read back unchanged"""
+    task_throughput = TaskThroughput(simulated_primaries=1000, sampled_at=1700000000.25, rate=rate)
+    assert TaskThroughput.deserialize(task_throughput.serialize().encode()) == task_throughput
+
+
+def test_job_time_accounts_for_pending_tasks():
+    """Test that pending tasks are started on the first running task slot which becomes free"""
+    # running tasks finish after 30 s and 90 s, pending task runs with mean rate 1.5 primaries per second
+    assert estimate_job_time(running_tasks=[(60, 2.0), (90, 1.0)], pending_tasks=[]) == pytest.approx(90)
+    assert estimate_job_time(running_tasks=[(60, 2.0), (90, 1.0)], pending_tasks=[150]) == pytest.approx(130)
+    assert estimate_job_time(running_tasks=[(60, 2.0), (90, None)], pending_tasks=[]) == pytest.approx(45)
+    assert estimate_job_time(running_tasks=[(60, None)], pending_tasks=[100]) is None
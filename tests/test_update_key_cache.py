@@ -0,0 +1,109 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm.scoping import scoped_session
+
+from yaptide.persistence.models import CelerySimulationModel, YaptideUserModel
+from yaptide.routes.utils.tokens import decode_simulation_auth_token, encode_simulation_auth_token
+from yaptide.routes.utils.update_key_cache import UpdateKeyCache, get_update_key_cache, verify_update_key
+from yaptide.utils.enums import InputType, SimulationType
+from tests.conftest import captured_statements
+
+
+def test_decode_simulation_auth_token():
+    """Test that simulation id and expiration time are decoded from the update key"""
+    sim_id, key_expires_at = decode_simulation_auth_token(encode_simulation_auth_token(7))
+
+    assert sim_id == 7
+    assert key_expires_at > datetime.utcnow() + timedelta(days=6)
+    assert decode_simulation_auth_token("not a token") == ("Invalid token.", None)
+
+
+def test_update_key_cache_hits_and_misses():
+    """Test that cache returns simulation ids of stored keys and counts hits and misses"""
+    cache = UpdateKeyCache(ttl=60, maxsize=10)
+    key_expires_at = datetime.utcnow() + timedelta(hours=1)
+
+    assert cache.get("key") is None
+    cache.set("key", sim_id=1, key_expires_at=key_expires_at)
+    assert cache.get("key") == 1
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+
+
+def test_update_key_cache_expiration():
+    """Test that entries expire with the key or after TTL, whichever comes first"""
+    cache = UpdateKeyCache(ttl=0.05, maxsize=10)
+    cache.set("long lived key", sim_id=1, key_expires_at=datetime.utcnow() + timedelta(hours=1))
+    cache.set("expired key", sim_id=2, key_expires_at=datetime.utcnow() - timedelta(seconds=1))
+
+    assert cache.get("expired key") is None
+    assert cache.get("long lived key") == 1
+    time.sleep(0.1)
+    assert cache.get("long lived key") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_update_key_cache_invalidation_and_size():
+    """Test that keys of deleted simulation are removed and least recently used keys are evicted"""
+    cache = UpdateKeyCache(ttl=60, maxsize=2)
+    key_expires_at = datetime.utcnow() + timedelta(hours=1)
+    cache.set("first", sim_id=1, key_expires_at=key_expires_at)
+    cache.set("second", sim_id=2, key_expires_at=key_expires_at)
+    cache.get("first")
+    cache.set("third", sim_id=2, key_expires_at=key_expires_at)
+
+    assert cache.get("second") is None
+    cache.invalidate_simulation(2)
+    assert cache.get("third") is None
+    assert cache.get("first") == 1
+
+
+@pytest.fixture
+def update_key_cache(monkeypatch):
+    """Enables update key cache of the process, which is disabled for other tests"""
+    monkeypatch.setenv("UPDATE_KEY_CACHE_TTL", "60")
+    get_update_key_cache.cache_clear()
+    yield get_update_key_cache()
+    get_update_key_cache.cache_clear()
+
+
+def test_verify_update_key_checks_signature_before_database(
+    db_session: scoped_session, db_good_username: str, db_good_password: str, update_key_cache: UpdateKeyCache
+):
+    """Test that forged keys are rejected without querying the database and keys of existing simulation are cached"""
+    user = YaptideUserModel(username=db_good_username)
+    user.set_password(db_good_password)
+    db_session.add(user)
+    db_session.commit()
+    simulation = CelerySimulationModel(
+        job_id="testjob",
+        user_id=user.id,
+        input_type=InputType.FILES.value,
+        sim_type=SimulationType.SHIELDHIT.value,
+        title="testtitle",
+    )
+    db_session.add(simulation)
+    db_session.commit()
+    sim_id = simulation.id
+
+    with captured_statements() as statements:
+        # forged key gives the same answer for existing and missing simulations
+        assert verify_update_key(update_key="forged key", sim_id=sim_id) == "Invalid update key"
+        assert verify_update_key(update_key="forged key", sim_id=sim_id + 1) == "Invalid update key"
+        assert verify_update_key(update_key=encode_simulation_auth_token(sim_id), sim_id=sim_id + 1) == (
+            "Invalid update key"
+        )
+    assert len(statements) == 0
+
+    missing_key = encode_simulation_auth_token(sim_id + 1)
+    assert verify_update_key(update_key=missing_key, sim_id=sim_id + 1) == f"Simulation {sim_id + 1} does not exist"
+
+    update_key = encode_simulation_auth_token(sim_id)
+    with captured_statements() as statements:
+        assert verify_update_key(update_key=update_key, sim_id=sim_id) is None
+        assert verify_update_key(update_key=update_key, sim_id=sim_id) is None
+    assert len(statements) == 1
+    assert update_key_cache.stats()["size"] == 1
@@ -0,0 +1,74 @@
+import time
+
+from sqlalchemy import inspect
+from sqlalchemy.orm.scoping import scoped_session
+
+from yaptide.persistence.models import KeycloakUserModel, YaptideUserModel
+from yaptide.routes.utils.user_cache import UserCache, user_from_snapshot, user_snapshot
+
+
+def test_user_cache_hits_and_misses():
+    """Test that cache returns stored snapshots and counts hits and misses"""
+    cache = UserCache(ttl=60, maxsize=10)
+    snapshot = {"id": 1, "username": "Gandalf", "auth_provider": "YaptideUser"}
+
+    assert cache.get(1) is None
+    cache.set(1, snapshot)
+    assert cache.get(1) == snapshot
+    assert cache.get(1) == snapshot
+
+    stats = cache.stats()
+    assert stats["backend"] == "memory"
+    assert (stats["hits"], stats["misses"], stats["size"]) == (2, 1, 1)
+
+
+def test_user_cache_expiration_and_invalidation():
+    """Test that entries are removed after TTL and on invalidation"""
+    cache = UserCache(ttl=0.05, maxsize=10)
+    cache.set(1, {"id": 1})
+    cache.set(2, {"id": 2})
+
+    cache.invalidate(1)
+    assert cache.get(1) is None
+    assert cache.get(2) == {"id": 2}
+
+    time.sleep(0.1)
+    assert cache.get(2) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_user_cache_is_bounded():
+    """Test that least recently used entries are evicted when cache is full"""
+    cache = UserCache(ttl=60, maxsize=2)
+    cache.set(1, {"id": 1})
+    cache.set(2, {"id": 2})
+    cache.get(1)
+    cache.set(3, {"id": 3})
+
+    assert cache.get(2) is None
+    assert cache.get(1) == {"id": 1}
+    assert cache.get(3) == {"id": 3}
+
+
+def test_user_from_snapshot(db_session: scoped_session, db_good_username: str, db_good_password: str):
+    """Test that user rebuilt from snapshot is attached to the session and loads secrets on access only"""
+    yaptide_user = YaptideUserModel(username=db_good_username)
+    yaptide_user.set_password(db_good_password)
+    keycloak_user = KeycloakUserModel(username=db_good_username, cert="cert", private_key="key")
+    db_session.add_all([yaptide_user, keycloak_user])
+    db_session.commit()
+    snapshots = [user_snapshot(yaptide_user), user_snapshot(keycloak_user)]
+    assert "password_hash" not in snapshots[0]
+    assert "private_key" not in snapshots[1]
+    db_session.expunge_all()
+
+    user = user_from_snapshot(snapshots[0])
+    assert isinstance(user, YaptideUserModel)
+    assert user.username == db_good_username
+    assert "password_hash" in inspect(user).unloaded
+    assert user.check_password(db_good_password)
+
+    user = user_from_snapshot(snapshots[1])
+    assert isinstance(user, KeycloakUserModel)
+    assert user in db_session
+    assert user.private_key == "key"
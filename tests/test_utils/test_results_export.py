@@ -0,0 +1,77 @@
+import io
+import json
+from pathlib import Path
+
+import numpy as np
+
+from yaptide.utils.results_export import page_values, stream_npz
+
+
+def make_page(page_number: int, axes_lengths: list[int], values_count: int) -> dict:
+    """Creates page dictionary with the same structure as pages generated by pymchelper JsonWriter"""
+    page = {
+        "data": {"name": "DOSE", "unit": "MeV/g", "values": [float(i) for i in range(values_count)]},
+        "dimensions": len(axes_lengths),
+        "metadata": {"name": "DOSE", "page_number": str(page_number)},
+    }
+    for i, length in enumerate(axes_lengths, start=1):
+        page[f"axis_dim{i}"] = {"name": f"Position {i}", "unit": "cm", "values": [0.5 + j for j in range(length)]}
+    return page
+
+
+def test_page_values_are_reshaped_to_axes():
+    """Test that values of 2D page are reshaped to lengths of its axes, in the order of the output file format"""
+    page = make_page(page_number=0, axes_lengths=[4, 3], values_count=12)
+
+    values = page_values(page, {"file_format": "bdo2019"})
+
+    assert values.shape == (4, 3)
+    assert values.dtype == np.float64
+    # Fortran order, the first axis changes fastest
+    assert values[1, 0] == 1.0
+    assert values[0, 1] == 4.0
+    assert page_values(page, {"file_format": "txt"})[0, 1] == 1.0
+
+
+def test_page_values_of_simulation_results():
+    """Test that 2D page of SHIELD-HIT12A results has values at positions given by its axes"""
+    results_path = Path(__file__).resolve().parent.parent / "res" / "json_with_results.json"
+    estimators = {estimator["name"]: estimator for estimator in json.loads(results_path.read_text())["estimators"]}
+    estimator = estimators["yz_profile_"]
+    page = estimator["pages"][0]
+    flat_values = page["data"]["values"]
+    ny, nz = len(page["axis_dim1"]["values"]), len(page["axis_dim2"]["values"])
+
+    values = page_values(page, estimator["metadata"])
+
+    assert values.shape == (ny, nz)
+    for y, z in ((0, 0), (5, 0), (0, 7), (ny - 1, nz - 1), (17, 123)):
+        assert values[y, z] == flat_values[y + ny * z]
+    # dose summed over Y follows the depth dose profile along Z scored by another estimator
+    depth_dose = np.asarray(estimators["z_profile_"]["pages"][0]["data"]["values"])
+    assert np.corrcoef(values.sum(axis=0), depth_dose)[0, 1] > 0.9
+
+
+def test_stream_npz_roundtrip():
+    """Test that streamed NPZ archive can be read back with numpy"""
+    pages = [
+        (
+            "z_profile",
+            {"number_of_primaries": "1000", "file_format": "bdo2019"},
+            make_page(page_number=0, axes_lengths=[4, 3], values_count=12),
+        ),
+        ("z_profile", {"number_of_primaries": "1000"}, make_page(page_number=1, axes_lengths=[], values_count=3)),
+    ]
+
+    chunks = list(stream_npz(pages))
+    # at least one chunk per page and one with the central directory of the archive
+    assert len(chunks) >= 3
+
+    with np.load(io.BytesIO(b"".join(chunks)), allow_pickle=False) as npz:
+        assert npz["z_profile/page_0/values"].shape == (4, 3)
+        assert npz["z_profile/page_0/values"][0, 1] == 4.0
+        assert list(npz["z_profile/page_0/axis_dim2"]) == [0.5, 1.5, 2.5]
+        attrs = json.loads(str(npz["z_profile/page_0/attrs"]))
+        assert attrs["axes"][0] == {"name": "Position 1", "unit": "cm"}
+        assert attrs["estimator_metadata"]["number_of_primaries"] == "1000"
+        assert npz["z_profile/page_1/values"].tolist() == [0.0, 1.0, 2.0]
@@ -0,0 +1,115 @@
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from yaptide.batch import watcher
+from yaptide.batch.watcher import (
+    COMPLETE_LINE,
+    REQUESTED_LINE,
+    RUN_LINE,
+    LogLine,
+    StopEvent,
+    classify_shieldhit_line,
+    log_generator,
+    wait_for_log_file,
+)
+
+
+@pytest.fixture(params=["inotify", "polling"])
+def tailing_mode(request, monkeypatch) -> str:
+    """Runs test with inotify and with polling fallback"""
+    if request.param == "polling":
+
+        def inotify_not_available():
+            raise OSError("inotify not available")
+
+        monkeypatch.setattr(watcher, "InotifyWatch", inotify_not_available)
+    return request.param
+
+
+def write_later(delay: float, action):
+    """Runs action in a separate thread after delay"""
+    thread = threading.Timer(delay, action)
+    thread.start()
+    return thread
+
+
+def test_log_file_is_opened_when_created(tmp_path: Path, tailing_mode: str):
+    """Test that log file created later, also in a subdirectory, is opened"""
+    logfile = tmp_path / "fluka_1234" / "input001.out"
+
+    def create_file():
+        logfile.parent.mkdir()
+        time.sleep(0.05)
+        logfile.write_text("started\n")
+
+    write_later(0.1, create_file)
+    thefile = wait_for_log_file(
+        tmp_path, "fluka_*/*001.out", max_wait_for_file_seconds=5, polling_interval_seconds=0.02
+    )
+
+    assert thefile is not None
+    assert thefile.readline() == "started\n"
+    thefile.close()
+    assert (
+        wait_for_log_file(tmp_path, "missing.log", max_wait_for_file_seconds=0.1, polling_interval_seconds=0.02) is None
+    )
+
+
+def test_truncated_and_rotated_log_files_are_followed(tmp_path: Path, tailing_mode: str):
+    """Test that lines are read from the beginning of truncated file and from the new file after rotation"""
+    filepath = tmp_path / "shieldhit_0001.log"
+    filepath.write_text("first line of the log\n")
+
+    def truncate():
+        filepath.write_text("truncated\n")
+
+    def rotate():
+        filepath.rename(tmp_path / "shieldhit_0001.log.1")
+        filepath.write_text("after rotation\n")
+
+    with open(filepath) as thefile:
+        lines = log_generator(thefile, max_idle_seconds=5, polling_interval_seconds=0.02)
+        assert next(lines) == "first line of the log\n"
+        write_later(0.1, truncate)
+        assert next(lines) == "truncated\n"
+        write_later(0.1, rotate)
+        assert next(lines) == "after rotation\n"
+        lines.close()
+
+
+def test_stop_event_stops_idle_generator(tmp_path: Path, tailing_mode: str):
+    """Test that idle generator stops when the event is set and times out without new data"""
+    filepath = tmp_path / "shieldhit_0001.log"
+    filepath.write_text("")
+    event = StopEvent()
+
+    with open(filepath) as thefile:
+        write_later(0.1, event.set)
+        start = time.monotonic()
+        assert not list(log_generator(thefile, event, max_idle_seconds=5, polling_interval_seconds=0.05))
+        assert time.monotonic() - start < 1
+
+        with pytest.raises(TimeoutError):
+            list(log_generator(thefile, max_idle_seconds=0.1, polling_interval_seconds=0.02))
+
+
+@pytest.mark.parametrize(
+    "line,expected",
+    [
+        (
+            " Primary particle no.     5000 ETR:    1 hour(s)    2 minute(s)   3 second(s)\n",
+            LogLine(RUN_LINE, 5000, 3723),
+        ),
+        (" Requested number of primaries NSTAT: 10000\n", LogLine(REQUESTED_LINE, 10000)),
+        (" Requested number of primaries NSTAT  :     10000\n", LogLine(REQUESTED_LINE, 10000)),
+        (" Run time:    0 hour(s)    1 minute(s)  10 second(s)\n", LogLine(COMPLETE_LINE, seconds=70)),
+        (" Primary particle no.  ETR: hour(s) minute(s) second(s)\n", None),
+        (" Transport of particles started\n", None),
+    ],
+)
+def test_shieldhit_line_classification(line: str, expected: LogLine):
+    """Test that relevant lines of SHIELD-HIT12A log are recognized and their numbers extracted"""
+    assert classify_shieldhit_line(line) == expected
@@ -10,6 +10,7 @@ from enum import Enum, auto
 import os
 
 import click
+import redis
 import sqlalchemy as db
 from werkzeug.security import generate_password_hash
 
@@ -140,6 +141,20 @@ def update_user(name, password, verbose):
     click.echo(f"Successfully updated user: {name}")
 
 
+def invalidate_cached_user(user_id: int):
+    """
+    Removes user from the user cache kept in Redis by the Flask server (see yaptide/routes/utils/user_cache.py).
+    In-process caches of the server are not reachable from here, their entries expire after a short TTL.
+    """
+    redis_url = os.environ.get("REDIS_URL")
+    if not redis_url:
+        return
+    try:
+        redis.Redis.from_url(redis_url).delete(f"yaptide:user:{user_id}")
+    except redis.RedisError as e:
+        click.echo(f"Unable to remove user {user_id} from cache: {e}", err=True)
+
+
 @run.command
 @click.argument("name")
 @click.argument("auth_provider")
@@ -154,9 +169,13 @@ def remove_user(name, auth_provider):
         click.echo(f"Aborting, user {name} does not exist")
         raise click.Abort()
 
-    query = db.delete(users).where(users.c.username == name, users.c.auth_provider == auth_provider)
-    con.execute(query)
+    query = (
+        db.delete(users).where(users.c.username == name, users.c.auth_provider == auth_provider).returning(users.c.id)
+    )
+    user_ids = con.execute(query).scalars().all()
     con.commit()
+    for user_id in user_ids:
+        invalidate_cached_user(user_id)
     click.echo(f"Successfully deleted user: {name}")
 
 
@@ -6,6 +6,7 @@ from flask_migrate import Migrate
 from yaptide.persistence.models import create_all
 from yaptide.persistence.database import db
 from yaptide.routes.main_routes import initialize_routes
+from yaptide.routes.utils.middleware import GzipRequestMiddleware
 
 
 def create_app():
@@ -54,6 +55,9 @@ def create_app():
     api = Api(app)
     initialize_routes(api)
 
+    # workers send large payloads (e.g. simulation results) gzip compressed
+    app.wsgi_app = GzipRequestMiddleware(app.wsgi_app)
+
     return app
 
 
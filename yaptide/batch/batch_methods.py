@@ -3,7 +3,6 @@ import json
 import logging
 import os
 import tempfile
-import requests
 from datetime import datetime
 from pathlib import Path
 from zipfile import ZipFile
@@ -18,6 +17,7 @@ from yaptide.batch.fluka_string_templates import ARRAY_FLUKA_BASH, COLLECT_FLUKA
 from yaptide.batch.utils.utils import convert_dict_to_sbatch_options, extract_sbatch_header
 from yaptide.persistence.models import BatchSimulationModel, ClusterModel, KeycloakUserModel, UserModel
 from yaptide.utils.enums import EntityState, SimulationType
+from yaptide.utils.http_client import get_backend_client
 from yaptide.utils.sim_utils import write_simulation_input_files
 
 from yaptide.admin.db_manage import TableTypes, connect_to_db
@@ -68,8 +68,10 @@ def get_connection(user: KeycloakUserModel, cluster: ClusterModel) -> Connection
 
 def post_update(dict_to_send):
     """For sending requests with information to flask"""
-    flask_url = os.environ.get("BACKEND_INTERNAL_URL")
-    return requests.Session().post(url=f"{flask_url}/jobs", json=dict_to_send)
+    client = get_backend_client()
+    if not client:
+        return None
+    return client.post("/jobs", dict_to_send)
 
 
 @celery_app.task()
@@ -1,21 +1,303 @@
 import argparse
 from collections.abc import Iterator
+import ctypes
+import ctypes.util
 import json
 import logging
+import os
 import re
+import selectors
 import signal
 import ssl
+import struct
 import threading
 import time
+import weakref
 from datetime import datetime
+from errno import EAGAIN
 from io import TextIOWrapper
 from pathlib import Path
+from typing import NamedTuple, Optional
 from urllib import request
-import math
 
-RUN_MATCH = r"\bPrimary particle no.\s*\d*\s*ETR:\s*\d*\s*hour.*\d*\s*minute.*\d*\s*second.*\b"
-COMPLETE_MATCH = r"\bRun time:\s*\d*\s*hour.*\d*\s*minute.*\d*\s*second.*\b"
-REQUESTED_MATCH = r"\bRequested number of primaries NSTAT"
+# lines of SHIELD-HIT12A log relevant for monitoring, each pattern is matched only at position of its keyword
+RUN_LINE = "run"
+RUN_KEYWORD = "Primary particle no."
+RUN_PATTERN = re.compile(r"Primary particle no\.\s*(\d+)\s*ETR:\s*(\d+)\s*hour\S*\s*(\d+)\s*minute\S*\s*(\d+)\s*second")
+REQUESTED_LINE = "requested"
+REQUESTED_KEYWORD = "Requested number of primaries NSTAT"
+REQUESTED_PATTERN = re.compile(r"Requested number of primaries NSTAT\s*:\s*(\d+)")
+COMPLETE_LINE = "complete"
+COMPLETE_KEYWORD = "Run time:"
+COMPLETE_PATTERN = re.compile(r"Run time:\s*(\d+)\s*hour\S*\s*(\d+)\s*minute\S*\s*(\d+)\s*second")
+
+
+class LogLine(NamedTuple):
+    """Line of SHIELD-HIT12A log relevant for monitoring"""
+
+    kind: str  # RUN_LINE, REQUESTED_LINE or COMPLETE_LINE
+    primaries: int = 0  # simulated primaries for run lines, requested primaries for requested lines
+    seconds: int = 0  # estimated remaining time for run lines, run time for complete lines
+
+
+def classify_shieldhit_line(line: str) -> Optional[LogLine]:
+    """
+    Classifies line of SHIELD-HIT12A log and extracts numbers from it, returns None for other lines.
+    Lines are first searched for keywords, patterns are matched only at position of the found keyword.
+    """
+    start = line.find(RUN_KEYWORD)
+    if start >= 0:
+        match = RUN_PATTERN.match(line, start)
+        if match is None:
+            return None
+        primaries, hours, minutes, seconds = map(int, match.groups())
+        return LogLine(RUN_LINE, primaries, hours * 3600 + minutes * 60 + seconds)
+    start = line.find(REQUESTED_KEYWORD)
+    if start >= 0:
+        match = REQUESTED_PATTERN.match(line, start)
+        return LogLine(REQUESTED_LINE, int(match.group(1))) if match else None
+    start = line.find(COMPLETE_KEYWORD)
+    if start >= 0:
+        match = COMPLETE_PATTERN.match(line, start)
+        if match is None:
+            return None
+        hours, minutes, seconds = map(int, match.groups())
+        return LogLine(COMPLETE_LINE, seconds=hours * 3600 + minutes * 60 + seconds)
+    return None
+
+
+# minimum interval between progress updates suggested by the backend in responses to task updates
+min_update_interval_seconds = 0.0
+
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+INOTIFY_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie and length of the name which follows
+
+
+class StopEvent(threading.Event):
+    """
+    Threading event stopping log monitors. Unlike plain `threading.Event`, setting it also wakes up
+    monitors waiting for new data in log files with inotify, so they do not need to check it periodically.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._read_fd, self._write_fd = os.pipe()
+        os.set_blocking(self._write_fd, False)
+        weakref.finalize(self, os.close, self._read_fd)
+        weakref.finalize(self, os.close, self._write_fd)
+
+    def fileno(self) -> int:
+        """Returns file descriptor which becomes readable when the event is set"""
+        return self._read_fd
+
+    def set(self):
+        super().set()
+        try:
+            os.write(self._write_fd, b"\0")
+        except BlockingIOError:
+            pass
+
+
+class InotifyWatch:
+    """Watches changes of files in directories with Linux inotify, called through ctypes"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self._read = libc.read
+        self._read.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t]
+        self._read.restype = ctypes.c_ssize_t
+        self._buffer = ctypes.create_string_buffer(64 * 1024)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def add_watch(self, directory: Path) -> int:
+        """Starts watching changes of files in the directory, returns watch descriptor"""
+        wd = self._add_watch(self.fd, os.fsencode(directory), INOTIFY_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), str(directory))
+        return wd
+
+    def remove_watch(self, wd: int):
+        """Stops watching the directory, directories removed in the meantime are ignored"""
+        self._rm_watch(self.fd, wd)
+
+    def read_events(self) -> list[tuple[int, int, str]]:
+        """Returns pending events as tuples (watch descriptor, mask, name of the changed file)"""
+        # read through libc, green `os.read` of eventlet (celery workers) blocks on inotify descriptors
+        length = self._read(self.fd, self._buffer, len(self._buffer))
+        if length < 0:
+            errno = ctypes.get_errno()
+            if errno == EAGAIN:
+                return []
+            raise OSError(errno, os.strerror(errno))
+        data = self._buffer.raw[:length]
+        events = []
+        offset = 0
+        while offset + INOTIFY_EVENT.size <= len(data):
+            wd, mask, _, name_length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset : offset + name_length].rstrip(b"\0"))
+            offset += name_length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        """Stops watching all directories"""
+        os.close(self.fd)
+
+
+class LogWaiter:
+    """
+    Waits for changes of log files: their creation, new data, truncation or replacement.
+    On Linux changes are awaited with inotify, so idle monitors are not woken up and new data is read immediately.
+    When inotify is not available (other systems, exhausted inotify limits) files are polled
+    every `polling_interval_seconds`.
+    """
+
+    def __init__(self, event: Optional[threading.Event] = None, polling_interval_seconds: float = 1):
+        self.event = event
+        self.polling_interval_seconds = polling_interval_seconds
+        self._watched = {}  # watched directories with names of watched files (None for all files)
+        self._names = {}  # watch descriptors with names of watched files
+        try:
+            self._inotify = InotifyWatch()
+        except (OSError, AttributeError) as e:
+            logging.debug("inotify not available, log files are polled: %s", e)
+            self._inotify = None
+
+    def watch(self, directory: Path, name: Optional[str] = None):
+        """Starts watching changes of the file with given name in the directory (or of all its files)"""
+        if self._inotify is None or directory in self._watched:
+            return
+        try:
+            wd = self._inotify.add_watch(directory)
+        except OSError as e:
+            logging.debug("Unable to watch %s with inotify, log files are polled: %s", directory, e)
+            self.close()
+            return
+        self._watched[directory] = name
+        self._names[wd] = name
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Waits at most `timeout` seconds for a change of the watched files,
+        when polling returns after `polling_interval_seconds`. Returns True if the monitoring should stop.
+        """
+        if self._inotify is None or (self.event is not None and not hasattr(self.event, "fileno")):
+            # plain threading events can be checked only periodically
+            timeout = min(timeout, self.polling_interval_seconds)
+        if self._inotify is None:
+            if self.event is None:
+                time.sleep(timeout)
+                return False
+            return self.event.wait(timeout)
+        # selectors (unlike select.poll) are also available in eventlet green threads used by celery workers
+        with selectors.DefaultSelector() as selector:
+            selector.register(self._inotify.fd, selectors.EVENT_READ)
+            if hasattr(self.event, "fileno"):
+                selector.register(self.event.fileno(), selectors.EVENT_READ)
+            deadline = time.monotonic() + timeout
+            while True:
+                if self.event is not None and self.event.is_set():
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not selector.select(remaining):
+                    return self.event is not None and self.event.is_set()
+                for wd, mask, name in self._inotify.read_events():
+                    watched_name = self._names.get(wd)
+                    if mask & (IN_Q_OVERFLOW | IN_IGNORED) or watched_name is None or watched_name == name:
+                        return self.event is not None and self.event.is_set()
+
+    def close(self):
+        """Stops watching files, the waiter falls back to polling"""
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+
+def wait_for_log_file(
+    directory: Path,
+    pattern: str,
+    event: Optional[threading.Event] = None,
+    max_wait_for_file_seconds: float = 30,
+    polling_interval_seconds: float = 1,
+) -> Optional[TextIOWrapper]:
+    """
+    Opens the log file as soon as it is created. Returns None if the file does not appear
+    within `max_wait_for_file_seconds` or if the monitoring is stopped with the event.
+
+    Args:
+        directory: Directory in which the log file is created.
+        pattern: Glob pattern of the log file, relative to the directory. It may contain one subdirectory
+            (e.g. `fluka_*/*001.out`), which is watched as soon as it is created.
+        event: Threading event to signal when to stop waiting.
+        max_wait_for_file_seconds: Maximum time to wait for the log file to be created.
+        polling_interval_seconds: Interval between successive checks if inotify is not available.
+    """
+    subdirectory_pattern = pattern.split("/")[0] if "/" in pattern else None
+    deadline = time.monotonic() + max_wait_for_file_seconds
+    waiter = LogWaiter(event, polling_interval_seconds=polling_interval_seconds)
+    try:
+        waiter.watch(directory)
+        while True:
+            if event is not None and event.is_set():
+                return None
+            if subdirectory_pattern:
+                for subdirectory in directory.glob(subdirectory_pattern):
+                    if subdirectory.is_dir():
+                        waiter.watch(subdirectory)
+            filepath = next(directory.glob(pattern), None)
+            if filepath is not None:
+                try:
+                    return open(filepath.resolve())  # skipcq: PTC-W6004
+                except FileNotFoundError:
+                    pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or waiter.wait(remaining):
+                return None
+    finally:
+        waiter.close()
+
+
+def follow_log_file(thefile: TextIOWrapper) -> Optional[TextIOWrapper]:
+    """
+    Handles truncation and replacement of the log file read up to its end. Returns file from which reading
+    should be continued: truncated file rewound to its beginning or the new file if the file was replaced
+    (e.g. rotated). Returns None if the file was not changed.
+    """
+    stat = os.fstat(thefile.fileno())
+    if stat.st_size < thefile.buffer.tell():
+        logging.debug("Log file %s truncated, reading from the beginning", thefile.name)
+        thefile.seek(0)
+        return thefile
+    try:
+        current_stat = os.stat(thefile.name)
+    except FileNotFoundError:
+        return None
+    if (current_stat.st_dev, current_stat.st_ino) == (stat.st_dev, stat.st_ino):
+        return None
+    try:
+        logging.debug("Log file %s replaced, reading the new file", thefile.name)
+        return open(thefile.name)  # skipcq: PTC-W6004
+    except FileNotFoundError:
+        return None
 
 
 def log_generator(
@@ -25,35 +307,53 @@ def log_generator(
     polling_interval_seconds: float = 1,
 ) -> Iterator[str]:
     """
-    Generator equivalent to `tail -f` Linux command.
-    Yields new lines appended to the end of the file.
+    Generator equivalent to `tail -F` Linux command.
+    Yields new lines appended to the end of the file. Truncated file is read again from the beginning,
+    replaced (rotated) file is read to its end and then the new file is followed.
     Main purpose is monitoring of the log files.
 
     Args:
         thefile: File object to read from.
-        event: Threading event to signal when to stop the generator.
+        event: Threading event to signal when to stop the generator. Use `StopEvent`
+            to stop the generator immediately, plain events are checked every `polling_interval_seconds`.
         max_idle_seconds: Maximum time to wait for new data before raising TimeoutError.
-        polling_interval_seconds: Interval between successive file polls while no new data is available.
+        polling_interval_seconds: Interval between successive file polls while no new data is available,
+            used only if inotify is not available.
     """
     if thefile is None:
         raise ValueError("File object cannot be None.")
-    idle_seconds = 0
-    while True:
-        if event and event.is_set():
-            break
-        line = thefile.readline()
-        if not line:
-            if event:
-                if event.wait(polling_interval_seconds):
-                    break
-            else:
-                time.sleep(polling_interval_seconds)
-            idle_seconds += polling_interval_seconds
-            if idle_seconds >= max_idle_seconds:
+    waiter = LogWaiter(event, polling_interval_seconds=polling_interval_seconds)
+    can_reopen = isinstance(thefile.name, str)
+    if can_reopen:
+        # watch is created before reading, so data written in the meantime is not missed
+        filepath = Path(thefile.name)
+        waiter.watch(filepath.parent, filepath.name)
+    current_file = thefile
+    idle_since = time.monotonic()
+    try:
+        while True:
+            if event and event.is_set():
+                break
+            line = current_file.readline()
+            if line:
+                idle_since = time.monotonic()
+                yield line
+                continue
+            next_file = follow_log_file(current_file) if can_reopen else None
+            if next_file is not None:
+                if current_file not in (thefile, next_file):
+                    current_file.close()
+                current_file = next_file
+                continue
+            remaining_seconds = max_idle_seconds - (time.monotonic() - idle_since)
+            if remaining_seconds <= 0:
                 raise TimeoutError("No new log data received before timeout.")
-            continue
-        idle_seconds = 0
-        yield line
+            if waiter.wait(remaining_seconds):
+                break
+    finally:
+        waiter.close()
+        if current_file is not thefile:
+            current_file.close()
 
 
 def send_task_update(sim_id: int, task_id: int, update_key: str, update_dict: dict, backend_url: str) -> bool:
@@ -76,6 +376,7 @@ def send_task_update(sim_id: int, task_id: int, update_key: str, update_dict: di
             if res.getcode() != 202:
                 logging.warning("Sending update to %s failed", tasks_url)
                 return False
+            record_min_update_interval(res.read())
     except Exception as e:  # skipcq: PYL-W0703
         print(e)
         logging.debug("Sending update to %s failed", tasks_url)
@@ -83,6 +384,17 @@ def send_task_update(sim_id: int, task_id: int, update_key: str, update_dict: di
     return True
 
 
+def record_min_update_interval(response_body: bytes) -> None:
+    """Reads minimum interval between progress updates suggested by the backend"""
+    global min_update_interval_seconds  # skipcq: PYL-W0603
+    try:
+        suggested_interval = json.loads(response_body).get("min_update_interval")
+    except ValueError:
+        return
+    if isinstance(suggested_interval, (int, float)):
+        min_update_interval_seconds = float(suggested_interval)
+
+
 def read_shieldhit_file(
     filepath: Path,
     sim_id: int,
@@ -109,22 +421,22 @@ def read_shieldhit_file(
         max_wait_for_file_seconds: Maximum time to wait for the log file to be created
             before marking the task as FAILED.
         max_idle_seconds: Maximum time to wait for new data before marking the task as FAILED.
-        update_interval_seconds: Minimum interval between successive updates to the backend.
+        update_interval_seconds: Minimum interval between successive updates to the backend,
+            extended when the backend suggests a longer one.
         polling_interval_seconds: Interval between successive file polls while no new
-            data is available or while waiting for the file to be created.
+            data is available or while waiting for the file to be created, used only if inotify is not available.
     """
     try:
         logging.debug("Started monitoring, simulation id: %d, task id: %s", sim_id, task_id)
         logfile = None
         last_update_timestamp_seconds = 0
 
-        open_file_attempts = math.ceil(max_wait_for_file_seconds / polling_interval_seconds)
-        for _ in range(open_file_attempts):
-            try:
-                logfile = open(filepath)  # skipcq: PTC-W6004
-                break
-            except FileNotFoundError:
-                time.sleep(polling_interval_seconds)
+        logfile = wait_for_log_file(
+            filepath.parent,
+            filepath.name,
+            max_wait_for_file_seconds=max_wait_for_file_seconds,
+            polling_interval_seconds=polling_interval_seconds,
+        )
 
         if logfile is None:
             logging.debug("Log file for task %s not found", task_id)
@@ -140,35 +452,34 @@ def read_shieldhit_file(
 
         loglines = log_generator(
             logfile,
-            threading.Event(),
             max_idle_seconds=max_idle_seconds,
             polling_interval_seconds=polling_interval_seconds,
         )
 
         for line in loglines:
+            log_line = classify_shieldhit_line(line)
+            if log_line is None:
+                continue
             utc_now = datetime.utcnow()
-            if re.search(RUN_MATCH, line):
-                logging.debug("Found RUN_MATCH in line: %s for file: %s and task: %s ", line, filepath, task_id)
-                if utc_now.timestamp() - last_update_timestamp_seconds < update_interval_seconds:
-                    logging.debug("Skipping update, too often")
+            if log_line.kind == RUN_LINE:
+                update_interval = max(update_interval_seconds, min_update_interval_seconds)
+                if utc_now.timestamp() - last_update_timestamp_seconds < update_interval:
                     continue
                 last_update_timestamp_seconds = utc_now.timestamp()
-                splitted = line.split()
                 up_dict = {  # skipcq: PYL-W0612
-                    "simulated_primaries": int(splitted[3]),
-                    "estimated_time": int(splitted[9]) + int(splitted[7]) * 60 + int(splitted[5]) * 3600,
+                    "simulated_primaries": log_line.primaries,
+                    "estimated_time": log_line.seconds,
                 }
                 send_task_update(
                     sim_id=sim_id, task_id=task_id, update_key=update_key, update_dict=up_dict, backend_url=backend_url
                 )
-                logging.debug("Update for task: %d - simulated primaries: %s", task_id, splitted[3])
+                logging.debug("Update for task: %d - simulated primaries: %d", task_id, log_line.primaries)
 
-            elif re.search(REQUESTED_MATCH, line):
-                logging.debug("Found REQUESTED_MATCH in line: %s for file: %s and task: %s ", line, filepath, task_id)
-                splitted = line.split(": ")
+            elif log_line.kind == REQUESTED_LINE:
+                logging.debug("Found requested primaries in file: %s and task: %s ", filepath, task_id)
                 up_dict = {  # skipcq: PYL-W0612
                     "simulated_primaries": 0,
-                    "requested_primaries": int(splitted[1]),
+                    "requested_primaries": log_line.primaries,
                     "start_time": utc_now.isoformat(sep=" "),
                     "task_state": "RUNNING",
                 }
@@ -177,8 +488,8 @@ def read_shieldhit_file(
                 )
                 logging.debug("Update for task: %d - RUNNING", task_id)
 
-            elif re.search(COMPLETE_MATCH, line):
-                logging.debug("Found COMPLETE_MATCH in line: %s for file: %s and task: %s ", line, filepath, task_id)
+            elif log_line.kind == COMPLETE_LINE:
+                logging.debug("Found run time in file: %s and task: %s ", filepath, task_id)
                 up_dict = {  # skipcq: PYL-W0612
                     "end_time": utc_now.isoformat(sep=" "),
                     "task_state": "COMPLETED",
@@ -188,8 +499,6 @@ def read_shieldhit_file(
                 )
                 logging.debug("Update for task: %d - COMPLETED", task_id)
                 return
-            else:
-                logging.debug("No match found in line: %s for file: %s and task: %s ", line, filepath, task_id)
 
         raise RuntimeError(
             f"Log stream ended without completion markers in SHIELDHIT monitor for task {task_id}. "
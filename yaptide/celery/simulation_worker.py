@@ -1,7 +1,16 @@
 from celery import Celery
+from celery.signals import worker_init
+
+from yaptide.celery.utils.cpu_affinity import pin_worker_process
 
 celery_app = Celery(
     "simulation_worker",
     include=["yaptide.celery.tasks"],
     task_routes={"yaptide.celery.tasks*": {"queue": "simulations"}},
 )
+
+
+@worker_init.connect
+def reserve_worker_cores(**_kwargs):
+    """With CPU pinning enabled, worker process runs on cores not used by simulations"""
+    pin_worker_process()
@@ -1,13 +1,15 @@
 import contextlib
 from dataclasses import dataclass
 import logging
+import os
 import tempfile
 from datetime import datetime
 from pathlib import Path
-import threading
-from typing import Optional
+from typing import Callable, Optional
 
 from yaptide.batch.batch_methods import post_update
+from yaptide.celery.utils.input_cache import write_task_input_files
+from yaptide.celery.utils.input_store import fetch_input_files
 from yaptide.celery.utils.pymc import (
     average_estimators,
     command_to_run_fluka,
@@ -16,10 +18,12 @@ from yaptide.celery.utils.pymc import (
     get_fluka_estimators,
     get_shieldhit_estimators,
     get_tmp_dir,
-    read_shieldhit_file,
     read_file_offline,
-    read_fluka_file,
+    read_fluka_files_offline,
 )
+from yaptide.celery.utils.progress.fluka_monitor import FlukaLogParser, fluka_log_pattern
+from yaptide.celery.utils.progress.monitor_service import TaskMonitor, get_progress_monitor_service
+from yaptide.celery.utils.progress.shieldhit_monitor import ShieldhitLogParser
 from yaptide.celery.utils.requests import send_simulation_logfiles, send_simulation_results, send_task_update
 from yaptide.celery.simulation_worker import celery_app
 from yaptide.utils.enums import EntityState
@@ -27,7 +31,6 @@ from yaptide.utils.sim_utils import (
     check_and_convert_payload_to_files_dict,
     estimators_to_list,
     simulation_logfiles,
-    write_simulation_input_files,
 )
 
 
@@ -41,14 +44,19 @@ def convert_input_files(payload_dict: dict) -> dict:
 @celery_app.task(bind=True)
 def run_single_simulation(
     self,
-    files_dict: dict,
+    files_dict: Optional[dict],
     task_id: int,
     update_key: str = "",
     simulation_id: int = None,
     keep_tmp_files: bool = False,
     sim_type: str = "shieldhit",
+    cycles: int = 1,
+    input_ref: Optional[str] = None,
 ) -> dict:
-    """Function running single simulation"""
+    """
+    Function running single simulation, FLUKA simulation is run in `cycles` cycles.
+    Input is passed in `files_dict` or, if it is None, fetched from the input store by its hash `input_ref`.
+    """
     # for the purpose of running this function in pytest we would like to have some control
     # on the temporary directory used by the function
 
@@ -57,6 +65,9 @@ def run_single_simulation(
     logging.info("Sending initial update for task %d, setting celery id %s", task_id, self.request.id)
     send_task_update(simulation_id, task_id, update_key, {"celery_id": self.request.id})
 
+    if files_dict is None:
+        files_dict = fetch_input_files(input_ref)
+
     # we would like to have some control on the temporary directory used by the function
     tmp_dir = get_tmp_dir()
     logging.info("Temporary directory is: %s", tmp_dir)
@@ -68,13 +79,15 @@ def run_single_simulation(
         if keep_tmp_files
         else tempfile.TemporaryDirectory(dir=tmp_dir)
     ) as tmp_work_dir:
-        write_simulation_input_files(files_dict=files_dict, output_dir=Path(tmp_work_dir))
+        write_task_input_files(files_dict=files_dict, output_dir=Path(tmp_work_dir))
         logging.debug("Generated input files: %s", files_dict.keys())
 
         if sim_type == "shieldhit":
             simulation_result = run_single_simulation_for_shieldhit(tmp_work_dir, task_id, update_key, simulation_id)
         elif sim_type == "fluka":
-            simulation_result = run_single_simulation_for_fluka(tmp_work_dir, task_id, update_key, simulation_id)
+            simulation_result = run_single_simulation_for_fluka(
+                tmp_work_dir, task_id, update_key, simulation_id, cycles
+            )
 
         # there is no simulation output
         if not simulation_result.estimators_dict:
@@ -155,27 +168,34 @@ def run_single_simulation_for_shieldhit(
 
     command_stdout, command_stderr = "", ""
     simulated_primaries, requested_primaries = 0, 0
-    event = threading.Event()
-
-    # start monitoring process if possible
-    # is None if monitoring if monitor was not started
-    task_monitor = monitor_shieldhit(event, tmp_work_dir, task_id, update_key, simulation_id)
+    # progress is parsed either from stdout of the simulator or from its log file followed by the monitor service
+    # task_monitor is None if the log file is not monitored, stdout_parser is None if stdout is not parsed
+    stdout_parser, task_monitor = None, None
+    if shieldhit_progress_from_stdout():
+        stdout_parser = ShieldhitLogParser()
+    else:
+        task_monitor = monitor_shieldhit(tmp_work_dir, task_id, update_key, simulation_id)
     # run the simulation
     logging.info("Running SHIELD-HIT12A process in %s", tmp_work_dir)
     process_exit_success, command_stdout, command_stderr = execute_simulation_subprocess(
-        dir_path=Path(tmp_work_dir), command_as_list=command_as_list
+        dir_path=Path(tmp_work_dir),
+        command_as_list=command_as_list,
+        stdout_callback=parse_shieldhit_stdout(stdout_parser, task_id, update_key, simulation_id),
     )
     logging.info("SHIELD-HIT12A process finished with status %s", process_exit_success)
 
+    if stdout_parser is not None:
+        get_progress_monitor_service().wait_for_updates()
+        simulated_primaries = stdout_parser.simulated_primaries
+        requested_primaries = stdout_parser.requested_primaries
     # terminate monitoring process
     if task_monitor:
         logging.debug("Terminating monitoring process for task %d", task_id)
-        event.set()
-        task_monitor.task.join()
+        get_progress_monitor_service().unregister(task_monitor)
         logging.debug("Monitoring process for task %d terminated", task_id)
     # if watcher didn't finish yet, we need to read the log file and send the last update to the backend
     if task_monitor:
-        simulated_primaries, requested_primaries = read_file_offline(task_monitor.path_to_monitor)
+        simulated_primaries, requested_primaries = read_file_offline(Path(tmp_work_dir) / shieldhit_log_name(task_id))
 
     # both simulation execution and monitoring process are finished now, we can read the estimators
     estimators_dict = get_shieldhit_estimators(dir_path=Path(tmp_work_dir))
@@ -191,18 +211,17 @@ def run_single_simulation_for_shieldhit(
 
 
 def run_single_simulation_for_fluka(
-    tmp_work_dir: str, task_id: int, update_key: str = "", simulation_id: Optional[int] = None
+    tmp_work_dir: str, task_id: int, update_key: str = "", simulation_id: Optional[int] = None, cycles: int = 1
 ) -> SimulationTaskResult:
     """Function running single simulation for shieldhit"""
-    command_as_list = command_to_run_fluka(dir_path=Path(tmp_work_dir), task_id=task_id)
+    command_as_list, cycles = command_to_run_fluka(dir_path=Path(tmp_work_dir), task_id=task_id, cycles=cycles)
     logging.info("Command to run FLUKA: %s", " ".join(command_as_list))
 
     command_stdout, command_stderr = "", ""
     simulated_primaries, requested_primaries = 0, 0
-    event = threading.Event()
     # start monitoring process if possible
     # is None if monitoring if monitor was not started
-    task_monitor = monitor_fluka(event, tmp_work_dir, task_id, update_key, simulation_id)
+    task_monitor = monitor_fluka(tmp_work_dir, task_id, update_key, simulation_id, cycles)
 
     # run the simulation
     logging.info("Running Fluka process in %s", tmp_work_dir)
@@ -214,13 +233,12 @@ def run_single_simulation_for_fluka(
     # terminate monitoring process
     if task_monitor:
         logging.debug("Terminating monitoring process for task %s", task_id)
-        event.set()
-        task_monitor.task.join()
+        get_progress_monitor_service().unregister(task_monitor)
         logging.debug("Monitoring process for task %s terminated", task_id)
-    # TO BE IMPLEMENTED
     # if watcher didn't finish yet, we need to read the log file and send the last update to the backend
-    # reading of the log file for fluka after simulation was finished
-    # fluka copies the file back to main directory from temporary directory
+    # fluka copies files of each cycle back to main directory from temporary directory after the cycle is finished
+    if task_monitor:
+        simulated_primaries, requested_primaries = read_fluka_files_offline(Path(tmp_work_dir), cycles)
 
     # both simulation execution and monitoring process are finished now, we can read the estimators
     estimators_dict = get_fluka_estimators(dir_path=Path(tmp_work_dir))
@@ -301,69 +319,69 @@ def merge_results(results: list[dict]) -> dict:
     return final_result
 
 
-@dataclass
-class MonitorTask:
-    """Class representing monitoring task"""
-
-    path_to_monitor: Path
-    task: threading.Thread
-
-
-def monitor_shieldhit(
-    event: threading.Event, tmp_work_dir: str, task_id: int, update_key: str, simulation_id: str
-) -> Optional[MonitorTask]:
-    """Function monitoring progress of SHIELD-HIT12A simulation"""
+def monitor_shieldhit(tmp_work_dir: str, task_id: int, update_key: str, simulation_id: int) -> Optional[TaskMonitor]:
+    """Registers log file of SHIELD-HIT12A simulation in the progress monitor service of the worker"""
     # we would like to monitor the progress of simulation
     # this is done by reading the log file and sending the updates to the backend
-    # if we have update_key and simulation_id the monitoring task can submit the updates to backend
-    path_to_monitor = Path(tmp_work_dir) / f"shieldhit_{task_id:04d}.log"
+    # if we have update_key and simulation_id the monitor can submit the updates to backend
     if update_key and simulation_id is not None:
-        current_logging_level = logging.getLogger().getEffectiveLevel()
-        task = threading.Thread(
-            target=read_shieldhit_file,
-            kwargs=dict(
-                event=event,
-                filepath=path_to_monitor,
-                simulation_id=simulation_id,
-                task_id=task_id,
-                update_key=update_key,
-                logging_level=current_logging_level,
-            ),
+        return get_progress_monitor_service().register(
+            simulation_id=simulation_id,
+            task_id=task_id,
+            update_key=update_key,
+            directory=Path(tmp_work_dir),
+            pattern=shieldhit_log_name(task_id),
+            parser=ShieldhitLogParser(),
         )
-        task.start()
-        logging.info("Started monitoring process for task %d", task_id)
-        return MonitorTask(path_to_monitor=path_to_monitor, task=task)
 
     logging.info("No monitoring processes started for task %d", task_id)
     return None
 
 
+def shieldhit_progress_from_stdout() -> bool:
+    """
+    Returns True if progress of SHIELD-HIT12A is parsed directly from its stdout,
+    instead of following its log file, controlled by SHIELDHIT_PROGRESS_FROM_STDOUT environment variable
+    """
+    return os.environ.get("SHIELDHIT_PROGRESS_FROM_STDOUT", "").lower() in ("1", "true", "yes")
+
+
+def parse_shieldhit_stdout(
+    parser: Optional[ShieldhitLogParser], task_id: int, update_key: str, simulation_id: int
+) -> Optional[Callable[[str], None]]:
+    """Returns callback parsing progress of SHIELD-HIT12A from lines of its stdout, if progress should be sent"""
+    if parser is None:
+        return None
+    if update_key and simulation_id is not None:
+        return get_progress_monitor_service().stream_parser(simulation_id, task_id, update_key, parser)
+    logging.info("No progress of task %d is sent, parsing its stdout only", task_id)
+    return parser.parse
+
+
 def monitor_fluka(
-    event: threading.Event, tmp_work_dir: str, task_id: int, update_key: str, simulation_id: int
-) -> Optional[MonitorTask]:
-    """Function running the monitoring process for Fluka simulation"""
+    tmp_work_dir: str, task_id: int, update_key: str, simulation_id: int, cycles: int = 1
+) -> Optional[TaskMonitor]:
+    """
+    Registers log file of Fluka simulation in the progress monitor service of the worker,
+    log files of next cycles are followed when previous cycles finish
+    """
     # we would like to monitor the progress of simulation
     # this is done by reading the log file and sending the updates to the backend
-    # if we have update_key and simulation_id the monitoring task can submit the updates to backend
-    # We use dir instead path, because fluka simulator generates direcoty with PID in name of its process
-    dir_to_monitor = Path(tmp_work_dir)
+    # if we have update_key and simulation_id the monitor can submit the updates to backend
     if update_key and simulation_id is not None:
-        current_logging_level = logging.getLogger().getEffectiveLevel()
-        task = threading.Thread(
-            target=read_fluka_file,
-            kwargs=dict(
-                event=event,
-                dirpath=dir_to_monitor,
-                simulation_id=simulation_id,
-                task_id=task_id,
-                update_key=update_key,
-                logging_level=current_logging_level,
-            ),
+        return get_progress_monitor_service().register(
+            simulation_id=simulation_id,
+            task_id=task_id,
+            update_key=update_key,
+            directory=Path(tmp_work_dir),
+            pattern=fluka_log_pattern(cycle=1),
+            parser=FlukaLogParser(verbose=logging.getLogger().getEffectiveLevel() <= logging.INFO, cycles=cycles),
         )
 
-        task.start()
-        logging.info("Started monitoring process for task %d", task_id)
-        return MonitorTask(path_to_monitor=dir_to_monitor, task=task)
-
     logging.info("No monitoring processes started for task %d", task_id)
     return None
+
+
+def shieldhit_log_name(task_id: int) -> str:
+    """Returns name of SHIELD-HIT12A log file of the task"""
+    return f"shieldhit_{task_id:04d}.log"
@@ -0,0 +1,178 @@
+"""
+Core-aware execution of simulations, enabled with `CPU_PINNING` environment variable.
+
+Simulators are CPU-bound single-threaded processes, so a worker runs as many tasks at once as it has cores
+and each simulator subprocess is pinned to a dedicated core. The number of cores comes from the CPU quota
+of the cgroup of the worker (`cpus` limit in docker-compose, `MAX_CORES`) and its CPU affinity.
+Cores may be grouped into NUMA nodes with `SIMULATION_NUMA_NODES` (CPU lists of nodes separated by `;`,
+e.g. `0-7;8-15`), then only listed cores are used and consecutive simulations are spread over the nodes.
+`RESERVED_CORES` cores (one by default) are left for the worker process itself, which runs
+progress monitors and merging of results.
+
+The worker is started with concurrency printed by `python -m yaptide.celery.utils.cpu_affinity`,
+see `run_simulation_worker.sh`. Cores are assigned within a single worker process, as with eventlet pool.
+"""
+
+import contextlib
+import logging
+import math
+import os
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import zip_longest
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+CGROUP_V2_CPU_MAX = Path("/sys/fs/cgroup/cpu.max")
+CGROUP_V1_CPU_QUOTA = Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+CGROUP_V1_CPU_PERIOD = Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+RESERVED_CORES = 1  # cores left for monitor and merge threads of the worker process
+
+
+def cpu_pinning_enabled() -> bool:
+    """Returns True if simulations are pinned to cores, controlled by CPU_PINNING environment variable"""
+    return os.environ.get("CPU_PINNING", "").lower() in ("1", "true", "yes")
+
+
+def parse_cpu_list(cpu_list: str) -> list[int]:
+    """Returns cores from CPU list in the kernel format, e.g. `0-3,8` gives [0, 1, 2, 3, 8]"""
+    cores = []
+    for part in cpu_list.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cores.extend(range(int(first), int(last or first) + 1))
+    return cores
+
+
+def cgroup_cpu_limit(
+    cpu_max: Path = CGROUP_V2_CPU_MAX, quota: Path = CGROUP_V1_CPU_QUOTA, period: Path = CGROUP_V1_CPU_PERIOD
+) -> Optional[float]:
+    """Returns CPU quota of the cgroup in cores (cgroup v2 or v1), None if there is no quota"""
+    try:
+        if cpu_max.exists():
+            max_quota, max_period = cpu_max.read_text().split()
+            return None if max_quota == "max" else int(max_quota) / int(max_period)
+        if quota.exists():
+            quota_us = int(quota.read_text())
+            return None if quota_us <= 0 else quota_us / int(period.read_text())
+    except (OSError, ValueError) as e:
+        logging.warning("Unable to read CPU quota of the cgroup: %s", e)
+    return None
+
+
+@dataclass(frozen=True)
+class CorePlan:
+    """Cores of the worker: reserved for the worker process and dedicated to simulations, in order of use"""
+
+    reserved: tuple[int, ...]
+    simulation: tuple[int, ...]
+
+
+def plan_cores(nodes: list[list[int]], cpu_limit: Optional[float], reserved_cores: int = RESERVED_CORES) -> CorePlan:
+    """
+    Splits cores of NUMA nodes into reserved ones and ones for simulations, within the CPU limit.
+    Cores are taken from nodes in turn, so simulations are spread over the nodes.
+    With a single core available nothing is reserved, the worker process shares it with the simulation.
+    """
+    interleaved = [core for cores in zip_longest(*nodes) for core in cores if core is not None]
+    usable = len(interleaved) if cpu_limit is None else max(1, min(len(interleaved), math.floor(cpu_limit)))
+    cores = interleaved[:usable]
+    reserved = max(0, min(reserved_cores, len(cores) - 1))
+    return CorePlan(reserved=tuple(cores[:reserved]), simulation=tuple(cores[reserved:]))
+
+
+@lru_cache(maxsize=1)
+def get_core_plan() -> CorePlan:
+    """Returns cores of the worker, based on its CPU affinity, cgroup quota and environment variables"""
+    available = os.sched_getaffinity(0)
+    numa_nodes = os.environ.get("SIMULATION_NUMA_NODES", "")
+    nodes = [[core for core in parse_cpu_list(node) if core in available] for node in numa_nodes.split(";")]
+    if not any(nodes):
+        if numa_nodes:
+            logging.warning("No cores of SIMULATION_NUMA_NODES=%s are available, using all cores", numa_nodes)
+        nodes = [sorted(available)]
+    reserved_cores = int(os.environ.get("RESERVED_CORES", RESERVED_CORES))
+    plan = plan_cores(nodes, cgroup_cpu_limit(), reserved_cores)
+    logging.info("Cores reserved for the worker: %s, for simulations: %s", plan.reserved, plan.simulation)
+    return plan
+
+
+class CorePool:
+    """Assigns dedicated cores to running simulations, cores are taken in order of the plan"""
+
+    def __init__(self, cores: tuple[int, ...]):
+        self.cores = cores
+        self._busy: set[int] = set()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def core(self) -> Iterator[Optional[int]]:
+        """Yields a free core kept for the caller until exit, None if all cores are busy"""
+        with self._lock:
+            core = next((core for core in self.cores if core not in self._busy), None)
+            if core is not None:
+                self._busy.add(core)
+        try:
+            yield core
+        finally:
+            if core is not None:
+                with self._lock:
+                    self._busy.discard(core)
+
+
+@lru_cache(maxsize=1)
+def get_core_pool() -> Optional[CorePool]:
+    """Returns pool of cores for simulations or None if CPU pinning is disabled"""
+    if not cpu_pinning_enabled():
+        return None
+    return CorePool(get_core_plan().simulation)
+
+
+@contextlib.contextmanager
+def simulation_core() -> Iterator[Optional[int]]:
+    """Yields core dedicated to a simulation subprocess, None if the simulation is not pinned"""
+    core_pool = get_core_pool()
+    if core_pool is None:
+        yield None
+        return
+    with core_pool.core() as core:
+        if core is None:
+            logging.warning("All %d cores are busy, simulation is not pinned", len(core_pool.cores))
+        yield core
+
+
+def core_pinning(core: Optional[int]) -> Optional[Callable[[], None]]:
+    """
+    Returns function pinning the calling process to the core, None if the simulation is not pinned.
+    It is run in the simulator subprocess before exec (`preexec_fn` of `subprocess.Popen`), so the simulator
+    and processes it starts (e.g. FLUKA executable started by `rfluka`) never run on cores of the worker.
+    """
+    if core is None:
+        return None
+
+    def pin() -> None:
+        try:
+            os.sched_setaffinity(0, {core})
+        except OSError:
+            # logging is not safe between fork and exec, the simulation runs unpinned
+            pass
+
+    return pin
+
+
+def pin_worker_process() -> None:
+    """Pins the worker process (monitor and merge threads) to the reserved cores, if CPU pinning is enabled"""
+    if not cpu_pinning_enabled() or not get_core_plan().reserved:
+        return
+    try:
+        os.sched_setaffinity(0, set(get_core_plan().reserved))
+    except OSError as e:
+        logging.warning("Unable to pin worker process to cores %s: %s", get_core_plan().reserved, e)
+
+
+if __name__ == "__main__":
+    # concurrency of the worker, used by run_simulation_worker.sh
+    print(len(get_core_plan().simulation))
@@ -0,0 +1,130 @@
+import hashlib
+import logging
+import os
+import shutil
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from yaptide.celery.utils.pymc import get_tmp_dir
+from yaptide.utils.sim_utils import write_simulation_input_files
+
+INPUT_CACHE_DIR_NAME = "yaptide_input_cache"
+INPUT_CACHE_MAX_BYTES = 512 * 1024 * 1024  # default size limit of all cached inputs on the host
+# files modified in the work directory of the task (FLUKA random seed and primaries per cycle) are copied
+OVERLAY_SUFFIXES = (".inp",)
+
+
+def input_hash(files_dict: dict) -> str:
+    """Returns hash of simulation input files (filenames as keys and content as values)"""
+    digest = hashlib.sha256()
+    for filename in sorted(files_dict):
+        for part in (filename, files_dict[filename]):
+            encoded = part.encode()
+            digest.update(len(encoded).to_bytes(8, "little"))
+            digest.update(encoded)
+    return digest.hexdigest()
+
+
+class InputCache:
+    """
+    Per-host cache of simulation input files, shared by all worker processes on the host.
+    Input of a simulation is written once into a directory named after hash of its content,
+    work directories of its tasks get hardlinks to the cached files, so tasks of the same simulation
+    running on the host do not write the same files again. Cached files are read-only, files which tasks
+    modify (see OVERLAY_SUFFIXES) are copied into the work directory instead.
+    Entries are evicted in least recently used order when their total size exceeds `max_bytes`,
+    work directories are not affected, as hardlinks keep the files alive.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = INPUT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def populate(self, files_dict: dict, output_dir: Path) -> None:
+        """Saves simulation input files into the work directory of the task, using cached files if possible"""
+        overlay = {name: content for name, content in files_dict.items() if name.endswith(OVERLAY_SUFFIXES)}
+        shared = {name: content for name, content in files_dict.items() if name not in overlay}
+        write_simulation_input_files(files_dict=overlay, output_dir=output_dir)
+        if not shared:
+            return
+        try:
+            entry = self._materialize(shared)
+            for filename in shared:
+                os.link(entry / filename, output_dir / filename)
+        except OSError as e:
+            # e.g. cache on another filesystem or entry evicted meanwhile by another worker process
+            logging.warning("Input cache not used, writing input files directly: %s", e)
+            for filename in shared:
+                (output_dir / filename).unlink(missing_ok=True)
+            write_simulation_input_files(files_dict=shared, output_dir=output_dir)
+            return
+        self._evict(keep=entry)
+
+    def _materialize(self, files_dict: dict) -> Path:
+        """Returns directory with cached input files, writes them if they are not cached yet"""
+        entry = self.directory / input_hash(files_dict)
+        if entry.is_dir():
+            # modification time of the entry is its last use
+            os.utime(entry)
+            logging.debug("Input files found in cache %s", entry)
+            return entry
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # files are written to a temporary directory, renamed when complete, so other processes see whole entries
+        tmp_entry = self.directory / f".{entry.name}.{uuid.uuid4().hex}"
+        tmp_entry.mkdir()
+        write_simulation_input_files(files_dict=files_dict, output_dir=tmp_entry)
+        for filename in files_dict:
+            (tmp_entry / filename).chmod(0o444)
+        try:
+            tmp_entry.rename(entry)
+            logging.debug("Input files cached in %s", entry)
+        except OSError:
+            # another process cached the same input meanwhile
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+        return entry
+
+    def _evict(self, keep: Path) -> None:
+        """Removes least recently used entries until the cache fits its size limit"""
+        entries = []
+        for entry in self.directory.iterdir():
+            if entry.name.startswith(".") or not entry.is_dir():
+                continue
+            try:
+                size = sum(path.stat().st_size for path in entry.iterdir())
+                entries.append((entry.stat().st_mtime, size, entry))
+            except FileNotFoundError:
+                continue
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total_size <= self.max_bytes:
+                break
+            if entry == keep:
+                continue
+            logging.debug("Removing input files cached in %s", entry)
+            shutil.rmtree(entry, ignore_errors=True)
+            total_size -= size
+
+
+@lru_cache(maxsize=1)
+def get_input_cache() -> Optional[InputCache]:
+    """
+    Returns input cache of the worker host or None if it is disabled.
+    The cache is kept in `INPUT_CACHE_DIR` (by default in temporary directory of the worker, so hardlinks
+    to work directories of tasks are possible) and limited to `INPUT_CACHE_MAX_BYTES`, 0 disables the cache.
+    """
+    max_bytes = int(os.environ.get("INPUT_CACHE_MAX_BYTES", INPUT_CACHE_MAX_BYTES))
+    if max_bytes <= 0:
+        return None
+    directory = Path(os.environ.get("INPUT_CACHE_DIR", get_tmp_dir() / INPUT_CACHE_DIR_NAME))
+    return InputCache(directory=directory, max_bytes=max_bytes)
+
+
+def write_task_input_files(files_dict: dict, output_dir: Path) -> None:
+    """Saves simulation input files into the work directory of the task, through the input cache if enabled"""
+    input_cache = get_input_cache()
+    if input_cache is None:
+        write_simulation_input_files(files_dict=files_dict, output_dir=output_dir)
+        return
+    input_cache.populate(files_dict=files_dict, output_dir=output_dir)
@@ -0,0 +1,105 @@
+"""
+Simulation input passed to tasks by reference.
+
+All tasks of a job run the same input, so instead of embedding it in every task message, the input is uploaded
+once to Redis under a key named after hash of its content (`yaptide:input:<hash>`) and tasks get only the hash.
+Workers fetch the input when the task starts and keep recently used inputs in process memory, so tasks
+of the same job run by the same worker process fetch it once.
+"""
+
+import gzip
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional
+
+import redis
+
+from yaptide.celery.utils.input_cache import input_hash
+from yaptide.utils.redis_client import get_redis_client, redis_key
+
+INPUT_STORE_TTL = 3 * 24 * 3600  # seconds, input must outlive tasks waiting in the queue
+INPUT_STORE_LOCAL_ENTRIES = 4  # number of inputs kept in memory of the worker process
+INPUT_STORE_SOCKET_TIMEOUT = 30  # seconds, inputs may have several megabytes
+
+
+class InputStore:
+    """Keeps simulation inputs in Redis, compressed and addressed by hash of their content"""
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        ttl: int = INPUT_STORE_TTL,
+        local_entries: int = INPUT_STORE_LOCAL_ENTRIES,
+    ):
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.local_entries = local_entries
+        self._local: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, files_dict: dict) -> str:
+        """Uploads input (filenames as keys and content as values) and returns its hash"""
+        input_ref = input_hash(files_dict)
+        key = redis_key("input", input_ref)
+        # the same input may be uploaded again, e.g. by a rerun of the simulation, then only its TTL is extended
+        if not self.redis_client.expire(key, self.ttl):
+            value = gzip.compress(json.dumps(files_dict).encode(), compresslevel=6)
+            self.redis_client.set(key, value, ex=self.ttl)
+            logging.debug("Input %s uploaded, %d bytes compressed", input_ref, len(value))
+        return input_ref
+
+    def get(self, input_ref: str) -> dict:
+        """Returns input with given hash, raises LookupError if it expired"""
+        with self._lock:
+            if input_ref in self._local:
+                self._local.move_to_end(input_ref)
+                return self._local[input_ref]
+        value = self.redis_client.get(redis_key("input", input_ref))
+        if value is None:
+            raise LookupError(f"Simulation input {input_ref} not found, it may have expired")
+        files_dict = json.loads(gzip.decompress(value))
+        with self._lock:
+            self._local[input_ref] = files_dict
+            while len(self._local) > self.local_entries:
+                self._local.popitem(last=False)
+        return files_dict
+
+
+@lru_cache(maxsize=1)
+def get_input_store() -> Optional[InputStore]:
+    """
+    Returns input store or None if inputs are embedded in task messages.
+    The store uses Redis configured with `REDIS_URL`, the same one for Flask server and workers.
+    Setting `INPUT_BY_REFERENCE` environment variable to 0 disables the store.
+    """
+    if os.environ.get("INPUT_BY_REFERENCE", "1") == "0":
+        return None
+    redis_client = get_redis_client(socket_timeout=INPUT_STORE_SOCKET_TIMEOUT)
+    if redis_client is None:
+        return None
+    ttl = int(os.environ.get("INPUT_STORE_TTL", INPUT_STORE_TTL))
+    return InputStore(redis_client=redis_client, ttl=ttl)
+
+
+def upload_input_files(files_dict: dict) -> Optional[str]:
+    """Uploads input of the job, returns its hash or None if the input has to be embedded in task messages"""
+    input_store = get_input_store()
+    if input_store is None:
+        return None
+    try:
+        return input_store.put(files_dict)
+    except redis.RedisError as e:
+        logging.warning("Unable to upload simulation input, embedding it in task messages: %s", e)
+        return None
+
+
+def fetch_input_files(input_ref: str) -> dict:
+    """Returns input of the task uploaded with `upload_input_files`"""
+    input_store = get_input_store()
+    if input_store is None:
+        raise LookupError(f"Simulation input {input_ref} passed by reference, but input store is not configured")
+    return input_store.get(input_ref)
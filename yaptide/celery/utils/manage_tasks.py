@@ -4,25 +4,39 @@ from celery import chain, chord, group
 from celery.result import AsyncResult
 
 from yaptide.celery.tasks import merge_results, run_single_simulation, set_merging_queued_state
+from yaptide.celery.utils.input_store import upload_input_files
 from yaptide.celery.simulation_worker import celery_app
 from yaptide.utils.enums import EntityState
 
 
-def run_job(
-    files_dict: dict, update_key: str, simulation_id: int, ntasks: int, celery_ids: list, sim_type: str = "shieldhit"
+def run_job(  # skipcq: PYL-R0913
+    files_dict: dict,
+    update_key: str,
+    simulation_id: int,
+    ntasks: int,
+    celery_ids: list,
+    sim_type: str = "shieldhit",
+    cycles: int = 1,
 ) -> str:
-    """Runs asynchronous simulation job"""
+    """
+    Runs asynchronous simulation job, each task of FLUKA simulation runs in `cycles` cycles.
+    Input is uploaded once to the input store and tasks get only its hash,
+    it is embedded in every task message only if the store is not available.
+    """
     logging.debug("Starting run_simulation task for %d tasks", ntasks)
     logging.debug("Simulation id: %d", simulation_id)
     logging.debug("Update key: %s", update_key)
+    input_ref = upload_input_files(files_dict)
     map_group = group(
         [
             run_single_simulation.s(
-                files_dict=files_dict,  # simulation input, keys: filenames, values: file contents
+                files_dict=None if input_ref else files_dict,  # simulation input, keys: filenames, values: contents
                 task_id=i,
                 update_key=update_key,
                 simulation_id=simulation_id,
                 sim_type=sim_type,
+                cycles=cycles,
+                input_ref=input_ref,
             ).set(task_id=celery_ids[i])
             for i in range(ntasks)
         ]
@@ -0,0 +1,73 @@
+from collections import deque
+import logging
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+STDOUT_SPOOL_NAME = "simulator_stdout.log"
+STDERR_SPOOL_NAME = "simulator_stderr.log"
+SPOOL_FILE_SIZE = 16 * 1024 * 1024  # characters written to a spool file before it is rotated
+SPOOL_BACKUP_COUNT = 2  # number of rotated spool files kept next to the current one
+TAIL_LINES = 200  # lines of output kept in memory for error reporting
+TAIL_LINE_LENGTH = 1000  # characters of a single line kept in the tail
+
+
+class OutputSpool:
+    """
+    Consumes output stream of simulator process line by line. Lines are written to rotating files
+    in the work directory (`name`, `name.1`, ..., `name.<backup_count>`, the oldest one is removed),
+    so the memory used does not depend on the amount of output. Only the last lines are kept in memory,
+    to be reported when the simulation fails. Each line may also be passed to a callback,
+    e.g. to parse progress of the simulation directly from the pipe.
+    """
+
+    def __init__(  # skipcq: PYL-R0913
+        self,
+        filepath: Path,
+        line_callback: Optional[Callable[[str], None]] = None,
+        max_file_size: int = SPOOL_FILE_SIZE,
+        backup_count: int = SPOOL_BACKUP_COUNT,
+        tail_lines: int = TAIL_LINES,
+    ):
+        self.filepath = filepath
+        self.line_callback = line_callback
+        self.max_file_size = max_file_size
+        self.backup_count = backup_count
+        self.line_count = 0
+        self._tail: deque[str] = deque(maxlen=tail_lines)
+
+    def consume(self, stream: Iterable[str]) -> None:
+        """Reads the stream until its end, errors of the callback do not stop reading"""
+        file_size = 0
+        spool = open(self.filepath, "w")  # skipcq: PTC-W6004
+        try:
+            for line in stream:
+                if file_size + len(line) > self.max_file_size and file_size > 0:
+                    spool.close()
+                    self._rotate()
+                    spool = open(self.filepath, "w")  # skipcq: PTC-W6004
+                    file_size = 0
+                spool.write(line)
+                file_size += len(line)
+                self.line_count += 1
+                self._tail.append(line[:TAIL_LINE_LENGTH])
+                if self.line_callback is not None:
+                    try:
+                        self.line_callback(line)
+                    except Exception as e:  # skipcq: PYL-W0703
+                        logging.error("Parsing output line of %s failed, parsing stopped: %s", self.filepath.name, e)
+                        self.line_callback = None
+        finally:
+            spool.close()
+
+    def tail(self) -> str:
+        """Returns the last lines of the output"""
+        return "".join(self._tail)
+
+    def _rotate(self) -> None:
+        """Shifts spool files by one, the oldest one is removed"""
+        for number in range(self.backup_count, 0, -1):
+            source = self.filepath.with_name(f"{self.filepath.name}.{number - 1}") if number > 1 else self.filepath
+            if source.exists():
+                source.replace(self.filepath.with_name(f"{self.filepath.name}.{number}"))
+        if self.backup_count == 0:
+            self.filepath.unlink(missing_ok=True)
@@ -2,10 +2,9 @@ from dataclasses import dataclass
 from datetime import datetime, timezone
 import logging
 import re
-import threading
-from typing import Iterator, Optional
+from typing import Optional
 
-from yaptide.celery.utils.requests import send_task_update
+from yaptide.celery.utils.requests import progress_update_interval
 from yaptide.utils.enums import EntityState
 
 # templates for regex matching output from `<simulation>_<no>.out` file
@@ -39,15 +38,6 @@ def parse_progress_remaining_line(line: str) -> Optional[tuple[int, int]]:
     return (int(parts[0]), int(parts[1]))
 
 
-@dataclass
-class TaskDetails:
-    """Class holding details about the task."""
-
-    simulation_id: int
-    task_id: int
-    update_key: str
-
-
 def time_now_utc() -> datetime:
     """Function returning current time in UTC timezone."""
     # because datetime.utcnow() is deprecated
@@ -68,112 +58,107 @@ class ProgressDetails:
     last_update_timestamp_seconds: float = 0
 
 
-def check_progress(
-    line: str, update_interval_seconds: float, details: TaskDetails, progress_details: ProgressDetails
-) -> bool:
-    """
-    Function checking if the line contains progress information and sending update if needed.
+def fluka_log_pattern(cycle: int) -> str:
+    """Returns glob pattern of FLUKA `<simulation><cycle>.out` file, relative to the task directory"""
+    # fluka simulator generates directory with PID in name of its process, so the file is found with glob pattern
+    return f"fluka_*/*{cycle:03d}.out"
 
-    Args:
-        line: Line to be checked for progress information.
-        update_interval_seconds: Minimum interval between progress updates in seconds.
-        details: TaskDetails object containing details about the task.
-        progress_details: ProgressDetails object containing details about the progress.
 
-    Returns:
-        True if the line contained progress information, False otherwise.
+class FlukaLogParser:
     """
-    res = parse_progress_remaining_line(line)
-    if res:
+    Parser of FLUKA `<simulation><cycle>.out` files, fed with their lines one by one.
+    For every line returns update of the task which should be sent to the backend, if any.
+    Progress updates are returned at most once per update interval, state transitions always.
+    With many cycles, each cycle writes its own file and simulates the same number of primaries,
+    progress of the task is summed over cycles and the task is completed with the last cycle.
+    """
+
+    def __init__(self, update_interval_seconds: float = 2, verbose: bool = False, cycles: int = 1):
+        self.update_interval_seconds = update_interval_seconds
+        self.verbose = verbose
+        self.cycles = cycles
+        self.cycle = 1
+        self.cycle_primaries = 0
+        self.in_progress = False
+        self.progress_details = ProgressDetails(utc_now=time_now_utc())
+        self.finished = False
+
+    def next_log_file(self) -> Optional[str]:
+        """
+        Called when the file of the current cycle is finished, returns glob pattern of the file of the next cycle
+        and prepares the parser for it, None if the last cycle is finished.
+        """
+        if self.cycle >= self.cycles:
+            return None
+        self.cycle += 1
+        self.in_progress = False
+        self.finished = False
+        return fluka_log_pattern(self.cycle)
+
+    def check_progress(self, line: str) -> tuple[bool, Optional[dict]]:
+        """
+        Checks if the line contains progress information.
+
+        Returns:
+            True if the line contained progress information, False otherwise,
+            and update to be sent (None if the update is skipped to not send updates too often).
+        """
+        progress_details = self.progress_details
+        res = parse_progress_remaining_line(line)
+        if not res:
+            return False, None
         progress, remainder = res
         logger.debug("Found progress remaining line with progress: %s, remaining: %s", progress, remainder)
+        if not self.cycle_primaries:
+            self.cycle_primaries = progress + remainder
+        # primaries simulated in previous cycles are added
+        progress += (self.cycle - 1) * self.cycle_primaries
         if not progress_details.requested_primaries:
-            progress_details.requested_primaries = progress + remainder
-            up_dict = {
+            progress_details.requested_primaries = self.cycle_primaries * self.cycles
+            return True, {
                 "simulated_primaries": progress,
                 "requested_primaries": progress_details.requested_primaries,
                 "start_time": utc_without_offset(progress_details.utc_now),
                 "task_state": EntityState.RUNNING.value,
             }
-            send_task_update(details.simulation_id, details.task_id, details.update_key, up_dict)
-        else:
-            if (
-                progress_details.utc_now.timestamp() - progress_details.last_update_timestamp_seconds
-                < update_interval_seconds  # do not send update too often
-                and progress_details.requested_primaries > progress
-            ):
-                return True
-            progress_details.last_update_timestamp_seconds = progress_details.utc_now.timestamp()
-            up_dict = {
-                "simulated_primaries": progress,
-            }
-            send_task_update(details.simulation_id, details.task_id, details.update_key, up_dict)
-        return True
-    return False
-
-
-def read_fluka_out_file(
-    event: threading.Event,
-    line_iterator: Iterator[str],
-    update_interval_seconds: float,
-    details: TaskDetails,
-    verbose: bool = False,
-) -> None:
-    """
-    Function reading the fluka output file and reporting progress to the backend.
-
-    Args:
-        event: Threading event to signal when to stop monitoring.
-        line_iterator: Iterator over lines of the log file to be monitored.
-        update_interval_seconds: Minimum interval between successive updates to the backend.
-        details: TaskDetails object containing details about the task.
-        verbose: If True, debug logs will be printed. Default is False.
-    """
-    in_progress = False
-    progress_details = ProgressDetails(utc_now=time_now_utc())
-    for line in line_iterator:
-        if event.is_set():
-            return
-        progress_details.utc_now = time_now_utc()
-        if in_progress:
-            if check_progress(
-                line=line,
-                update_interval_seconds=update_interval_seconds,
-                details=details,
-                progress_details=progress_details,
-            ):
-                continue
+        if (
+            progress_details.utc_now.timestamp() - progress_details.last_update_timestamp_seconds
+            < progress_update_interval(self.update_interval_seconds)  # do not send update too often
+            and progress_details.requested_primaries > progress
+        ):
+            return True, None
+        progress_details.last_update_timestamp_seconds = progress_details.utc_now.timestamp()
+        return True, {"simulated_primaries": progress}
+
+    def parse(self, line: str) -> Optional[dict]:
+        """Returns update of the task reported by the line or None if there is nothing to send"""
+        self.progress_details.utc_now = time_now_utc()
+        if self.in_progress:
+            contains_progress, up_dict = self.check_progress(line)
+            if contains_progress:
+                return up_dict
             if line.startswith(S_OK_OUT_COLLECTED):
-                in_progress = False
-                if verbose:
+                self.in_progress = False
+                if self.verbose:
                     logger.debug("Found end of simulation calculation line")
-                continue
-        else:
-            if line.startswith(S_OK_OUT_IN_PROGRESS):
-                in_progress = True
-                if verbose:
-                    logger.debug("Found progress line")
-                continue
-            if line.startswith(S_OK_OUT_START):
-                logger.debug("Found start of the simulation")
-                continue
-            if S_OK_OUT_FIN_PRE_CHECK in line and re.match(S_OK_OUT_FIN_PATTERN, line):
-                logger.debug("Found end of the simulation")
-                logger.info("Parsing log file for task %s finished", details.task_id)
-                up_dict = {
-                    "simulated_primaries": progress_details.requested_primaries,
-                    "end_time": utc_without_offset(progress_details.utc_now),
-                    "task_state": EntityState.COMPLETED.value,
-                }
-                logger.info(
-                    "Sending final update for task %d, simulated primaries %d",
-                    details.task_id,
-                    progress_details.requested_primaries,
-                )
-                send_task_update(details.simulation_id, details.task_id, details.update_key, up_dict)
-                return
-    if not event.is_set():
-        raise RuntimeError(
-            f"Log stream ended without completion markers in FLUKA monitor for task {details.task_id}. "
-            f"This should never happen."
-        )
+            return None
+        if line.startswith(S_OK_OUT_IN_PROGRESS):
+            self.in_progress = True
+            if self.verbose:
+                logger.debug("Found progress line")
+            return None
+        if line.startswith(S_OK_OUT_START):
+            logger.debug("Found start of the simulation")
+            return None
+        if S_OK_OUT_FIN_PRE_CHECK in line and re.match(S_OK_OUT_FIN_PATTERN, line):
+            self.finished = True
+            if self.cycle < self.cycles:
+                logger.debug("Found end of cycle %d of the simulation", self.cycle)
+                return {"simulated_primaries": self.cycle * self.cycle_primaries}
+            logger.debug("Found end of the simulation")
+            return {
+                "simulated_primaries": self.progress_details.requested_primaries,
+                "end_time": utc_without_offset(self.progress_details.utc_now),
+                "task_state": EntityState.COMPLETED.value,
+            }
+        return None
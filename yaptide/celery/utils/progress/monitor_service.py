@@ -0,0 +1,361 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+from io import TextIOWrapper
+import logging
+import os
+from pathlib import Path
+import queue
+import selectors
+import threading
+import time
+from typing import Callable, Optional, Protocol
+
+from yaptide.batch.watcher import IN_IGNORED, IN_Q_OVERFLOW, InotifyWatch, follow_log_file
+from yaptide.celery.utils.requests import send_task_update
+from yaptide.utils.enums import EntityState
+
+MONITOR_POLLING_INTERVAL = 1  # seconds, interval between reads of log files which cannot be watched with inotify
+MONITOR_READ_SIZE = 1024 * 1024  # characters read from a single log file at once, so other files are not delayed
+
+
+class LogParser(Protocol):
+    """Parser of simulator log file fed with its lines, see ShieldhitLogParser and FlukaLogParser"""
+
+    finished: bool
+
+    def parse(self, line: str) -> Optional[dict]:
+        """Returns update of the task reported by the line or None if there is nothing to send"""
+
+    def next_log_file(self) -> Optional[str]:
+        """Returns glob pattern of the log file to follow when the current one is finished, None if parsing ends"""
+
+
+@dataclass(eq=False)
+class TaskMonitor:
+    """Task registered in the progress monitor service, with state of reading its log file"""
+
+    simulation_id: int
+    task_id: int
+    update_key: str
+    directory: Path
+    pattern: str
+    parser: LogParser
+    file_deadline: float
+    max_wait_for_file_seconds: float
+    max_idle_seconds: float
+    logfile: Optional[TextIOWrapper] = None
+    partial_line: str = ""
+    idle_since: float = 0
+    has_more_data: bool = False
+    polled: bool = False
+    watches: set[int] = field(default_factory=set)
+
+    @property
+    def deadline(self) -> float:
+        """Time (monotonic) at which the task fails if its log file does not change"""
+        if self.logfile is None:
+            return self.file_deadline
+        return self.idle_since + self.max_idle_seconds
+
+
+class ProgressMonitorService:
+    """
+    Follows log files of all simulation tasks run by the worker process in a single thread,
+    instead of a thread per task. The thread waits for changes of log files with inotify, reads new lines
+    of changed files in batches and parses them with parsers of the tasks. Updates are passed to a single
+    sender thread, which sends them with `send_task_update`, so progress updates of all tasks are coalesced.
+    Log files which cannot be watched with inotify are polled. The thread runs only while tasks are registered.
+    """
+
+    def __init__(self, polling_interval_seconds: float = MONITOR_POLLING_INTERVAL):
+        self.polling_interval_seconds = polling_interval_seconds
+        self._monitors: list[TaskMonitor] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._updates: queue.Queue = queue.Queue()
+        self._sender = threading.Thread(target=self._send_updates, daemon=True, name="task-update-sender")
+        self._sender.start()
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        os.set_blocking(self._wakeup_read, False)
+        os.set_blocking(self._wakeup_write, False)
+        try:
+            self._inotify = InotifyWatch()
+        except (OSError, AttributeError) as e:
+            logging.info("inotify not available, log files are polled: %s", e)
+            self._inotify = None
+
+    def register(  # skipcq: PYL-R0913
+        self,
+        simulation_id: int,
+        task_id: int,
+        update_key: str,
+        directory: Path,
+        pattern: str,
+        parser: LogParser,
+        max_wait_for_file_seconds: float = 20,
+        max_idle_seconds: float = 5 * 60,
+    ) -> TaskMonitor:
+        """
+        Starts monitoring log file of the task. The task is marked as FAILED if the file is not created within
+        `max_wait_for_file_seconds` or if no new data appears in it within `max_idle_seconds`.
+
+        Args:
+            simulation_id: Simulation ID.
+            task_id: Task ID.
+            update_key: Simulation auth token for backend updates.
+            directory: Directory in which the log file is created.
+            pattern: Glob pattern of the log file, relative to the directory.
+                It may contain one subdirectory (e.g. `fluka_*/*001.out`).
+            parser: Parser of the log file.
+            max_wait_for_file_seconds: Maximum time to wait for the log file to be created.
+            max_idle_seconds: Maximum time to wait for new data.
+        """
+        monitor = TaskMonitor(
+            simulation_id=simulation_id,
+            task_id=task_id,
+            update_key=update_key,
+            directory=directory,
+            pattern=pattern,
+            parser=parser,
+            file_deadline=time.monotonic() + max_wait_for_file_seconds,
+            max_wait_for_file_seconds=max_wait_for_file_seconds,
+            max_idle_seconds=max_idle_seconds,
+        )
+        with self._lock:
+            self._watch(monitor, directory)
+            self._monitors.append(monitor)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="progress-monitor")
+                self._thread.start()
+        self._wake()
+        logging.info("Started monitoring task %d, %d tasks monitored", task_id, len(self._monitors))
+        return monitor
+
+    def unregister(self, monitor: TaskMonitor) -> None:
+        """
+        Stops monitoring the task, if its log file was not parsed to the end yet,
+        and waits until all its updates are sent, so no updates of the task are sent after this call.
+        """
+        with self._lock:
+            if monitor in self._monitors:
+                self._remove(monitor)
+        self._wake()
+        self.wait_for_updates()
+        logging.debug("Stopped monitoring task %d", monitor.task_id)
+
+    def stream_parser(
+        self, simulation_id: int, task_id: int, update_key: str, parser: LogParser
+    ) -> Callable[[str], None]:
+        """
+        Returns callback parsing lines of simulator output read directly from its pipe,
+        for simulators which report progress on stdout, so their log file does not have to be followed.
+        Updates are sent by the sender thread, `wait_for_updates` should be called when the output ends.
+        """
+
+        def parse(line: str) -> None:
+            if parser.finished:
+                return
+            update_dict = parser.parse(line)
+            if update_dict:
+                self._updates.put((simulation_id, task_id, update_key, update_dict))
+
+        return parse
+
+    def wait_for_updates(self) -> None:
+        """Waits until all updates passed to the sender thread so far are sent"""
+        updates_sent = threading.Event()
+        self._updates.put(updates_sent)
+        updates_sent.wait()
+
+    def _wake(self) -> None:
+        """Wakes up the monitoring thread, so it notices registered and removed tasks"""
+        try:
+            os.write(self._wakeup_write, b"\0")
+        except BlockingIOError:
+            pass
+
+    def _watch(self, monitor: TaskMonitor, directory: Path) -> None:
+        """Starts watching changes of files in the directory, if it cannot be watched the task is polled"""
+        if self._inotify is None:
+            monitor.polled = True
+            return
+        try:
+            monitor.watches.add(self._inotify.add_watch(directory))
+        except OSError as e:
+            logging.warning(
+                "Unable to watch %s with inotify, log file of task %d is polled: %s", directory, monitor.task_id, e
+            )
+            monitor.polled = True
+
+    def _remove(self, monitor: TaskMonitor) -> None:
+        """Removes the task from monitored ones, must be called with the lock held"""
+        self._monitors.remove(monitor)
+        if monitor.logfile is not None:
+            monitor.logfile.close()
+        if self._inotify is not None:
+            watches_in_use = set().union(*(other.watches for other in self._monitors))
+            for wd in monitor.watches - watches_in_use:
+                self._inotify.remove_watch(wd)
+
+    def _send(self, monitor: TaskMonitor, update_dict: dict) -> None:
+        """Passes update of the task to the sender thread"""
+        self._updates.put((monitor.simulation_id, monitor.task_id, monitor.update_key, update_dict))
+
+    def _send_updates(self) -> None:
+        """Sends updates in order in which they were passed, events put in the queue are set when reached"""
+        while True:
+            update = self._updates.get()
+            if isinstance(update, threading.Event):
+                update.set()
+                continue
+            try:
+                send_task_update(*update)
+            except Exception as err:  # skipcq: PYL-W0703
+                logging.error("Sending update of task %d failed: %s", update[1], err)
+
+    def _fail(self, monitor: TaskMonitor) -> None:
+        """Marks the task as FAILED and stops monitoring it"""
+        self._send(monitor, {"task_state": EntityState.FAILED.value, "end_time": datetime.utcnow().isoformat(sep=" ")})
+        self._remove(monitor)
+
+    def _run(self) -> None:
+        """Runs the monitoring thread, if it fails all monitored tasks are marked as FAILED"""
+        try:
+            self._loop()
+        except Exception as err:  # skipcq: PYL-W0703
+            logging.error("Progress monitor service failed: %s", err)
+            with self._lock:
+                for monitor in list(self._monitors):
+                    self._fail(monitor)
+                self._thread = None
+
+    def _loop(self) -> None:
+        """Main loop of the monitoring thread, stops when there are no monitored tasks"""
+        with selectors.DefaultSelector() as selector:
+            selector.register(self._wakeup_read, selectors.EVENT_READ)
+            if self._inotify is not None:
+                selector.register(self._inotify.fd, selectors.EVENT_READ)
+            changed_watches = None  # None means that all tasks are checked
+            while True:
+                with self._lock:
+                    if not self._monitors:
+                        self._thread = None
+                        return
+                    timeout = self._check_monitors(changed_watches)
+                changed_watches = set()
+                for key, _ in selector.select(timeout):
+                    if key.fd == self._wakeup_read:
+                        os.read(self._wakeup_read, 4096)
+                        changed_watches = None
+                        continue
+                    for wd, mask, _ in self._inotify.read_events():
+                        if mask & IN_Q_OVERFLOW:
+                            changed_watches = None
+                        elif changed_watches is not None and not mask & IN_IGNORED:
+                            changed_watches.add(wd)
+
+    def _check_monitors(self, changed_watches: Optional[set[int]]) -> float:
+        """Processes tasks with changed log files, returns time to wait for the next change"""
+        now = time.monotonic()
+        for monitor in list(self._monitors):
+            if (
+                changed_watches is None
+                or monitor.polled
+                or monitor.has_more_data
+                or monitor.watches & changed_watches
+                or now >= monitor.deadline
+            ):
+                self._process(monitor)
+        now = time.monotonic()
+        timeout = min(monitor.deadline for monitor in self._monitors) - now if self._monitors else 0
+        if any(monitor.has_more_data for monitor in self._monitors):
+            return 0
+        if any(monitor.polled for monitor in self._monitors):
+            timeout = min(timeout, self.polling_interval_seconds)
+        return max(timeout, 0)
+
+    def _process(self, monitor: TaskMonitor) -> None:
+        """Reads new lines of log file of the task and sends updates reported by them"""
+        now = time.monotonic()
+        try:
+            if monitor.logfile is None and not self._open(monitor):
+                if now >= monitor.file_deadline:
+                    logging.error("Log file for task %d not found", monitor.task_id)
+                    self._fail(monitor)
+                return
+            lines = self._read_lines(monitor)
+            if not lines:
+                next_file = follow_log_file(monitor.logfile)
+                if next_file is not None:
+                    if next_file is not monitor.logfile:
+                        monitor.logfile.close()
+                        monitor.logfile = next_file
+                    monitor.partial_line = ""
+                    lines = self._read_lines(monitor)
+            if not lines:
+                if now >= monitor.deadline:
+                    logging.error("Simulation watcher %d timed out", monitor.task_id)
+                    self._fail(monitor)
+                return
+            monitor.idle_since = now
+            for line in lines:
+                update_dict = monitor.parser.parse(line)
+                if update_dict:
+                    self._send(monitor, update_dict)
+                if monitor.parser.finished:
+                    self._finish_log_file(monitor)
+                    return
+        except Exception as err:  # skipcq: PYL-W0703
+            logging.error("Error while monitoring log file for task %d: %s", monitor.task_id, err)
+            self._fail(monitor)
+
+    def _finish_log_file(self, monitor: TaskMonitor) -> None:
+        """Stops monitoring the task or starts waiting for its next log file, if the parser expects one"""
+        pattern = monitor.parser.next_log_file()
+        if pattern is None:
+            logging.info("Parsing log file for task %d finished", monitor.task_id)
+            self._remove(monitor)
+            return
+        logging.info("Parsing log file for task %d finished, waiting for %s", monitor.task_id, pattern)
+        monitor.logfile.close()
+        monitor.logfile = None
+        monitor.partial_line = ""
+        monitor.has_more_data = False
+        monitor.pattern = pattern
+        monitor.file_deadline = time.monotonic() + monitor.max_wait_for_file_seconds
+
+    def _open(self, monitor: TaskMonitor) -> bool:
+        """Opens log file of the task, returns False if it was not created yet"""
+        if "/" in monitor.pattern:
+            for subdirectory in monitor.directory.glob(monitor.pattern.split("/")[0]):
+                if subdirectory.is_dir() and not monitor.polled:
+                    self._watch(monitor, subdirectory)
+        filepath = next(monitor.directory.glob(monitor.pattern), None)
+        if filepath is None:
+            return False
+        try:
+            monitor.logfile = open(filepath.resolve())  # skipcq: PTC-W6004
+        except FileNotFoundError:
+            return False
+        logging.debug("Log file for task %d found", monitor.task_id)
+        monitor.idle_since = time.monotonic()
+        return True
+
+    @staticmethod
+    def _read_lines(monitor: TaskMonitor) -> list[str]:
+        """Returns complete lines appended to the log file since the last read"""
+        data = monitor.logfile.read(MONITOR_READ_SIZE)
+        monitor.has_more_data = len(data) == MONITOR_READ_SIZE
+        if not data:
+            return []
+        lines = (monitor.partial_line + data).split("\n")
+        # last line is kept until it is completed
+        monitor.partial_line = lines.pop()
+        return [line + "\n" for line in lines]
+
+
+@lru_cache(maxsize=1)
+def get_progress_monitor_service() -> ProgressMonitorService:
+    """Returns progress monitor service of the worker process"""
+    return ProgressMonitorService()
@@ -0,0 +1,64 @@
+from datetime import datetime
+import logging
+from typing import Optional
+
+from yaptide.batch.watcher import REQUESTED_LINE, RUN_LINE, classify_shieldhit_line
+from yaptide.celery.utils.requests import progress_update_interval
+from yaptide.utils.enums import EntityState
+
+logger = logging.getLogger(__name__)
+
+
+class ShieldhitLogParser:
+    """
+    Parser of SHIELD-HIT12A log file, fed with its lines one by one.
+    For every line returns update of the task which should be sent to the backend, if any.
+    Progress updates are returned at most once per update interval, state transitions always.
+    """
+
+    def __init__(self, update_interval_seconds: float = 2):
+        self.update_interval_seconds = update_interval_seconds
+        self.requested_primaries = 0
+        self.simulated_primaries = 0
+        self.last_update_timestamp_seconds = 0
+        self.finished = False
+
+    @staticmethod
+    def next_log_file() -> Optional[str]:
+        """SHIELD-HIT12A writes a single log file, so there is no next one to follow"""
+        return None
+
+    def parse(self, line: str) -> Optional[dict]:
+        """Returns update of the task reported by the line or None if there is nothing to send"""
+        log_line = classify_shieldhit_line(line)
+        if log_line is None:
+            return None
+        utc_now = datetime.utcnow()
+        if log_line.kind == RUN_LINE:
+            self.simulated_primaries = log_line.primaries
+            if (
+                utc_now.timestamp() - self.last_update_timestamp_seconds
+                < progress_update_interval(self.update_interval_seconds)  # do not send update too often
+                and self.requested_primaries >= self.simulated_primaries
+            ):
+                return None
+            self.last_update_timestamp_seconds = utc_now.timestamp()
+            return {"simulated_primaries": self.simulated_primaries, "estimated_time": log_line.seconds}
+
+        if log_line.kind == REQUESTED_LINE:
+            logger.debug("Found requested number of primaries: %d", log_line.primaries)
+            # found a line with requested primaries, task is in RUNNING state
+            self.requested_primaries = log_line.primaries
+            return {
+                "simulated_primaries": 0,
+                "start_time": utc_now.isoformat(sep=" "),
+                "task_state": EntityState.RUNNING.value,
+            }
+
+        logger.debug("Found run time: %d seconds", log_line.seconds)
+        self.finished = True
+        return {
+            "simulated_primaries": self.simulated_primaries,
+            "end_time": utc_now.isoformat(sep=" "),
+            "task_state": EntityState.COMPLETED.value,
+        }
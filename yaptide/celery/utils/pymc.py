@@ -1,22 +1,26 @@
 import logging
 import os
-import re
 import subprocess
 import tempfile
 import threading
-import math
-from datetime import datetime
 from pathlib import Path
-from typing import List, Optional, Protocol
+from typing import BinaryIO, Callable, Iterator, List, Optional, Protocol
 
 from pymchelper.executor.options import SimulationSettings, SimulatorType
 from pymchelper.executor.runner import Runner
+from pymchelper.flair.Input import Card
 from pymchelper.input_output import frompattern
 
-from yaptide.batch.watcher import COMPLETE_MATCH, REQUESTED_MATCH, RUN_MATCH, log_generator
-from yaptide.celery.utils.progress.fluka_monitor import TaskDetails, read_fluka_out_file
-from yaptide.celery.utils.requests import send_task_update
-from yaptide.utils.enums import EntityState
+from yaptide.batch.watcher import REQUESTED_LINE, RUN_LINE, classify_shieldhit_line
+from yaptide.celery.utils.cpu_affinity import core_pinning, simulation_core
+from yaptide.celery.utils.process_output import STDERR_SPOOL_NAME, STDOUT_SPOOL_NAME, OutputSpool
+from yaptide.celery.utils.progress.fluka_monitor import (
+    S_OK_OUT_COLLECTED,
+    S_OK_OUT_IN_PROGRESS,
+    parse_progress_remaining_line,
+)
+
+OFFLINE_READ_BLOCK_SIZE = 64 * 1024  # bytes read at once when log files are read backwards
 
 
 def get_tmp_dir() -> Path:
@@ -77,8 +81,11 @@ def get_shieldhit_estimators(dir_path: Path) -> dict:
     return estimators_dict
 
 
-def command_to_run_fluka(dir_path: Path, task_id: int) -> list[str]:
-    """Function to create command to run FLUKA."""
+def command_to_run_fluka(dir_path: Path, task_id: int, cycles: int = 1) -> tuple[list[str], int]:
+    """
+    Function to create command to run FLUKA, returns the command and number of cycles it runs,
+    which may be lower than requested so that cycles divide primaries of the task evenly.
+    """
     input_file = next(dir_path.glob("*.inp"), None)
     if input_file is None:
         logging.debug("failed to generate fluka command. No *.inp file found in %s", dir_path)
@@ -86,14 +93,52 @@ def command_to_run_fluka(dir_path: Path, task_id: int) -> list[str]:
         # this should never happen
         raise FileNotFoundError("Input file not found")
 
+    update_rng_seed_in_fluka_file(input_file, task_id)
+    if cycles > 1:
+        _, cycles = update_primaries_per_cycle_in_fluka_file(input_file, cycles)
     # create settings object
     # we are providing input file, simulator type and additional options
-    # provided option M with value 1 will run execute only one simulation cycle, default is 5
-    settings = SimulationSettings(input_path=str(input_file), simulator_type=SimulatorType.fluka, cmdline_opts="-M 1")
-    update_rng_seed_in_fluka_file(input_file, task_id)
+    # provided option M sets number of simulation cycles, each cycle simulates equal part of primaries of the task
+    settings = SimulationSettings(
+        input_path=str(input_file), simulator_type=SimulatorType.fluka, cmdline_opts=f"-M {cycles}"
+    )
     command_as_list = str(settings).split()
     command_as_list.append(str(input_file))
-    return command_as_list
+    return command_as_list, cycles
+
+
+def update_primaries_per_cycle_in_fluka_file(input_file: Path, cycles: int) -> tuple[int, int]:
+    """
+    Function dividing number of primaries in START card of FLUKA input file between cycles,
+    only WHAT(1) of the card is changed. Number of cycles is lowered to the largest divisor of the number
+    of primaries, so all cycles together simulate exactly the primaries of the task.
+    Returns number of primaries per cycle and number of cycles, a single cycle if the START card cannot be read.
+    """
+    all_input_lines = input_file.read_text().split("\n")
+    for i, line in enumerate(all_input_lines):
+        # replace first found card START, written in fixed format with WHAT(1) in columns 11-20
+        if line.startswith("START"):
+            # in free format the value follows the tag directly, it cannot be replaced by columns
+            what_1 = "" if line[5:10].strip() else line[10:20]
+            try:
+                primaries = int(float(what_1))
+            except ValueError:
+                logging.warning("Unable to read number of primaries from %r, running a single cycle", line)
+                return 0, 1
+            divisor_cycles = max((divisor for divisor in range(1, cycles + 1) if primaries % divisor == 0), default=1)
+            if divisor_cycles != cycles:
+                logging.warning(
+                    "%d primaries can not be divided into %d cycles, using %d cycles", primaries, cycles, divisor_cycles
+                )
+            primaries_per_cycle = max(primaries // divisor_cycles, 1)
+            logging.debug("Number of primaries per cycle: %d", primaries_per_cycle)
+            card = Card(tag="START")
+            card.setWhat(1, str(primaries_per_cycle))
+            all_input_lines[i] = line[:10] + str(card)[10:20] + line[20:]
+            input_file.write_text("\n".join(all_input_lines))
+            return primaries_per_cycle, divisor_cycles
+    logging.warning("No START card found in %s", input_file)
+    return 0, cycles
 
 
 def update_rng_seed_in_fluka_file(input_file: Path, task_id: int) -> None:
@@ -113,37 +158,58 @@ def update_rng_seed_in_fluka_file(input_file: Path, task_id: int) -> None:
     update_fluka_function(str(input_file.resolve()), random_seed)
 
 
-def execute_simulation_subprocess(dir_path: Path, command_as_list: list[str]) -> tuple[bool, str, str]:
-    """Function to execute simulation subprocess."""
+def execute_simulation_subprocess(
+    dir_path: Path, command_as_list: list[str], stdout_callback: Optional[Callable[[str], None]] = None
+) -> tuple[bool, str, str]:
+    """
+    Function to execute simulation subprocess. Its output is streamed to spool files in `dir_path`
+    instead of being kept in memory, returned stdout and stderr contain only their last lines.
+    Each line of stdout is passed to `stdout_callback`, if given.
+    With CPU pinning enabled the subprocess runs on a dedicated core.
+    """
     process_exit_success: bool = True
-    command_stdout: str = ""
-    command_stderr: str = ""
+    stdout_spool = OutputSpool(dir_path / STDOUT_SPOOL_NAME, line_callback=stdout_callback)
+    stderr_spool = OutputSpool(dir_path / STDERR_SPOOL_NAME)
     try:
-        completed_process = subprocess.run(
-            command_as_list, check=True, cwd=str(dir_path), stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
-        )
-        logging.info("simulation subprocess with return code %d finished", completed_process.returncode)
-
-        # Capture stdout and stderr
-        command_stdout = completed_process.stdout
-        command_stderr = completed_process.stderr
-
-        process_exit_success = True
-
-        # Log stdout and stderr using logging
-        logging.info("Command Output:\n%s", command_stdout)
-        logging.info("Command Error Output:\n%s", command_stderr)
-    except subprocess.CalledProcessError as e:
-        process_exit_success = False
-        # If the command exits with a non-zero status
-        logging.error(
-            "Command Error: %sSTD OUT: %s\nExecuted Command: %s", e.stderr, e.stdout, " ".join(command_as_list)
+        with (
+            simulation_core() as core,
+            subprocess.Popen(
+                command_as_list,
+                cwd=str(dir_path),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                errors="replace",
+                preexec_fn=core_pinning(core),
+            ) as process,
+        ):
+            # both pipes are read at once, so the process is not blocked on a full pipe
+            stderr_reader = threading.Thread(target=stderr_spool.consume, args=(process.stderr,), daemon=True)
+            stderr_reader.start()
+            stdout_spool.consume(process.stdout)
+            stderr_reader.join()
+            returncode = process.wait()
+        logging.info(
+            "simulation subprocess with return code %d finished, %d lines of stdout and %d of stderr spooled in %s",
+            returncode,
+            stdout_spool.line_count,
+            stderr_spool.line_count,
+            dir_path,
         )
+        process_exit_success = returncode == 0
+        if not process_exit_success:
+            # If the command exits with a non-zero status
+            logging.error(
+                "Command Error: %sSTD OUT: %s\nExecuted Command: %s",
+                stderr_spool.tail(),
+                stdout_spool.tail(),
+                " ".join(command_as_list),
+            )
     except Exception as e:  # skipcq: PYL-W0703
         process_exit_success = False
         logging.error("Exception while running simulation: %s", e)
 
-    return process_exit_success, command_stdout, command_stderr
+    return process_exit_success, stdout_spool.tail(), stderr_spool.tail()
 
 
 def get_fluka_estimators(dir_path: Path) -> dict:
@@ -203,257 +269,88 @@ def average_estimators(base_list: list[dict], list_to_add: list[dict], averaged_
     return base_list
 
 
-# skipcq:  PY-R1000
-def read_shieldhit_file(
-    event: threading.Event,
-    filepath: Path,
-    simulation_id: int,
-    task_id: int,
-    update_key: str,
-    max_wait_for_file_seconds: float = 20,
-    max_idle_seconds: float = 5 * 60,
-    update_interval_seconds: float = 2,
-    polling_interval_seconds: float = 1,
-    logging_level: int = logging.WARNING,
-):
+def read_lines_backwards(thefile: BinaryIO, block_size: int = OFFLINE_READ_BLOCK_SIZE) -> Iterator[str]:
+    """Yields lines of the file opened in binary mode from the last one, reading the file backwards in blocks"""
+    position = thefile.seek(0, os.SEEK_END)
+    remainder = b""
+    while position > 0:
+        read_size = min(block_size, position)
+        position -= read_size
+        thefile.seek(position)
+        lines = (thefile.read(read_size) + remainder).split(b"\n")
+        # first line of the block may start in the previous block
+        remainder = lines.pop(0)
+        for line in reversed(lines):
+            yield line.decode(errors="replace") + "\n"
+    if remainder:
+        yield remainder.decode(errors="replace") + "\n"
+
+
+def read_file_offline(filepath: Path) -> tuple[int, int]:
     """
-    Monitors log file of a shieldhit task, when new line with message matching regex appears, sends update to backend
-    The purpose of the updates is the progress bar update and state updates (like simulation failed or completed).
-    All possible exceptions are caught and logged, and in case of any exception the task is marked as FAILED.
-
-    Args:
-        event: Threading event to signal when to stop monitoring.
-        filepath: Path to the log file to monitor.
-        simulation_id: Simulation ID.
-        task_id: Task ID.
-        update_key: Simulation auth token for backend updates.
-        max_wait_for_file_seconds: Maximum time to wait for the log file to be created
-            before marking the task as FAILED.
-        max_idle_seconds: Maximum time to wait for new data before marking the task as FAILED.
-        update_interval_seconds: Minimum interval between successive updates to the backend.
-        polling_interval_seconds: Interval between successive file polls while no new
-            data is available or while waiting for the file to be created.
-        logging_level: Logging level to use for monitoring logs.
+    Reads log file and returns number of simulated and requested primaries.
+    Requested primaries are read from the head of the file, up to the first progress line,
+    simulated primaries from the last progress line, found by reading the file backwards,
+    so the time of reading does not depend on the size of the log.
     """
+    simulated_primaries = 0
+    requested_primaries = 0
     try:
-        logging.getLogger(__name__).setLevel(logging_level)
-        logfile = None
-        last_update_timestamp_seconds = 0
-        logging.info("Started monitoring, simulation id: %d, task id: %d", simulation_id, task_id)
-
-        open_file_attempts = math.ceil(max_wait_for_file_seconds / polling_interval_seconds)
-        # if the logfile is not created in the first max_wait_for_file_seconds, it is probably an error
-        for i in range(open_file_attempts):
-            if event.is_set():
-                return
-            try:
-                logging.debug("Trying to open file %s, attempt %d/%d", filepath, i, open_file_attempts)
-                logfile = open(filepath)  # skipcq: PTC-W6004
+        with open(filepath, "rb") as f:
+            for raw_line in f:
+                log_line = classify_shieldhit_line(raw_line.decode(errors="replace"))
+                if log_line is None:
+                    continue
+                if log_line.kind == REQUESTED_LINE:
+                    requested_primaries = log_line.primaries
+                # requested primaries are always reported before the progress
                 break
-            except FileNotFoundError:
-                if event.wait(polling_interval_seconds):
-                    return
-
-        # if logfile was not created in the first max_wait_for_file_seconds, task is marked as failed
-        if logfile is None:
-            logging.error("Log file for task %d not found", task_id)
-            up_dict = {"task_state": EntityState.FAILED.value, "end_time": datetime.utcnow().isoformat(sep=" ")}
-            send_task_update(simulation_id, task_id, update_key, up_dict)
-            return
-        logging.debug("Log file for task %d found", task_id)
-
-        # create generator which waits for new lines in log file
-        # if no new line appears in max_idle_seconds, generator stops
-        loglines = log_generator(
-            logfile, event, max_idle_seconds=max_idle_seconds, polling_interval_seconds=polling_interval_seconds
-        )
-        requested_primaries = 0
-        logging.info("Parsing log file for task %d started", task_id)
-        simulated_primaries = 0
-
-        for line in loglines:
-            if event.is_set():
-                return
-            utc_now = datetime.utcnow()
-            logging.debug("Parsing line: %s", line.rstrip())
-            if re.search(RUN_MATCH, line):
-                logging.debug(
-                    "Found RUN_MATCH in line: %s for file: %s and task: %d ", line.rstrip(), filepath, task_id
-                )
-                splitted = line.split()
-                try:
-                    simulated_primaries = int(splitted[3])
-                except (IndexError, ValueError):
-                    logging.error("Cannot parse number of simulated primaries in line: %s", line.rstrip())
-                if (
-                    utc_now.timestamp() - last_update_timestamp_seconds
-                    < update_interval_seconds  # do not send update too often
-                    and requested_primaries >= simulated_primaries
-                ):
-                    logging.debug("Skipping update for task %d", task_id)
+            for line in read_lines_backwards(f):
+                log_line = classify_shieldhit_line(line)
+                if log_line is None:
                     continue
-                last_update_timestamp_seconds = utc_now.timestamp()
-                estimated_seconds = 0
-                try:
-                    estimated_seconds = int(splitted[9]) + int(splitted[7]) * 60 + int(splitted[5]) * 3600
-                except (IndexError, ValueError):
-                    logging.error("Cannot parse estimated time in line: %s", line.rstrip())
-                up_dict = {"simulated_primaries": simulated_primaries, "estimated_time": estimated_seconds}
-                logging.debug("Sending update for task %d, simulated primaries %d", task_id, simulated_primaries)
-                send_task_update(simulation_id, task_id, update_key, up_dict)
-
-            elif re.search(REQUESTED_MATCH, line):
-                logging.debug("Found REQUESTED_MATCH in line: %s for file: %s and task: %d ", line, filepath, task_id)
-                # found a line with requested primaries, update database
-                # task is in RUNNING state
-                splitted = line.split(": ")
-                requested_primaries = int(splitted[1])
-                up_dict = {
-                    "simulated_primaries": 0,
-                    "start_time": utc_now.isoformat(sep=" "),
-                    "task_state": EntityState.RUNNING.value,
-                }
-                logging.debug("Sending update for task %d", task_id)
-                send_task_update(simulation_id, task_id, update_key, up_dict)
-            elif re.search(COMPLETE_MATCH, line):
-                logging.debug("Found COMPLETE_MATCH in line: %s for file: %s and task: %d ", line, filepath, task_id)
-                logging.info("Parsing log file for task %d finished", task_id)
-                up_dict = {
-                    "simulated_primaries": simulated_primaries,
-                    "end_time": utc_now.isoformat(sep=" "),
-                    "task_state": EntityState.COMPLETED.value,
-                }
-                logging.info("Sending final update for task %d, simulated primaries %d", task_id, simulated_primaries)
-                send_task_update(simulation_id, task_id, update_key, up_dict)
-                return
-
-        if not event.is_set():
-            raise RuntimeError(
-                f"Log stream ended without completion markers in SHIELDHIT monitor for task {task_id}. "
-                f"This should never happen."
-            )
-    except TimeoutError as err:
-        logging.error("Simulation watcher %d timed out: %s", task_id, err)
-        up_dict = {"task_state": EntityState.FAILED.value, "end_time": datetime.utcnow().isoformat(sep=" ")}
-        send_task_update(simulation_id, task_id, update_key, up_dict)
-    except Exception as err:  # skipcq: PYL-W0703
-        logging.error("Error while monitoring log file for task %d: %s", task_id, err)
-        up_dict = {"task_state": EntityState.FAILED.value, "end_time": datetime.utcnow().isoformat(sep=" ")}
-        send_task_update(simulation_id, task_id, update_key, up_dict)
-    finally:
-        if logfile is not None:
-            logfile.close()
-
-
-def read_fluka_file(
-    event: threading.Event,
-    dirpath: Path,
-    simulation_id: int,
-    task_id: int,
-    update_key: str,
-    max_wait_for_file_seconds: float = 20,
-    max_idle_seconds: float = 5 * 60,
-    update_interval_seconds: float = 2,
-    polling_interval_seconds: float = 1,
-    logging_level: int = logging.WARNING,
-):
+                if log_line.kind == RUN_LINE:
+                    simulated_primaries = log_line.primaries
+                    break
+                if log_line.kind == REQUESTED_LINE:
+                    # no progress reported after the requested primaries
+                    break
+    except FileNotFoundError:
+        logging.error("Log file %s not found", filepath)
+    return simulated_primaries, requested_primaries
+
+
+def read_fluka_files_offline(dir_path: Path, cycles: int = 1) -> tuple[int, int]:
     """
-    Monitors log file of a fluka task, when new line with message matching regex appears, sends update to backend
-    The purpose of the updates is the progress bar update and state updates (like simulation failed or completed).
-    All possible exceptions are caught and logged, and in case of any exception the task is marked as FAILED.
-
-    Args:
-        event: Threading event to signal when to stop monitoring.
-        dirpath: Path to the directory containing the log file to monitor.
-        simulation_id: Simulation ID.
-        task_id: Task ID.
-        update_key: Simulation auth token for backend updates.
-        max_wait_for_file_seconds: Maximum time to wait for the log file to be created
-            before marking the task as FAILED.
-        max_idle_seconds: Maximum time to wait for new data before marking the task as FAILED.
-        update_interval_seconds: Minimum interval between successive updates to the backend.
-        polling_interval_seconds: Interval between successive file polls while no new
-            data is available or while waiting for the file to be created.
-        logging_level: Logging level to use for monitoring logs.
+    Reads FLUKA `<simulation><cycle>.out` files of all cycles copied to `dir_path`
+    and returns number of primaries simulated in all cycles and requested for all cycles.
     """
-    try:
-        logging.getLogger(__name__).setLevel(logging_level)
-        logfile = None
-        logging.info("Started monitoring, simulation id: %d, task id: %d", simulation_id, task_id)
-
-        # if the logfile is not created in the first max_wait_for_file_seconds, it is probably an error
-        # continuation of awful glob path hack
-        def get_first_matching_file() -> Optional[Path]:
-            """Returns first matching file."""
-            path = next(dirpath.glob("fluka_*/*001.out"), None)
-            return path.resolve() if path else None
-
-        open_file_attempts = math.ceil(max_wait_for_file_seconds / polling_interval_seconds)
-        for _ in range(open_file_attempts):
-            if event.is_set():
-                return
-            try:
-                optional_file = get_first_matching_file()
-                if not optional_file:
-                    if event.wait(polling_interval_seconds):
-                        return
-                    continue
-                logfile = open(optional_file)  # skipcq: PTC-W6004
-                break
-            except FileNotFoundError:
-                if event.wait(polling_interval_seconds):
-                    return
-
-        # if logfile was not created in the first max_wait_for_file_seconds, task is marked as failed
-        if logfile is None:
-            logging.error("Log file for task %d not found", task_id)
-            up_dict = {"task_state": EntityState.FAILED.value, "end_time": datetime.utcnow().isoformat(sep=" ")}
-            send_task_update(simulation_id, task_id, update_key, up_dict)
-            return
-        logging.debug("Log file for task %d found", task_id)
-
-        # create generator which waits for new lines in log file
-        # if no new line appears in max_idle_seconds, generator stops
-        loglines = log_generator(
-            logfile, event, max_idle_seconds=max_idle_seconds, polling_interval_seconds=polling_interval_seconds
-        )
-        logging.info("Parsing log file for task %d started", task_id)
-        read_fluka_out_file(
-            event,
-            loglines,
-            update_interval_seconds=update_interval_seconds,
-            details=TaskDetails(simulation_id, task_id, update_key),
-            verbose=logging_level <= logging.INFO,
-        )
-    except TimeoutError as err:
-        logging.error("Simulation watcher %d timed out: %s", task_id, err)
-        up_dict = {"task_state": EntityState.FAILED.value, "end_time": datetime.utcnow().isoformat(sep=" ")}
-        send_task_update(simulation_id, task_id, update_key, up_dict)
-    except Exception as err:  # skipcq: PYL-W0703
-        logging.error("Error while monitoring log file for task %d: %s", task_id, err)
-        up_dict = {"task_state": EntityState.FAILED.value, "end_time": datetime.utcnow().isoformat(sep=" ")}
-        send_task_update(simulation_id, task_id, update_key, up_dict)
-    finally:
-        if logfile is not None:
-            logfile.close()
+    simulated_primaries = cycle_primaries = 0
+    for filepath in sorted(dir_path.glob("*[0-9][0-9][0-9].out")):
+        simulated, requested = read_fluka_file_offline(filepath)
+        simulated_primaries += simulated
+        cycle_primaries = max(cycle_primaries, requested)
+    return simulated_primaries, cycle_primaries * cycles
 
 
-def read_file_offline(filepath: Path) -> tuple[int, int]:
-    """Reads log file and returns number of simulated and requested primaries"""
-    simulated_primaries = 0
-    requested_primaries = 0
+def read_fluka_file_offline(filepath: Path) -> tuple[int, int]:
+    """
+    Reads FLUKA `<simulation>_<no>.out` file backwards and returns number of simulated and requested primaries
+    from the last progress line, which is a line of numbers following the line with next seeds.
+    """
     try:
-        with open(filepath, "r") as f:
-            for line in f:
-                logging.debug("Parsing line: %s", line.rstrip())
-                if re.search(RUN_MATCH, line):
-                    logging.debug("Found RUN_MATCH in line: %s for file: %s", line.rstrip(), filepath)
-                    splitted = line.split()
-                    simulated_primaries = int(splitted[3])
-                elif re.search(REQUESTED_MATCH, line):
-                    logging.debug("Found REQUESTED_MATCH in line: %s for file: %s", line.rstrip(), filepath)
-                    splitted = line.split(": ")
-                    requested_primaries = int(splitted[1])
+        with open(filepath, "rb") as f:
+            last_progress = None
+            for line in read_lines_backwards(f):
+                if line.startswith(S_OK_OUT_COLLECTED):
+                    # numbers printed after all cases were handled are not progress lines
+                    last_progress = None
+                elif line.startswith(S_OK_OUT_IN_PROGRESS):
+                    if last_progress is not None:
+                        progress, remainder = last_progress
+                        return progress, progress + remainder
+                elif last_progress is None:
+                    last_progress = parse_progress_remaining_line(line)
     except FileNotFoundError:
         logging.error("Log file %s not found", filepath)
-    return simulated_primaries, requested_primaries
+    return 0, 0
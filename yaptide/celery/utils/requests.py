@@ -1,38 +1,203 @@
+import atexit
 import logging
 import os
+import threading
+import time
+from functools import lru_cache
+from typing import Optional
 
-import requests
+from requests import Response
 
+from yaptide.utils.http_client import BackendClient, get_backend_client
 
-def send_task_update(simulation_id: int, task_id: int, update_key: str, update_dict: dict) -> bool:
-    """Sends task status to backend which will update the database"""
-    flask_url = os.environ.get("BACKEND_INTERNAL_URL")
-    if not flask_url:
-        logging.warning("Flask URL not found via BACKEND_INTERNAL_URL")
-        return False
-    if not update_key:
-        logging.warning("Update key not found, skipping update")
-        return False
+# keys of update_dict which only report progress of a running task, such updates may be coalesced,
+# updates with any other key (e.g. task_state, start_time, end_time) are state transitions sent immediately
+PROGRESS_UPDATE_KEYS = frozenset({"simulated_primaries", "estimated_time"})
+TASK_UPDATE_FLUSH_INTERVAL = 1.0  # seconds, default time window in which progress updates are collected
+
+
+class UpdateIntervalHint:
+    """
+    Minimum interval between progress updates of a task, suggested by the backend in responses to task updates
+    (`min_update_interval`, see yaptide/routes/utils/backpressure.py). Shared by all monitors of the worker process.
+    """
+
+    def __init__(self):
+        self.min_update_interval = 0.0
+
+    def record(self, response: Response) -> None:
+        """Reads suggested interval from response to accepted task update"""
+        try:
+            min_update_interval = response.json().get("min_update_interval")
+        except ValueError:
+            return
+        if isinstance(min_update_interval, (int, float)):
+            self.min_update_interval = float(min_update_interval)
+
+
+@lru_cache(maxsize=1)
+def get_update_interval_hint() -> UpdateIntervalHint:
+    """Returns update interval hint of the worker process"""
+    return UpdateIntervalHint()
+
+
+def progress_update_interval(update_interval_seconds: float) -> float:
+    """Returns interval between progress updates of a task, extended when the backend asks for slower updates"""
+    return max(update_interval_seconds, get_update_interval_hint().min_update_interval)
+
+
+def _post_task_update(
+    client: BackendClient, simulation_id: int, task_id: int, update_key: str, update_dict: dict
+) -> bool:
+    """Sends single task update to the backend"""
     dict_to_send = {
         "simulation_id": simulation_id,
         "task_id": task_id,
         "update_key": update_key,
         "update_dict": update_dict,
     }
-    logging.debug("Sending update %s to the backend %s", dict_to_send, flask_url)
-    res: requests.Response = requests.Session().post(url=f"{flask_url}/tasks", json=dict_to_send)
+    logging.debug("Sending update %s to the backend %s", dict_to_send, client.base_url)
+    res = client.post("/tasks", dict_to_send)
+    if res is None:
+        logging.warning("Task update for %s - Failed: backend unreachable", task_id)
+        return False
     if res.status_code != 202:
         logging.warning("Update_dict: %s", update_dict)
         logging.warning("Task update for %s - Failed: %s", task_id, res.json().get("message"))
         return False
+    get_update_interval_hint().record(res)
     return True
 
 
+class TaskUpdateCoalescer:
+    """
+    Collects progress updates of tasks run by the worker process and sends them together to `/tasks/batch`.
+    Within the flush interval only the latest progress of each task is kept.
+    State transitions are sent immediately, merged with pending progress of the same task.
+    Requests concerning the same task are never sent concurrently: a state transition waits for the batch
+    carrying progress of its task, so the backend never receives progress of a task after its state transition.
+    """
+
+    def __init__(self, flush_interval_seconds: float):
+        self.flush_interval_seconds = flush_interval_seconds
+        self._pending: dict[tuple[int, int], tuple[str, dict]] = {}
+        self._in_flight: set[tuple[int, int]] = set()
+        self._lock = threading.Lock()
+        self._in_flight_done = threading.Condition(self._lock)
+        self._flusher: Optional[threading.Thread] = None
+
+    def submit(
+        self, client: BackendClient, simulation_id: int, task_id: int, update_key: str, update_dict: dict
+    ) -> bool:
+        """Queues progress update or sends state transition immediately"""
+        key = (simulation_id, task_id)
+        if self.flush_interval_seconds > 0 and set(update_dict) <= PROGRESS_UPDATE_KEYS:
+            with self._lock:
+                _, pending_dict = self._pending.get(key, (update_key, {}))
+                self._pending[key] = (update_key, {**pending_dict, **update_dict})
+                self._ensure_flusher()
+            return True
+        with self._in_flight_done:
+            self._in_flight_done.wait_for(lambda: key not in self._in_flight)
+            _, pending_dict = self._pending.pop(key, (update_key, {}))
+            self._in_flight.add(key)
+        try:
+            return _post_task_update(client, simulation_id, task_id, update_key, {**pending_dict, **update_dict})
+        finally:
+            self._release({key})
+
+    def flush(self) -> bool:
+        """Sends all pending progress updates in a single request, except of tasks with requests in flight"""
+        with self._lock:
+            pending = {key: value for key, value in self._pending.items() if key not in self._in_flight}
+            for key in pending:
+                del self._pending[key]
+            self._in_flight.update(pending)
+        if not pending:
+            return True
+        try:
+            return self._send_batch(pending)
+        finally:
+            self._release(set(pending))
+
+    def _release(self, keys: set[tuple[int, int]]) -> None:
+        """Marks requests of the tasks as completed and wakes up state transitions waiting for them"""
+        with self._in_flight_done:
+            self._in_flight -= keys
+            self._in_flight_done.notify_all()
+
+    @staticmethod
+    def _send_batch(pending: dict[tuple[int, int], tuple[str, dict]]) -> bool:
+        """Sends progress updates of many tasks to `/tasks/batch`"""
+        client = get_backend_client()
+        if not client:
+            return False
+        simulations: dict[int, dict] = {}
+        for (simulation_id, task_id), (update_key, update_dict) in pending.items():
+            simulation_dict = simulations.setdefault(
+                simulation_id, {"simulation_id": simulation_id, "update_key": update_key, "tasks": []}
+            )
+            simulation_dict["tasks"].append({"task_id": task_id, "update_dict": update_dict})
+        logging.debug("Sending %d coalesced task updates to the backend %s", len(pending), client.base_url)
+        res = client.post("/tasks/batch", {"simulations": list(simulations.values())})
+        if res is None:
+            logging.warning("Coalesced task updates - Failed: backend unreachable")
+            return False
+        if res.status_code != 202:
+            logging.warning("Coalesced task updates - Failed: %s", res.json().get("message"))
+            return False
+        for rejected in res.json().get("rejected", []):
+            logging.warning("Task update rejected: %s", rejected)
+        get_update_interval_hint().record(res)
+        return True
+
+    def _ensure_flusher(self) -> None:
+        """Starts background thread flushing pending updates, must be called with the lock held"""
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True, name="task-update-coalescer")
+            self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        """Flushes pending updates every flush interval, stops when there is nothing left to send"""
+        while True:
+            time.sleep(self.flush_interval_seconds)
+            self.flush()
+            with self._lock:
+                if not self._pending:
+                    self._flusher = None
+                    return
+
+
+@lru_cache(maxsize=1)
+def get_task_update_coalescer() -> TaskUpdateCoalescer:
+    """
+    Returns task update coalescer of the worker process.
+    Time window is configured with `TASK_UPDATE_FLUSH_INTERVAL` environment variable, 0 disables coalescing.
+    """
+    flush_interval = float(os.environ.get("TASK_UPDATE_FLUSH_INTERVAL", TASK_UPDATE_FLUSH_INTERVAL))
+    coalescer = TaskUpdateCoalescer(flush_interval_seconds=flush_interval)
+    atexit.register(coalescer.flush)
+    return coalescer
+
+
+def send_task_update(simulation_id: int, task_id: int, update_key: str, update_dict: dict) -> bool:
+    """
+    Sends task status to backend which will update the database.
+    Progress updates are coalesced and sent in batches, state transitions are sent immediately.
+    """
+    client = get_backend_client()
+    if not client:
+        return False
+    if not update_key:
+        logging.warning("Update key not found, skipping update")
+        return False
+    return get_task_update_coalescer().submit(client, simulation_id, task_id, update_key, update_dict)
+
+
 def send_simulation_results(simulation_id: int, update_key: str, estimators: list) -> bool:
     """Sends simulation results to flask to save it in database"""
-    flask_url = os.environ.get("BACKEND_INTERNAL_URL")
-    if not flask_url:
-        logging.warning("Flask URL not found via BACKEND_INTERNAL_URL")
+    client = get_backend_client()
+    if not client:
         return False
     if not update_key:
         logging.warning("Update key not found, skipping update")
@@ -42,8 +207,11 @@ def send_simulation_results(simulation_id: int, update_key: str, estimators: lis
         "update_key": update_key,
         "estimators": estimators,
     }
-    logging.info("Sending results to flask via %s", flask_url)
-    res: requests.Response = requests.Session().post(url=f"{flask_url}/results", json=dict_to_send)
+    logging.info("Sending results to flask via %s", client.base_url)
+    res = client.post("/results", dict_to_send, idempotent=False)
+    if res is None:
+        logging.warning("Saving results failed: backend unreachable")
+        return False
     if res.status_code != 202:
         logging.warning("Saving results failed: %s", res.json().get("message"))
         return False
@@ -55,17 +223,19 @@ def send_simulation_logfiles(simulation_id: int, update_key: str, logfiles: dict
     Sends simulation logfiles to Flask backend which will save it in database
     Returns True if successful, False otherwise
     """
-    flask_url = os.environ.get("BACKEND_INTERNAL_URL")
-    if not flask_url:
-        logging.warning("Flask URL not found via BACKEND_INTERNAL_URL")
+    client = get_backend_client()
+    if not client:
         return False
     dict_to_send = {
         "simulation_id": simulation_id,
         "update_key": update_key,
         "logfiles": logfiles,
     }
-    logging.info("Sending log files to flask via %s", flask_url)
-    res: requests.Response = requests.Session().post(url=f"{flask_url}/logfiles", json=dict_to_send)
+    logging.info("Sending log files to flask via %s", client.base_url)
+    res = client.post("/logfiles", dict_to_send, idempotent=False)
+    if res is None:
+        logging.warning("Saving logfiles failed: backend unreachable")
+        return False
     if res.status_code != 202:
         logging.warning("Saving logfiles failed: %s", res.json()["message"])
         return False
@@ -1,10 +1,18 @@
 import logging
-from typing import Optional, Union
+from collections import Counter
+from collections.abc import Iterator
+from datetime import datetime
+from typing import NamedTuple, Optional, Union
 
-from sqlalchemy import and_
-from sqlalchemy.orm import with_polymorphic
+from sqlalchemy import Row, and_, func, select, tuple_
+from sqlalchemy.orm import selectinload, undefer, with_polymorphic
 
 from yaptide.persistence.database import db
+from yaptide.persistence.job_events import (
+    job_state_event,
+    publish_job_events,
+    task_status_event,
+)
 from yaptide.persistence.models import (
     BatchSimulationModel,
     BatchTaskModel,
@@ -17,10 +25,15 @@ from yaptide.persistence.models import (
     LogfilesModel,
     PageModel,
     SimulationModel,
+    TASK_STATE_COUNTER_COLUMNS,
     TaskModel,
     UserModel,
     YaptideUserModel,
+    decompress,
 )
+from yaptide.utils.enums import EntityState
+
+FINISHED_TASK_STATES = (EntityState.COMPLETED.value, EntityState.FAILED.value, EntityState.CANCELED.value)
 
 
 def add_object_to_db(obj: db.Model, make_commit: bool = True) -> None:
@@ -96,6 +109,11 @@ def fetch_simulation_by_sim_id(sim_id: int) -> Union[BatchSimulationModel, Celer
     return simulation
 
 
+def check_simulation_exists(sim_id: int) -> bool:
+    """Checks if simulation exists, without loading it"""
+    return db.session.query(SimulationModel.id).filter_by(id=sim_id).first() is not None
+
+
 def fetch_simulations_by_user_id(user_id: int) -> Union[list[BatchSimulationModel], list[CelerySimulationModel]]:
     """Fetches simulations by user id, sorted by id"""
     SimulationPoly = with_polymorphic(SimulationModel, [BatchSimulationModel, CelerySimulationModel])
@@ -110,6 +128,16 @@ def fetch_task_by_sim_id_and_task_id(sim_id: int, task_id: int) -> Union[BatchTa
     return task
 
 
+def check_task_exists(sim_id: int, task_id: int) -> bool:
+    """Checks if task of the simulation exists, without loading it"""
+    return db.session.query(TaskModel.id).filter_by(simulation_id=sim_id, task_id=task_id).first() is not None
+
+
+def fetch_task_ids_by_sim_id(sim_id: int) -> set[int]:
+    """Fetches ids of tasks (`task_id` used by workers) of the simulation, without loading the tasks"""
+    return {task_id for (task_id,) in db.session.query(TaskModel.task_id).filter_by(simulation_id=sim_id)}
+
+
 def fetch_tasks_by_sim_id(sim_id: int) -> Union[list[BatchTaskModel], list[CeleryTaskModel]]:
     """Fetches tasks by simulation id, sorted by task_id"""
     TaskPoly = with_polymorphic(TaskModel, [BatchTaskModel, CeleryTaskModel])
@@ -117,6 +145,118 @@ def fetch_tasks_by_sim_id(sim_id: int) -> Union[list[BatchTaskModel], list[Celer
     return tasks
 
 
+def fetch_tasks_by_sim_ids_and_task_ids(
+    task_keys: list[tuple[int, int]],
+) -> Union[list[BatchTaskModel], list[CeleryTaskModel]]:
+    """Fetches tasks identified by (simulation id, task id) pairs in a single query"""
+    if not task_keys:
+        return []
+    TaskPoly = with_polymorphic(TaskModel, [BatchTaskModel, CeleryTaskModel])
+    tasks = db.session.query(TaskPoly).filter(tuple_(TaskModel.simulation_id, TaskModel.task_id).in_(task_keys)).all()
+    return tasks
+
+
+def fetch_task_states_count_by_sim_id(sim_id: int) -> dict[str, int]:
+    """Fetches number of tasks of the simulation in each state, counted by the database"""
+    rows = (
+        db.session.query(TaskModel.task_state, func.count(TaskModel.id))
+        .filter_by(simulation_id=sim_id)
+        .group_by(TaskModel.task_state)
+        .all()
+    )
+    return dict(rows)
+
+
+def fetch_tasks_page_by_sim_id(
+    sim_id: int, after_id: Optional[int], limit: int
+) -> Union[list[BatchTaskModel], list[CeleryTaskModel]]:
+    """Fetches at most `limit` tasks of the simulation with database id greater than `after_id`, sorted by id"""
+    TaskPoly = with_polymorphic(TaskModel, [BatchTaskModel, CeleryTaskModel])
+    query = db.session.query(TaskPoly).filter_by(simulation_id=sim_id)
+    if after_id is not None:
+        query = query.filter(TaskModel.id > after_id)
+    return query.order_by(TaskModel.id).limit(limit).all()
+
+
+def fetch_task_states_summary_by_sim_id(sim_id: int) -> list[tuple[str, int, int, int]]:
+    """
+    Fetches aggregated state of the simulation tasks, computed by the database.
+    Returns tuples (task state, number of tasks, requested primaries, simulated primaries), one per task state.
+    """
+    rows = (
+        db.session.query(
+            TaskModel.task_state,
+            func.count(TaskModel.id),
+            func.coalesce(func.sum(TaskModel.requested_primaries), 0),
+            func.coalesce(func.sum(TaskModel.simulated_primaries), 0),
+        )
+        .filter_by(simulation_id=sim_id)
+        .group_by(TaskModel.task_state)
+        .all()
+    )
+    return [tuple(row) for row in rows]
+
+
+def fetch_unfinished_tasks_progress_by_sim_id(
+    sim_id: int, task_ids: list[int]
+) -> list[tuple[int, int, Optional[int], Optional[datetime]]]:
+    """
+    Fetches progress of unfinished tasks with provided task ids.
+    Returns tuples (task id, simulated primaries, estimated time, end time).
+    """
+    if not task_ids:
+        return []
+    rows = (
+        db.session.query(TaskModel.task_id, TaskModel.simulated_primaries, TaskModel.estimated_time, TaskModel.end_time)
+        .filter_by(simulation_id=sim_id)
+        .filter(TaskModel.task_id.in_(task_ids), TaskModel.task_state.not_in(FINISHED_TASK_STATES))
+        .all()
+    )
+    return [tuple(row) for row in rows]
+
+
+def fetch_unfinished_tasks_by_sim_id(sim_id: int) -> list[tuple[int, str, int, int]]:
+    """
+    Fetches unfinished (pending and running) tasks of the simulation.
+    Returns tuples (task id, task state, requested primaries, simulated primaries).
+    """
+    rows = (
+        db.session.query(
+            TaskModel.task_id, TaskModel.task_state, TaskModel.requested_primaries, TaskModel.simulated_primaries
+        )
+        .filter_by(simulation_id=sim_id)
+        .filter(TaskModel.task_state.not_in(FINISHED_TASK_STATES))
+        .all()
+    )
+    return [tuple(row) for row in rows]
+
+
+def fetch_tasks_estimated_time_range_by_sim_id(
+    sim_id: int, exclude_task_ids: list[int]
+) -> tuple[Optional[int], Optional[int]]:
+    """Fetches minimal and maximal estimated time of unfinished tasks of the simulation, except the excluded ones"""
+    query = db.session.query(func.min(TaskModel.estimated_time), func.max(TaskModel.estimated_time)).filter(
+        TaskModel.simulation_id == sim_id,
+        TaskModel.task_state.not_in(FINISHED_TASK_STATES),
+        TaskModel.end_time.is_(None),
+        TaskModel.estimated_time > 0,
+    )
+    if exclude_task_ids:
+        query = query.filter(TaskModel.task_id.not_in(exclude_task_ids))
+    return tuple(query.one())
+
+
+def fetch_task_ids_by_sim_id_and_state(sim_id: int, task_state: str) -> list[int]:
+    """Fetches database ids of the simulation tasks in provided state, sorted"""
+    rows = (
+        db.session.query(TaskModel.id)
+        .filter_by(simulation_id=sim_id, task_state=task_state)
+        .order_by(TaskModel.id)
+        .all()
+    )
+    return [task_id for (task_id,) in rows]
+
+
 def fetch_celery_tasks_by_sim_id(sim_id: int) -> list[CeleryTaskModel]:
     """Fetches celery tasks by simulation"""
     tasks = db.session.query(CeleryTaskModel).filter_by(simulation_id=sim_id).all()
@@ -129,9 +269,18 @@ def fetch_batch_tasks_by_sim_id(sim_id: int) -> list[BatchTaskModel]:
     return tasks
 
 
-def fetch_estimators_by_sim_id(sim_id: int) -> list[EstimatorModel]:
-    """Fetches estimators by simulation id, sorted by id"""
-    estimators = db.session.query(EstimatorModel).filter_by(simulation_id=sim_id).order_by(EstimatorModel.id).all()
+def fetch_estimators_by_sim_id(sim_id: int, with_data: bool = False) -> list[EstimatorModel]:
+    """Fetches estimators by simulation id, sorted by id.
+    If `with_data` is set, estimator metadata and all pages (together with their data)
+    are loaded as well, using one additional query for pages of all estimators.
+    """
+    query = db.session.query(EstimatorModel).filter_by(simulation_id=sim_id).order_by(EstimatorModel.id)
+    if with_data:
+        query = query.options(
+            undefer(EstimatorModel.compressed_data),
+            selectinload(EstimatorModel.pages).undefer(PageModel.compressed_data),
+        )
+    estimators = query.all()
     return estimators
 
 
@@ -143,16 +292,24 @@ def fetch_estimator_names_by_job_id(job_id: int) -> Optional[list[str]]:
     simulation_id = fetch_simulation_id_by_job_id(job_id=job_id)
     if not simulation_id:
         return None
+    return fetch_estimator_names_by_sim_id(sim_id=simulation_id)
+
+
+def fetch_estimator_names_by_sim_id(sim_id: int) -> list[str]:
+    """Fetches estimators names by simulation id, sorted by estimator id"""
     estimator_names_tuples = (
-        db.session.query(EstimatorModel.name).filter_by(simulation_id=simulation_id).order_by(EstimatorModel.id).all()
+        db.session.query(EstimatorModel.name).filter_by(simulation_id=sim_id).order_by(EstimatorModel.id).all()
     )
     estimator_names = [name for (name,) in estimator_names_tuples]
     return estimator_names
 
 
-def fetch_estimator_by_sim_id_and_est_name(sim_id: int, est_name: str) -> EstimatorModel:
+def fetch_estimator_by_sim_id_and_est_name(sim_id: int, est_name: str, with_data: bool = False) -> EstimatorModel:
     """Fetches estimator by simulation id and estimator name"""
-    estimator = db.session.query(EstimatorModel).filter_by(simulation_id=sim_id, name=est_name).first()
+    query = db.session.query(EstimatorModel).filter_by(simulation_id=sim_id, name=est_name)
+    if with_data:
+        query = query.options(undefer(EstimatorModel.compressed_data))
+    estimator = query.first()
     return estimator
 
 
@@ -168,25 +325,32 @@ def fetch_estimator_id_by_sim_id_and_est_name(sim_id: int, est_name: str) -> Opt
     return estimator_id[0] if estimator_id else None
 
 
-def fetch_pages_by_estimator_id(est_id: int) -> list[PageModel]:
+def fetch_pages_by_estimator_id(est_id: int, with_data: bool = False) -> list[PageModel]:
     """Fetches pages by estimator id, sorted by page number"""
-    pages = db.session.query(PageModel).filter_by(estimator_id=est_id).order_by(PageModel.page_number).all()
+    query = db.session.query(PageModel).filter_by(estimator_id=est_id).order_by(PageModel.page_number)
+    if with_data:
+        query = query.options(undefer(PageModel.compressed_data))
+    pages = query.all()
     return pages
 
 
-def fetch_page_by_est_id_and_page_number(est_id: int, page_number: int) -> PageModel:
+def fetch_page_by_est_id_and_page_number(est_id: int, page_number: int, with_data: bool = False) -> PageModel:
     """Fetches page by estimator id and page number"""
-    page = db.session.query(PageModel).filter_by(estimator_id=est_id, page_number=page_number).first()
+    query = db.session.query(PageModel).filter_by(estimator_id=est_id, page_number=page_number)
+    if with_data:
+        query = query.options(undefer(PageModel.compressed_data))
+    page = query.first()
     return page
 
 
-def fetch_pages_by_est_id_and_page_numbers(est_id: int, page_numbers: list) -> PageModel:
+def fetch_pages_by_est_id_and_page_numbers(est_id: int, page_numbers: list, with_data: bool = False) -> PageModel:
     """Fetches page by estimator id and page number"""
-    pages = (
-        db.session.query(PageModel)
-        .filter(and_(PageModel.estimator_id == est_id, PageModel.page_number.in_(page_numbers)))
-        .all()
+    query = db.session.query(PageModel).filter(
+        and_(PageModel.estimator_id == est_id, PageModel.page_number.in_(page_numbers))
     )
+    if with_data:
+        query = query.options(undefer(PageModel.compressed_data))
+    pages = query.all()
     return pages
 
 
@@ -201,6 +365,47 @@ def fetch_pages_metadata_by_est_id(est_id: str) -> EstimatorModel:
     return pages_metadata
 
 
+def fetch_pages_metadata_by_sim_id(sim_id: int) -> list[tuple[str, Optional[int], Optional[str], Optional[int]]]:
+    """
+    Fetches pages metadata of all estimators of the simulation in a single query.
+    Returns list of (estimator name, page number, page name, page dimension) tuples,
+    sorted by estimator id and page number. Estimators without pages are returned with page columns set to None.
+    """
+    pages_metadata = (
+        db.session.query(EstimatorModel.name, PageModel.page_number, PageModel.page_name, PageModel.page_dimension)
+        .outerjoin(PageModel, PageModel.estimator_id == EstimatorModel.id)
+        .filter(EstimatorModel.simulation_id == sim_id)
+        .order_by(EstimatorModel.id, PageModel.page_number)
+        .all()
+    )
+    return pages_metadata
+
+
+def iterate_pages_data_by_sim_id(sim_id: int, batch_size: int = 8) -> Iterator[tuple[str, Optional[dict], dict]]:
+    """
+    Iterates over all pages of all estimators of the simulation, sorted by estimator id and page number.
+    Yields tuples (estimator name, estimator metadata, page data).
+    Pages are fetched from the database in batches of `batch_size` rows,
+    so the whole simulation result is never kept in memory.
+    """
+    estimators = (
+        db.session.query(EstimatorModel.id, EstimatorModel.name, EstimatorModel.compressed_data)
+        .filter_by(simulation_id=sim_id)
+        .order_by(EstimatorModel.id)
+        .all()
+    )
+    for estimator_id, estimator_name, estimator_compressed_data in estimators:
+        estimator_metadata = decompress(estimator_compressed_data)
+        pages_query = (
+            db.session.query(PageModel.compressed_data)
+            .filter_by(estimator_id=estimator_id)
+            .order_by(PageModel.page_number)
+            .yield_per(batch_size)
+        )
+        for (page_compressed_data,) in pages_query:
+            yield estimator_name, estimator_metadata, decompress(page_compressed_data)
+
+
 def fetch_all_clusters() -> list[ClusterModel]:
     """Fetches all clusters"""
     clusters = db.session.query(ClusterModel).all()
@@ -213,27 +418,151 @@ def fetch_cluster_by_id(cluster_id: int) -> ClusterModel:
     return cluster
 
 
-def fetch_input_by_sim_id(sim_id: int) -> InputModel:
+def fetch_input_by_sim_id(sim_id: int, with_data: bool = False) -> InputModel:
     """Fetches input by simulation id"""
-    input_model = db.session.query(InputModel).filter_by(simulation_id=sim_id).first()
+    query = db.session.query(InputModel).filter_by(simulation_id=sim_id)
+    if with_data:
+        query = query.options(undefer(InputModel.compressed_data))
+    input_model = query.first()
     return input_model
 
 
-def fetch_logfiles_by_sim_id(sim_id: int) -> LogfilesModel:
+def fetch_logfiles_by_sim_id(sim_id: int, with_data: bool = False) -> LogfilesModel:
     """Fetches logfiles by simulation id"""
-    logfiles = db.session.query(LogfilesModel).filter_by(simulation_id=sim_id).first()
+    query = db.session.query(LogfilesModel).filter_by(simulation_id=sim_id)
+    if with_data:
+        query = query.options(undefer(LogfilesModel.compressed_data))
+    logfiles = query.first()
     return logfiles
 
 
-def update_task_state(task: Union[BatchTaskModel, CeleryTaskModel], update_dict: dict) -> None:
-    """Updates task state and makes commit"""
-    task.update_state(update_dict)
+def update_task_state(sim_id: int, task_id: int, update_dict: dict) -> Optional[Row]:
+    """
+    Updates task state, makes commit and publishes new task status to job event stream.
+    Returns updated row of the task or None if the task does not exist or is already finished.
+    """
+    updated_tasks = update_tasks_states(updates=[(sim_id, task_id, update_dict)])
+    return updated_tasks[0] if updated_tasks else None
+
+
+def update_tasks_states(updates: list[tuple[int, int, dict]]) -> list[Row]:
+    """
+    Updates states of many tasks, identified by (simulation id, task id, update dict) tuples,
+    together with aggregated task counters of their simulations. Makes a single commit
+    and publishes new task statuses to job event streams. Returns updated rows of the tasks,
+    tasks which do not exist or are already finished are not updated and are missing in the result.
+    """
+    updated_tasks = []
+    counters_changes: dict[int, Counter] = {}
+    # tasks are updated in a fixed order, so concurrent transactions updating the same tasks cannot deadlock
+    for sim_id, task_id, update_dict in sorted(updates, key=lambda update: update[:2]):
+        updated = update_task_row(sim_id=sim_id, task_id=task_id, update_dict=update_dict)
+        if updated is None:
+            continue
+        previous, task = updated
+        changes = counters_changes.setdefault(sim_id, Counter())
+        if task.task_state != previous.task_state:
+            changes[TASK_STATE_COUNTER_COLUMNS.get(previous.task_state)] -= 1
+            changes[TASK_STATE_COUNTER_COLUMNS.get(task.task_state)] += 1
+        changes["simulated_primaries"] += task.simulated_primaries - previous.simulated_primaries
+        changes["requested_primaries"] += task.requested_primaries - previous.requested_primaries
+        if update_dict.get("celery_id"):
+            celery_task_table = CeleryTaskModel.__table__
+            db.session.execute(
+                celery_task_table.update()
+                .where(celery_task_table.c.id == task.id)
+                .values(celery_id=update_dict["celery_id"])
+            )
+        updated_tasks.append(task)
+
+    # counters are changed by the database (column = column + change), so concurrent updates are not lost,
+    # simulations are updated in order of their ids, so concurrent transactions cannot deadlock
+    simulation_table = SimulationModel.__table__
+    for sim_id in sorted(counters_changes):
+        values = {
+            column: simulation_table.c[column] + change
+            for column, change in counters_changes[sim_id].items()
+            if column is not None and change
+        }
+        values["tasks_update_time"] = func.now()
+        db.session.execute(simulation_table.update().where(simulation_table.c.id == sim_id).values(values))
     db.session.commit()
 
+    publish_job_events([task_status_event(task) for task in updated_tasks])
+    return updated_tasks
+
+
+class CountedTaskValues(NamedTuple):
+    """Values of the task counted in aggregated task counters of its simulation"""
+
+    task_state: str
+    simulated_primaries: int
+    requested_primaries: int
+
+
+def update_task_row(sim_id: int, task_id: int, update_dict: dict) -> Optional[tuple[CountedTaskValues, Row]]:
+    """
+    Updates the task with a single guarded statement, without making commit. Finished tasks are never changed
+    and rules of `TaskModel.update_state_values` are applied by the database to the current row,
+    so concurrent updates do not overwrite each other.
+    Returns counted values of the task before the update and the updated row,
+    None if the task does not exist or is already finished.
+    """
+    task_table = TaskModel.__table__
+    task = task_table.c
+    previous = select(task.id, task.task_state, task.simulated_primaries, task.requested_primaries).where(
+        task.simulation_id == sim_id, task.task_id == task_id, task.task_state.not_in(FINISHED_TASK_STATES)
+    )
+    values = TaskModel.update_state_values(update_dict)
+    if db.session.get_bind().dialect.name == "postgresql":
+        # previous values are returned by the same statement, from the row locked in the subquery
+        previous = previous.with_for_update().subquery("previous")
+        statement = (
+            task_table.update()
+            .where(task.id == previous.c.id)
+            .values(values)
+            .returning(
+                *task_table.c,
+                previous.c.task_state.label("previous_task_state"),
+                previous.c.simulated_primaries.label("previous_simulated_primaries"),
+                previous.c.requested_primaries.label("previous_requested_primaries"),
+            )
+        )
+        row = db.session.execute(statement).one_or_none()
+        if row is None:
+            return None
+        return (
+            CountedTaskValues(
+                row.previous_task_state, row.previous_simulated_primaries, row.previous_requested_primaries
+            ),
+            row,
+        )
+    # other databases (SQLite) cannot return values from before the update, the update is guarded
+    # by the values read before, it is repeated if the task was changed in between
+    while True:
+        previous_row = db.session.execute(previous).one_or_none()
+        if previous_row is None:
+            return None
+        statement = (
+            task_table.update()
+            .where(
+                task.id == previous_row.id,
+                task.task_state == previous_row.task_state,
+                task.simulated_primaries == previous_row.simulated_primaries,
+                task.requested_primaries == previous_row.requested_primaries,
+            )
+            .values(values)
+            .returning(*task_table.c)
+        )
+        row = db.session.execute(statement).one_or_none()
+        if row is not None:
+            return CountedTaskValues(*previous_row[1:]), row
+
 
 def update_simulation_state(simulation: Union[BatchSimulationModel, CelerySimulationModel], update_dict: dict) -> None:
-    """Updates simulation state and makes commit"""
+    """Updates simulation state, makes commit and publishes new job state to job event stream"""
     if simulation.update_state(update_dict):
         db.session.commit()
+        publish_job_events([job_state_event(simulation)])
     else:
         logging.warning("Simulation state not updated, skipping commit")
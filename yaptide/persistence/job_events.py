@@ -0,0 +1,277 @@
+"""
+Events of simulation jobs kept in Redis streams and pushed to clients by `/jobs/stream` (Server-Sent Events).
+
+Every change of a job or task state is appended to a Redis stream of the simulation
+(`yaptide:events:<simulation id>`). Ids of stream entries are used as ids of SSE events,
+so clients reconnecting with `Last-Event-ID` header receive only the events they have missed.
+Publishing is best effort: if Redis is not configured or unavailable, events are dropped
+and clients have to poll `/jobs` instead.
+"""
+
+import json
+import logging
+import os
+import time
+import uuid
+from collections.abc import Iterator
+from typing import Optional, Union
+
+import redis
+from flask import json as flask_json
+from sqlalchemy import Row
+
+from yaptide.persistence.models import (
+    BatchSimulationModel,
+    BatchTaskModel,
+    CelerySimulationModel,
+    CeleryTaskModel,
+    split_estimated_time,
+    task_status_dict,
+)
+from yaptide.utils.enums import EntityState
+from yaptide.utils.redis_client import REDIS_SOCKET_TIMEOUT, get_redis_client, redis_key
+
+JOB_EVENTS_MAXLEN = 1000  # number of events kept per simulation, older events are trimmed
+JOB_EVENTS_TTL = 24 * 3600  # seconds, events of simulations which are not updated anymore are removed after this time
+JOB_STREAM_HEARTBEAT_INTERVAL = 15  # seconds, keeps idle connections open through proxies
+JOB_STREAM_MAX_DURATION = 30 * 60  # seconds, after this time the stream is closed and the client reconnects
+JOB_STREAM_MAX_PER_USER = 5  # number of streams which a single user may keep open at the same time
+JOB_STREAM_RETRY = 3000  # milliseconds, time after which the browser reconnects a closed stream
+FINAL_JOB_STATES = (EntityState.COMPLETED.value, EntityState.FAILED.value, EntityState.CANCELED.value)
+INITIAL_EVENT_ID = "0-0"
+
+JobEvent = tuple[int, str, dict]  # simulation id, event type and event data
+
+
+def job_events_key(sim_id: int) -> str:
+    """Returns key of Redis stream with events of the simulation"""
+    return redis_key("events", sim_id)
+
+
+def task_status_event(task: Union[BatchTaskModel, CeleryTaskModel, Row]) -> JobEvent:
+    """
+    Returns event with status of the task (model or row of the `Task` table), as returned by `/jobs`.
+    In the events tasks are identified by their number within the simulation (`task_id` sent by workers).
+    """
+    return task.simulation_id, "task", {**task_status_dict(task), "task_id": task.task_id}
+
+
+def task_progress_event(sim_id: int, task_id: int, update_dict: dict) -> JobEvent:
+    """Returns event with live progress of the running task"""
+    data = {"task_id": task_id}
+    if "simulated_primaries" in update_dict:
+        data["simulated_primaries"] = update_dict["simulated_primaries"]
+    if update_dict.get("estimated_time"):
+        data["estimated_time"] = split_estimated_time(update_dict["estimated_time"])
+    return sim_id, "task", data
+
+
+def job_state_event(simulation: Union[BatchSimulationModel, CelerySimulationModel]) -> JobEvent:
+    """Returns event with state of the job"""
+    data = {"job_state": simulation.job_state}
+    if simulation.end_time:
+        data["end_time"] = simulation.end_time
+    return simulation.id, "job", data
+
+
+def publish_job_events(events: list[JobEvent]) -> None:
+    """Appends events to streams of their simulations, events are dropped if Redis is not available"""
+    redis_client = get_redis_client()
+    if redis_client is None or not events:
+        return
+    try:
+        pipeline = redis_client.pipeline(transaction=False)
+        for sim_id, event_type, data in events:
+            key = job_events_key(sim_id)
+            fields = {"event": event_type, "data": flask_json.dumps(data)}
+            if event_type == "task":
+                # kept separately, so changed tasks can be found without parsing event data
+                fields["task_id"] = data["task_id"]
+            pipeline.xadd(
+                key,
+                fields,
+                maxlen=JOB_EVENTS_MAXLEN,
+                approximate=True,
+            )
+            pipeline.expire(key, JOB_EVENTS_TTL)
+        pipeline.execute()
+    except redis.RedisError as e:
+        logging.warning("Unable to publish %d job events: %s", len(events), e)
+
+
+def latest_job_event_id(redis_client: redis.Redis, sim_id: int) -> str:
+    """Returns id of the latest event of the simulation, events published later are newer than this id"""
+    entries = redis_client.xrevrange(job_events_key(sim_id), count=1)
+    return entries[0][0].decode() if entries else INITIAL_EVENT_ID
+
+
+def can_resume_job_events(redis_client: redis.Redis, sim_id: int, last_event_id: str) -> bool:
+    """
+    Checks if events following `last_event_id` are still available, i.e. the event was not trimmed or expired.
+    Stream without any events can be resumed from the beginning only if it could not have been trimmed yet.
+    """
+    key = job_events_key(sim_id)
+    try:
+        if last_event_id == INITIAL_EVENT_ID:
+            return redis_client.xlen(key) < JOB_EVENTS_MAXLEN
+        return bool(redis_client.xrange(key, min=last_event_id, max=last_event_id, count=1))
+    except redis.ResponseError:
+        # malformed id sent by the client
+        return False
+
+
+def read_job_events(
+    redis_client: redis.Redis, sim_id: int, last_event_id: str, block: Optional[int] = None
+) -> list[tuple[str, str, str]]:
+    """
+    Returns events newer than `last_event_id` as tuples (event id, event type, JSON data).
+    If `block` (in milliseconds) is given, waits for new events at most this long.
+    """
+    response = redis_client.xread({job_events_key(sim_id): last_event_id}, count=JOB_EVENTS_MAXLEN, block=block)
+    if not response:
+        return []
+    _, entries = response[0]
+    return [(entry_id.decode(), fields[b"event"].decode(), fields[b"data"].decode()) for entry_id, fields in entries]
+
+
+def fetch_status_version(sim_id: int) -> Optional[str]:
+    """
+    Returns status version of the simulation: id of its latest event, increasing with every task or job update.
+    Returns None if the version is not known (Redis not available or no events published yet).
+    """
+    redis_client = get_redis_client()
+    if redis_client is None:
+        return None
+    try:
+        status_version = latest_job_event_id(redis_client, sim_id)
+    except redis.RedisError as e:
+        logging.warning("Unable to read status version of simulation %d: %s", sim_id, e)
+        return None
+    return None if status_version == INITIAL_EVENT_ID else status_version
+
+
+def fetch_changed_task_ids(sim_id: int, since_version: str) -> Optional[set[int]]:
+    """
+    Returns ids of tasks (`task_id` sent by workers) updated after the provided status version.
+    Returns None if the changes cannot be determined, e.g. the version is too old and its events were trimmed.
+    """
+    redis_client = get_redis_client()
+    if redis_client is None:
+        return None
+    try:
+        if not can_resume_job_events(redis_client, sim_id, since_version):
+            return None
+        entries = redis_client.xrange(job_events_key(sim_id), min=f"({since_version}")
+    except redis.RedisError as e:
+        logging.warning("Unable to read events of simulation %d: %s", sim_id, e)
+        return None
+    return {int(fields[b"task_id"]) for _, fields in entries if b"task_id" in fields}
+
+
+def format_server_sent_event(event_type: str, data: str, event_id: Optional[str] = None) -> bytes:
+    """Returns event in `text/event-stream` format, data is a single line of JSON"""
+    lines = [f"id: {event_id}"] if event_id else []
+    lines += [f"event: {event_type}", f"data: {data}"]
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+def is_final_job_event(event_type: str, data: str) -> bool:
+    """Checks if the event reports a final state of the job, after which no more events are expected"""
+    return event_type == "job" and json.loads(data).get("job_state") in FINAL_JOB_STATES
+
+
+class JobStreamSlots:
+    """
+    Limits number of streams opened by a single user, across all Flask processes.
+    Open streams are kept in a Redis sorted set per user, scored with time of the last heartbeat,
+    so slots of streams which were not closed properly (e.g. killed process) expire on their own.
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        max_per_user: int = JOB_STREAM_MAX_PER_USER,
+        heartbeat_interval: float = JOB_STREAM_HEARTBEAT_INTERVAL,
+    ):
+        self.redis_client = redis_client
+        self.max_per_user = max_per_user
+        self.expire_after = 3 * heartbeat_interval
+
+    def acquire(self, user_id: int) -> Optional[str]:
+        """Returns id of the acquired slot or None if the user has too many open streams"""
+        key = redis_key("streams", user_id)
+        slot = uuid.uuid4().hex
+        now = time.time()
+        pipeline = self.redis_client.pipeline()
+        pipeline.zremrangebyscore(key, "-inf", now - self.expire_after)
+        pipeline.zadd(key, {slot: now})
+        pipeline.zcard(key)
+        pipeline.expire(key, int(self.expire_after) + 1)
+        _, _, open_streams, _ = pipeline.execute()
+        if open_streams > self.max_per_user:
+            self.release(user_id=user_id, slot=slot)
+            return None
+        return slot
+
+    def refresh(self, user_id: int, slot: str) -> None:
+        """Marks the stream as still open"""
+        key = redis_key("streams", user_id)
+        pipeline = self.redis_client.pipeline()
+        pipeline.zadd(key, {slot: time.time()}, xx=True)
+        pipeline.expire(key, int(self.expire_after) + 1)
+        pipeline.execute()
+
+    def release(self, user_id: int, slot: str) -> None:
+        """Frees the slot of a closed stream"""
+        self.redis_client.zrem(redis_key("streams", user_id), slot)
+
+
+def get_job_stream_slots(redis_client: redis.Redis) -> JobStreamSlots:
+    """Returns stream limiter configured with `JOB_STREAM_MAX_PER_USER` environment variable"""
+    max_per_user = int(os.environ.get("JOB_STREAM_MAX_PER_USER", JOB_STREAM_MAX_PER_USER))
+    return JobStreamSlots(redis_client=redis_client, max_per_user=max_per_user)
+
+
+def stream_job_events(  # skipcq: PYL-R0913
+    sim_id: int,
+    user_id: int,
+    slot: str,
+    last_event_id: str,
+    initial_events: list[bytes],
+    follow: bool = True,
+    heartbeat_interval: float = JOB_STREAM_HEARTBEAT_INTERVAL,
+    max_duration: float = JOB_STREAM_MAX_DURATION,
+) -> Iterator[bytes]:
+    """
+    Yields Server-Sent Events of the simulation newer than `last_event_id`, preceded by `initial_events`.
+    Waiting for events blocks only the current thread (or green thread), other requests are served meanwhile.
+    Comments are sent as heartbeats when there are no events. The stream ends after the final state of the job,
+    after `max_duration` seconds or when the client disconnects. If `follow` is False,
+    only events already published are sent. The stream slot of the user is released when the stream ends.
+    """
+    redis_client = get_redis_client(socket_timeout=heartbeat_interval + REDIS_SOCKET_TIMEOUT)
+    slots = JobStreamSlots(redis_client=redis_client, heartbeat_interval=heartbeat_interval)
+    deadline = time.monotonic() + max_duration
+    try:
+        yield f"retry: {JOB_STREAM_RETRY}\n\n".encode()
+        yield from initial_events
+        while True:
+            block = int(heartbeat_interval * 1000) if follow else None
+            events = read_job_events(redis_client, sim_id=sim_id, last_event_id=last_event_id, block=block)
+            for event_id, event_type, data in events:
+                last_event_id = event_id
+                yield format_server_sent_event(event_type=event_type, data=data, event_id=event_id)
+                if is_final_job_event(event_type=event_type, data=data):
+                    return
+            if not follow or time.monotonic() > deadline:
+                return
+            if not events:
+                yield b": heartbeat\n\n"
+            slots.refresh(user_id=user_id, slot=slot)
+    except redis.RedisError as e:
+        logging.warning("Stream of simulation %d events interrupted: %s", sim_id, e)
+    finally:
+        try:
+            slots.release(user_id=user_id, slot=slot)
+        except redis.RedisError as e:
+            logging.warning("Unable to release stream slot of user %d: %s", user_id, e)
@@ -0,0 +1,154 @@
+"""
+Live progress of running tasks kept in Redis.
+
+Progress updates (`simulated_primaries`, `estimated_time`) are sent by workers every few seconds,
+but they matter only while the job runs. Instead of writing each of them to the database,
+they are kept in a Redis hash per simulation (`yaptide:progress:<simulation id>`) and read from there
+by status endpoints. The database receives state transitions (together with the latest progress of the task)
+and periodic snapshots, written at most once per flush interval per simulation.
+If Redis is not configured, progress is written through to the database as before.
+"""
+
+import logging
+import os
+import time
+from functools import lru_cache
+from typing import Optional
+
+import redis
+
+from yaptide.persistence.db_methods import update_tasks_states
+from yaptide.persistence.job_events import publish_job_events, task_progress_event
+from yaptide.utils.redis_client import get_redis_client, redis_key
+
+PROGRESS_KEYS = ("simulated_primaries", "estimated_time")
+LIVE_PROGRESS_FLUSH_INTERVAL = 60  # seconds, default interval between snapshots of live progress saved in database
+LIVE_PROGRESS_TTL = 24 * 3600  # seconds, live progress of abandoned simulations is removed after this time
+_FLUSHED_AT_FIELD = "_flushed_at"
+
+
+def is_progress_update(update_dict: dict) -> bool:
+    """Checks if update contains only progress of the task, without any state transition"""
+    return bool(update_dict) and set(update_dict) <= set(PROGRESS_KEYS)
+
+
+class LiveProgressStore:
+    """Keeps progress of running tasks in Redis hashes, one hash per simulation, fields `<task id>:<key>`"""
+
+    def __init__(self, redis_client: redis.Redis, flush_interval: float = LIVE_PROGRESS_FLUSH_INTERVAL):
+        self.redis_client = redis_client
+        self.flush_interval = flush_interval
+
+    def record(self, sim_id: int, task_id: int, update_dict: dict) -> None:
+        """Stores progress of the task, simulation seen for the first time is marked as just written to the database"""
+        key = redis_key("progress", sim_id)
+        pipeline = self.redis_client.pipeline()
+        pipeline.hset(key, mapping={f"{task_id}:{name}": int(value) for name, value in update_dict.items()})
+        pipeline.hsetnx(key, _FLUSHED_AT_FIELD, time.time())
+        pipeline.expire(key, LIVE_PROGRESS_TTL)
+        pipeline.execute()
+
+    def get(self, sim_id: int) -> dict[int, dict]:
+        """Returns live progress of all tasks of the simulation, keyed by task id"""
+        progress: dict[int, dict] = {}
+        for field, value in self.redis_client.hgetall(redis_key("progress", sim_id)).items():
+            task_id, _, name = field.decode().partition(":")
+            if name:
+                progress.setdefault(int(task_id), {})[name] = int(value)
+        return progress
+
+    def pop(self, sim_id: int, task_id: int) -> dict:
+        """Returns live progress of the task and removes it from the store"""
+        key = redis_key("progress", sim_id)
+        fields = [f"{task_id}:{name}" for name in PROGRESS_KEYS]
+        pipeline = self.redis_client.pipeline()
+        pipeline.hmget(key, fields)
+        pipeline.hdel(key, *fields)
+        values, _ = pipeline.execute()
+        return {name: int(value) for name, value in zip(PROGRESS_KEYS, values) if value is not None}
+
+    def acquire_flush(self, sim_id: int) -> bool:
+        """
+        Checks if live progress of the simulation should be saved in the database.
+        Returns True for at most one caller (across all Flask processes) per flush interval.
+        """
+        key = redis_key("progress", sim_id)
+        flushed_at = self.redis_client.hget(key, _FLUSHED_AT_FIELD)
+        if flushed_at is not None and time.time() - float(flushed_at) < self.flush_interval:
+            return False
+        lock_timeout = max(1, int(self.flush_interval))
+        if not self.redis_client.set(redis_key("progress", sim_id, "flush"), 1, nx=True, ex=lock_timeout):
+            return False
+        self.redis_client.hset(key, _FLUSHED_AT_FIELD, time.time())
+        return True
+
+
+@lru_cache(maxsize=1)
+def get_live_progress_store() -> Optional[LiveProgressStore]:
+    """
+    Returns live progress store or None if Redis is not configured.
+    Flush interval is configured with `LIVE_PROGRESS_FLUSH_INTERVAL` environment variable.
+    """
+    redis_client = get_redis_client()
+    if redis_client is None:
+        return None
+    flush_interval = float(os.environ.get("LIVE_PROGRESS_FLUSH_INTERVAL", LIVE_PROGRESS_FLUSH_INTERVAL))
+    return LiveProgressStore(redis_client=redis_client, flush_interval=flush_interval)
+
+
+def record_live_progress(sim_id: int, task_id: int, update_dict: dict) -> bool:
+    """
+    Stores progress update in the live progress store.
+    Returns False if the update has to be written to the database instead
+    (it is not a progress update, Redis is not configured or unavailable).
+    """
+    store = get_live_progress_store()
+    if store is None or not is_progress_update(update_dict):
+        return False
+    try:
+        store.record(sim_id=sim_id, task_id=task_id, update_dict=update_dict)
+        publish_job_events([task_progress_event(sim_id=sim_id, task_id=task_id, update_dict=update_dict)])
+        if store.acquire_flush(sim_id=sim_id):
+            flush_live_progress(sim_id=sim_id)
+    except redis.RedisError as e:
+        logging.warning("Unable to store live progress of simulation %d: %s", sim_id, e)
+        return False
+    return True
+
+
+def merge_live_progress(sim_id: int, task_id: int, update_dict: dict) -> dict:
+    """
+    Returns state transition update extended with the latest live progress of the task.
+    Live progress of the task is removed from the store, as from now on the database is up to date.
+    """
+    store = get_live_progress_store()
+    if store is None:
+        return update_dict
+    try:
+        live_progress = store.pop(sim_id=sim_id, task_id=task_id)
+    except redis.RedisError as e:
+        logging.warning("Unable to read live progress of simulation %d: %s", sim_id, e)
+        return update_dict
+    return {**live_progress, **update_dict}
+
+
+def fetch_live_progress(sim_id: int) -> dict[int, dict]:
+    """Returns live progress of tasks of the simulation, keyed by task id, empty if it is not available"""
+    store = get_live_progress_store()
+    if store is None:
+        return {}
+    try:
+        return store.get(sim_id=sim_id)
+    except redis.RedisError as e:
+        logging.warning("Unable to read live progress of simulation %d: %s", sim_id, e)
+        return {}
+
+
+def flush_live_progress(sim_id: int) -> None:
+    """Saves snapshot of live progress of the simulation tasks in the database"""
+    live_progress = fetch_live_progress(sim_id=sim_id)
+    if not live_progress:
+        return
+    updates = [(sim_id, task_id, progress) for task_id, progress in live_progress.items()]
+    logging.debug("Saving live progress of %d tasks of simulation %d", len(updates), sim_id)
+    update_tasks_states(updates=updates)
@@ -4,9 +4,10 @@
 import gzip
 import json
 from datetime import datetime
+from typing import Optional
 
-from sqlalchemy import Column, UniqueConstraint
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, UniqueConstraint, case, func, null
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql.functions import now
 from werkzeug.security import check_password_hash, generate_password_hash
 
@@ -69,6 +70,16 @@ class ClusterModel(db.Model):
     simulations = relationship("BatchSimulationModel")
 
 
+# columns of SimulationModel counting tasks in each state
+TASK_STATE_COUNTER_COLUMNS = {
+    EntityState.PENDING.value: "pending_tasks",
+    EntityState.RUNNING.value: "running_tasks",
+    EntityState.COMPLETED.value: "completed_tasks",
+    EntityState.FAILED.value: "failed_tasks",
+    EntityState.CANCELED.value: "canceled_tasks",
+}
+
+
 class SimulationModel(db.Model):
     """Simulation model"""
 
@@ -97,6 +108,32 @@ class SimulationModel(db.Model):
         default=EntityState.UNKNOWN.value,
         doc="Simulation state (i.e. 'pending', 'running', 'completed', 'failed')",
     )
+    # aggregated state of simulation tasks, updated together with the tasks (see db_methods.update_tasks_states)
+    # so lists of simulations can show progress without loading tasks
+    pending_tasks: Column[int] = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0", doc="Number of pending tasks"
+    )
+    running_tasks: Column[int] = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0", doc="Number of running tasks"
+    )
+    completed_tasks: Column[int] = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0", doc="Number of completed tasks"
+    )
+    failed_tasks: Column[int] = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0", doc="Number of failed tasks"
+    )
+    canceled_tasks: Column[int] = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0", doc="Number of canceled tasks"
+    )
+    requested_primaries: Column[int] = db.Column(
+        db.BigInteger, nullable=False, default=0, server_default="0", doc="Requested primaries of all tasks"
+    )
+    simulated_primaries: Column[int] = db.Column(
+        db.BigInteger, nullable=False, default=0, server_default="0", doc="Simulated primaries of all tasks"
+    )
+    tasks_update_time: Column[datetime] = db.Column(
+        db.DateTime(timezone=True), nullable=True, doc="Time of the last update of any task"
+    )
 
     tasks = relationship("TaskModel", cascade="delete")
     estimators = relationship("EstimatorModel", cascade="delete")
@@ -105,6 +142,19 @@ class SimulationModel(db.Model):
 
     __mapper_args__ = {"polymorphic_identity": "Simulation", "polymorphic_on": platform, "with_polymorphic": "*"}
 
+    def get_tasks_progress_dict(self) -> dict:
+        """Returns aggregated state of the simulation tasks as a dictionary"""
+        return {
+            "tasks_states": {
+                task_state: getattr(self, column)
+                for task_state, column in TASK_STATE_COUNTER_COLUMNS.items()
+                if getattr(self, column)
+            },
+            "requested_primaries": self.requested_primaries,
+            "simulated_primaries": self.simulated_primaries,
+            "tasks_update_time": self.tasks_update_time,
+        }
+
     def update_state(self, update_dict: dict) -> bool:
         """
         Updating database is more costly than a simple query.
@@ -165,17 +215,13 @@ class BatchSimulationModel(SimulationModel):
         return db_commit_required
 
 
-def allowed_state_change(current_state: str, next_state: str):
-    """Ensures that no such change like Completed -> Canceled happens"""
-    return not (
-        current_state in [EntityState.FAILED.value, EntityState.COMPLETED.value]
-        and next_state in [EntityState.CANCELED]
-    )
-
-
-def value_changed(current_value: str, new_value: str):
-    """checks if value from update_dict differs from object in database"""
-    return new_value and current_value != new_value
+def split_estimated_time(estimated_time: int) -> dict:
+    """Converts estimated time in seconds to dictionary with hours, minutes and seconds"""
+    return {
+        "hours": estimated_time // 3600,
+        "minutes": (estimated_time // 60) % 60,
+        "seconds": estimated_time % 60,
+    }
 
 
 class TaskModel(db.Model):
@@ -212,61 +258,85 @@ class TaskModel(db.Model):
 
     __mapper_args__ = {"polymorphic_identity": "Task", "polymorphic_on": platform, "with_polymorphic": "*"}
 
-    def update_state(self, update_dict: dict):  # skipcq: PY-R1000
+    @staticmethod
+    def update_state_values(update_dict: dict) -> dict:
         """
-        Updating database is more costly than a simple query.
-        Therefore we check first if update is needed and
-        perform it only for such fields which exists and which have updated values.
+        Returns values for SQL `UPDATE` of the `Task` table, which apply the update rules:
+        - simulated primaries never decrease, so a delayed update does not move progress back,
+        - completed task reports all requested primaries as simulated,
+        - `start_time` and `end_time` can be set only once,
+        - `estimated_time` is meaningless when `end_time` is set, so it is removed then.
+        Rules are expressed with SQL `CASE` and `COALESCE` on current values of the row,
+        so the update does not need to read the row first. The statement has to exclude finished tasks,
+        which are never changed, in its `WHERE` clause (see db_methods.update_task_row).
+        `celery_id` is kept in another table and is not included.
         """
-        if self.task_state in (EntityState.COMPLETED.value, EntityState.FAILED.value, EntityState.CANCELED.value):
-            return
-        if value_changed(self.requested_primaries, update_dict.get("requested_primaries")):
-            self.requested_primaries = update_dict["requested_primaries"]
-        if value_changed(self.simulated_primaries, update_dict.get("simulated_primaries")):
-            self.simulated_primaries = update_dict["simulated_primaries"]
-        if value_changed(self.task_state, update_dict.get("task_state")) and allowed_state_change(
-            self.task_state, update_dict["task_state"]
-        ):
-            self.task_state = update_dict["task_state"]
-            if self.task_state == EntityState.COMPLETED.value:
-                self.simulated_primaries = self.requested_primaries
-        # Here we have a special case, `estimated_time` cannot be set when `end_time` is set - it is meaningless
-        have_estim_time = "estimated_time" in update_dict and self.estimated_time != update_dict["estimated_time"]
-        end_time_not_set = self.end_time is None
-        if have_estim_time and end_time_not_set:
-            self.estimated_time = update_dict["estimated_time"]
-        if "start_time" in update_dict and self.start_time is None:
-            # a convertion from string to datetime is needed, as in the POST payload start_time comes in string format
-            self.start_time = datetime.strptime(update_dict["start_time"], "%Y-%m-%d %H:%M:%S.%f")
-        # Here we have a special case, `end_time` can be set only once
-        # therefore we update it only if it not set previously (`self.end_time is None`)
-        # and if update was requested (`"end_time" in update_dict`)
-        if "end_time" in update_dict and self.end_time is None:
-            # a convertion from string to datetime is needed, as in the POST payload end_time comes in string format
-            self.end_time = datetime.strptime(update_dict["end_time"], "%Y-%m-%d %H:%M:%S.%f")
-            self.estimated_time = None
-        self.last_update_time = now()
-
-    def get_status_dict(self) -> dict:
-        """Returns task information as a dictionary"""
-        result = {
-            "task_state": self.task_state,
-            "requested_primaries": self.requested_primaries,
-            "simulated_primaries": self.simulated_primaries,
-            "last_update_time": self.last_update_time,
-            "task_id": self.id,
-        }
-        if self.estimated_time:
-            result["estimated_time"] = {
-                "hours": self.estimated_time // 3600,
-                "minutes": (self.estimated_time // 60) % 60,
-                "seconds": self.estimated_time % 60,
-            }
-        if self.start_time:
-            result["start_time"] = self.start_time
-        if self.end_time:
-            result["end_time"] = self.end_time
-        return result
+        task = TaskModel.__table__.c
+        values = {"last_update_time": now()}
+        requested_primaries = task.requested_primaries
+        if update_dict.get("requested_primaries"):
+            requested_primaries = values["requested_primaries"] = update_dict["requested_primaries"]
+        if update_dict.get("simulated_primaries"):
+            values["simulated_primaries"] = case(
+                (task.simulated_primaries < update_dict["simulated_primaries"], update_dict["simulated_primaries"]),
+                else_=task.simulated_primaries,
+            )
+        if update_dict.get("task_state"):
+            values["task_state"] = update_dict["task_state"]
+            if update_dict["task_state"] == EntityState.COMPLETED.value:
+                values["simulated_primaries"] = requested_primaries
+        if "start_time" in update_dict:
+            start_time = datetime.strptime(update_dict["start_time"], "%Y-%m-%d %H:%M:%S.%f")
+            values["start_time"] = func.coalesce(task.start_time, start_time)
+        # `end_time` can be set only once, estimated time is removed when it is set
+        if "end_time" in update_dict:
+            end_time = datetime.strptime(update_dict["end_time"], "%Y-%m-%d %H:%M:%S.%f")
+            values["end_time"] = func.coalesce(task.end_time, end_time)
+            values["estimated_time"] = case((task.end_time.is_(None), null()), else_=task.estimated_time)
+        elif "estimated_time" in update_dict:
+            values["estimated_time"] = case(
+                (task.end_time.is_(None), update_dict["estimated_time"]), else_=task.estimated_time
+            )
+        return values
+
+    def get_status_dict(self, live_progress: Optional[dict] = None) -> dict:
+        """
+        Returns task information as a dictionary.
+        Progress stored in the database may be overridden with more recent live progress of the running task
+        (see yaptide/persistence/live_progress.py), the task object itself is not modified.
+        """
+        return task_status_dict(task=self, live_progress=live_progress)
+
+
+def task_status_dict(task, live_progress: Optional[dict] = None) -> dict:
+    """
+    Returns task information as a dictionary, see `TaskModel.get_status_dict`.
+    Works also for rows of the `Task` table returned by SQL statements, without loading the model.
+    """
+    simulated_primaries = task.simulated_primaries
+    estimated_time = task.estimated_time
+    if live_progress and task.task_state not in (
+        EntityState.COMPLETED.value,
+        EntityState.FAILED.value,
+        EntityState.CANCELED.value,
+    ):
+        simulated_primaries = live_progress.get("simulated_primaries", simulated_primaries)
+        if task.end_time is None:
+            estimated_time = live_progress.get("estimated_time", estimated_time)
+    result = {
+        "task_state": task.task_state,
+        "requested_primaries": task.requested_primaries,
+        "simulated_primaries": simulated_primaries,
+        "last_update_time": task.last_update_time,
+        "task_id": task.id,
+    }
+    if estimated_time:
+        result["estimated_time"] = split_estimated_time(estimated_time)
+    if task.start_time:
+        result["start_time"] = task.start_time
+    if task.end_time:
+        result["end_time"] = task.end_time
+    return result
 
 
 class CeleryTaskModel(TaskModel):
@@ -276,12 +346,6 @@ class CeleryTaskModel(TaskModel):
     id: Column[int] = db.Column(db.Integer, db.ForeignKey("Task.id", ondelete="CASCADE"), primary_key=True)
     celery_id: Column[str] = db.Column(db.String, nullable=False, default="", doc="Celery task ID")
 
-    def update_state(self, update_dict: dict):
-        """Update method for CeleryTaskModel"""
-        if "celery_id" in update_dict and self.celery_id != update_dict["celery_id"]:
-            self.celery_id = update_dict["celery_id"]
-        return super().update_state(update_dict)
-
     __mapper_args__ = {"polymorphic_identity": PlatformType.DIRECT.value, "polymorphic_load": "inline"}
 
 
@@ -323,7 +387,9 @@ class InputModel(db.Model):
     __tablename__ = "Input"
     id: Column[int] = db.Column(db.Integer, primary_key=True)
     simulation_id: Column[int] = db.Column(db.Integer, db.ForeignKey("Simulation.id", ondelete="CASCADE"))
-    compressed_data: Column[bytes] = db.Column(db.LargeBinary)
+    # compressed blobs (here and in the models below) are deferred, they are fetched from the database
+    # only when accessed or when the query explicitly asks for them (see `with_data` in db_methods)
+    compressed_data = deferred(db.Column(db.LargeBinary))
 
     @property
     def data(self):
@@ -347,8 +413,8 @@ class EstimatorModel(db.Model):
     file_name: Column[str] = db.Column(
         db.String, nullable=False, doc="Estimator name extracted from file generated by simulator"
     )
-    compressed_data: Column[bytes] = db.Column(db.LargeBinary, doc="Estimator metadata")
-    pages = relationship("PageModel", cascade="delete")
+    compressed_data = deferred(db.Column(db.LargeBinary, doc="Estimator metadata"))
+    pages = relationship("PageModel", cascade="delete", order_by="PageModel.page_number")
 
     @property
     def data(self):
@@ -368,7 +434,7 @@ class PageModel(db.Model):
     page_name: Column[str] = db.Column(db.String, nullable=False, doc="Page name")
     estimator_id: Column[int] = db.Column(db.Integer, db.ForeignKey("Estimator.id", ondelete="CASCADE"), nullable=False)
     page_number: Column[int] = db.Column(db.Integer, nullable=False, doc="Page number")
-    compressed_data: Column[bytes] = db.Column(db.LargeBinary, doc="Page json object - data, axes and metadata")
+    compressed_data = deferred(db.Column(db.LargeBinary, doc="Page json object - data, axes and metadata"))
     page_dimension: Column[int] = db.Column(db.Integer, nullable=False, doc="Dimension of data")
 
     @property
@@ -389,7 +455,7 @@ class LogfilesModel(db.Model):
     simulation_id: Column[int] = db.Column(
         db.Integer, db.ForeignKey("Simulation.id", ondelete="CASCADE"), nullable=False
     )
-    compressed_data: Column[bytes] = db.Column(db.LargeBinary, doc="Json object containing logfiles")
+    compressed_data = deferred(db.Column(db.LargeBinary, doc="Json object containing logfiles"))
 
     @property
     def data(self):
@@ -0,0 +1,160 @@
+"""
+Throughput of running tasks and job-level ETA.
+
+Each progress update with `simulated_primaries` is a sample of the task progress. Samples are turned into
+an exponentially weighted rate of the task (primaries per second), weighted by the time between samples,
+so both frequent and rare updates give a similar estimate. Rates are kept in a Redis hash per simulation
+(`yaptide:throughput:<simulation id>`, fields `<task id>`), shared by all Flask processes,
+or in process memory if Redis is not configured.
+Rates of running tasks are combined into ETA of the whole job, which also accounts for tasks still pending.
+"""
+
+import heapq
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+import redis
+
+from yaptide.utils.redis_client import get_redis_client, redis_key
+
+THROUGHPUT_TIME_CONSTANT = 60  # seconds, samples older than that have weight lower than 1/e in the rate
+THROUGHPUT_TTL = 24 * 3600  # seconds, rates of abandoned simulations are removed after this time
+THROUGHPUT_LOCAL_SIMULATIONS = 1024  # maximal number of simulations kept in process memory without Redis
+
+
+@dataclass
+class TaskThroughput:
+    """Last progress sample of the task and its exponentially weighted rate (None until the second sample)"""
+
+    simulated_primaries: int
+    sampled_at: float
+    rate: Optional[float] = None
+
+    def updated(self, simulated_primaries: int, sampled_at: float, time_constant: float) -> "TaskThroughput":
+        """Returns throughput updated with a new sample, delayed samples are ignored"""
+        elapsed = sampled_at - self.sampled_at
+        if elapsed <= 0 or simulated_primaries < self.simulated_primaries:
+            return self
+        current_rate = (simulated_primaries - self.simulated_primaries) / elapsed
+        if self.rate is None:
+            return TaskThroughput(simulated_primaries, sampled_at, current_rate)
+        weight = 1 - math.exp(-elapsed / time_constant)
+        return TaskThroughput(simulated_primaries, sampled_at, self.rate + weight * (current_rate - self.rate))
+
+    def serialize(self) -> str:
+        """Returns throughput as a string stored in Redis"""
+        return f"{self.simulated_primaries}:{self.sampled_at}:{'' if self.rate is None else self.rate}"
+
+    @staticmethod
+    def deserialize(value: bytes) -> "TaskThroughput":
+        """Returns throughput read from Redis"""
+        simulated_primaries, sampled_at, rate = value.decode().split(":")
+        return TaskThroughput(int(simulated_primaries), float(sampled_at), float(rate) if rate else None)
+
+
+class ThroughputStore:
+    """Keeps throughput of tasks, in Redis hashes (one per simulation) or in process memory if Redis is None"""
+
+    def __init__(self, redis_client: Optional[redis.Redis] = None, time_constant: float = THROUGHPUT_TIME_CONSTANT):
+        self.redis_client = redis_client
+        self.time_constant = time_constant
+        self._local: OrderedDict[int, dict[int, TaskThroughput]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, sim_id: int, task_id: int, simulated_primaries: int, sampled_at: Optional[float] = None) -> None:
+        """Updates throughput of the task with progress reported at `sampled_at` (now by default)"""
+        sampled_at = time.time() if sampled_at is None else sampled_at
+        if self.redis_client is None:
+            with self._lock:
+                tasks = self._local.setdefault(sim_id, {})
+                self._local.move_to_end(sim_id)
+                tasks[task_id] = self._updated(tasks.get(task_id), simulated_primaries, sampled_at)
+                while len(self._local) > THROUGHPUT_LOCAL_SIMULATIONS:
+                    self._local.popitem(last=False)
+            return
+        # updates of a single task are sent one after another by its monitor, so read and write do not race
+        key = redis_key("throughput", sim_id)
+        value = self.redis_client.hget(key, task_id)
+        throughput = self._updated(
+            TaskThroughput.deserialize(value) if value else None, simulated_primaries, sampled_at
+        )
+        pipeline = self.redis_client.pipeline()
+        pipeline.hset(key, task_id, throughput.serialize())
+        pipeline.expire(key, THROUGHPUT_TTL)
+        pipeline.execute()
+
+    def get(self, sim_id: int) -> dict[int, TaskThroughput]:
+        """Returns throughput of tasks of the simulation, keyed by task id"""
+        if self.redis_client is None:
+            with self._lock:
+                return dict(self._local.get(sim_id, {}))
+        return {
+            int(task_id): TaskThroughput.deserialize(value)
+            for task_id, value in self.redis_client.hgetall(redis_key("throughput", sim_id)).items()
+        }
+
+    def _updated(
+        self, throughput: Optional[TaskThroughput], simulated_primaries: int, sampled_at: float
+    ) -> TaskThroughput:
+        """Returns throughput updated with a new sample, the first sample starts the throughput"""
+        if throughput is None:
+            return TaskThroughput(simulated_primaries, sampled_at)
+        return throughput.updated(simulated_primaries, sampled_at, self.time_constant)
+
+
+@lru_cache(maxsize=1)
+def get_throughput_store() -> ThroughputStore:
+    """
+    Returns throughput store, kept in Redis if it is configured.
+    Time constant of the rate is configured with `THROUGHPUT_TIME_CONSTANT` environment variable.
+    """
+    time_constant = float(os.environ.get("THROUGHPUT_TIME_CONSTANT", THROUGHPUT_TIME_CONSTANT))
+    return ThroughputStore(redis_client=get_redis_client(), time_constant=time_constant)
+
+
+def record_throughput(sim_id: int, task_id: int, update_dict: dict) -> None:
+    """Updates throughput of the task if the update reports its progress"""
+    if not update_dict.get("simulated_primaries"):
+        return
+    try:
+        get_throughput_store().record(
+            sim_id=sim_id, task_id=task_id, simulated_primaries=int(update_dict["simulated_primaries"])
+        )
+    except redis.RedisError as e:
+        logging.warning("Unable to store throughput of simulation %d: %s", sim_id, e)
+
+
+def fetch_throughput(sim_id: int) -> dict[int, TaskThroughput]:
+    """Returns throughput of tasks of the simulation, keyed by task id, empty if it is not available"""
+    try:
+        return get_throughput_store().get(sim_id=sim_id)
+    except redis.RedisError as e:
+        logging.warning("Unable to read throughput of simulation %d: %s", sim_id, e)
+        return {}
+
+
+def estimate_job_time(running_tasks: list[tuple[int, Optional[float]]], pending_tasks: list[int]) -> Optional[float]:
+    """
+    Estimates time (in seconds) needed to finish the job.
+    `running_tasks` are tuples (remaining primaries, rate), rate is None if it is not known yet,
+    `pending_tasks` are requested primaries of tasks waiting for a worker.
+    Tasks without known rate and pending tasks are assumed to run with the mean rate of running tasks.
+    Pending tasks start when a running task finishes, so the job runs with the concurrency observed now.
+    Returns None if no rate is known.
+    """
+    rates = [rate for _, rate in running_tasks if rate]
+    if not rates:
+        return None
+    mean_rate = sum(rates) / len(rates)
+    finish_times = [remaining / (rate or mean_rate) for remaining, rate in running_tasks]
+    heapq.heapify(finish_times)
+    for requested_primaries in sorted(pending_tasks, reverse=True):
+        heapq.heappush(finish_times, heapq.heappop(finish_times) + requested_primaries / mean_rate)
+    return max(finish_times)
@@ -13,6 +13,7 @@ from yaptide.routes.utils.response_templates import (  # skipcq: FLK-E101
     yaptide_response,
 )
 from yaptide.routes.utils.tokens import encode_auth_token
+from yaptide.routes.utils.user_cache import invalidate_cached_user_by_token
 
 
 class AuthRegister(Resource):
@@ -124,6 +125,7 @@ class AuthLogOut(Resource):
     @staticmethod
     def delete():
         """Method logging the user out"""
+        invalidate_cached_user_by_token(request.cookies.get("access_token"))
         resp = yaptide_response(message="User logged out", code=200)
         resp.delete_cookie("access_token")
         resp.delete_cookie("refresh_token")
@@ -3,18 +3,17 @@ from datetime import datetime
 
 from flask import request
 from flask_restful import Resource
-from marshmallow import Schema, fields
+from marshmallow import Schema, fields, validate
 
 from yaptide.batch.batch_methods import delete_job, get_job_status, submit_job
 from yaptide.persistence.db_methods import (
     add_object_to_db,
     fetch_all_clusters,
-    fetch_batch_simulation_by_job_id,
     fetch_batch_tasks_by_sim_id,
     fetch_cluster_by_id,
     make_commit_to_db,
     update_simulation_state,
-    update_task_state,
+    update_tasks_states,
 )
 from yaptide.persistence.models import (  # skipcq: FLK-E101
     BatchSimulationModel,
@@ -27,7 +26,9 @@ from yaptide.routes.utils.tokens import encode_simulation_auth_token
 from yaptide.routes.utils.decorators import requires_auth
 from yaptide.routes.utils.response_templates import error_validation_response, error_internal_response, yaptide_response
 from yaptide.routes.utils.utils import (
-    check_if_job_is_owned_and_exist,
+    MAX_TASKS_PAGE_SIZE,
+    fetch_owned_simulation,
+    get_job_tasks_info,
     determine_input_type,
     make_input_dict,
     get_clamped_ntasks_value,
@@ -106,6 +107,8 @@ class JobsBatch(Resource):
                 requested_primaries=requested_primaries,
             )
             add_object_to_db(task, False)
+        simulation.pending_tasks = payload_dict["ntasks"]
+        simulation.requested_primaries = requested_primaries * payload_dict["ntasks"]
 
         input_model = InputModel(simulation_id=simulation.id)
         input_model.data = input_dict
@@ -119,11 +122,18 @@ class JobsBatch(Resource):
         """Class specifies API parameters"""
 
         job_id = fields.String()
+        summary = fields.Boolean(load_default=False)
+        limit = fields.Integer(load_default=None, validate=validate.Range(min=1, max=MAX_TASKS_PAGE_SIZE))
+        after_task_id = fields.Integer(load_default=None)
 
     @staticmethod
     @requires_auth()
     def get(user: KeycloakUserModel):
-        """Method geting job's result"""
+        """
+        Method geting job's result.
+        With `summary` parameter aggregated state of tasks is returned instead of their statuses,
+        with `limit` (and `after_task_id`) statuses of tasks are returned page by page.
+        """
         if not isinstance(user, KeycloakUserModel):
             return yaptide_response(message="User is not allowed to use this endpoint", code=403)
 
@@ -135,23 +145,24 @@ class JobsBatch(Resource):
 
         job_id: str = params_dict["job_id"]
 
-        is_owned, error_message, res_code = check_if_job_is_owned_and_exist(job_id=job_id, user=user)
-        if not is_owned:
+        simulation, error_message, res_code = fetch_owned_simulation(
+            job_id=job_id, user=user, platform=PlatformType.BATCH
+        )
+        if simulation is None:
             return yaptide_response(message=error_message, code=res_code)
-        simulation = fetch_batch_simulation_by_job_id(job_id=job_id)
-
-        tasks = fetch_batch_tasks_by_sim_id(sim_id=simulation.id)
 
-        job_tasks_status = [task.get_status_dict() for task in tasks]
+        tasks_info, _ = get_job_tasks_info(
+            simulation=simulation,
+            summary=params_dict["summary"],
+            after_task_id=params_dict["after_task_id"],
+            limit=params_dict["limit"],
+        )
 
         if simulation.job_state in (EntityState.COMPLETED.value, EntityState.FAILED.value):
             return yaptide_response(
                 message=f"Job state: {simulation.job_state}",
                 code=200,
-                content={
-                    "job_state": simulation.job_state,
-                    "job_tasks_status": job_tasks_status,
-                },
+                content={"job_state": simulation.job_state, **tasks_info},
             )
 
         cluster = fetch_cluster_by_id(cluster_id=simulation.cluster_id)
@@ -160,7 +171,7 @@ class JobsBatch(Resource):
         update_simulation_state(simulation=simulation, update_dict=job_info)
 
         job_info.pop("end_time", None)
-        job_info["job_tasks_status"] = job_tasks_status
+        job_info.update(tasks_info)
 
         return yaptide_response(message="", code=200, content=job_info)
 
@@ -179,12 +190,12 @@ class JobsBatch(Resource):
 
         job_id: str = params_dict["job_id"]
 
-        is_owned, error_message, res_code = check_if_job_is_owned_and_exist(job_id=job_id, user=user)
-        if not is_owned:
+        simulation, error_message, res_code = fetch_owned_simulation(
+            job_id=job_id, user=user, platform=PlatformType.BATCH
+        )
+        if simulation is None:
             return yaptide_response(message=error_message, code=res_code)
 
-        simulation = fetch_batch_simulation_by_job_id(job_id=job_id)
-
         if simulation.job_state in (
             EntityState.COMPLETED.value,
             EntityState.FAILED.value,
@@ -209,8 +220,9 @@ class JobsBatch(Resource):
 
         tasks = fetch_batch_tasks_by_sim_id(sim_id=simulation.id)
 
-        for task in tasks:
-            update_task_state(task=task, update_dict={"task_state": EntityState.CANCELED.value})
+        update_tasks_states(
+            updates=[(simulation.id, task.task_id, {"task_state": EntityState.CANCELED.value}) for task in tasks]
+        )
 
         return yaptide_response(message="", code=status_code, content=result)
 
@@ -1,23 +1,20 @@
 import logging
-from collections import Counter
 from datetime import datetime
 
 from flask import request
 from flask_restful import Resource
-from marshmallow import Schema, fields
+from marshmallow import Schema, fields, validate
 from uuid import uuid4
 
 from yaptide.celery.simulation_worker import celery_app
 from yaptide.celery.utils.manage_tasks import get_job_results, run_job
 from yaptide.persistence.db_methods import (
     add_object_to_db,
-    fetch_celery_simulation_by_job_id,
     fetch_celery_tasks_by_sim_id,
     fetch_estimators_by_sim_id,
-    fetch_pages_by_estimator_id,
     make_commit_to_db,
     update_simulation_state,
-    update_task_state,
+    update_tasks_states,
 )
 from yaptide.persistence.models import (
     CelerySimulationModel,
@@ -28,15 +25,26 @@ from yaptide.persistence.models import (
     UserModel,
 )
 from yaptide.routes.utils.decorators import requires_auth
-from yaptide.routes.utils.response_templates import error_validation_response, yaptide_response
+from yaptide.routes.utils.response_templates import (
+    error_validation_response,
+    not_modified_response,
+    yaptide_response,
+)
 from yaptide.routes.utils.utils import (
-    check_if_job_is_owned_and_exist,
+    fetch_owned_simulation,
+    get_job_status_version,
+    MAX_TASKS_PAGE_SIZE,
+    get_job_tasks_info,
+    job_status_etag,
+    make_job_status_conditional,
     determine_input_type,
     make_input_dict,
+    get_clamped_cycles_value,
+    get_cycles_error,
     get_clamped_ntasks_value,
 )
 from yaptide.routes.utils.tokens import encode_simulation_auth_token
-from yaptide.utils.enums import EntityState, PlatformType
+from yaptide.utils.enums import EntityState, PlatformType, SimulationType
 from yaptide.utils.helper_tasks import terminate_unfinished_tasks
 
 
@@ -46,7 +54,12 @@ class JobsDirect(Resource):
     @staticmethod
     @requires_auth()
     def post(user: UserModel):
-        """Submit simulation job to celery"""
+        """
+        Submit simulation job to celery.
+        Tasks of FLUKA simulations may be split into many cycles with optional `cycles` parameter,
+        so results of finished cycles are kept if later cycles fail.
+        Primaries of each task have to be divisible by the number of cycles.
+        """
         payload_dict: dict = request.get_json(force=True)
         if not payload_dict:
             return yaptide_response(message="No JSON in body", code=400)
@@ -64,6 +77,14 @@ class JobsDirect(Resource):
 
         # ensure the ntasks value is in allowed range
         payload_dict["ntasks"] = get_clamped_ntasks_value(payload_dict=payload_dict, ntasks=payload_dict["ntasks"])
+        input_dict = make_input_dict(payload_dict=payload_dict, input_type=input_type)
+        requested_primaries = input_dict["number_of_all_primaries"] // payload_dict["ntasks"]
+        cycles = 1
+        if payload_dict["sim_type"] == SimulationType.FLUKA.value:
+            cycles = get_clamped_cycles_value(cycles=int(payload_dict.get("cycles", 1)))
+            error_message = get_cycles_error(cycles=cycles, task_primaries=requested_primaries)
+            if error_message:
+                return yaptide_response(message=error_message, code=400)
 
         # create a new simulation in the database, not waiting for the job to finish
         job_id = datetime.now().strftime("%Y%m%d-%H%M%S-") + str(uuid4()) + PlatformType.DIRECT.value
@@ -79,15 +100,15 @@ class JobsDirect(Resource):
         logging.info("Simulation %d created and inserted into DB", simulation.id)
         logging.debug("Update key set to %s", update_key)
 
-        input_dict = make_input_dict(payload_dict=payload_dict, input_type=input_type)
         # create tasks in the database in the default PENDING state
         celery_ids = [str(uuid4()) for _ in range(payload_dict["ntasks"])]
-        requested_primaries = input_dict["number_of_all_primaries"] // payload_dict["ntasks"]
         for i in range(payload_dict["ntasks"]):
             task = CeleryTaskModel(
                 simulation_id=simulation.id, task_id=i, celery_id=celery_ids[i], requested_primaries=requested_primaries
             )
             add_object_to_db(task, make_commit=False)
+        simulation.pending_tasks = payload_dict["ntasks"]
+        simulation.requested_primaries = requested_primaries * payload_dict["ntasks"]
         make_commit_to_db()
 
         # submit the asynchronous job to celery
@@ -98,6 +119,7 @@ class JobsDirect(Resource):
             payload_dict["ntasks"],
             celery_ids,
             payload_dict["sim_type"],
+            cycles,
         )
 
         input_model = InputModel(simulation_id=simulation.id)
@@ -112,11 +134,19 @@ class JobsDirect(Resource):
         """Class specifies API parameters for GET and DELETE request"""
 
         job_id = fields.String()
+        since_version = fields.String(load_default=None)
+        summary = fields.Boolean(load_default=False)
+        limit = fields.Integer(load_default=None, validate=validate.Range(min=1, max=MAX_TASKS_PAGE_SIZE))
+        after_task_id = fields.Integer(load_default=None)
 
     @staticmethod
     @requires_auth()
     def get(user: UserModel):
-        """Method returning job status and results"""
+        """
+        Method returning job status and results.
+        Supports conditional polling (`since_version` parameter or `If-None-Match` header),
+        `summary` of tasks and pagination of task statuses (`limit`, `after_task_id`), as `/jobs`.
+        """
         # validate request parameters and handle errors
         schema = JobsDirect.APIParametersSchema()
         errors: dict[str, list[str]] = schema.validate(request.args)
@@ -126,42 +156,45 @@ class JobsDirect(Resource):
 
         # get job_id from request parameters and check if user owns this job
         job_id = param_dict["job_id"]
-        is_owned, error_message, res_code = check_if_job_is_owned_and_exist(job_id=job_id, user=user)
-        if not is_owned:
+        simulation, error_message, res_code = fetch_owned_simulation(
+            job_id=job_id, user=user, platform=PlatformType.DIRECT
+        )
+        if simulation is None:
             return yaptide_response(message=error_message, code=res_code)
 
-        # find appropriate simulation in the database
-        simulation = fetch_celery_simulation_by_job_id(job_id=job_id)
-
-        tasks = fetch_celery_tasks_by_sim_id(sim_id=simulation.id)
-
-        job_tasks_status = [task.get_status_dict() for task in tasks]
-
-        if simulation.job_state in (EntityState.COMPLETED.value, EntityState.FAILED.value):
-            return yaptide_response(
-                message=f"Job state: {simulation.job_state}",
-                code=200,
-                content={
-                    "job_state": simulation.job_state,
-                    "job_tasks_status": job_tasks_status,
-                },
-            )
-
+        status_version, not_modified, changed_task_ids = get_job_status_version(
+            simulation=simulation, since_version=param_dict["since_version"]
+        )
+        if not_modified:
+            return not_modified_response(etag=job_status_etag(sim_id=simulation.id, status_version=status_version))
+
+        tasks_info, status_counter = get_job_tasks_info(
+            simulation=simulation,
+            summary=param_dict["summary"],
+            after_task_id=param_dict["after_task_id"],
+            limit=param_dict["limit"],
+            changed_task_ids=changed_task_ids,
+        )
+        tasks_count = sum(status_counter.values())
         job_info = {"job_state": simulation.job_state}
-        status_counter = Counter([task["task_state"] for task in job_tasks_status])
-        if status_counter[EntityState.PENDING.value] == len(job_tasks_status):
-            job_info["job_state"] = EntityState.PENDING.value
-        elif status_counter[EntityState.FAILED.value] == len(job_tasks_status):
-            job_info["job_state"] = EntityState.FAILED.value
-        elif status_counter[EntityState.RUNNING.value] > 0:
-            job_info["job_state"] = EntityState.RUNNING.value
 
-        # if simulation is not found, return error
-        update_simulation_state(simulation=simulation, update_dict=job_info)
+        if simulation.job_state not in (EntityState.COMPLETED.value, EntityState.FAILED.value):
+            if status_counter[EntityState.PENDING.value] == tasks_count:
+                job_info["job_state"] = EntityState.PENDING.value
+            elif status_counter[EntityState.FAILED.value] == tasks_count:
+                job_info["job_state"] = EntityState.FAILED.value
+            elif status_counter[EntityState.RUNNING.value] > 0:
+                job_info["job_state"] = EntityState.RUNNING.value
 
-        job_info["job_tasks_status"] = job_tasks_status
+            # if simulation is not found, return error
+            update_simulation_state(simulation=simulation, update_dict=job_info)
 
-        return yaptide_response(message=f"Job state: {job_info['job_state']}", code=200, content=job_info)
+        job_info.update(tasks_info)
+        if status_version is not None:
+            job_info["status_version"] = status_version
+
+        response = yaptide_response(message=f"Job state: {job_info['job_state']}", code=200, content=job_info)
+        return make_job_status_conditional(response=response, sim_id=simulation.id, status_version=status_version)
 
     @staticmethod
     @requires_auth()
@@ -175,12 +208,12 @@ class JobsDirect(Resource):
 
         job_id = params_dict["job_id"]
 
-        is_owned, error_message, res_code = check_if_job_is_owned_and_exist(job_id=job_id, user=user)
-        if not is_owned:
+        simulation, error_message, res_code = fetch_owned_simulation(
+            job_id=job_id, user=user, platform=PlatformType.DIRECT
+        )
+        if simulation is None:
             return yaptide_response(message=error_message, code=res_code)
 
-        simulation = fetch_celery_simulation_by_job_id(job_id=job_id)
-
         if simulation.job_state in (
             EntityState.COMPLETED.value,
             EntityState.FAILED.value,
@@ -207,9 +240,13 @@ class JobsDirect(Resource):
         celery_app.control.revoke(simulation.merge_id, terminate=True, signal="SIGINT")
         celery_app.control.revoke(celery_ids, terminate=True, signal="SIGINT")
         update_simulation_state(simulation=simulation, update_dict={"job_state": EntityState.CANCELED.value})
-        for task in tasks:
-            if task.task_state in [EntityState.PENDING.value, EntityState.RUNNING.value]:
-                update_task_state(task=task, update_dict={"task_state": EntityState.CANCELED.value})
+        update_tasks_states(
+            updates=[
+                (simulation.id, task.task_id, {"task_state": EntityState.CANCELED.value})
+                for task in tasks
+                if task.task_state in [EntityState.PENDING.value, EntityState.RUNNING.value]
+            ]
+        )
 
         terminate_unfinished_tasks.delay(simulation_id=simulation.id)
         return yaptide_response(message="Cancelled sucessfully", code=200)
@@ -234,22 +271,21 @@ class ResultsDirect(Resource):
         param_dict: dict = schema.load(request.args)
 
         job_id = param_dict["job_id"]
-        is_owned, error_message, res_code = check_if_job_is_owned_and_exist(job_id=job_id, user=user)
-        if not is_owned:
+        simulation, error_message, res_code = fetch_owned_simulation(
+            job_id=job_id, user=user, platform=PlatformType.DIRECT
+        )
+        if simulation is None:
             return yaptide_response(message=error_message, code=res_code)
 
-        simulation = fetch_celery_simulation_by_job_id(job_id=job_id)
-
-        estimators: list[EstimatorModel] = fetch_estimators_by_sim_id(sim_id=simulation.id)
+        estimators: list[EstimatorModel] = fetch_estimators_by_sim_id(sim_id=simulation.id, with_data=True)
         if len(estimators) > 0:
             logging.debug("Returning results from database")
             result_estimators = []
             for estimator in estimators:
-                pages: list[PageModel] = fetch_pages_by_estimator_id(est_id=estimator.id)
                 estimator_dict = {
                     "metadata": estimator.data,
                     "name": estimator.name,
-                    "pages": [page.data for page in pages],
+                    "pages": [page.data for page in estimator.pages],
                 }
                 result_estimators.append(estimator_dict)
             return yaptide_response(
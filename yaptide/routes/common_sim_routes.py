@@ -3,9 +3,10 @@ from collections import Counter
 from datetime import datetime
 from typing import List
 
-from flask import request, current_app as app
+import redis
+from flask import Response, json, request, current_app as app
 from flask_restful import Resource
-from marshmallow import Schema, fields
+from marshmallow import Schema, fields, validate
 
 from yaptide.persistence.db_methods import (
     add_object_to_db,
@@ -18,19 +19,36 @@ from yaptide.persistence.db_methods import (
     fetch_page_by_est_id_and_page_number,
     fetch_pages_by_est_id_and_page_numbers,
     fetch_pages_by_estimator_id,
-    fetch_simulation_by_job_id,
     fetch_simulation_by_sim_id,
-    fetch_simulation_id_by_job_id,
     fetch_tasks_by_sim_id,
     make_commit_to_db,
     update_simulation_state,
 )
-from yaptide.persistence.models import EstimatorModel, LogfilesModel, PageModel, UserModel
+from yaptide.persistence.job_events import (
+    FINAL_JOB_STATES,
+    can_resume_job_events,
+    format_server_sent_event,
+    get_job_stream_slots,
+    latest_job_event_id,
+    read_job_events,
+    stream_job_events,
+)
+from yaptide.persistence.live_progress import fetch_live_progress
+from yaptide.persistence.models import EstimatorModel, LogfilesModel, PageModel, SimulationModel, UserModel
 from yaptide.routes.utils.decorators import requires_auth
-from yaptide.routes.utils.response_templates import yaptide_response
-from yaptide.routes.utils.utils import check_if_job_is_owned_and_exist
-from yaptide.routes.utils.tokens import decode_auth_token
+from yaptide.routes.utils.response_templates import not_modified_response, yaptide_response
+from yaptide.routes.utils.utils import (
+    fetch_owned_simulation,
+    get_job_progress,
+    get_job_status_version,
+    MAX_TASKS_PAGE_SIZE,
+    get_job_tasks_info,
+    job_status_etag,
+    make_job_status_conditional,
+)
+from yaptide.routes.utils.update_key_cache import verify_update_key
 from yaptide.utils.enums import EntityState, InputType
+from yaptide.utils.redis_client import get_redis_client
 
 
 class JobsResource(Resource):
@@ -40,11 +58,24 @@ class JobsResource(Resource):
         """Class specifies API parameters for GET and DELETE request"""
 
         job_id = fields.String()
+        since_version = fields.String(load_default=None)
+        summary = fields.Boolean(load_default=False)
+        limit = fields.Integer(load_default=None, validate=validate.Range(min=1, max=MAX_TASKS_PAGE_SIZE))
+        after_task_id = fields.Integer(load_default=None)
 
     @staticmethod
     @requires_auth()
     def get(user: UserModel):
-        """Method returning info about job"""
+        """
+        Method returning info about job.
+        Clients polling the job status may send `status_version` from the previous response as `since_version`
+        parameter (or its ETag as `If-None-Match` header). If nothing has changed, 304 Not Modified is returned.
+        With `since_version` only statuses of changed tasks are returned (`changed_tasks_only` is set).
+        For jobs with many tasks, `summary` parameter returns aggregated state of tasks instead of their statuses
+        and `limit` returns statuses page by page, next page starts after `next_task_id` sent as `after_task_id`.
+        Running jobs with known throughput of tasks contain `job_progress` with `primaries_per_second`
+        and `estimated_time` of the whole job (see `get_job_progress`).
+        """
         schema = JobsResource.APIParametersSchema()
         errors: dict[str, list[str]] = schema.validate(request.args)
         if errors:
@@ -53,52 +84,51 @@ class JobsResource(Resource):
 
         # get job_id from request parameters and check if user owns this job
         job_id = param_dict["job_id"]
-        is_owned, error_message, res_code = check_if_job_is_owned_and_exist(job_id=job_id, user=user)
-        if not is_owned:
+        simulation, error_message, res_code = fetch_owned_simulation(job_id=job_id, user=user)
+        if simulation is None:
             return yaptide_response(message=error_message, code=res_code)
 
-        simulation = fetch_simulation_by_job_id(job_id=job_id)
         if simulation.job_state == EntityState.UNKNOWN.value:
             return yaptide_response(
                 message="Job state is unknown", code=200, content={"job_state": simulation.job_state}
             )
 
-        tasks = fetch_tasks_by_sim_id(sim_id=simulation.id)
-
-        job_tasks_status = [task.get_status_dict() for task in tasks]
-        job_tasks_status = sorted(job_tasks_status, key=lambda x: x["task_id"])
+        # version is read before the status, so changes made meanwhile are reported in the next response
+        status_version, not_modified, changed_task_ids = get_job_status_version(
+            simulation=simulation, since_version=param_dict["since_version"]
+        )
+        if not_modified:
+            return not_modified_response(etag=job_status_etag(sim_id=simulation.id, status_version=status_version))
+
+        tasks_info, task_states = get_job_tasks_info(
+            simulation=simulation,
+            summary=param_dict["summary"],
+            after_task_id=param_dict["after_task_id"],
+            limit=param_dict["limit"],
+            changed_task_ids=changed_task_ids,
+        )
+        job_info = {"job_state": simulation.job_state}
 
-        if simulation.job_state in (
+        if simulation.job_state not in (
             EntityState.COMPLETED.value,
             EntityState.FAILED.value,
             EntityState.MERGING_QUEUED.value,
             EntityState.MERGING_RUNNING.value,
         ):
-            return yaptide_response(
-                message=f"Job state: {simulation.job_state}",
-                code=200,
-                content={
-                    "job_state": simulation.job_state,
-                    "job_tasks_status": job_tasks_status,
-                },
+            job_info["job_state"] = derive_job_state(
+                job_id=job_id, job_state=simulation.job_state, task_states=task_states
             )
+            update_simulation_state(simulation=simulation, update_dict=job_info)
+            job_progress = get_job_progress(simulation=simulation)
+            if job_progress:
+                job_info["job_progress"] = job_progress
 
-        job_info = {"job_state": simulation.job_state}
-        status_counter = Counter([task["task_state"] for task in job_tasks_status])
-        if status_counter[EntityState.PENDING.value] == len(job_tasks_status):
-            job_info["job_state"] = EntityState.PENDING.value
-        elif status_counter[EntityState.FAILED.value] == len(job_tasks_status):
-            job_info["job_state"] = EntityState.FAILED.value
-        elif status_counter[EntityState.RUNNING.value] > 0:
-            job_info["job_state"] = EntityState.RUNNING.value
-        elif job_id.endswith("BATCH") and status_counter[EntityState.COMPLETED.value] == len(job_tasks_status):
-            job_info["job_state"] = EntityState.MERGING_QUEUED.value
-
-        update_simulation_state(simulation=simulation, update_dict=job_info)
-
-        job_info["job_tasks_status"] = job_tasks_status
+        job_info.update(tasks_info)
+        if status_version is not None:
+            job_info["status_version"] = status_version
 
-        return yaptide_response(message=f"Job state: {job_info['job_state']}", code=200, content=job_info)
+        response = yaptide_response(message=f"Job state: {job_info['job_state']}", code=200, content=job_info)
+        return make_job_status_conditional(response=response, sim_id=simulation.id, status_version=status_version)
 
     @staticmethod
     def post():
@@ -112,8 +142,7 @@ class JobsResource(Resource):
             app.logger.info(f"sim_id {sim_id} simulation not found ")
             return yaptide_response(message=f"Simulation {sim_id} does not exist", code=501)
 
-        decoded_token = decode_auth_token(payload_dict["update_key"], payload_key_to_return="simulation_id")
-        if decoded_token != sim_id:
+        if verify_update_key(update_key=payload_dict["update_key"], sim_id=sim_id):
             return yaptide_response(message="Invalid update key", code=400)
 
         update_simulation_state(simulation, payload_dict)
@@ -125,14 +154,115 @@ class JobsResource(Resource):
         return yaptide_response(message="Task updated", code=202)
 
 
+class JobsStreamResource(Resource):
+    """Class responsible for pushing job and task status changes to clients as Server-Sent Events"""
+
+    class APIParametersSchema(Schema):
+        """Class specifies API parameters"""
+
+        job_id = fields.String(required=True)
+
+    @staticmethod
+    @requires_auth()
+    def get(user: UserModel):
+        """
+        Method streaming status of the job as `text/event-stream`, to be used instead of polling `/jobs`.
+        A new stream starts with `snapshot` event (job state and statuses of all tasks), followed by
+        `task` events (task status or progress, tasks are identified by `task_id` sent by workers)
+        and `job` events (job state transitions). Stream reconnected with `Last-Event-ID` header
+        is resumed with missed events, without the snapshot. The stream ends after the final job state
+        and further reconnections are answered with 204 No Content, which stops the browser `EventSource`.
+        """
+        schema = JobsStreamResource.APIParametersSchema()
+        errors: dict[str, list[str]] = schema.validate(request.args)
+        if errors:
+            return yaptide_response(message="Wrong parameters", code=400, content=errors)
+        param_dict: dict = schema.load(request.args)
+
+        job_id = param_dict["job_id"]
+        simulation, error_message, res_code = fetch_owned_simulation(job_id=job_id, user=user)
+        if simulation is None:
+            return yaptide_response(message=error_message, code=res_code)
+
+        redis_client = get_redis_client()
+        if redis_client is None:
+            return yaptide_response(message="Job status stream is not available on this server", code=501)
+
+        job_is_final = simulation.job_state in FINAL_JOB_STATES
+        last_event_id = request.headers.get("Last-Event-ID", "").strip()
+        slots = get_job_stream_slots(redis_client=redis_client)
+        try:
+            resumed = bool(last_event_id) and can_resume_job_events(redis_client, simulation.id, last_event_id)
+            if resumed and job_is_final and not read_job_events(redis_client, simulation.id, last_event_id):
+                return Response(status=204)
+            slot = slots.acquire(user_id=user.id)
+            if slot is None:
+                return yaptide_response(message="Too many open job status streams", code=429)
+            initial_events = []
+            if not resumed:
+                # id is read before the snapshot, so events published meanwhile are sent after it
+                last_event_id = latest_job_event_id(redis_client, simulation.id)
+                snapshot = get_job_snapshot(job_id=job_id, simulation=simulation)
+                initial_events.append(
+                    format_server_sent_event(event_type="snapshot", data=json.dumps(snapshot), event_id=last_event_id)
+                )
+        except redis.RedisError as e:
+            logging.warning("Unable to open stream of job %s: %s", job_id, e)
+            return yaptide_response(message="Job status stream is temporarily unavailable", code=503)
+
+        stream = stream_job_events(
+            sim_id=simulation.id,
+            user_id=user.id,
+            slot=slot,
+            last_event_id=last_event_id,
+            initial_events=initial_events,
+            follow=not job_is_final,
+        )
+        # response is not buffered by nginx, events have to reach the client immediately
+        return Response(
+            stream,
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+
+def derive_job_state(job_id: str, job_state: str, task_states: Counter) -> str:
+    """Returns job state derived from number of its tasks in each state"""
+    tasks_count = sum(task_states.values())
+    if task_states[EntityState.PENDING.value] == tasks_count:
+        return EntityState.PENDING.value
+    if task_states[EntityState.FAILED.value] == tasks_count:
+        return EntityState.FAILED.value
+    if task_states[EntityState.RUNNING.value] > 0:
+        return EntityState.RUNNING.value
+    if job_id.endswith("BATCH") and task_states[EntityState.COMPLETED.value] == tasks_count:
+        return EntityState.MERGING_QUEUED.value
+    return job_state
+
+
+def get_job_snapshot(job_id: str, simulation: SimulationModel) -> dict:
+    """Returns current state of the job and statuses of its tasks, identified by task number within the job"""
+    tasks = fetch_tasks_by_sim_id(sim_id=simulation.id)
+    live_progress = fetch_live_progress(sim_id=simulation.id)
+    job_tasks_status = [
+        {**task.get_status_dict(live_progress.get(task.task_id)), "task_id": task.task_id} for task in tasks
+    ]
+    job_tasks_status = sorted(job_tasks_status, key=lambda x: x["task_id"])
+    job_state = simulation.job_state
+    if job_state in (EntityState.PENDING.value, EntityState.RUNNING.value):
+        task_states = Counter([task["task_state"] for task in job_tasks_status])
+        job_state = derive_job_state(job_id=job_id, job_state=job_state, task_states=task_states)
+    return {"job_state": job_state, "job_tasks_status": job_tasks_status}
+
+
 def get_single_estimator(sim_id: int, estimator_name: str):
     """Retrieve a single estimator by simulation ID and estimator name"""
-    estimator = fetch_estimator_by_sim_id_and_est_name(sim_id=sim_id, est_name=estimator_name)
+    estimator = fetch_estimator_by_sim_id_and_est_name(sim_id=sim_id, est_name=estimator_name, with_data=True)
 
     if not estimator:
         return yaptide_response(message="Estimator not found", code=404)
 
-    pages = fetch_pages_by_estimator_id(est_id=estimator.id)
+    pages = fetch_pages_by_estimator_id(est_id=estimator.id, with_data=True)
     estimator_dict = {"metadata": estimator.data, "name": estimator.name, "pages": [page.data for page in pages]}
     return yaptide_response(
         message=f"Estimator '{estimator_name}' for simulation: {sim_id}", code=200, content=estimator_dict
@@ -141,7 +271,7 @@ def get_single_estimator(sim_id: int, estimator_name: str):
 
 def get_all_estimators(sim_id: int):
     """Retrieve all estimators for a given simulation ID"""
-    estimators = fetch_estimators_by_sim_id(sim_id=sim_id)
+    estimators = fetch_estimators_by_sim_id(sim_id=sim_id, with_data=True)
     if len(estimators) == 0:
         return yaptide_response(message="Results are unavailable", code=404)
 
@@ -228,8 +358,7 @@ class ResultsResource(Resource):
         if not simulation:
             return yaptide_response(message="Simulation does not exist", code=400)
 
-        decoded_token = decode_auth_token(payload_dict["update_key"], payload_key_to_return="simulation_id")
-        if decoded_token != sim_id:
+        if verify_update_key(update_key=payload_dict["update_key"], sim_id=sim_id):
             return yaptide_response(message="Invalid update key", code=400)
 
         if simulation.input_type == InputType.EDITOR.value:
@@ -293,13 +422,11 @@ class ResultsResource(Resource):
         page_number = param_dict.get("page_number")
         page_numbers = param_dict.get("page_numbers")
 
-        is_owned, error_message, res_code = check_if_job_is_owned_and_exist(job_id=job_id, user=user)
-        if not is_owned:
+        simulation, error_message, res_code = fetch_owned_simulation(job_id=job_id, user=user)
+        if simulation is None:
             return yaptide_response(message=error_message, code=res_code)
 
-        simulation_id = fetch_simulation_id_by_job_id(job_id=job_id)
-        if not simulation_id:
-            return yaptide_response(message="Simulation does not exist", code=404)
+        simulation_id = simulation.id
 
         # if estimator name is provided, return specific estimator
         if estimator_name is None:
@@ -310,13 +437,15 @@ class ResultsResource(Resource):
 
         estimator_id = fetch_estimator_id_by_sim_id_and_est_name(sim_id=simulation_id, est_name=estimator_name)
         if page_number is not None:
-            page = fetch_page_by_est_id_and_page_number(est_id=estimator_id, page_number=page_number)
+            page = fetch_page_by_est_id_and_page_number(est_id=estimator_id, page_number=page_number, with_data=True)
             result = {"page": page.data}
             return yaptide_response(message="Page retrieved successfully", code=200, content=result)
 
         if page_numbers is not None:
             parsed_page_numbers = parse_page_numbers(page_numbers)
-            pages = fetch_pages_by_est_id_and_page_numbers(est_id=estimator_id, page_numbers=parsed_page_numbers)
+            pages = fetch_pages_by_est_id_and_page_numbers(
+                est_id=estimator_id, page_numbers=parsed_page_numbers, with_data=True
+            )
             result = {"pages": [page.data for page in pages]}
             return yaptide_response(message="Pages retrieved successfully", code=200, content=result)
         return yaptide_response(message="Wrong parameters", code=400, content=errors)
@@ -341,13 +470,11 @@ class InputsResource(Resource):
         param_dict: dict = schema.load(request.args)
         job_id = param_dict["job_id"]
 
-        is_owned, error_message, res_code = check_if_job_is_owned_and_exist(job_id=job_id, user=user)
-        if not is_owned:
+        simulation, error_message, res_code = fetch_owned_simulation(job_id=job_id, user=user)
+        if simulation is None:
             return yaptide_response(message=error_message, code=res_code)
 
-        simulation = fetch_simulation_by_job_id(job_id=job_id)
-
-        input_model = fetch_input_by_sim_id(sim_id=simulation.id)
+        input_model = fetch_input_by_sim_id(sim_id=simulation.id, with_data=True)
         if not input_model:
             return yaptide_response(message="Input of simulation is unavailable", code=404)
 
@@ -374,16 +501,12 @@ class LogfilesResource(Resource):
             return yaptide_response(message="Incomplete JSON data", code=400)
 
         sim_id = payload_dict["simulation_id"]
-        simulation = fetch_simulation_by_sim_id(sim_id=sim_id)
+        # simulation is not needed here, so it is not loaded, its existence is checked together with the update key
+        error_message = verify_update_key(update_key=payload_dict["update_key"], sim_id=sim_id)
+        if error_message:
+            return yaptide_response(message=error_message, code=400)
 
-        if not simulation:
-            return yaptide_response(message="Simulation does not exist", code=400)
-
-        decoded_token = decode_auth_token(payload_dict["update_key"], payload_key_to_return="simulation_id")
-        if decoded_token != sim_id:
-            return yaptide_response(message="Invalid update key", code=400)
-
-        logfiles = LogfilesModel(simulation_id=simulation.id)
+        logfiles = LogfilesModel(simulation_id=sim_id)
         logfiles.data = payload_dict["logfiles"]
         add_object_to_db(logfiles)
 
@@ -405,13 +528,11 @@ class LogfilesResource(Resource):
         param_dict: dict = schema.load(request.args)
 
         job_id = param_dict["job_id"]
-        is_owned, error_message, res_code = check_if_job_is_owned_and_exist(job_id=job_id, user=user)
-        if not is_owned:
+        simulation, error_message, res_code = fetch_owned_simulation(job_id=job_id, user=user)
+        if simulation is None:
             return yaptide_response(message=error_message, code=res_code)
 
-        simulation = fetch_simulation_by_job_id(job_id=job_id)
-
-        logfile = fetch_logfiles_by_sim_id(sim_id=simulation.id)
+        logfile = fetch_logfiles_by_sim_id(sim_id=simulation.id, with_data=True)
         if not logfile:
             return yaptide_response(message="Logfiles are unavailable", code=404)
 
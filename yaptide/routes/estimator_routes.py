@@ -2,15 +2,11 @@ from flask import request
 from flask_restful import Resource
 from marshmallow import Schema, fields
 
-from yaptide.persistence.db_methods import (
-    fetch_estimators_by_sim_id,
-    fetch_pages_metadata_by_est_id,
-    fetch_simulation_id_by_job_id,
-)
+from yaptide.persistence.db_methods import fetch_pages_metadata_by_sim_id
 from yaptide.persistence.models import UserModel
 from yaptide.routes.utils.decorators import requires_auth
 from yaptide.routes.utils.response_templates import yaptide_response
-from yaptide.routes.utils.utils import check_if_job_is_owned_and_exist
+from yaptide.routes.utils.utils import fetch_owned_simulation
 
 
 class EstimatorResource(Resource):
@@ -33,26 +29,19 @@ class EstimatorResource(Resource):
 
         job_id = param_dict["job_id"]
 
-        is_owned, error_message, res_code = check_if_job_is_owned_and_exist(job_id=job_id, user=user)
-        if not is_owned:
+        simulation, error_message, res_code = fetch_owned_simulation(job_id=job_id, user=user)
+        if simulation is None:
             return yaptide_response(message=error_message, code=res_code)
 
-        simulation_id = fetch_simulation_id_by_job_id(job_id=job_id)
-        if not simulation_id:
-            return yaptide_response(message="Simulation does not exist", code=404)
-
-        estimators = fetch_estimators_by_sim_id(sim_id=simulation_id)
+        # rows are sorted by estimator, so pages of each estimator are grouped together
         results = []
-
-        for estimator in estimators:
-            pages_metadata = fetch_pages_metadata_by_est_id(est_id=estimator.id)
-            estimator_dict = {
-                "name": estimator.name,
-                "pages_metadata": [
-                    {"page_number": page[0], "page_name": page[1], "page_dimension": page[2]} for page in pages_metadata
-                ],
-            }
-            results.append(estimator_dict)
+        for name, page_number, page_name, page_dimension in fetch_pages_metadata_by_sim_id(sim_id=simulation.id):
+            if not results or results[-1]["name"] != name:
+                results.append({"name": name, "pages_metadata": []})
+            if page_number is not None:
+                results[-1]["pages_metadata"].append(
+                    {"page_number": page_number, "page_name": page_name, "page_dimension": page_dimension}
+                )
 
         if len(results) == 0:
             return yaptide_response(message="Pages metadata not found", code=404)
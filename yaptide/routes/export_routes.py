@@ -0,0 +1,60 @@
+from flask import Response, request, stream_with_context
+from flask_restful import Resource
+from marshmallow import Schema, fields, validate
+
+from yaptide.persistence.db_methods import fetch_estimator_names_by_sim_id, iterate_pages_data_by_sim_id
+from yaptide.persistence.models import UserModel
+from yaptide.routes.utils.decorators import requires_auth
+from yaptide.routes.utils.response_templates import yaptide_response
+from yaptide.routes.utils.utils import fetch_owned_simulation
+from yaptide.utils.results_export import hdf5_available, stream_hdf5, stream_npz
+
+EXPORT_FORMATS = {
+    "npz": (stream_npz, "application/zip", "npz"),
+    "hdf5": (stream_hdf5, "application/x-hdf5", "h5"),
+}
+
+
+class ExportResource(Resource):
+    """Class responsible for exporting whole simulation results as a single binary file"""
+
+    class APIParametersSchema(Schema):
+        """Class specifies API parameters"""
+
+        job_id = fields.String(required=True)
+        format = fields.String(load_default="npz", validate=validate.OneOf(list(EXPORT_FORMATS)))
+
+    @staticmethod
+    @requires_auth()
+    def get(user: UserModel):
+        """
+        Method streaming all estimators of the simulation as NPZ or HDF5 file.
+        Each page is written as a native typed array, axes and metadata are stored alongside as attributes.
+        The file is built incrementally from pages stored in the database.
+        """
+        schema = ExportResource.APIParametersSchema()
+        errors: dict[str, list[str]] = schema.validate(request.args)
+        if errors:
+            return yaptide_response(message="Wrong parameters", code=400, content=errors)
+        param_dict: dict = schema.load(request.args)
+
+        job_id = param_dict["job_id"]
+        export_format = param_dict["format"]
+
+        simulation, error_message, res_code = fetch_owned_simulation(job_id=job_id, user=user)
+        if simulation is None:
+            return yaptide_response(message=error_message, code=res_code)
+
+        if not fetch_estimator_names_by_sim_id(sim_id=simulation.id):
+            return yaptide_response(message="Results are unavailable", code=404)
+
+        if export_format == "hdf5" and not hdf5_available():
+            return yaptide_response(message="HDF5 export is not available on this server", code=501)
+
+        stream_function, mimetype, extension = EXPORT_FORMATS[export_format]
+        stream = stream_function(iterate_pages_data_by_sim_id(sim_id=simulation.id))
+        return Response(
+            stream_with_context(stream),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f'attachment; filename="{job_id}.{extension}"'},
+        )
@@ -12,6 +12,7 @@ from yaptide.persistence.db_methods import add_object_to_db, fetch_keycloak_user
 from yaptide.persistence.models import KeycloakUserModel
 from yaptide.routes.utils.response_templates import error_internal_response, yaptide_response
 from yaptide.routes.utils.tokens import encode_auth_token
+from yaptide.routes.utils.user_cache import invalidate_cached_user, invalidate_cached_user_by_token
 from werkzeug.exceptions import Forbidden, Unauthorized
 
 ROOT_DIR = Path(__file__).parent.resolve()
@@ -118,6 +119,7 @@ class AuthKeycloak(Resource):
             user.cert = res_json.get("cert")
             user.private_key = res_json.get("private")
             make_commit_to_db()
+            invalidate_cached_user(user.id)
 
         try:
             # prepare our own tokens
@@ -138,6 +140,7 @@ class AuthKeycloak(Resource):
     @staticmethod
     def delete():
         """Method returning status of logging out"""
+        invalidate_cached_user_by_token(request.cookies.get("access_token"))
         resp = yaptide_response(message="User logged out", code=200)
         resp.delete_cookie("access_token")
         return resp
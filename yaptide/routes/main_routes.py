@@ -3,10 +3,17 @@ from flask_restful import Api, Resource
 from yaptide.routes.auth_routes import AuthLogIn, AuthLogOut, AuthRefresh, AuthRegister, AuthStatus
 from yaptide.routes.batch_routes import Clusters, JobsBatch
 from yaptide.routes.celery_routes import JobsDirect
-from yaptide.routes.common_sim_routes import JobsResource, InputsResource, LogfilesResource, ResultsResource
+from yaptide.routes.common_sim_routes import (
+    JobsResource,
+    JobsStreamResource,
+    InputsResource,
+    LogfilesResource,
+    ResultsResource,
+)
 from yaptide.routes.estimator_routes import EstimatorResource
+from yaptide.routes.export_routes import ExportResource
 from yaptide.routes.keycloak_routes import AuthKeycloak
-from yaptide.routes.task_routes import TasksResource
+from yaptide.routes.task_routes import TasksBatchResource, TasksResource
 from yaptide.routes.user_routes import UserSimulations, UserUpdate
 from yaptide.routes.utils.response_templates import yaptide_response
 
@@ -28,10 +35,13 @@ def initialize_routes(api: Api):
     api.add_resource(JobsBatch, "/jobs/batch")
 
     api.add_resource(JobsResource, "/jobs")
+    api.add_resource(JobsStreamResource, "/jobs/stream")
 
     api.add_resource(TasksResource, "/tasks")
+    api.add_resource(TasksBatchResource, "/tasks/batch")
 
     api.add_resource(ResultsResource, "/results")
+    api.add_resource(ExportResource, "/results/export")
     api.add_resource(InputsResource, "/inputs")
     api.add_resource(LogfilesResource, "/logfiles")
 
@@ -1,13 +1,30 @@
-from flask import request
+import time
+from typing import Optional
+
+from flask import Response, request
 from flask_restful import Resource
 
-from yaptide.persistence.db_methods import (
-    fetch_simulation_by_sim_id,
-    fetch_task_by_sim_id_and_task_id,
-    update_task_state,
-)
+from yaptide.persistence.db_methods import update_task_state, update_tasks_states
+from yaptide.persistence.live_progress import merge_live_progress, record_live_progress
+from yaptide.persistence.throughput import record_throughput
+from yaptide.routes.utils.backpressure import get_update_load_monitor
 from yaptide.routes.utils.response_templates import yaptide_response
-from yaptide.routes.utils.tokens import decode_auth_token
+from yaptide.routes.utils.task_ids_cache import verify_task_exists
+from yaptide.routes.utils.update_key_cache import verify_update_key
+
+
+def updates_accepted_response(
+    message: str, updates: int, start_time: float, content: Optional[dict] = None
+) -> Response:
+    """
+    Returns response to accepted task updates, records time spent on handling them in the update load monitor.
+    Response contains minimum interval between progress updates of a task (`min_update_interval`, in seconds),
+    which monitors of the tasks should respect.
+    """
+    min_update_interval = get_update_load_monitor().record(updates=updates, seconds=time.perf_counter() - start_time)
+    return yaptide_response(
+        message=message, code=202, content={**(content or {}), "min_update_interval": min_update_interval}
+    )
 
 
 class TasksResource(Resource):
@@ -25,7 +42,9 @@ class TasksResource(Resource):
             "update_dict": <dict>
         }
         simulation_id and task_id self explanatory
+        Response contains `min_update_interval`, see `updates_accepted_response`.
         """
+        start_time = time.perf_counter()
         payload_dict: dict = request.get_json(force=True)
         required_keys = {"simulation_id", "task_id", "update_key", "update_dict"}
         if required_keys != set(payload_dict.keys()):
@@ -33,20 +52,96 @@ class TasksResource(Resource):
             return yaptide_response(message=f"Missing keys in JSON payload: {diff}", code=400)
 
         sim_id: int = payload_dict["simulation_id"]
-        simulation = fetch_simulation_by_sim_id(sim_id=sim_id)
+        task_id: int = payload_dict["task_id"]
+        update_dict: dict = payload_dict["update_dict"]
+
+        error_message = verify_update_key(update_key=payload_dict["update_key"], sim_id=sim_id)
+        if error_message:
+            return yaptide_response(message=error_message, code=400)
+        if not verify_task_exists(sim_id=sim_id, task_id=task_id):
+            return yaptide_response(message=f"Task {task_id} does not exist", code=400)
+
+        record_throughput(sim_id=sim_id, task_id=task_id, update_dict=update_dict)
+        # progress of running task is kept in the live progress store, without touching the database
+        if record_live_progress(sim_id=sim_id, task_id=task_id, update_dict=update_dict):
+            return updates_accepted_response(message="Task updated", updates=1, start_time=start_time)
+
+        update_dict = merge_live_progress(sim_id=sim_id, task_id=task_id, update_dict=update_dict)
+        # update is done without loading the task, updates of finished tasks are ignored
+        update_task_state(sim_id=sim_id, task_id=task_id, update_dict=update_dict)
+        return updates_accepted_response(message="Task updated", updates=1, start_time=start_time)
+
+
+class TasksBatchResource(Resource):
+    """Class responsible for updating many tasks at once"""
 
-        if not simulation:
-            return yaptide_response(message=f"Simulation {sim_id} does not exist", code=400)
+    @staticmethod
+    def post():
+        """
+        Method updating states of many tasks in a single transaction
+        Structure required by this method to work properly:
+        {
+            "simulations": [
+                {
+                    "simulation_id": <int>,
+                    "update_key": <string>,
+                    "tasks": [{"task_id": <int>, "update_dict": <dict>}, ...]
+                },
+                ...
+            ]
+        }
+        Updates of simulations with invalid update key and of non-existing tasks are rejected,
+        all other updates are applied. Rejected updates are listed in the response,
+        together with `min_update_interval`, see `updates_accepted_response`.
+        """
+        start_time = time.perf_counter()
+        payload_dict: dict = request.get_json(force=True)
+        simulations = payload_dict.get("simulations") if isinstance(payload_dict, dict) else None
+        if not isinstance(simulations, list):
+            return yaptide_response(message="Missing list of simulations in JSON payload", code=400)
 
-        decoded_token = decode_auth_token(payload_dict["update_key"], payload_key_to_return="simulation_id")
-        if decoded_token != sim_id:
-            return yaptide_response(message="Invalid update key", code=400)
+        required_keys = {"simulation_id", "update_key", "tasks"}
+        for simulation_dict in simulations:
+            if required_keys != set(simulation_dict.keys()):
+                diff = required_keys.difference(set(simulation_dict.keys()))
+                return yaptide_response(message=f"Missing keys in JSON payload: {diff}", code=400)
 
-        task = fetch_task_by_sim_id_and_task_id(sim_id=simulation.id, task_id=payload_dict["task_id"])
+        rejected = []
+        requested_updates: dict[tuple[int, int], dict] = {}
+        for simulation_dict in simulations:
+            sim_id: int = simulation_dict["simulation_id"]
+            error_message = verify_update_key(update_key=simulation_dict["update_key"], sim_id=sim_id)
+            if error_message:
+                rejected.append({"simulation_id": sim_id, "message": error_message})
+                continue
+            for task_dict in simulation_dict["tasks"]:
+                task_id: int = task_dict["task_id"]
+                if not verify_task_exists(sim_id=sim_id, task_id=task_id):
+                    rejected.append({"simulation_id": sim_id, "task_id": task_id, "message": "Task does not exist"})
+                    continue
+                # updates of the same task are applied in the order they were sent
+                requested_updates.setdefault((sim_id, task_id), {}).update(task_dict["update_dict"])
 
-        if not task:
-            return yaptide_response(message=f"Task {payload_dict['task_id']} does not exist", code=400)
+        # progress of running tasks is kept in the live progress store, only state transitions go to the database
+        live_updates_count = 0
+        for (sim_id, task_id), update_dict in list(requested_updates.items()):
+            record_throughput(sim_id=sim_id, task_id=task_id, update_dict=update_dict)
+            if record_live_progress(sim_id=sim_id, task_id=task_id, update_dict=update_dict):
+                del requested_updates[(sim_id, task_id)]
+                live_updates_count += 1
 
-        update_task_state(task=task, update_dict=payload_dict["update_dict"])
+        updates = [
+            (sim_id, task_id, merge_live_progress(sim_id=sim_id, task_id=task_id, update_dict=update_dict))
+            for (sim_id, task_id), update_dict in requested_updates.items()
+        ]
+        # updates of finished tasks are ignored
+        if updates:
+            update_tasks_states(updates=updates)
 
-        return yaptide_response(message="Task updated", code=202)
+        updated_tasks_count = live_updates_count + len(requested_updates)
+        return updates_accepted_response(
+            message="Tasks updated",
+            updates=updated_tasks_count,
+            start_time=start_time,
+            content={"updated_tasks": updated_tasks_count, "rejected": rejected},
+        )
@@ -10,6 +10,8 @@ from sqlalchemy import asc, desc
 from yaptide.persistence.models import SimulationModel, UserModel
 from yaptide.routes.utils.decorators import requires_auth
 from yaptide.routes.utils.response_templates import error_validation_response, yaptide_response
+from yaptide.routes.utils.task_ids_cache import invalidate_simulation_task_ids
+from yaptide.routes.utils.update_key_cache import invalidate_simulation_update_keys
 from yaptide.persistence.db_methods import delete_object_from_db, fetch_simulation_by_job_id
 from yaptide.utils.enums import EntityState
 
@@ -66,7 +68,12 @@ class UserSimulations(Resource):
     @staticmethod
     @requires_auth()
     def get(user: UserModel):
-        """Method returning simulations from the database"""
+        """
+        Method returning simulations from the database.
+        Progress of each simulation comes from task counters stored with the simulation, so the whole page
+        is loaded with a single query. Progress of running tasks is saved there periodically
+        (see yaptide/persistence/live_progress.py), `/jobs` returns the most recent one.
+        """
         schema = UserSimulations.GetAPIParametersSchema()
         params_dict: dict = schema.load(request.args)
         logging.info("User %s requested simulations with parameters: %s", user.username, params_dict)
@@ -89,6 +96,8 @@ class UserSimulations(Resource):
                     # submission time, when user send the request to the backend - jobs may start much later than that
                     "end_time": simulation.end_time,
                     # end time, when the all jobs are finished and results are merged
+                    "job_state": simulation.job_state,
+                    "tasks_progress": simulation.get_tasks_progress_dict(),
                     "metadata": {
                         "platform": simulation.platform,
                         "server": "Yaptide",
@@ -132,7 +141,10 @@ class UserSimulations(Resource):
                 code=403,
             )
 
+        sim_id = simulation.id
         delete_object_from_db(simulation)
+        invalidate_simulation_update_keys(sim_id)
+        invalidate_simulation_task_ids(sim_id)
         return yaptide_response(message=f"Simulation with job_id={job_id} successfully deleted from database", code=200)
 
 
@@ -0,0 +1,63 @@
+import math
+import os
+import threading
+import time
+from functools import lru_cache
+
+TASK_UPDATE_INTERVAL = 2  # seconds, interval between progress updates of a task used by monitors by default
+TASK_MAX_UPDATE_INTERVAL = 60  # seconds, upper limit of the suggested interval
+TASK_UPDATE_TARGET_LOAD = 0.5  # fraction of time of the Flask process which may be spent on handling task updates
+TASK_UPDATE_LOAD_WINDOW = 10  # seconds, time window in which the load is measured
+
+
+class UpdateLoadMonitor:
+    """
+    Measures load of the Flask process caused by task updates: fraction of time spent on handling them
+    (mostly waiting for the database), averaged over a time window with exponential decay.
+    From the load it derives the minimum interval between progress updates of a single task,
+    returned to workers in responses to task updates. Rate of updates is inversely proportional to the interval,
+    so when the load exceeds `target_load`, the interval is extended proportionally and monitors slow down
+    progress updates instead of overloading the backend. State transitions are never delayed by the monitors.
+    """
+
+    def __init__(self, base_interval: float, max_interval: float, target_load: float, window: float):
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.target_load = target_load
+        self.window = window
+        self.min_update_interval = base_interval
+        self._updates = 0.0
+        self._busy_seconds = 0.0
+        self._interval_sum = 0.0
+        self._last_record = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, updates: int, seconds: float) -> float:
+        """Records number of handled updates and time spent on handling them, returns minimum update interval"""
+        with self._lock:
+            now = time.monotonic()
+            decay = math.exp(-(now - self._last_record) / self.window)
+            self._last_record = now
+            self._updates = self._updates * decay + updates
+            self._busy_seconds = self._busy_seconds * decay + seconds
+            # interval suggested to workers when the measured updates were sent, weighted by number of updates
+            self._interval_sum = self._interval_sum * decay + self.min_update_interval * updates
+            load = self._busy_seconds / self.window
+            interval_in_use = self._interval_sum / self._updates if self._updates else self.base_interval
+            interval = interval_in_use * load / self.target_load
+            self.min_update_interval = min(self.max_interval, max(self.base_interval, interval))
+            return self.min_update_interval
+
+
+@lru_cache(maxsize=1)
+def get_update_load_monitor() -> UpdateLoadMonitor:
+    """
+    Returns update load monitor of the process, configured with environment variables:
+    `TASK_UPDATE_INTERVAL`, `TASK_MAX_UPDATE_INTERVAL` and `TASK_UPDATE_TARGET_LOAD`
+    """
+    return UpdateLoadMonitor(
+        base_interval=float(os.environ.get("TASK_UPDATE_INTERVAL", TASK_UPDATE_INTERVAL)),
+        max_interval=float(os.environ.get("TASK_MAX_UPDATE_INTERVAL", TASK_MAX_UPDATE_INTERVAL)),
+        target_load=float(os.environ.get("TASK_UPDATE_TARGET_LOAD", TASK_UPDATE_TARGET_LOAD)),
+        window=TASK_UPDATE_LOAD_WINDOW,
+    )
@@ -4,8 +4,8 @@ from typing import Union
 from flask import request
 from werkzeug.exceptions import Forbidden, Unauthorized
 
-from yaptide.persistence.db_methods import fetch_user_by_id
 from yaptide.routes.utils.tokens import decode_auth_token
+from yaptide.routes.utils.user_cache import fetch_user_by_id_cached
 
 
 def requires_auth(is_refresh: bool = False):
@@ -21,7 +21,7 @@ def requires_auth(is_refresh: bool = False):
                 raise Unauthorized(description="No token provided")
             resp: Union[int, str] = decode_auth_token(token=token, is_refresh=is_refresh)
             if isinstance(resp, int):
-                user = fetch_user_by_id(user_id=resp)
+                user = fetch_user_by_id_cached(user_id=resp)
                 if user:
                     return f(user, *args, **kwargs)
                 raise Forbidden(description="User not found")
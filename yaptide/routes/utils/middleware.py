@@ -0,0 +1,55 @@
+import io
+import logging
+import zlib
+
+MAX_DECOMPRESSED_REQUEST_SIZE = 1024 * 1024 * 1024  # bytes, protects the server against decompression bombs
+DECOMPRESS_CHUNK_SIZE = 64 * 1024  # bytes
+
+
+class GzipRequestMiddleware:
+    """
+    WSGI middleware decompressing request bodies sent with `Content-Encoding: gzip`.
+    Workers compress large payloads (results, logfiles), Flask itself handles only uncompressed bodies.
+    """
+
+    def __init__(self, app, max_size: int = MAX_DECOMPRESSED_REQUEST_SIZE):
+        self.app = app
+        self.max_size = max_size
+
+    def __call__(self, environ, start_response):
+        if environ.get("HTTP_CONTENT_ENCODING", "").lower() != "gzip":
+            return self.app(environ, start_response)
+
+        try:
+            body = self._decompress(environ["wsgi.input"], int(environ.get("CONTENT_LENGTH") or 0))
+        except (zlib.error, ValueError) as e:
+            logging.warning("Unable to decompress request body: %s", e)
+            start_response("400 Bad Request", [("Content-Type", "application/json")])
+            return [b'{"message": "Invalid gzip request body"}']
+
+        environ = dict(environ)
+        del environ["HTTP_CONTENT_ENCODING"]
+        environ["wsgi.input"] = io.BytesIO(body)
+        environ["CONTENT_LENGTH"] = str(len(body))
+        return self.app(environ, start_response)
+
+    def _decompress(self, stream, content_length: int) -> bytes:
+        """Decompresses gzip stream, raises ValueError if decompressed body exceeds the size limit"""
+        decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        chunks = []
+        size = 0
+        remaining = content_length
+        while remaining > 0:
+            compressed = stream.read(min(DECOMPRESS_CHUNK_SIZE, remaining))
+            if not compressed:
+                break
+            remaining -= len(compressed)
+            chunk = decompressor.decompress(compressed, self.max_size - size + 1)
+            size += len(chunk)
+            if size > self.max_size or decompressor.unconsumed_tail:
+                raise ValueError(f"decompressed body exceeds {self.max_size} bytes")
+            chunks.append(chunk)
+        chunks.append(decompressor.flush())
+        if not decompressor.eof:
+            raise ValueError("truncated gzip body")
+        return b"".join(chunks)
@@ -10,6 +10,13 @@ def yaptide_response(message: str, code: int, content: dict = None) -> Response:
     return make_response(response_dict, code)
 
 
+def not_modified_response(etag: str) -> Response:
+    """Function returning Response object when resource has not changed since the version known to the client"""
+    response = make_response("", 304)
+    response.set_etag(etag)
+    return response
+
+
 def error_validation_response(content: dict = None) -> Response:
     """Function returning Response object when ValidationError occures"""
     return yaptide_response(message="Wrong data provided", code=400, content=content)
@@ -0,0 +1,84 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional
+
+from yaptide.persistence.db_methods import check_task_exists, fetch_task_ids_by_sim_id
+
+TASK_IDS_CACHE_TTL = 300  # seconds, default time after which task ids of the simulation are fetched again
+TASK_IDS_CACHE_SIZE = 1024  # maximal number of simulations with task ids kept in the in-process cache
+
+
+class TaskIdsCache:
+    """
+    Bounded LRU of ids of tasks of simulations, so updates of running tasks can be checked
+    without querying the database. Tasks are created together with their simulation,
+    entries expire after `ttl` seconds, so deleted simulations are noticed by all Flask processes.
+    """
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: OrderedDict[int, tuple[float, frozenset[int]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sim_id: int) -> Optional[frozenset[int]]:
+        """Returns task ids of the simulation or None if there is no valid entry"""
+        with self._lock:
+            entry = self._entries.get(sim_id)
+            if entry is None:
+                return None
+            expires_at, task_ids = entry
+            if expires_at <= time.monotonic():
+                del self._entries[sim_id]
+                return None
+            self._entries.move_to_end(sim_id)
+            return task_ids
+
+    def set(self, sim_id: int, task_ids: set[int]) -> None:
+        """Stores task ids of the simulation"""
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[sim_id] = (time.monotonic() + self.ttl, frozenset(task_ids))
+            self._entries.move_to_end(sim_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate_simulation(self, sim_id: int) -> None:
+        """Removes task ids of the simulation from the cache"""
+        with self._lock:
+            self._entries.pop(sim_id, None)
+
+
+@lru_cache(maxsize=1)
+def get_task_ids_cache() -> TaskIdsCache:
+    """Returns task ids cache of the process, TTL is configured with `TASK_IDS_CACHE_TTL` environment variable"""
+    ttl = float(os.environ.get("TASK_IDS_CACHE_TTL", TASK_IDS_CACHE_TTL))
+    return TaskIdsCache(ttl=ttl, maxsize=TASK_IDS_CACHE_SIZE)
+
+
+def verify_task_exists(sim_id: int, task_id: int) -> bool:
+    """
+    Checks if the task of the simulation exists. Task ids of the simulation are cached,
+    so updates of known tasks do not query the database, unknown task ids are checked in the database.
+    """
+    cache = get_task_ids_cache()
+    task_ids = cache.get(sim_id)
+    if task_ids is not None:
+        if task_id in task_ids:
+            return True
+        # tasks may have been added after the entry was stored, e.g. batch tasks are committed after job submission
+        if not check_task_exists(sim_id=sim_id, task_id=task_id):
+            return False
+    task_ids = fetch_task_ids_by_sim_id(sim_id=sim_id)
+    if task_ids:
+        cache.set(sim_id, task_ids)
+    return task_id in task_ids
+
+
+def invalidate_simulation_task_ids(sim_id: int) -> None:
+    """Removes task ids of the simulation from the task ids cache"""
+    get_task_ids_cache().invalidate_simulation(sim_id)
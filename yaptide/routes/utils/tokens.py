@@ -1,6 +1,6 @@
 from datetime import datetime, timedelta
 from secrets import token_hex
-from typing import Union
+from typing import Optional, Union
 
 import jwt
 
@@ -67,3 +67,17 @@ def decode_auth_token(token: str, is_refresh: bool = False, payload_key_to_retur
         return "Signature expired."
     except jwt.InvalidTokenError:
         return "Invalid token."
+
+
+def decode_simulation_auth_token(token: str) -> tuple[Union[int, str], Optional[datetime]]:
+    """
+    Function decoding simulation 'update_key', returns simulation id and expiration time of the token.
+    For invalid token returns error message and None, as `decode_auth_token` does.
+    """
+    try:
+        payload = jwt.decode(token, SECRET_KEY_TOKEN, algorithms=["HS256"])
+        return int(payload["simulation_id"]), datetime.utcfromtimestamp(payload["exp"])
+    except jwt.ExpiredSignatureError:
+        return "Signature expired.", None
+    except jwt.InvalidTokenError:
+        return "Invalid token.", None
@@ -0,0 +1,122 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional
+
+from yaptide.persistence.db_methods import check_simulation_exists
+from yaptide.routes.utils.tokens import decode_simulation_auth_token
+
+UPDATE_KEY_CACHE_TTL = 300  # seconds, default time after which existence of the simulation is checked again
+UPDATE_KEY_CACHE_SIZE = 4096  # maximal number of verified update keys kept in the in-process cache
+UPDATE_KEY_CACHE_STATS_INTERVAL = 10000  # number of lookups after which cache statistics are logged
+
+
+class UpdateKeyCache:
+    """
+    Bounded LRU of verified simulation update keys, mapped to simulation id and expiration time of the entry.
+    Entry expires with the key itself or after `ttl` seconds, whichever comes first,
+    so deleted simulations are noticed by all Flask processes after at most `ttl` seconds.
+    """
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, update_key: str) -> Optional[int]:
+        """Returns id of the simulation of verified update key or None if there is no valid entry"""
+        with self._lock:
+            sim_id = self._get(update_key)
+            if sim_id is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            lookups = self.hits + self.misses
+        if lookups % UPDATE_KEY_CACHE_STATS_INTERVAL == 0:
+            logging.info("Update key cache statistics: %s", self.stats())
+        return sim_id
+
+    def set(self, update_key: str, sim_id: int, key_expires_at: datetime) -> None:
+        """Stores verified update key of the simulation, `key_expires_at` is expiration time (UTC) of the key"""
+        if self.ttl <= 0:
+            return
+        key_lifetime = (key_expires_at - datetime.utcnow()).total_seconds()
+        expires_at = time.monotonic() + min(self.ttl, key_lifetime)
+        with self._lock:
+            self._entries[update_key] = (expires_at, sim_id)
+            self._entries.move_to_end(update_key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate_simulation(self, sim_id: int) -> None:
+        """Removes all update keys of the simulation from the cache"""
+        with self._lock:
+            for update_key in [key for key, (_, key_sim_id) in self._entries.items() if key_sim_id == sim_id]:
+                del self._entries[update_key]
+
+    def clear(self) -> None:
+        """Removes all entries from the cache and resets statistics"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Returns cache statistics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+            }
+
+    def _get(self, update_key: str) -> Optional[int]:
+        entry = self._entries.get(update_key)
+        if entry is None:
+            return None
+        expires_at, sim_id = entry
+        if expires_at <= time.monotonic():
+            del self._entries[update_key]
+            return None
+        self._entries.move_to_end(update_key)
+        return sim_id
+
+
+@lru_cache(maxsize=1)
+def get_update_key_cache() -> UpdateKeyCache:
+    """Returns update key cache of the process, TTL is configured with `UPDATE_KEY_CACHE_TTL` environment variable"""
+    ttl = float(os.environ.get("UPDATE_KEY_CACHE_TTL", UPDATE_KEY_CACHE_TTL))
+    return UpdateKeyCache(ttl=ttl, maxsize=UPDATE_KEY_CACHE_SIZE)
+
+
+def verify_update_key(update_key: str, sim_id: int) -> Optional[str]:
+    """
+    Verifies that the update key was issued for the simulation and that the simulation exists.
+    Returns None for a valid key, otherwise a message describing the problem.
+    Verified keys are cached, so the token is decoded and the database is queried once per key.
+    Database is queried only for keys with valid signature, so forged keys do not reveal which simulations exist.
+    """
+    cache = get_update_key_cache()
+    if cache.get(update_key) == sim_id:
+        return None
+    decoded_sim_id, key_expires_at = decode_simulation_auth_token(update_key)
+    if decoded_sim_id != sim_id:
+        return "Invalid update key"
+    if not check_simulation_exists(sim_id=sim_id):
+        return f"Simulation {sim_id} does not exist"
+    cache.set(update_key, sim_id=sim_id, key_expires_at=key_expires_at)
+    return None
+
+
+def invalidate_simulation_update_keys(sim_id: int) -> None:
+    """Removes update keys of the simulation from the update key cache"""
+    get_update_key_cache().invalidate_simulation(sim_id)
@@ -0,0 +1,171 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Union
+
+import redis
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from yaptide.persistence.database import db
+from yaptide.persistence.db_methods import fetch_user_by_id
+from yaptide.persistence.models import KeycloakUserModel, UserModel, YaptideUserModel
+from yaptide.routes.utils.tokens import decode_auth_token
+from yaptide.utils.redis_client import get_redis_client, redis_key
+
+USER_CACHE_TTL = 30  # seconds, default time after which cached user is fetched again from the database
+USER_CACHE_SIZE = 1024  # maximal number of users kept in the in-process cache
+USER_CACHE_STATS_INTERVAL = 1000  # number of lookups after which cache statistics are logged
+
+# Only columns of the base user table are cached. Passwords, certificates and private keys are never stored
+# in the cache, they are loaded from the database on first access (see `user_from_snapshot`).
+CACHED_USER_COLUMNS = ("id", "username", "auth_provider")
+
+
+class UserCache:
+    """
+    Bounded cache of user snapshots keyed by user id, entries expire after `ttl` seconds.
+    If Redis client is provided, snapshots are kept in Redis and shared between all Flask processes,
+    so invalidation is visible everywhere. Otherwise snapshots are kept in memory of the process
+    and other processes may serve a stale entry for at most `ttl` seconds.
+    """
+
+    def __init__(self, ttl: float, maxsize: int, redis_client: Optional[redis.Redis] = None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.redis_client = redis_client
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[int, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[dict]:
+        """Returns cached snapshot of the user or None if there is no valid entry"""
+        snapshot = self._get_from_redis(user_id) if self.redis_client else self._get_from_memory(user_id)
+        with self._lock:
+            if snapshot is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            lookups = self.hits + self.misses
+        if lookups % USER_CACHE_STATS_INTERVAL == 0:
+            logging.info("User cache statistics: %s", self.stats())
+        return snapshot
+
+    def set(self, user_id: int, snapshot: dict) -> None:
+        """Stores snapshot of the user"""
+        if self.ttl <= 0:
+            return
+        if self.redis_client:
+            try:
+                self.redis_client.set(redis_key("user", user_id), json.dumps(snapshot), ex=max(1, int(self.ttl)))
+            except redis.RedisError as e:
+                logging.warning("Unable to store user %d in Redis cache: %s", user_id, e)
+            return
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, snapshot)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        """Removes user from the cache"""
+        if self.redis_client:
+            try:
+                self.redis_client.delete(redis_key("user", user_id))
+            except redis.RedisError as e:
+                logging.warning("Unable to remove user %d from Redis cache: %s", user_id, e)
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        """Removes all entries from the in-process cache and resets statistics"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Returns cache statistics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "redis" if self.redis_client else "memory",
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+            }
+
+    def _get_from_memory(self, user_id: int) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, snapshot = entry
+            if expires_at <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return snapshot
+
+    def _get_from_redis(self, user_id: int) -> Optional[dict]:
+        try:
+            data = self.redis_client.get(redis_key("user", user_id))
+        except redis.RedisError as e:
+            logging.warning("Unable to read user %d from Redis cache: %s", user_id, e)
+            return None
+        return json.loads(data) if data else None
+
+
+@lru_cache(maxsize=1)
+def get_user_cache() -> UserCache:
+    """Returns user cache of the process, TTL is configured with `USER_CACHE_TTL` environment variable"""
+    ttl = float(os.environ.get("USER_CACHE_TTL", USER_CACHE_TTL))
+    return UserCache(ttl=ttl, maxsize=USER_CACHE_SIZE, redis_client=get_redis_client())
+
+
+def user_snapshot(user: UserModel) -> dict:
+    """Returns dictionary with cached columns of the user"""
+    return {column: getattr(user, column) for column in CACHED_USER_COLUMNS}
+
+
+def user_from_snapshot(snapshot: dict) -> Union[KeycloakUserModel, YaptideUserModel]:
+    """
+    Rebuilds user object from the snapshot and attaches it to the current session without querying the database.
+    Columns which are not part of the snapshot are expired and loaded on first access.
+    """
+    mapper = inspect(UserModel).polymorphic_map[snapshot["auth_provider"]]
+    user = mapper.class_(**snapshot)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def fetch_user_by_id_cached(user_id: int) -> Optional[Union[KeycloakUserModel, YaptideUserModel]]:
+    """Fetches user by id, using the user cache before querying the database"""
+    cache = get_user_cache()
+    snapshot = cache.get(user_id)
+    if snapshot is not None:
+        return user_from_snapshot(snapshot)
+    user = fetch_user_by_id(user_id=user_id)
+    if user:
+        cache.set(user_id, user_snapshot(user))
+    return user
+
+
+def invalidate_cached_user(user_id: int) -> None:
+    """Removes user from the user cache"""
+    get_user_cache().invalidate(user_id)
+
+
+def invalidate_cached_user_by_token(token: Optional[str]) -> None:
+    """Removes user identified by the access token from the user cache, invalid tokens are ignored"""
+    if not token:
+        return
+    user_id = decode_auth_token(token=token)
+    if isinstance(user_id, int):
+        invalidate_cached_user(user_id)
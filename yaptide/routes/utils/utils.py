@@ -1,21 +1,220 @@
-from typing import Optional
+from collections import Counter
+from typing import Optional, Union
 import logging
+import math
 
-from yaptide.persistence.db_methods import fetch_simulation_by_job_id
-from yaptide.persistence.models import UserModel
-from yaptide.utils.enums import InputType
+from flask import Response, g, request
+
+from yaptide.persistence.db_methods import (
+    fetch_simulation_by_job_id,
+    fetch_task_ids_by_sim_id_and_state,
+    fetch_task_states_count_by_sim_id,
+    fetch_task_states_summary_by_sim_id,
+    fetch_tasks_by_sim_id,
+    fetch_tasks_by_sim_ids_and_task_ids,
+    fetch_tasks_estimated_time_range_by_sim_id,
+    fetch_tasks_page_by_sim_id,
+    fetch_unfinished_tasks_by_sim_id,
+    fetch_unfinished_tasks_progress_by_sim_id,
+)
+from yaptide.persistence.job_events import fetch_changed_task_ids, fetch_status_version
+from yaptide.persistence.live_progress import fetch_live_progress
+from yaptide.persistence.throughput import estimate_job_time, fetch_throughput
+from yaptide.persistence.models import BatchSimulationModel, CelerySimulationModel, UserModel, split_estimated_time
+from yaptide.utils.enums import EntityState, InputType, PlatformType
 from yaptide.utils.sim_utils import files_dict_with_adjusted_primaries, get_total_number_of_primaries
 
+MAX_TASKS_PAGE_SIZE = 1000  # maximal number of task statuses returned in a single page of job status
+MAX_FLUKA_CYCLES = 100  # maximal number of cycles of a single FLUKA task
+
 
-def check_if_job_is_owned_and_exist(job_id: str, user: UserModel) -> tuple[bool, str, int]:
-    """Function checking if provided task is owned by user managing action"""
-    simulation = fetch_simulation_by_job_id(job_id=job_id)
+def fetch_request_simulation(job_id: str) -> Optional[Union[BatchSimulationModel, CelerySimulationModel]]:
+    """
+    Function fetching simulation by job id, cached for the duration of the current request.
+    Handlers usually check ownership and then need the same simulation again,
+    with the cache this takes only one query. Missing simulations are not cached.
+    """
+    cache: dict = g.setdefault("simulations_by_job_id", {})
+    simulation = cache.get(job_id)
+    if simulation is None:
+        simulation = fetch_simulation_by_job_id(job_id=job_id)
+        if simulation is not None:
+            cache[job_id] = simulation
+    return simulation
 
-    if not simulation:
-        return False, "Job with provided ID does not exist", 404
-    if simulation.user_id == user.id:
-        return True, "", 200
-    return False, "Job with provided ID does not belong to the user", 403
+
+def fetch_owned_simulation(
+    job_id: str, user: UserModel, platform: Optional[PlatformType] = None
+) -> tuple[Optional[Union[BatchSimulationModel, CelerySimulationModel]], str, int]:
+    """
+    Function returning simulation with provided job id if it exists and is owned by user managing action.
+    If platform is provided, simulation has to be run on this platform.
+    Returns tuple (simulation, "", 200) or (None, error message, response code) if the check fails.
+    """
+    simulation = fetch_request_simulation(job_id=job_id)
+
+    if not simulation or (platform is not None and simulation.platform != platform.value):
+        return None, "Job with provided ID does not exist", 404
+    if simulation.user_id != user.id:
+        return None, "Job with provided ID does not belong to the user", 403
+    return simulation, "", 200
+
+
+def get_job_tasks_info(
+    simulation: Union[BatchSimulationModel, CelerySimulationModel],
+    summary: bool = False,
+    after_task_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    changed_task_ids: Optional[set[int]] = None,
+) -> tuple[dict, Counter]:
+    """
+    Function returning tasks part of the job status response and number of tasks in each state.
+    Depending on request parameters, the response contains:
+    - `job_tasks_summary` with aggregated state of all tasks, if `summary` is set,
+    - statuses of changed tasks only (`changed_tasks_only` is set), if `changed_task_ids` are provided,
+    - a page of at most `limit` task statuses following `after_task_id`, with `next_task_id` cursor
+      if there are more tasks, if `limit` is set,
+    - statuses of all tasks otherwise.
+    Task statuses are sorted by `task_id`, as in `/jobs` response.
+    """
+    if summary:
+        job_tasks_summary, task_states = get_job_tasks_summary(simulation=simulation)
+        return {"job_tasks_summary": job_tasks_summary}, task_states
+
+    live_progress = fetch_live_progress(sim_id=simulation.id)
+    tasks_info = {}
+    if changed_task_ids is not None:
+        tasks = fetch_tasks_by_sim_ids_and_task_ids(
+            task_keys=[(simulation.id, task_id) for task_id in changed_task_ids]
+        )
+        tasks_info["changed_tasks_only"] = True
+    elif limit is not None:
+        tasks = fetch_tasks_page_by_sim_id(sim_id=simulation.id, after_id=after_task_id, limit=limit + 1)
+        if len(tasks) > limit:
+            tasks = tasks[:limit]
+            tasks_info["next_task_id"] = tasks[-1].id
+    else:
+        tasks = fetch_tasks_by_sim_id(sim_id=simulation.id)
+    job_tasks_status = [task.get_status_dict(live_progress.get(task.task_id)) for task in tasks]
+    tasks_info["job_tasks_status"] = sorted(job_tasks_status, key=lambda x: x["task_id"])
+
+    if changed_task_ids is None and limit is None:
+        task_states = Counter([task["task_state"] for task in job_tasks_status])
+    else:
+        task_states = Counter(fetch_task_states_count_by_sim_id(sim_id=simulation.id))
+    return tasks_info, task_states
+
+
+def get_job_tasks_summary(simulation: Union[BatchSimulationModel, CelerySimulationModel]) -> tuple[dict, Counter]:
+    """
+    Function returning aggregated state of the simulation tasks and number of tasks in each state.
+    Aggregates are computed by the database, only progress of running tasks kept in the live progress store
+    is combined with them, so the cost does not grow with the number of finished tasks.
+    """
+    task_states = Counter()
+    requested_primaries = simulated_primaries = 0
+    for task_state, tasks_count, requested, simulated in fetch_task_states_summary_by_sim_id(sim_id=simulation.id):
+        task_states[task_state] = tasks_count
+        requested_primaries += requested
+        simulated_primaries += simulated
+
+    live_progress = fetch_live_progress(sim_id=simulation.id)
+    live_tasks = fetch_unfinished_tasks_progress_by_sim_id(sim_id=simulation.id, task_ids=list(live_progress))
+    estimated_times = []
+    for task_id, simulated, estimated_time, end_time in live_tasks:
+        progress = live_progress[task_id]
+        simulated_primaries += progress.get("simulated_primaries", simulated) - simulated
+        if end_time is None:
+            estimated_time = progress.get("estimated_time", estimated_time)
+        if estimated_time:
+            estimated_times.append(estimated_time)
+    estimated_time_range = fetch_tasks_estimated_time_range_by_sim_id(
+        sim_id=simulation.id, exclude_task_ids=[task_id for task_id, *_ in live_tasks]
+    )
+    estimated_times += [estimated_time for estimated_time in estimated_time_range if estimated_time]
+
+    job_tasks_summary = {
+        "tasks_count": sum(task_states.values()),
+        "task_states": dict(task_states),
+        "requested_primaries": requested_primaries,
+        "simulated_primaries": simulated_primaries,
+        "failed_task_ids": fetch_task_ids_by_sim_id_and_state(
+            sim_id=simulation.id, task_state=EntityState.FAILED.value
+        ),
+    }
+    if estimated_times:
+        job_tasks_summary["estimated_time_min"] = split_estimated_time(min(estimated_times))
+        job_tasks_summary["estimated_time_max"] = split_estimated_time(max(estimated_times))
+    return job_tasks_summary, task_states
+
+
+def get_job_progress(simulation: Union[BatchSimulationModel, CelerySimulationModel]) -> Optional[dict]:
+    """
+    Function returning throughput of the job (`primaries_per_second`, sum of rates of running tasks)
+    and its estimated time to finish (`estimated_time`), which accounts also for pending tasks.
+    Returns None if the job has no running tasks with known rate.
+    """
+    throughput = fetch_throughput(sim_id=simulation.id)
+    if not throughput:
+        return None
+    live_progress = fetch_live_progress(sim_id=simulation.id)
+    running_tasks, pending_tasks = [], []
+    for task_id, task_state, requested, simulated in fetch_unfinished_tasks_by_sim_id(sim_id=simulation.id):
+        if task_state == EntityState.PENDING.value:
+            pending_tasks.append(requested)
+            continue
+        task_throughput = throughput.get(task_id)
+        simulated = max(
+            simulated,
+            live_progress.get(task_id, {}).get("simulated_primaries", 0),
+            task_throughput.simulated_primaries if task_throughput else 0,
+        )
+        running_tasks.append((max(requested - simulated, 0), task_throughput.rate if task_throughput else None))
+    estimated_time = estimate_job_time(running_tasks=running_tasks, pending_tasks=pending_tasks)
+    if estimated_time is None:
+        return None
+    return {
+        "primaries_per_second": round(sum(rate for _, rate in running_tasks if rate), 1),
+        "estimated_time": split_estimated_time(math.ceil(estimated_time)),
+    }
+
+
+def get_job_status_version(
+    simulation: Union[BatchSimulationModel, CelerySimulationModel], since_version: Optional[str]
+) -> tuple[Optional[str], bool, Optional[set[int]]]:
+    """
+    Function checking which part of the job status has changed since the version known to the client,
+    sent as `If-None-Match` header (ETag of the previous response) or `since_version` parameter.
+    Returns tuple (current status version, True if nothing has changed, ids of changed tasks).
+    Ids of changed tasks are None if all tasks have to be returned.
+    """
+    status_version = fetch_status_version(sim_id=simulation.id)
+    if status_version is None:
+        return None, False, None
+    if since_version == status_version or request.if_none_match.contains(
+        job_status_etag(sim_id=simulation.id, status_version=status_version)
+    ):
+        return status_version, True, set()
+    if since_version is None:
+        return status_version, False, None
+    return status_version, False, fetch_changed_task_ids(sim_id=simulation.id, since_version=since_version)
+
+
+def job_status_etag(sim_id: int, status_version: str) -> str:
+    """Function returning ETag of job status response"""
+    return f"{sim_id}-{status_version}"
+
+
+def make_job_status_conditional(response: Response, sim_id: int, status_version: Optional[str]) -> Response:
+    """
+    Function adding ETag to job status response. If status version is not known, ETag is computed from
+    response content, so unchanged status is still answered with 304 Not Modified, saving the transfer.
+    """
+    if status_version is None:
+        response.add_etag()
+        return response.make_conditional(request)
+    response.set_etag(job_status_etag(sim_id=sim_id, status_version=status_version))
+    return response
 
 
 def determine_input_type(payload_dict: dict) -> Optional[str]:
@@ -100,3 +299,26 @@ def get_clamped_ntasks_value(payload_dict: dict, ntasks: int) -> int:
 
     # if ntasks is within range, return the original value
     return ntasks
+
+
+def get_clamped_cycles_value(cycles: int) -> int:
+    """
+    Function that validates number of cycles of FLUKA tasks and returns the number of cycles to use,
+    clamped to range [1; MAX_FLUKA_CYCLES]. Each cycle simulates equal part of primaries of the task.
+    """
+    if cycles < 1 or cycles > MAX_FLUKA_CYCLES:
+        clamped_cycles = min(max(cycles, 1), MAX_FLUKA_CYCLES)
+        logging.warning("Received %d as the cycles value. Clamping to %d.", cycles, clamped_cycles)
+        return clamped_cycles
+    return cycles
+
+
+def get_cycles_error(cycles: int, task_primaries: int) -> Optional[str]:
+    """
+    Function checking that primaries of each task can be divided evenly between its cycles,
+    as every cycle of FLUKA task simulates the same number of primaries.
+    Returns error message or None if the number of cycles is valid.
+    """
+    if task_primaries % cycles:
+        return f"Primaries of each task ({task_primaries}) cannot be divided evenly into {cycles} cycles"
+    return None
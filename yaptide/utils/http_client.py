@@ -0,0 +1,140 @@
+import gzip
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+BACKEND_CONNECT_TIMEOUT = 5  # seconds
+BACKEND_READ_TIMEOUT = 120  # seconds, saving large results in the database may take a while
+BACKEND_MAX_RETRIES = 3  # number of retries after the first attempt
+BACKEND_RETRY_BACKOFF = 0.5  # seconds, base of the exponential backoff between retries
+BACKEND_RETRY_BACKOFF_MAX = 10  # seconds, upper limit of a single backoff
+BACKEND_POOL_SIZE = 16  # number of keep-alive connections kept per worker process
+GZIP_THRESHOLD = 64 * 1024  # bytes, request bodies larger than this are sent gzip compressed
+RETRY_STATUS_CODES = frozenset({502, 503, 504})  # backend is unavailable, request was not processed
+STATS_LOG_INTERVAL = 1000  # number of requests after which client statistics are logged
+
+
+class BackendClient:
+    """
+    HTTP client used by workers to call Flask backend (task updates, results, logfiles, batch job updates).
+    A single session is kept per worker process, so connections to the backend are reused (keep-alive).
+    Requests are retried a bounded number of times with jittered exponential backoff
+    when the backend is unreachable or unavailable. Large JSON payloads are gzip compressed.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        connect_timeout: float = BACKEND_CONNECT_TIMEOUT,
+        read_timeout: float = BACKEND_READ_TIMEOUT,
+        max_retries: int = BACKEND_MAX_RETRIES,
+        retry_backoff: float = BACKEND_RETRY_BACKOFF,
+        pool_size: int = BACKEND_POOL_SIZE,
+        gzip_threshold: int = GZIP_THRESHOLD,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.gzip_threshold = gzip_threshold
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "failures": 0,
+            "retries": 0,
+            "total_latency_seconds": 0.0,
+            "max_latency_seconds": 0.0,
+        }
+
+    def post(self, path: str, payload: dict, idempotent: bool = True) -> Optional[requests.Response]:
+        """
+        Sends JSON payload to the backend endpoint, returns response or None if the backend could not be reached.
+        Non-idempotent requests (e.g. saving results) are not retried after a read timeout,
+        as the backend could have already processed them.
+        """
+        body = json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if len(body) > self.gzip_threshold:
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        url = f"{self.base_url}{path}"
+
+        for attempt in range(self.max_retries + 1):
+            start = time.monotonic()
+            response = None
+            try:
+                response = self.session.post(url, data=body, headers=headers, timeout=self.timeout)
+                retry = response.status_code in RETRY_STATUS_CODES
+                reason = f"status code {response.status_code}"
+            except requests.ConnectionError as e:
+                retry, reason = True, str(e)
+            except requests.Timeout as e:
+                retry, reason = idempotent, str(e)
+            self._record(latency=time.monotonic() - start, failed=response is None or response.status_code >= 400)
+            if not retry:
+                return response
+            if attempt == self.max_retries:
+                logging.warning("Request to %s failed after %d attempts: %s", url, attempt + 1, reason)
+                return response
+            backoff = random.uniform(0, min(BACKEND_RETRY_BACKOFF_MAX, self.retry_backoff * 2**attempt))
+            logging.info("Request to %s failed (%s), retrying in %.2f s", url, reason, backoff)
+            with self._stats_lock:
+                self._stats["retries"] += 1
+            time.sleep(backoff)
+        return None
+
+    def stats(self) -> dict:
+        """Returns counters of requests sent by this client"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["mean_latency_seconds"] = stats["total_latency_seconds"] / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+    def _record(self, latency: float, failed: bool) -> None:
+        with self._stats_lock:
+            self._stats["requests"] += 1
+            self._stats["failures"] += int(failed)
+            self._stats["total_latency_seconds"] += latency
+            self._stats["max_latency_seconds"] = max(self._stats["max_latency_seconds"], latency)
+            requests_count = self._stats["requests"]
+        if requests_count % STATS_LOG_INTERVAL == 0:
+            logging.info("Backend client statistics: %s", self.stats())
+
+
+_clients: dict[tuple[int, str], BackendClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_backend_client() -> Optional[BackendClient]:
+    """
+    Returns backend client of the current process, configured with environment variables:
+    `BACKEND_INTERNAL_URL` (required), `BACKEND_CONNECT_TIMEOUT`, `BACKEND_READ_TIMEOUT` and `BACKEND_MAX_RETRIES`.
+    Clients are not shared between forked processes, as connections of the pool cannot be shared.
+    """
+    flask_url = os.environ.get("BACKEND_INTERNAL_URL")
+    if not flask_url:
+        logging.warning("Flask URL not found via BACKEND_INTERNAL_URL")
+        return None
+    key = (os.getpid(), flask_url)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = BackendClient(
+                base_url=flask_url,
+                connect_timeout=float(os.environ.get("BACKEND_CONNECT_TIMEOUT", BACKEND_CONNECT_TIMEOUT)),
+                read_timeout=float(os.environ.get("BACKEND_READ_TIMEOUT", BACKEND_READ_TIMEOUT)),
+                max_retries=int(os.environ.get("BACKEND_MAX_RETRIES", BACKEND_MAX_RETRIES)),
+            )
+            _clients[key] = client
+    return client
@@ -0,0 +1,29 @@
+import logging
+import os
+from functools import lru_cache
+from typing import Optional
+
+import redis
+
+REDIS_KEY_PREFIX = "yaptide"
+REDIS_SOCKET_TIMEOUT = 2  # seconds, Redis is only used as an accelerator, so it must not block requests for long
+
+
+@lru_cache(maxsize=4)
+def get_redis_client(socket_timeout: float = REDIS_SOCKET_TIMEOUT) -> Optional[redis.Redis]:
+    """
+    Returns Redis client shared by the Flask server process, configured with `REDIS_URL` environment variable.
+    Redis is optional, if the variable is not set None is returned and callers fall back to in-process
+    or database only behaviour.
+    Blocking commands (e.g. `XREAD BLOCK`) need a client with socket timeout longer than the blocking time.
+    """
+    redis_url = os.environ.get("REDIS_URL")
+    if not redis_url:
+        logging.debug("REDIS_URL not set, Redis features are disabled")
+        return None
+    return redis.Redis.from_url(redis_url, socket_timeout=socket_timeout, socket_connect_timeout=REDIS_SOCKET_TIMEOUT)
+
+
+def redis_key(*parts) -> str:
+    """Returns Redis key built from provided parts, e.g. `redis_key("user", 5)` gives `yaptide:user:5`"""
+    return ":".join([REDIS_KEY_PREFIX, *(str(part) for part in parts)])
@@ -0,0 +1,135 @@
+import io
+import json
+import logging
+import tempfile
+import zipfile
+from collections.abc import Iterable, Iterator
+from typing import Optional
+
+import numpy as np
+
+EXPORT_CHUNK_SIZE = 1024 * 1024  # size of chunks in bytes, used when streaming files from disk
+# formats with values stored in Fortran order, the same as in `pymchelper.page.Page`
+FORTRAN_ORDER_FILE_FORMATS = {"bdo2016", "bdo2019", "fluka_binary"}
+
+
+class _StreamBuffer(io.RawIOBase):
+    """
+    Write-only, non-seekable buffer used as a target for `zipfile.ZipFile`.
+    Bytes written by the archive are collected until they are taken by the streaming generator.
+    As the buffer is not seekable, `zipfile` writes local headers with data descriptors,
+    which allows to produce the archive in a single forward pass.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        """Returns bytes written since the last call and empties the buffer"""
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def page_axes(page_dict: dict) -> list[dict]:
+    """Returns list of axes (`axis_dim1`, `axis_dim2`, ...) of the page in the order of dimensions"""
+    return [page_dict[f"axis_dim{i}"] for i in range(1, int(page_dict.get("dimensions", 0)) + 1)]
+
+
+def page_values(page_dict: dict, estimator_metadata: Optional[dict] = None) -> np.ndarray:
+    """
+    Converts page values to a native array.
+    Values are reshaped to the axes lengths if they match the number of values,
+    otherwise a flat array is returned. Values are flat in the order of the simulator output file,
+    Fortran order for formats in `FORTRAN_ORDER_FILE_FORMATS` (`file_format` of estimator metadata), C otherwise.
+    """
+    values = np.asarray(page_dict["data"]["values"], dtype=np.float64)
+    shape = tuple(len(axis["values"]) for axis in page_axes(page_dict))
+    if shape and int(np.prod(shape)) == values.size:
+        file_format = (estimator_metadata or {}).get("file_format")
+        values = values.reshape(shape, order="F" if file_format in FORTRAN_ORDER_FILE_FORMATS else "C")
+    return values
+
+
+def page_attributes(page_dict: dict, estimator_name: str, estimator_metadata: Optional[dict]) -> dict:
+    """Returns page description (everything except numerical arrays) which is stored as JSON attribute"""
+    return {
+        "estimator_name": estimator_name,
+        "estimator_metadata": estimator_metadata,
+        "dimensions": int(page_dict.get("dimensions", 0)),
+        "data": {key: value for key, value in page_dict["data"].items() if key != "values"},
+        "axes": [{key: value for key, value in axis.items() if key != "values"} for axis in page_axes(page_dict)],
+        "metadata": page_dict.get("metadata", {}),
+    }
+
+
+def stream_npz(pages: Iterable[tuple[str, Optional[dict], dict]]) -> Iterator[bytes]:
+    """
+    Streams NPZ archive built from pages provided by the iterable of
+    (estimator name, estimator metadata, page dict) tuples.
+    Each page is written as separate members of the archive:
+    - `<estimator>/page_<number>/values` - array with page values, reshaped to the axes lengths
+    - `<estimator>/page_<number>/axis_dim<i>` - array with values of i-th axis
+    - `<estimator>/page_<number>/attrs` - JSON string with page and estimator metadata
+    Only one page is kept in memory at a time and the archive bytes are yielded after each page.
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for estimator_name, estimator_metadata, page_dict in pages:
+            prefix = f"{estimator_name}/page_{page_dict['metadata']['page_number']}"
+            arrays = {"values": page_values(page_dict, estimator_metadata)}
+            for i, axis in enumerate(page_axes(page_dict), start=1):
+                arrays[f"axis_dim{i}"] = np.asarray(axis["values"], dtype=np.float64)
+            attrs = page_attributes(page_dict, estimator_name, estimator_metadata)
+            arrays["attrs"] = np.array(json.dumps(attrs))
+            for array_name, array in arrays.items():
+                with archive.open(f"{prefix}/{array_name}.npy", mode="w", force_zip64=True) as member:
+                    np.lib.format.write_array(member, array, allow_pickle=False)
+            yield buffer.take()
+    yield buffer.take()
+
+
+def stream_hdf5(pages: Iterable[tuple[str, Optional[dict], dict]]) -> Iterator[bytes]:
+    """
+    Streams HDF5 file built from pages provided by the iterable of
+    (estimator name, estimator metadata, page dict) tuples.
+    HDF5 format requires random access, so the file is written page by page into a temporary file
+    and then streamed in chunks. Each page is stored as `/<estimator>/page_<number>` dataset
+    with axes and metadata kept as dataset attributes.
+    Requires optional `h5py` package.
+    """
+    import h5py  # skipcq: PYL-C0415
+
+    with tempfile.TemporaryFile() as tmp_file:
+        with h5py.File(tmp_file, mode="w") as h5_file:
+            for estimator_name, estimator_metadata, page_dict in pages:
+                group = h5_file.require_group(estimator_name)
+                if estimator_metadata is not None and "metadata" not in group.attrs:
+                    group.attrs["metadata"] = json.dumps(estimator_metadata)
+                dataset = group.create_dataset(
+                    f"page_{page_dict['metadata']['page_number']}", data=page_values(page_dict, estimator_metadata)
+                )
+                for i, axis in enumerate(page_axes(page_dict), start=1):
+                    dataset.attrs[f"axis_dim{i}"] = np.asarray(axis["values"], dtype=np.float64)
+                dataset.attrs["attrs"] = json.dumps(page_attributes(page_dict, estimator_name, estimator_metadata))
+        logging.debug("HDF5 export written, %d bytes", tmp_file.tell())
+        tmp_file.seek(0)
+        while chunk := tmp_file.read(EXPORT_CHUNK_SIZE):
+            yield chunk
+
+
+def hdf5_available() -> bool:
+    """Checks if optional `h5py` package, required for HDF5 export, is installed"""
+    try:
+        import h5py  # noqa: F401 skipcq: PYL-C0415, PYL-W0611
+    except ImportError:
+        return False
+    return True